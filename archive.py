@@ -0,0 +1,236 @@
+import os
+import sys
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+# Archivio WARC delle pagine scaricate.
+# Ogni risposta HTTP (fetch.get) e ogni lettura di page_source da Selenium (fetch.get_page_source)
+# viene aggiunta a un file WARC compresso (.warc.gz, un membro gzip per record, come da standard):
+# le risposte HTTP come record "response" con stato e intestazioni, gli snapshot del DOM come
+# record "resource" text/html.
+# Quando un selettore si rompe, reextract.py riesegue l'estrazione del sito sull'archivio, in
+# parallelo e senza rete, invece di ripetere l'intero crawl.
+# Essendo un membro gzip per record, ogni record si rilegge direttamente dal suo offset compresso.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_WARC  "1" per archiviare in archives/<nome script>.warc.gz, un percorso per sceglierlo,
+#                 vuoto per disattivare (default)
+
+WARC_ENV = "SCRAPER_WARC"
+ARCHIVE_DIR = "archives"
+WARC_VERSION = "WARC/1.1"
+
+READ_CHUNK = 1 << 16
+
+# Intestazioni che non descrivono più il corpo archiviato (requests lo restituisce già decompresso)
+_STALE_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
+
+
+def default_archive_path(site=None):
+    """Percorso di default dell'archivio di un sito (default: lo script in esecuzione)."""
+    site = site or os.path.splitext(os.path.basename(sys.argv[0] or "scraper"))[0] or "scraper"
+    return os.path.join(ARCHIVE_DIR, f"{site}.warc.gz")
+
+
+def _warc_date():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _header_value(value):
+    """Valore di intestazione su una sola riga."""
+    return str(value).replace("\r", " ").replace("\n", " ")
+
+
+class WarcWriter:
+    """Scrittura in append di record WARC, un membro gzip per record; thread-safe."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.records = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "ab")
+        info = (f"software: webscraper_tools\r\nformat: WARC File Format 1.1\r\n"
+                f"command: {_header_value(' '.join(sys.argv))}\r\n").encode("utf-8")
+        self._write("warcinfo", None, "application/warc-fields", info)
+        print(f"Archivio WARC: {self.path}")
+
+    def _write(self, record_type, url, content_type, block):
+        headers = [
+            WARC_VERSION,
+            f"WARC-Type: {record_type}",
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+            f"WARC-Date: {_warc_date()}",
+        ]
+        if url:
+            headers.append(f"WARC-Target-URI: {_header_value(url)}")
+        headers.append(f"Content-Type: {content_type}")
+        headers.append(f"Content-Length: {len(block)}")
+        record = ("\r\n".join(headers) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        self.file.write(compressor.compress(record) + compressor.flush())
+        self.file.flush()  # Un crash non perde i record già scritti
+        self.records += 1
+
+    def write(self, record_type, url, content_type, block):
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self._write(record_type, url, content_type, block)
+
+    def write_response(self, url, status, reason, headers, body):
+        """Archivia una risposta HTTP (record "response") con il corpo già decodificato."""
+        lines = [f"HTTP/1.1 {status} {reason or ''}".rstrip()]
+        for name, value in (headers or {}).items():
+            if name.lower() in _STALE_HEADERS:
+                name = f"X-Archive-Orig-{name}"
+            lines.append(f"{name}: {_header_value(value)}")
+        lines.append(f"Content-Length: {len(body)}")
+        block = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8", "replace") + body
+        self.write("response", url, "application/http; msgtype=response", block)
+
+    def write_page(self, url, html):
+        """Archivia uno snapshot del DOM letto dal browser (record "resource")."""
+        self.write("resource", url, "text/html; charset=utf-8", html.encode("utf-8"))
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class WarcRecord:
+    """Record letto da un archivio: tipo, URL, data, stato e intestazioni HTTP (se presenti) e contenuto."""
+
+    def __init__(self, headers, block):
+        self.headers = headers
+        self.type = headers.get("warc-type", "")
+        self.url = headers.get("warc-target-uri")
+        self.date = headers.get("warc-date")
+        self.status = None
+        self.http_headers = {}
+        self.content_type = headers.get("content-type", "")
+        self.payload = block
+        if self.type == "response" and self.content_type.startswith("application/http"):
+            head, _, self.payload = block.partition(b"\r\n\r\n")
+            lines = head.decode("iso-8859-1").split("\r\n")
+            parts = lines[0].split(" ", 2)
+            self.status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                self.http_headers[name.strip().lower()] = value.strip()
+            self.content_type = self.http_headers.get("content-type", "")
+        elif self.type == "resource":
+            self.status = 200
+
+    @property
+    def is_html(self):
+        return "html" in self.content_type.lower()
+
+    def text(self):
+        """Contenuto decodificato con il charset dichiarato (default utf-8)."""
+        charset = "utf-8"
+        for part in self.content_type.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name.lower() == "charset" and value:
+                charset = value.strip("\"'")
+        try:
+            return self.payload.decode(charset, "replace")
+        except LookupError:
+            return self.payload.decode("utf-8", "replace")
+
+
+def parse_record(data):
+    """Costruisce un WarcRecord dai byte decompressi di un record."""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    lines = head.decode("utf-8", "replace").split("\r\n")
+    if not lines or not lines[0].startswith("WARC/"):
+        raise ValueError(f"Record WARC non valido: {lines[0][:40] if lines else ''!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", len(rest)))
+    return WarcRecord(headers, rest[:length])
+
+
+def iter_members(f):
+    """Membri gzip di un file come coppie (offset compresso, byte decompressi)."""
+    offset = 0
+    buffer = b""
+    while True:
+        decompressor = zlib.decompressobj(31)
+        start = offset
+        parts = []
+        while not decompressor.eof:
+            if not buffer:
+                buffer = f.read(READ_CHUNK)
+                if not buffer:
+                    if parts or offset != start:
+                        print(f"Archivio troncato: record incompleto all'offset {start} ignorato.")
+                    return
+            parts.append(decompressor.decompress(buffer))
+            offset += len(buffer) - len(decompressor.unused_data)
+            buffer = decompressor.unused_data
+        yield start, b"".join(parts)
+
+
+def iter_records(path):
+    """Record dell'archivio `path` come coppie (offset, WarcRecord), nell'ordine di scrittura."""
+    with open(path, "rb") as f:
+        for offset, data in iter_members(f):
+            yield offset, parse_record(data)
+
+
+def read_record(f, offset):
+    """Rilegge il record all'offset compresso `offset` del file binario aperto `f`."""
+    f.seek(offset)
+    for _, data in iter_members(f):
+        return parse_record(data)
+    raise ValueError(f"Nessun record all'offset {offset}")
+
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer():
+    """Archivio del processo secondo SCRAPER_WARC, oppure None se l'archiviazione è disattivata."""
+    global _WRITER
+    value = os.environ.get(WARC_ENV, "")
+    if not value or value == "0":
+        return None
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = WarcWriter(default_archive_path() if value == "1" else value)
+    return _WRITER
+
+
+def archive_response(url, response):
+    """Aggiunge una risposta requests all'archivio, se attivo (le risposte in streaming sono escluse)."""
+    writer = get_writer()
+    if writer is None or response._content is False:
+        return
+    try:
+        writer.write_response(url, response.status_code, response.reason, response.headers, response.content)
+    except OSError as e:
+        print(f"Risposta non archiviata ({url}): {e}")
+
+
+def archive_page(url, html):
+    """Aggiunge all'archivio, se attivo, l'HTML corrente di una pagina letta dal browser."""
+    writer = get_writer()
+    if writer is None:
+        return
+    try:
+        writer.write_page(url, html)
+    except OSError as e:
+        print(f"Pagina non archiviata ({url}): {e}")
@@ -0,0 +1,527 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cassette
+
+try:
+    import resource
+except ImportError:  # Windows: il picco RSS non è disponibile
+    resource = None
+
+# Benchmark delle funzioni di estrazione di ogni scraper su pagine salvate.
+# Le fixture sono cassette (vedi cassette.py) in benchmarks/fixtures/<modulo>.jsonl.gz:
+#   python benchmark.py --record scraper_hilti     -> esegue il caso sul sito reale e registra la fixture
+#   python benchmark.py                           -> esegue tutti i casi offline e confronta con la baseline
+#   python benchmark.py --save-baseline           -> salva i risultati come nuova baseline
+# Gli scraper Selenium vengono eseguiti con Chrome headless sul server di riproduzione locale.
+# Ogni caso gira in un processo separato (cwd temporanea), così il picco RSS è per-scraper
+# e gli eventuali CSV scritti con percorso relativo non toccano quelli del repository.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, "benchmarks", "fixtures")
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+
+# Variazione oltre la quale una metrica viene segnalata come regressione (10%)
+REGRESSION_THRESHOLD = 0.10
+
+
+# --- Casi di benchmark ---
+# Ogni caso riceve il modulo dello scraper e il driver (None per gli scraper basati su requests)
+# e restituisce la lista dei record estratti.
+
+def _follow_listing(listing_function, driver, start_url):
+    """Segue la paginazione (urls, next_url) di una funzione di elenco, restituendo tutti gli URL di dettaglio."""
+    detail_urls = []
+    current_url = start_url
+    seen = set()
+    while current_url and current_url not in seen:
+        seen.add(current_url)
+        urls_on_page, current_url = listing_function(driver, current_url)
+        detail_urls.extend(urls_on_page)
+    return list(dict.fromkeys(detail_urls))
+
+
+def bench_bigmat(m, driver):
+    return m.scrape_bigmat_products_paginated(m.BIGMAT_START_URL)
+
+
+def bench_dakota(m, driver):
+    return m.scrape_dakota_products_paginated(m.DAKOTA_START_URL)
+
+
+def bench_mapei(m, driver):
+    return m.scrape_mapei_products_paginated(m.MAPEI_START_URL)
+
+
+def bench_hilti(m, driver):
+    return [p for url in m.HILTI_URLS for p in m.scrape_hilti_page(url)]
+
+
+def bench_fischer(m, driver):
+    return [p for url in m.FISCHER_URLS for p in m.scrape_fischer_page(url)]
+
+
+def bench_maurer(m, driver):
+    return [p for url in m.MAURER_URLS for p in m.scrape_maurer_category(url)]
+
+
+def bench_bosch(m, driver):
+    return [p for url in m.category_urls for p in m.scrape_category_pages(url)]
+
+
+def bench_dewalt(m, driver):
+    scraper = m.DeWaltScraper()
+    scraper.scrape_url("https://www.dewalt.it/prodotti/utensili-manuali")
+    return scraper.products
+
+
+def bench_firstcorp(m, driver):
+    return m.scrape_products("https://www.firstcorporation.it/product-category/griglie-di-aerazione/")
+
+
+def bench_fitt(m, driver):
+    scraper = m.FittScraper()
+    scraper.scrape_all_products()
+    return scraper.products_data
+
+
+def bench_unifix(m, driver):
+    scraper = m.UnishopScraper("https://www.unishop.it/viteria/")
+    scraper.run()
+    return scraper.products
+
+
+def bench_poron(m, driver):
+    scraper = m.PoronScraperSelenium(use_selenium=False)
+    scraper.scrape_all_products()
+    return scraper.products_data
+
+
+def bench_palazzetti(m, driver):
+    urls = [m.PALAZZETTI_INITIAL_URL]
+    for _ in range(3):  # macro-categorie -> categorie -> prodotti
+        next_level = []
+        for url in urls:
+            next_level.extend(m.collect_links_from_listing(driver, url, m.LISTING_ITEM_CONTAINER_SELECTOR, m.LISTING_ITEM_LINK_SELECTOR))
+        urls = list(dict.fromkeys(next_level))
+    return [m.scrape_palazzetti_product_detail(driver, url) for url in urls]
+
+
+def bench_upower(m, driver):
+    urls = m.get_product_urls_from_listing(driver, m.UPOWER_LISTING_URL)
+    return [m.scrape_upower_product_detail(driver, url) for url in urls]
+
+
+def bench_volteco(m, driver):
+    urls = m.collect_product_links(driver, m.VOLTECO_INITIAL_URL)
+    return [m.scrape_product_detail_page(driver, url) for url in urls]
+
+
+def bench_weber(m, driver):
+    urls = m.scrape_weber_listing(driver, m.WEBER_LISTING_URL)
+    return [m.scrape_weber_product_detail(driver, url) for url in urls]
+
+
+def bench_weber_single(m, driver):
+    return [m.scrape_weber_single_product(driver, m.WEBER_PRODUCT_URL)]
+
+
+def bench_weberSG(m, driver):
+    urls = []
+    for start_url in m.START_URLS_FOR_LISTINGS:
+        urls.extend(_follow_listing(m.scrape_weber_listing_page_for_product_urls, driver, start_url))
+    return [m.scrape_weber_detail_page(driver, url) for url in urls]
+
+
+def bench_sait(m, driver):
+    urls = []
+    for start_url in m.SAIT_LISTING_URLS:
+        urls.extend(_follow_listing(m.scrape_sait_listing_page, driver, start_url))
+    return [m.scrape_sait_detail_page(driver, url) for url in urls]
+
+
+def bench_papillon(m, driver):
+    urls = []
+    for start_url in m.PAPILLON_START_URLS_FOR_CATEGORIES:
+        urls.extend(_follow_listing(m.scrape_papillon_category_page_for_product_urls, driver, start_url))
+    return [m.scrape_papillon_detail_page(driver, url) for url in urls]
+
+
+def bench_yamato(m, driver):
+    urls = []
+    for start_url in m.YAMATO_START_URLS_FOR_CATEGORIES:
+        urls.extend(_follow_listing(m.scrape_yamato_category_page_for_product_urls, driver, start_url))
+    return [m.scrape_yamato_detail_page(driver, url) for url in urls]
+
+
+def bench_kapriol(m, driver):
+    urls = []
+    for start_url in m.START_URLS_FOR_LISTINGS:
+        urls_on_page, _ = m.scrape_kapriol_listing_page_for_product_urls(driver, start_url, None)
+        urls.extend(urls_on_page)
+    return [m.scrape_kapriol_detail_page(driver, url) for url in dict.fromkeys(urls)]
+
+
+def bench_index(m, driver):
+    products = []
+    for start_url in m.START_URLS_FOR_LISTINGS:
+        products_on_page, _ = m.scrape_edilportale_listing_page(driver, start_url)
+        products.extend(products_on_page)
+    for product_data in products:
+        m.scrape_edilportale_detail_page(driver, product_data)
+    return products
+
+
+def bench_edilportale(m, driver):
+    driver.get(m.START_URL)
+    products = m.scrape_edilportale_listing_page(driver)
+    for product_data in products:
+        driver.get(product_data["product url"])
+        m.scrape_edilportale_detail_page(driver, product_data)
+    return products
+
+
+def bench_boero(m, driver):
+    products = []
+    for page_num in range(1, m.NUM_PAGES_TO_SCRAPE + 1):
+        page_url = f"{m.BASE_URL}{m.LISTING_PATH}" if page_num == 1 else f"{m.BASE_URL}{m.LISTING_PATH}?page={page_num}"
+        products.extend(m.scrape_boero_page(driver, page_url))
+    return products
+
+
+def bench_fassabortolo(m, driver):
+    return [p for url in m.FASSABORTOLO_URLS for p in m.scrape_fassabortolo_category(driver, url)]
+
+
+def bench_sika_imm(m, driver):
+    urls = m.get_product_urls_from_listing(driver, m.SIKA_LISTING_URL)
+    return [m.scrape_product_detail(driver, url) for url in urls]
+
+
+def bench_knauf(m, driver):
+    # scraper_knauf crea il proprio driver a livello di modulo
+    return m.scrape_knauf_products(m.KNAUF_URL)
+
+
+def bench_leca(m, driver):
+    scraper = m.LecaScraper(headless=True)
+    try:
+        return scraper.scrape_all_products()
+    finally:
+        scraper.driver.quit()
+
+
+def bench_sanmarco(m, driver):
+    scraper = m.ProductScraper(["https://www.sanmarco.it/prodotti/"], headless=True)
+    try:
+        return scraper.scrape_all_products()
+    finally:
+        scraper.driver.quit()
+
+
+def bench_raimondi(m, driver):
+    # scrape_products gestisce da sé driver e salvataggio (CSV relativo, finisce nella cwd temporanea)
+    m.scrape_products(m.BASE_URL)
+    return []
+
+
+# nome modulo -> (funzione del caso, richiede un browser condiviso)
+CASES = {
+    "scraper_BigMat": (bench_bigmat, False),
+    "scraper_dakota": (bench_dakota, False),
+    "scraper_mapei": (bench_mapei, False),
+    "scraper_hilti": (bench_hilti, False),
+    "scraper_fischer": (bench_fischer, False),
+    "scraper_maurer": (bench_maurer, False),
+    "scraper_bosch": (bench_bosch, False),
+    "scraper_dewalt": (bench_dewalt, False),
+    "scraper_FirstCorp": (bench_firstcorp, False),
+    "scraper_fitt": (bench_fitt, False),
+    "scraper_unifix": (bench_unifix, False),
+    "scraper_poron": (bench_poron, False),
+    "scraper_palazzetti": (bench_palazzetti, True),
+    "scraper_upower": (bench_upower, True),
+    "scraper_volteco": (bench_volteco, True),
+    "scraper_weber": (bench_weber, True),
+    "scraping_singolo_prova": (bench_weber_single, True),
+    "scraper_weberSG": (bench_weberSG, True),
+    "scraper_sait": (bench_sait, True),
+    "scraper_papillon": (bench_papillon, True),
+    "scraper_yamato": (bench_yamato, True),
+    "scraper_kapriol": (bench_kapriol, True),
+    "scraper_index": (bench_index, True),
+    "scraper_edilportale": (bench_edilportale, True),
+    "scraper_boero": (bench_boero, True),
+    "scraper_FassaBortolo": (bench_fassabortolo, True),
+    "scraper_sika_imm": (bench_sika_imm, True),
+    "scraper_knauf": (bench_knauf, False),
+    "scraper_leca": (bench_leca, False),
+    "scraper_sanmarco": (bench_sanmarco, False),
+    "scraper_raimondi": (bench_raimondi, False),
+}
+# Non inclusi: scraper.py (main_scraper salva il CSV nella cartella del repository)
+# e scraper_sika.py (ChromeDriverManager().install() richiede la rete anche offline).
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIR, f"{name}.jsonl.gz")
+
+
+class TimedCassette(cassette.Cassette):
+    """Cassetta che registra l'istante di ogni pagina servita, per calcolare le latenze per pagina."""
+
+    def __init__(self, path, mode, latency_ms=(0.0, 0.0)):
+        super().__init__(path, mode, latency_ms)
+        self.page_times = []
+
+    def reset(self):
+        self.replay_positions = {}
+        self.page_times = []
+
+    def lookup(self, method, url):
+        entry = super().lookup(method, url)
+        if entry is not None:
+            self.page_times.append(time.perf_counter())
+        return entry
+
+
+class NoSleepTime:
+    """Sostituto del modulo time per lo scraper in prova: salta le pause di cortesia."""
+
+    def __init__(self):
+        self.skipped_seconds = 0.0
+
+    def sleep(self, seconds):
+        self.skipped_seconds += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def create_browser():
+    from selenium import webdriver
+    from fetch import prepare_driver
+
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    return prepare_driver(webdriver.Chrome(options=chrome_options))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_once(case_function, module, driver, tape):
+    tape.reset()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        records = case_function(module, driver) or []
+        end = time.perf_counter()
+    # Latenza per pagina: intervallo tra una pagina servita e la successiva (l'ultima fino alla fine del caso)
+    marks = tape.page_times + [end]
+    page_latencies = [(b - a) * 1000 for a, b in zip(marks, marks[1:])]
+    return end - start, len(tape.page_times), len(records), page_latencies
+
+
+def run_case_in_process(name, repeat, output_file):
+    """Eseguito nel processo figlio: misura un singolo caso e scrive il risultato in JSON."""
+    case_function, needs_browser = CASES[name]
+    tape = TimedCassette(fixture_path(name), "replay")
+    cassette.use_cassette(tape)
+
+    module = importlib.import_module(name)
+    module.time = NoSleepTime()
+    driver = create_browser() if needs_browser else None
+
+    try:
+        durations, latencies = [], []
+        pages = records = 0
+        for _ in range(repeat):
+            duration, pages, records, page_latencies = run_once(case_function, module, driver, tape)
+            durations.append(duration)
+            latencies.extend(page_latencies)
+
+        # Passata separata per le allocazioni: tracemalloc rallenta l'esecuzione e falserebbe i tempi
+        tracemalloc.start()
+        run_once(case_function, module, driver, tape)
+        _, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    best = min(durations)
+    result = {
+        "scraper": name,
+        "pages": pages,
+        "records": records,
+        "seconds": round(best, 4),
+        "pages_per_second": round(pages / best, 2) if best > 0 else 0.0,
+        "page_ms_p50": round(percentile(latencies, 0.50), 2),
+        "page_ms_p90": round(percentile(latencies, 0.90), 2),
+        "page_ms_p99": round(percentile(latencies, 0.99), 2),
+        "page_ms_mean": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "alloc_peak_kb": round(alloc_peak / 1024, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "skipped_sleep_seconds": round(module.time.skipped_seconds / (repeat + 1), 1),
+    }
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_case(name, repeat):
+    """Esegue un caso in un processo figlio e restituisce il risultato (o un dizionario con l'errore)."""
+    if not os.path.exists(fixture_path(name)):
+        return {"scraper": name, "error": "fixture mancante (registrala con --record)"}
+    with tempfile.TemporaryDirectory() as work_dir:
+        output_file = os.path.join(work_dir, "result.json")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+        command = [sys.executable, os.path.join(REPO_DIR, "benchmark.py"), "--child", name,
+                   "--repeat", str(repeat), "--output", output_file]
+        completed = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0 or not os.path.exists(output_file):
+            last_lines = (completed.stderr or completed.stdout).strip().splitlines()[-3:]
+            return {"scraper": name, "error": " | ".join(last_lines) or f"exit code {completed.returncode}"}
+        with open(output_file, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def record_fixture(name):
+    """Esegue un caso sul sito reale registrando tutte le risposte nella fixture."""
+    case_function, needs_browser = CASES[name]
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = fixture_path(name)
+    if os.path.exists(path):
+        os.remove(path)
+    cassette.use_cassette(cassette.Cassette(path, "record"))
+    module = importlib.import_module(name)
+    driver = create_browser() if needs_browser else None
+    try:
+        records = case_function(module, driver) or []
+    finally:
+        if driver is not None:
+            driver.quit()
+    print(f"Fixture registrata in {path} ({len(records)} record estratti).")
+
+
+# Metriche confrontate con la baseline: True se "più alto è meglio"
+COMPARED_METRICS = {
+    "pages_per_second": True,
+    "page_ms_p50": False,
+    "page_ms_p90": False,
+    "alloc_peak_kb": False,
+    "peak_rss_kb": False,
+}
+
+
+def compare_with_baseline(results, baseline):
+    """Stampa le variazioni rispetto alla baseline e restituisce l'elenco delle regressioni."""
+    regressions = []
+    previous_by_name = {r["scraper"]: r for r in baseline.get("results", [])}
+    for result in results:
+        previous = previous_by_name.get(result["scraper"])
+        if not previous or "error" in result or "error" in previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -REGRESSION_THRESHOLD if higher_is_better else change > REGRESSION_THRESHOLD
+            if worse:
+                regressions.append(f"{result['scraper']}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scraper':<24}{'pagine':>8}{'record':>8}{'pag/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'alloc KB':>12}{'RSS KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['scraper']:<24}  ERRORE: {r['error']}")
+            continue
+        print(f"{r['scraper']:<24}{r['pages']:>8}{r['records']:>8}{r['pages_per_second']:>10}"
+              f"{r['page_ms_p50']:>10}{r['page_ms_p90']:>10}{r['page_ms_p99']:>10}"
+              f"{r['alloc_peak_kb']:>12}{str(r['peak_rss_kb']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark degli scraper su fixture registrate.")
+    parser.add_argument("scrapers", nargs="*", help="Moduli da misurare (default: tutti quelli con una fixture)")
+    parser.add_argument("--repeat", type=int, default=3, help="Ripetizioni per caso (vale il tempo migliore)")
+    parser.add_argument("--record", action="store_true", help="Registra le fixture dal sito reale invece di misurare")
+    parser.add_argument("--save-baseline", action="store_true", help="Salva i risultati come nuova baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Esce con codice 1 se ci sono regressioni")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_case_in_process(args.child, args.repeat, args.output)
+        return
+
+    names = args.scrapers or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        print(f"Nessun caso di benchmark per: {', '.join(unknown)}")
+        sys.exit(1)
+
+    if args.record:
+        for name in names:
+            record_fixture(name)
+        return
+
+    if not args.scrapers:
+        names = [n for n in names if os.path.exists(fixture_path(n))]
+        if not names:
+            print(f"Nessuna fixture trovata in {FIXTURES_DIR}. Registrale con: python benchmark.py --record <scraper>")
+            return
+
+    results = []
+    for name in names:
+        print(f"Benchmark {name}...")
+        results.append(run_case(name, args.repeat))
+
+    print()
+    print_table(results)
+
+    regressions = []
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f))
+        if regressions:
+            print(f"\nRegressioni rispetto alla baseline (soglia {REGRESSION_THRESHOLD:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+        else:
+            print("\nNessuna regressione rispetto alla baseline.")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+        print(f"Baseline salvata in {BASELINE_FILE}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+# Rilevamento dei blocchi (pagine di challenge/CAPTCHA, codici di stato anomali, blocchi "morbidi")
+# e interruttore automatico (circuit breaker) per host.
+# Ogni risposta HTTP e ogni navigazione Selenium passano dal rilevatore; dopo BLOCK_THRESHOLD
+# rilevamenti consecutivi sullo stesso host l'interruttore si apre e, per il periodo di pausa,
+# le richieste verso quell'host falliscono subito con HostBlocked (senza traffico di rete) mentre
+# gli altri host proseguono. La pausa raddoppia a ogni nuova apertura (fino a MAX_COOLDOWN) e
+# rispetta l'intestazione Retry-After; alla scadenza passa una richiesta di prova: se va a buon fine
+# l'interruttore si richiude, altrimenti si riapre subito.
+# HostBlocked è una requests.exceptions.ConnectionError, quindi gli scraper la gestiscono come un
+# normale errore di rete; la coda di lavori (jobqueue) rimanda il lavoro a fine pausa senza
+# consumare un tentativo.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_BLOCK_DETECTION  "0" per disattivare rilevamento e interruttore (default: attivi)
+#   SCRAPER_BLOCK_THRESHOLD  rilevamenti consecutivi che aprono l'interruttore di un host (default: 3)
+#   SCRAPER_BLOCK_COOLDOWN   secondi della prima pausa, raddoppiati a ogni riapertura (default: 60)
+
+BLOCK_DETECTION = os.environ.get("SCRAPER_BLOCK_DETECTION", "1") != "0"
+BLOCK_THRESHOLD = int(os.environ.get("SCRAPER_BLOCK_THRESHOLD", "3"))
+BLOCK_COOLDOWN = float(os.environ.get("SCRAPER_BLOCK_COOLDOWN", "60"))
+MAX_COOLDOWN = 3600.0
+
+# Codici di stato con cui i siti segnalano un blocco o un limite di frequenza
+BLOCK_STATUSES = {403, 429, 503}
+
+# Segni inequivocabili di una pagina di challenge (Cloudflare, PerimeterX, Imperva, DataDome, ...)
+STRONG_MARKERS = (
+    "cf-browser-verification", "cf_chl_opt", "<title>just a moment...</title>", "attention required! | cloudflare",
+    "px-captcha", "_incapsula_resource", "geo.captcha-delivery.com", "verify you are human",
+    "verifica di non essere un robot", "unusual traffic from your computer",
+)
+# Segni ambigui (es. un reCAPTCHA in un modulo di contatto): contano solo in pagine molto piccole
+WEAK_MARKERS = ("captcha", "access denied", "accesso negato", "request blocked", "richiesta bloccata")
+SOFT_BLOCK_BYTES = 15000   # Sotto questa dimensione una pagina con segni ambigui è considerata un blocco
+SCAN_BYTES = 65536         # Porzione iniziale della pagina in cui cercare i segni
+
+# Elementi tipici delle pagine di challenge, cercati nel browser dopo ogni navigazione
+DEFAULT_PAGE_SELECTORS = [
+    ("css", "div.cf-browser-verification"),
+    ("css", "form#challenge-form"),
+    ("css", "#challenge-running, #challenge-stage"),
+    ("css", "#px-captcha"),
+    ("css", "iframe[src*='captcha-delivery.com']"),
+]
+
+PAGE_SCRIPT = """
+var selectors = arguments[0], strong = arguments[1], weak = arguments[2], softBytes = arguments[3], scanBytes = arguments[4];
+function visible(node) {
+    return !!node && node.nodeType === 1 && !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+}
+function detect() {
+    for (var i = 0; i < selectors.length; i++) {
+        var kind = selectors[i][0], expression = selectors[i][1], node = null;
+        try {
+            node = kind === 'xpath'
+                ? document.evaluate(expression, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                : document.querySelector(expression);
+        } catch (e) { continue; }
+        if (visible(node)) { return 'selector:' + expression; }
+    }
+    var html = document.documentElement ? document.documentElement.outerHTML : '';
+    var head = html.slice(0, scanBytes).toLowerCase();
+    for (var j = 0; j < strong.length; j++) { if (head.indexOf(strong[j]) >= 0) { return 'marker:' + strong[j]; } }
+    if (html.length < softBytes) {
+        for (var k = 0; k < weak.length; k++) { if (head.indexOf(weak[k]) >= 0) { return 'soft:' + weak[k]; } }
+    }
+    return null;
+}
+var reason = detect(), checked = document.__scraperBlockCheck;
+if (checked === undefined || (reason && !checked)) { document.__scraperBlockCheck = reason || ''; }
+return [checked === undefined ? null : checked, reason];
+"""
+
+_CONTAINS_RE = re.compile(r"^([\w-]+|\*):contains\((['\"])(.*)\2\)$")
+
+
+class HostBlocked(requests.exceptions.ConnectionError):
+    """Richiesta rifiutata senza traffico di rete: l'interruttore dell'host è aperto."""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"Host {host} in pausa per blocco rilevato (ancora {retry_after:.0f} s)")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def marker_reason(html, size=None):
+    """Motivo del blocco se l'HTML contiene i segni di una pagina di challenge, altrimenti None."""
+    head = html[:SCAN_BYTES].lower()
+    for marker in STRONG_MARKERS:
+        if marker in head:
+            return f"marker:{marker}"
+    if (len(html) if size is None else size) < SOFT_BLOCK_BYTES:
+        for marker in WEAK_MARKERS:
+            if marker in head:
+                return f"soft:{marker}"
+    return None
+
+
+def response_reason(response):
+    """Motivo del blocco per una risposta HTTP (codice di stato o contenuto), altrimenti None."""
+    if response.status_code in BLOCK_STATUSES:
+        return f"status:{response.status_code}"
+    if response._content is False or "html" not in response.headers.get("Content-Type", "html"):
+        return None  # Corpo in streaming o non HTML (immagini, PDF, JSON)
+    content = response.content
+    return marker_reason(content[:SCAN_BYTES].decode("utf-8", "replace"), size=len(content))
+
+
+def _normalize_selectors(selectors):
+    """Selettori come coppie (tipo, espressione); le stringhe CSS con :contains('testo') diventano XPath."""
+    normalized = []
+    for selector in selectors:
+        if isinstance(selector, (tuple, list)):
+            normalized.append([selector[0], selector[1]])
+            continue
+        match = _CONTAINS_RE.match(selector.strip())
+        if match:
+            tag, text = match.group(1), match.group(3).replace("'", "\\'")
+            normalized.append(["xpath", f"//{tag}[contains(text(), '{text}')]"])
+        else:
+            normalized.append(["css", selector])
+    return normalized
+
+
+def _page_check(driver, selectors):
+    """
+    (esito di un controllo precedente sullo stesso documento, motivo del blocco): l'esito precedente è
+    None se il documento non era ancora stato controllato, "" se non era stato rilevato un blocco.
+    """
+    previous, reason = driver.execute_script(PAGE_SCRIPT, _normalize_selectors(selectors), list(STRONG_MARKERS),
+                                             list(WEAK_MARKERS), SOFT_BLOCK_BYTES, SCAN_BYTES)
+    return previous, reason
+
+
+def page_reason(driver, selectors=DEFAULT_PAGE_SELECTORS):
+    """
+    Motivo del blocco per la pagina corrente del driver, in un solo round trip: elementi visibili tra
+    `selectors` (stringhe CSS o coppie ("css"|"xpath", espressione)) o segni di challenge nell'HTML.
+    """
+    return _page_check(driver, selectors)[1]
+
+
+class _HostState:
+    def __init__(self):
+        self.detections = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """Interruttore per host: si apre dopo `threshold` rilevamenti consecutivi, con pausa esponenziale."""
+
+    def __init__(self, threshold=BLOCK_THRESHOLD, cooldown=BLOCK_COOLDOWN, max_cooldown=MAX_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = _HostState()
+        return state
+
+    def before_request(self, host):
+        """Solleva HostBlocked se l'host è in pausa; alla scadenza della pausa lascia passare una richiesta di prova."""
+        with self.lock:
+            state = self._state(host)
+            remaining = state.open_until - time.time()
+            if remaining > 0:
+                metrics.inc("scraper_circuit_breaker_events_total", host=host, event="rejected")
+                raise HostBlocked(host, remaining)
+            if state.open_until and not state.probing:
+                state.probing = True
+                print(f"Pausa terminata per {host}: richiesta di prova.")
+
+    def record_block(self, host, reason, retry_after=None):
+        """Registra un blocco rilevato; apre (o riapre) l'interruttore quando serve. Restituisce True se è aperto."""
+        with self.lock:
+            state = self._state(host)
+            state.detections += 1
+            metrics.inc("scraper_blocks_detected_total", host=host, reason=reason.split(":")[0])
+            print(f"Blocco rilevato su {host} ({reason}), {state.detections} consecutivi.")
+            if not state.probing and state.detections < self.threshold:
+                return False
+            pause = min(self.max_cooldown, self.cooldown * 2 ** state.trips)
+            if retry_after:
+                pause = max(pause, min(self.max_cooldown, retry_after))
+            state.trips += 1
+            state.open_until = time.time() + pause
+            state.probing = False
+            metrics.inc("scraper_circuit_breaker_events_total", host=host, event="opened")
+            print(f"Interruttore aperto per {host}: pausa di {pause:.0f} s (apertura n. {state.trips}).")
+            return True
+
+    def record_success(self, host):
+        """Una risposta valida azzera i rilevamenti e, dopo una richiesta di prova riuscita, richiude l'interruttore."""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or (not state.detections and not state.open_until):
+                return
+            if state.probing:
+                metrics.inc("scraper_circuit_breaker_events_total", host=host, event="closed")
+                print(f"Interruttore richiuso per {host}.")
+                state.trips = 0
+                state.open_until = 0.0
+                state.probing = False
+            state.detections = 0
+
+    def remaining(self, host):
+        """Secondi di pausa rimanenti per `host` (0 se l'interruttore è chiuso)."""
+        with self.lock:
+            state = self.hosts.get(host)
+            return max(0.0, state.open_until - time.time()) if state else 0.0
+
+
+BREAKER = CircuitBreaker()
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.strip().isdigit() else None
+
+
+def before_request(host):
+    """Da chiamare prima di ogni richiesta verso `host`: solleva HostBlocked se l'host è in pausa."""
+    if BLOCK_DETECTION and host:
+        BREAKER.before_request(host)
+
+
+def check_response(host, response):
+    """Analizza una risposta HTTP e aggiorna l'interruttore dell'host; restituisce il motivo del blocco o None."""
+    if not BLOCK_DETECTION or not host:
+        return None
+    reason = response_reason(response)
+    if reason is None:
+        BREAKER.record_success(host)
+    else:
+        BREAKER.record_block(host, reason, retry_after=_retry_after(response))
+    return reason
+
+
+def check_content(host, url, status, html):
+    """
+    Come check_response per una pagina scaricata senza requests (es. fetch() dal browser, vedi
+    pagefetch.py): stato HTTP e HTML. Restituisce il motivo del blocco o None.
+    """
+    if not BLOCK_DETECTION or not host:
+        return None
+    reason = f"status:{status}" if status in BLOCK_STATUSES else marker_reason(html or "")
+    if reason is None:
+        BREAKER.record_success(host)
+    else:
+        BREAKER.record_block(host, reason)
+    return reason
+
+
+def check_page(driver, host=None, selectors=DEFAULT_PAGE_SELECTORS):
+    """
+    Analizza la pagina corrente del driver e aggiorna l'interruttore dell'host (default: quello della
+    URL corrente); restituisce il motivo del blocco o None.
+    Un secondo controllo sullo stesso documento (es. quello di prepared_get seguito da quello dello
+    scraper con i propri selettori) aggiorna l'interruttore solo se rileva un blocco non ancora
+    registrato: ogni navigazione conta una volta sola, anche se ripete la stessa URL.
+    """
+    try:
+        url = driver.current_url
+        previous, reason = _page_check(driver, selectors)
+    except Exception as e:
+        print(f"Controllo blocchi non riuscito: {e}")
+        return None
+    host = host or urlsplit(url).netloc
+    if BLOCK_DETECTION and host:
+        if reason is None:
+            if previous is None:
+                BREAKER.record_success(host)
+        elif not previous:
+            BREAKER.record_block(host, reason)
+    return reason
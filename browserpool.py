@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import cdpdriver
+import metrics
+
+try:
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+except ImportError:  # Il client funziona anche senza Selenium finché il pool non è attivo
+    webdriver = None
+    WebDriverException = Exception
+
+# Pool di browser "caldi": un demone locale tiene aperte alcune sessioni Chrome headless già avviate
+# e le presta agli scraper tramite un socket locale, così uno scraper parte in meno di un secondo
+# invece di avviare Chrome (e chromedriver) da zero a ogni esecuzione.
+#   - lo scraper chiede una sessione per il proprio sito (acquire) e vi si collega con webdriver.Remote;
+#   - alla chiusura (driver.quit()) o se il processo termina, la connessione si chiude e la sessione
+#     torna al pool: finestre extra chiuse, pagina vuota, attese implicite azzerate;
+#   - i cookie di una sessione (tra cui il consenso ai banner dei cookie) vengono salvati per sito
+#     al rilascio e reimpostati nella sessione successiva prestata allo stesso sito, così il banner
+#     non va riaccettato a ogni esecuzione; a parità di condizioni il pool preferisce una sessione
+#     che ha già servito il sito;
+#   - una sessione non più raggiungibile viene sostituita da una nuova.
+# Senza SCRAPER_BROWSER_POOL (o con il demone non raggiungibile) gli scraper avviano il proprio browser come prima.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_BROWSER_POOL  indirizzo host:porta del demone (es. 127.0.0.1:47815; default: pool non usato)
+#
+# Uso da riga di comando:
+#   python browserpool.py serve --size 4           # avvia il demone con 4 sessioni calde
+#   python browserpool.py status
+
+POOL_ENV = "SCRAPER_BROWSER_POOL"
+DEFAULT_ADDRESS = "127.0.0.1:47815"
+
+DEFAULT_SIZE = 2
+ACQUIRE_TIMEOUT = 120.0     # Secondi di attesa di una sessione libera prima di rinunciare
+CONNECT_TIMEOUT = 1.0       # Il client non aspetta un demone che non risponde
+WINDOW_SIZE = "1920,1080"
+
+# Campi di un cookie accettati da Network.setCookies
+_COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+def pool_address():
+    """Indirizzo (host, porta) del demone configurato, o None se il pool non è in uso."""
+    value = os.environ.get(POOL_ENV)
+    if not value:
+        return None
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def chrome_options():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument(f"--window-size={WINDOW_SIZE}")
+    return options
+
+
+# --- Demone ---
+
+class _Session:
+    """Sessione Chrome tenuta dal demone."""
+
+    def __init__(self, index):
+        self.index = index
+        start = time.perf_counter()
+        self.driver = webdriver.Chrome(options=chrome_options())
+        self.started = time.perf_counter() - start
+        self.sites = set()     # Siti già serviti (cookie e cache già presenti)
+        self.site = None       # Sito a cui è prestata in questo momento
+        self.leases = 0
+
+    @property
+    def executor_url(self):
+        return self.driver.service.service_url
+
+    def cookies(self):
+        return self.driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+
+    def set_cookies(self, cookies):
+        params = [{field: cookie[field] for field in _COOKIE_FIELDS if field in cookie} for cookie in cookies]
+        for cookie in params:
+            if cookie.get("expires", 0) < 0:
+                del cookie["expires"]  # Cookie di sessione
+        self.driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+
+    def reset(self):
+        """Riporta la sessione allo stato iniziale (cookie esclusi) prima di prestarla di nuovo."""
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+        self.driver.implicitly_wait(0)
+        self.driver.set_page_load_timeout(300)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+
+
+class BrowserPool:
+    """Sessioni calde e loro assegnazione ai client, con lo stato dei cookie per sito."""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.sessions = []
+        self.idle = []
+        self.site_cookies = {}
+        self.condition = threading.Condition()
+        self.next_index = 0
+        for _ in range(size):
+            self._add_session()
+
+    def _add_session(self):
+        session = _Session(self.next_index)
+        self.next_index += 1
+        print(f"Sessione {session.index} avviata in {session.started:.1f} s.")
+        with self.condition:
+            self.sessions.append(session)
+            self.idle.append(session)
+            self.condition.notify()
+        return session
+
+    def _replace(self, session):
+        print(f"Sessione {session.index} non più raggiungibile: sostituita.")
+        session.quit()
+        with self.condition:
+            self.sessions.remove(session)
+        self._add_session()
+
+    def acquire(self, site, timeout=ACQUIRE_TIMEOUT):
+        """Presta una sessione, preferendo una che ha già servito `site`; None se nessuna si libera in tempo."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.idle:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            session = next((candidate for candidate in self.idle if site in candidate.sites), self.idle[0])
+            self.idle.remove(session)
+            session.site = site
+        warm = site in session.sites
+        cookies = self.site_cookies.get(site)
+        if cookies and not warm:
+            try:
+                session.set_cookies(cookies)
+            except WebDriverException as e:
+                print(f"Cookie del sito {site} non reimpostati nella sessione {session.index}: {e}")
+        session.sites.add(site)
+        session.leases += 1
+        metrics.inc("scraper_browser_pool_leases_total", site=site, warm=str(warm or bool(cookies)).lower())
+        return session
+
+    def release(self, session):
+        """Salva i cookie del sito, ripulisce la sessione e la rimette a disposizione."""
+        try:
+            self.site_cookies[session.site] = session.cookies()
+            session.reset()
+        except WebDriverException:
+            self._replace(session)
+            return
+        with self.condition:
+            session.site = None
+            self.idle.append(session)
+            self.condition.notify()
+
+    def status(self):
+        with self.condition:
+            return {
+                "sessions": [
+                    {"index": session.index, "site": session.site, "sites": sorted(session.sites), "leases": session.leases}
+                    for session in self.sessions
+                ],
+                "idle": len(self.idle),
+                "sites_with_cookies": sorted(self.site_cookies),
+            }
+
+    def close(self):
+        for session in self.sessions:
+            session.quit()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Una connessione per client: le sessioni prestate tornano al pool quando la connessione si chiude."""
+
+    def handle(self):
+        pool = self.server.pool
+        leased = {}
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    break
+                op = request.get("op")
+                if op == "acquire":
+                    session = pool.acquire(request.get("site") or "default", request.get("timeout", ACQUIRE_TIMEOUT))
+                    if session is None:
+                        response = {"ok": False, "error": "Nessuna sessione libera"}
+                    else:
+                        leased[session.index] = session
+                        response = {"ok": True, "lease": session.index, "executor": session.executor_url,
+                                    "session_id": session.driver.session_id}
+                elif op == "release":
+                    session = leased.pop(request.get("lease"), None)
+                    if session is not None:
+                        pool.release(session)
+                    response = {"ok": session is not None}
+                elif op == "status":
+                    response = {"ok": True, **pool.status()}
+                else:
+                    response = {"ok": False, "error": f"Operazione sconosciuta: {op}"}
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            for session in leased.values():
+                pool.release(session)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address, size):
+    if webdriver is None:
+        print("Selenium non è installato: impossibile avviare il pool di browser.")
+        return 1
+    start = time.perf_counter()
+    pool = BrowserPool(size)
+    print(f"Pool di {size} sessioni pronto in {time.perf_counter() - start:.1f} s.")
+    server = _Server(address, _Handler)
+    server.pool = pool
+    print(f"In ascolto su {address[0]}:{address[1]} (imposta {POOL_ENV}={address[0]}:{address[1]} negli scraper).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Arresto del pool...")
+    finally:
+        server.server_close()
+        pool.close()
+    return 0
+
+
+# --- Client ---
+
+def _request(connection, reader, payload):
+    connection.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connessione con il pool di browser chiusa")
+    return json.loads(line)
+
+
+if webdriver is not None:
+    class PooledDriver(webdriver.Remote):
+        """
+        Driver collegato a una sessione già avviata dal pool. quit() non chiude il browser:
+        restituisce la sessione al pool.
+        """
+
+        def __init__(self, connection, reader, lease, executor_url, session_id):
+            self._pool_connection = connection
+            self._pool_reader = reader
+            self._pool_lease = lease
+            self._attach_session_id = session_id
+            super().__init__(command_executor=executor_url, options=webdriver.ChromeOptions())
+
+        def start_session(self, capabilities, *args, **kwargs):
+            # Nessuna nuova sessione: ci si collega a quella già aperta dal demone
+            self.session_id = self._attach_session_id
+            self.caps = dict(capabilities)
+
+        def quit(self):
+            if self._pool_connection is None:
+                return
+            try:
+                _request(self._pool_connection, self._pool_reader, {"op": "release", "lease": self._pool_lease})
+            except (OSError, ValueError):
+                pass  # Se la connessione è già chiusa il demone ha già ripreso la sessione
+            finally:
+                self._pool_reader.close()
+                self._pool_connection.close()
+                self._pool_connection = None
+else:
+    PooledDriver = None
+
+
+def attach(site=metrics.SITE, address=None, timeout=ACQUIRE_TIMEOUT):
+    """Sessione calda del pool per `site`, o None se il pool non è configurato o non è raggiungibile."""
+    address = address or pool_address()
+    if address is None or PooledDriver is None:
+        return None
+    start = time.perf_counter()
+    try:
+        connection = socket.create_connection(address, timeout=CONNECT_TIMEOUT)
+        connection.settimeout(timeout + CONNECT_TIMEOUT)
+        reader = connection.makefile("r", encoding="utf-8")
+        response = _request(connection, reader, {"op": "acquire", "site": site, "timeout": timeout})
+    except (OSError, ValueError) as e:
+        print(f"Pool di browser {address[0]}:{address[1]} non raggiungibile ({e}): avvio un browser locale.")
+        return None
+    if not response.get("ok"):
+        reader.close()
+        connection.close()
+        print(f"Pool di browser: {response.get('error')}. Avvio un browser locale.")
+        return None
+    connection.settimeout(None)
+    driver = PooledDriver(connection, reader, response["lease"], response["executor"], response["session_id"])
+    print(f"Collegato alla sessione {response['lease']} del pool di browser in {time.perf_counter() - start:.2f} s.")
+    return driver
+
+
+def get_driver(factory, site=metrics.SITE):
+    """
+    Driver Selenium per uno scraper: una sessione calda del pool se SCRAPER_BROWSER_POOL è impostato
+    e il demone risponde, poi una scheda del browser CDP condiviso se SCRAPER_CDP_DRIVER è impostato
+    (vedi cdpdriver.py), altrimenti il browser creato da factory() come senza pool.
+    """
+    return attach(site) or cdpdriver.new_driver() or factory()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool di sessioni Chrome calde per gli scraper Selenium.")
+    parser.add_argument("--address", default=os.environ.get(POOL_ENV) or DEFAULT_ADDRESS, help="host:porta del demone")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Avvia il demone")
+    serve_parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="Numero di sessioni calde")
+    commands.add_parser("status", help="Stato delle sessioni del demone")
+    args = parser.parse_args()
+
+    host, _, port = args.address.rpartition(":")
+    address = (host or "127.0.0.1", int(port))
+    if args.command == "serve":
+        return serve(address, args.size)
+    try:
+        with socket.create_connection(address, timeout=CONNECT_TIMEOUT) as connection:
+            status = _request(connection, connection.makefile("r", encoding="utf-8"), {"op": "status"})
+    except OSError as e:
+        print(f"Pool di browser {args.address} non raggiungibile: {e}")
+        return 1
+    print(f"{len(status['sessions'])} sessioni, {status['idle']} libere")
+    for session in status["sessions"]:
+        state = f"in uso da {session['site']}" if session["site"] else "libera"
+        print(f"  sessione {session['index']}: {state}, {session['leases']} prestiti, siti: {', '.join(session['sites']) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
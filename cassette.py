@@ -0,0 +1,260 @@
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+# Registrazione e riproduzione delle risposte HTTP ("cassette").
+# Durante una esecuzione reale ogni risposta viene aggiunta a un file JSON Lines
+# compresso con gzip; in riproduzione le stesse risposte vengono servite offline,
+# con una latenza simulata configurabile, così lo stesso scraper gira su un corpus fisso.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_CASSETTE_MODE      "record", "replay" oppure vuoto (disattivato)
+#   SCRAPER_CASSETTE           percorso del file (default: cassettes/<nome script>.jsonl.gz)
+#   SCRAPER_REPLAY_LATENCY_MS  latenza simulata in riproduzione, es. "50" oppure "20-80"
+
+MODE_ENV = "SCRAPER_CASSETTE_MODE"
+PATH_ENV = "SCRAPER_CASSETTE"
+LATENCY_ENV = "SCRAPER_REPLAY_LATENCY_MS"
+
+CASSETTE_DIR = "cassettes"
+
+
+def default_cassette_path():
+    """Percorso di default della cassetta, derivato dal nome dello script in esecuzione."""
+    script_name = os.path.splitext(os.path.basename(sys.argv[0] or "scraper"))[0] or "scraper"
+    return os.path.join(CASSETTE_DIR, f"{script_name}.jsonl.gz")
+
+
+def parse_latency(value):
+    """Converte "50" o "20-80" in una coppia (min_ms, max_ms)."""
+    if not value:
+        return (0.0, 0.0)
+    try:
+        if "-" in value:
+            low, high = value.split("-", 1)
+            return (float(low), float(high))
+        return (float(value), float(value))
+    except ValueError:
+        print(f"Valore di latenza non valido in {LATENCY_ENV}: '{value}'. Latenza disattivata.")
+        return (0.0, 0.0)
+
+
+class Cassette:
+    """Archivio di coppie richiesta/risposta su file gzip JSON Lines."""
+
+    def __init__(self, path, mode, latency_ms=(0.0, 0.0)):
+        self.path = path
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.entries = {}
+        self.replay_positions = {}
+        self.lock = threading.Lock()
+        if self.mode == "replay":
+            self.load()
+
+    @staticmethod
+    def key(method, url):
+        return f"{method.upper()} {url}"
+
+    def load(self):
+        if not os.path.exists(self.path):
+            print(f"Cassetta non trovata: {self.path}. Nessuna risposta disponibile in riproduzione.")
+            return
+        count = 0
+        # gzip.open legge anche i file composti da più membri (uno per ogni append)
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                self.entries.setdefault(self.key(entry["method"], entry["url"]), []).append(entry)
+                count += 1
+        print(f"Cassetta caricata: {count} risposte da {self.path}")
+
+    def record(self, method, url, status, headers, body, final_url=None):
+        """Aggiunge una risposta alla cassetta. Il file viene scritto subito, così un crash non perde dati."""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        entry = {
+            "method": method.upper(),
+            "url": url,
+            "final_url": final_url or url,
+            "status": status,
+            "headers": dict(headers or {}),
+            "body": base64.b64encode(body or b"").decode("ascii"),
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def lookup(self, method, url):
+        """
+        Restituisce la risposta registrata per (method, url) oppure None.
+        Se la stessa URL è stata registrata più volte le risposte vengono servite
+        nell'ordine di registrazione, ripetendo l'ultima.
+        """
+        key = self.key(method, url)
+        with self.lock:
+            candidates = self.entries.get(key)
+            if not candidates:
+                return None
+            position = self.replay_positions.get(key, 0)
+            entry = candidates[min(position, len(candidates) - 1)]
+            self.replay_positions[key] = position + 1
+        self.simulate_latency()
+        return entry
+
+    def simulate_latency(self):
+        low, high = self.latency_ms
+        if high > 0:
+            time.sleep(random.uniform(low, high) / 1000.0)
+
+    @staticmethod
+    def body_bytes(entry):
+        return base64.b64decode(entry["body"])
+
+
+_active_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """Restituisce la cassetta configurata dalle variabili d'ambiente, oppure None se disattivata."""
+    global _active_cassette
+    mode = os.environ.get(MODE_ENV, "").strip().lower()
+    if mode not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _active_cassette is None:
+            path = os.environ.get(PATH_ENV) or default_cassette_path()
+            latency = parse_latency(os.environ.get(LATENCY_ENV, ""))
+            _active_cassette = Cassette(path, mode, latency)
+            print(f"Cassetta HTTP attiva in modalità '{mode}': {path}")
+    return _active_cassette
+
+
+def use_cassette(tape):
+    """Installa esplicitamente una cassetta (usato dal benchmark), ignorando le variabili d'ambiente."""
+    global _active_cassette
+    with _cassette_lock:
+        _active_cassette = tape
+    if tape is not None:
+        os.environ[MODE_ENV] = tape.mode
+
+
+# --- Server di riproduzione per Selenium ---
+# Il browser non può usare la cassetta direttamente: le pagine vengono servite da un
+# server locale che riscrive le URL nella forma http://127.0.0.1:<porta>/<schema>/<host>/<percorso>.
+# I link relativi (es. paginazione) vengono risolti rispetto all'origine indicata nel Referer.
+
+def to_replay_path(url):
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return f"/{parts.scheme}/{parts.netloc}{quote(path, safe='/?=&%:;,+@!~*()')}"
+
+
+def from_replay_path(path, referer=None):
+    """Ricostruisce l'URL originale a partire dal percorso richiesto al server di riproduzione."""
+    segments = path.lstrip("/").split("/", 2)
+    if len(segments) >= 2 and segments[0] in ("http", "https"):
+        rest = segments[2] if len(segments) > 2 else ""
+        return unquote(f"{segments[0]}://{segments[1]}/{rest}")
+    if referer:
+        referer_path = urlsplit(referer).path
+        if referer_path:
+            origin_url = from_replay_path(referer_path)
+            if origin_url:
+                return urljoin(origin_url, unquote(path))
+    return None
+
+
+class ReplayServer:
+    """Server HTTP locale che serve al browser le pagine registrate nella cassetta."""
+
+    def __init__(self, cassette, host="127.0.0.1", port=0):
+        self.cassette = cassette
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def replay_url(self, url):
+        return self.base_url + to_replay_path(url)
+
+    def _make_handler(self):
+        cassette = self.cassette
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                original_url = from_replay_path(self.path, self.headers.get("Referer"))
+                entry = cassette.lookup("GET", original_url) if original_url else None
+                if entry is None:
+                    self.send_error(404, f"Non presente nella cassetta: {original_url}")
+                    return
+                body = Cassette.body_bytes(entry)
+                self.send_response(entry["status"])
+                content_type = next((v for k, v in entry["headers"].items() if k.lower() == "content-type"), "text/html; charset=utf-8")
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Silenzioso: le richieste di risorse statiche mancanti sono normali
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Server di riproduzione avviato su {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_replay_server = None
+
+
+def get_replay_server():
+    """Avvia (una sola volta) il server di riproduzione se la cassetta è in modalità replay."""
+    global _replay_server
+    cassette = get_cassette()
+    if cassette is None or cassette.mode != "replay":
+        return None
+    with _cassette_lock:
+        if _replay_server is None:
+            _replay_server = ReplayServer(cassette).start()
+    return _replay_server
+
+
+if __name__ == "__main__":
+    # Uso: python cassette.py <file cassetta>  -> riepilogo del contenuto
+    if len(sys.argv) < 2:
+        print("Uso: python cassette.py <file.jsonl.gz>")
+        sys.exit(1)
+    summary = Cassette(sys.argv[1], "replay")
+    total_bytes = sum(len(Cassette.body_bytes(e)) for entries in summary.entries.values() for e in entries)
+    print(f"URL distinte: {len(summary.entries)}")
+    print(f"Byte totali dei corpi: {total_bytes}")
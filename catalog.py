@@ -0,0 +1,301 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import metrics
+from fingerprint import canonical_url
+
+# Catalogo prodotti su SQLite: un'unica tabella alimentata da tutti gli scraper, con chiave
+# (sorgente, URL canonica) e indici su marca, sorgente, nome e ultima rilevazione.
+# I record vengono normalizzati (nome/nome_prodotto/title -> name, marca/Marca -> brand, ...)
+# e scritti a blocchi con upsert in transazione; i campi non riconosciuti finiscono in "extra" (JSON).
+# Le esportazioni diventano query sul catalogo invece di unioni di decine di CSV.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_CATALOG  percorso del database (default: catalog.db, "0" per non scrivere nel catalogo)
+#
+# Uso da riga di comando:
+#   python catalog.py import *.csv              # importa i CSV esistenti
+#   python catalog.py export out.csv --brand Hilti
+#   python catalog.py stats
+
+CATALOG_ENV = "SCRAPER_CATALOG"
+DEFAULT_PATH = "catalog.db"
+
+BATCH_SIZE = 500
+BUSY_TIMEOUT = 30.0  # Secondi di attesa se un altro processo sta scrivendo
+
+# Nomi di colonna usati dagli scraper per ogni campo del catalogo, in ordine di preferenza
+FIELD_ALIASES = {
+    "name": ("name", "nome", "nome_prodotto", "title", "Nome"),
+    "brand": ("brand", "marca", "Marca"),
+    "description": ("description", "descrizione", "combined_description", "short_description"),
+    "image_url": ("image_url", "image url", "immagine", "url_immagine", "immagine_url", "img"),
+    "url": ("product_page_url", "product url", "product_url", "url_prodotto", "url", "link", "detail_url"),
+    "category": ("category", "categoria"),
+    "price": ("price", "prezzo", "price_listing"),
+}
+COLUMNS = ("source", "url", "name", "brand", "description", "image_url", "category", "price", "extra", "first_seen", "last_seen")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    source      TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    name        TEXT,
+    brand       TEXT,
+    description TEXT,
+    image_url   TEXT,
+    category    TEXT,
+    price       TEXT,
+    extra       TEXT,
+    first_seen  TEXT NOT NULL,
+    last_seen   TEXT NOT NULL,
+    PRIMARY KEY (source, url)
+);
+CREATE INDEX IF NOT EXISTS idx_products_brand ON products (brand);
+CREATE INDEX IF NOT EXISTS idx_products_source ON products (source);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products (name);
+CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products (last_seen);
+"""
+
+UPSERT = f"""
+INSERT INTO products ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for _ in COLUMNS)})
+ON CONFLICT (source, url) DO UPDATE SET
+    name = excluded.name,
+    brand = excluded.brand,
+    description = excluded.description,
+    image_url = excluded.image_url,
+    category = excluded.category,
+    price = excluded.price,
+    extra = excluded.extra,
+    last_seen = excluded.last_seen
+"""
+
+_MISSING_VALUES = {"", "N/A", "n/a", "None"}
+
+
+def catalog_path():
+    """Percorso del catalogo configurato, o None se la scrittura nel catalogo è disattivata."""
+    value = os.environ.get(CATALOG_ENV, DEFAULT_PATH)
+    return None if value == "0" else value
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value in _MISSING_VALUES else value
+
+
+def normalize_record(record, source, seen_at):
+    """Converte un record di uno scraper nella riga del catalogo (tupla nell'ordine di COLUMNS)."""
+    row = {}
+    used = set()
+    for field, aliases in FIELD_ALIASES.items():
+        row[field] = None
+        for alias in aliases:
+            if alias in record:
+                used.add(alias)
+                if row[field] is None:
+                    row[field] = _clean(record[alias])
+    extra = {key: value for key, value in record.items() if key not in used and _clean(value) is not None}
+
+    if row["url"]:
+        key = canonical_url(row["url"]) if "://" in row["url"] else row["url"]
+    elif row["name"]:
+        # Senza URL il prodotto è identificato dal nome (minuscolo, spazi normalizzati)
+        key = "nome:" + re.sub(r"\s+", " ", row["name"].lower())
+    else:
+        return None
+    return (source, key, row["name"], row["brand"], row["description"], row["image_url"], row["category"],
+            row["price"], json.dumps(extra, ensure_ascii=False) if extra else None, seen_at, seen_at)
+
+
+class CatalogStore:
+    """Scrittura a blocchi nel catalogo: i record vengono accumulati e scritti ogni BATCH_SIZE in una transazione."""
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE):
+        self.path = path or catalog_path() or DEFAULT_PATH
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def add(self, record, source=metrics.SITE, seen_at=None):
+        row = normalize_record(record, source, seen_at or time.strftime("%Y-%m-%dT%H:%M:%S"))
+        if row is None:
+            return
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def add_many(self, records, source=metrics.SITE, seen_at=None):
+        seen_at = seen_at or time.strftime("%Y-%m-%dT%H:%M:%S")
+        for record in records:
+            self.add(record, source, seen_at)
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        with self.connection:  # Transazione: commit a fine blocco, rollback in caso di errore
+            self.connection.executemany(UPSERT, self.pending)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def query(self, source=None, brand=None, name=None, seen_since=None, order_by="source, brand, name"):
+        """Righe del catalogo (dizionari) filtrate per sorgente, marca, nome (sottostringa) e ultima rilevazione."""
+        self.flush()
+        conditions, params = [], []
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if brand:
+            conditions.append("brand = ? COLLATE NOCASE")
+            params.append(brand)
+        if name:
+            conditions.append("name LIKE ?")
+            params.append(f"%{name}%")
+        if seen_since:
+            conditions.append("last_seen >= ?")
+            params.append(seen_since)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM products"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order_by}"
+        cursor = self.connection.execute(sql, params)
+        for row in cursor:
+            yield dict(zip(COLUMNS, row))
+
+    def export_csv(self, filename, **filters):
+        """Esporta in CSV il risultato di query(); restituisce il numero di righe scritte."""
+        count = 0
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in self.query(**filters):
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def stats(self):
+        self.flush()
+        return self.connection.execute(
+            "SELECT source, COUNT(*), COUNT(DISTINCT brand), MAX(last_seen) FROM products GROUP BY source ORDER BY source"
+        ).fetchall()
+
+
+def save_records(records, source=metrics.SITE):
+    """
+    Scrive i record di uno scraper nel catalogo (se non disattivato con SCRAPER_CATALOG=0),
+    aggiorna l'indice di ricerca full-text e, con SCRAPER_EXPORT_FORMAT=parquet, l'export colonnare.
+    Non interrompe mai lo scraper: un errore del catalogo viene solo segnalato.
+    """
+    if not records:
+        return 0
+    if os.environ.get("SCRAPER_EXPORT_FORMAT") == "parquet":
+        import columnar  # Import locale: columnar dipende a sua volta da questo modulo
+        if columnar.available():
+            try:
+                columnar.save_records(records, source)
+            except Exception as e:
+                print(f"Errore durante l'export Parquet: {e}")
+        else:
+            print("SCRAPER_EXPORT_FORMAT=parquet richiede pyarrow (pip install pyarrow): export Parquet saltato.")
+    import search  # Import locale, come per columnar
+    search.save_records(records, source)
+    path = catalog_path()
+    if not path:
+        return 0
+    try:
+        with CatalogStore(path) as store:
+            store.add_many(records, source)
+            store.flush()
+            written = store.written
+    except Exception as e:
+        print(f"Errore durante la scrittura nel catalogo {path}: {e}")
+        return 0
+    print(f"Catalogo {path}: {written} record aggiornati per la sorgente '{source}'.")
+    return written
+
+
+def source_from_filename(path):
+    """Sorgente di un CSV esistente: nome del file senza timestamp né suffissi di copia."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stem = re.sub(r"_\d{8}_\d{6}$", "", stem)
+    stem = re.sub(r"\s+(copy|copia\w*)$", "", stem, flags=re.I)
+    return stem.replace("_backup", "_products").strip()
+
+
+def import_csv_files(paths, store, source=None):
+    """Importa CSV esistenti, dal più vecchio al più recente: a parità di chiave vince il file più recente."""
+    for path in sorted(paths, key=os.path.getmtime):
+        seen_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(path)))
+        file_source = source or source_from_filename(path)
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            rows = list(csv.DictReader(f))
+        store.add_many(rows, file_source, seen_at)
+        print(f"Importati {len(rows)} record da {path} (sorgente '{file_source}').")
+    store.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalogo prodotti SQLite.")
+    parser.add_argument("--db", default=catalog_path() or DEFAULT_PATH, help="Percorso del database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Importa file CSV nel catalogo")
+    import_parser.add_argument("files", nargs="+")
+    import_parser.add_argument("--source", help="Sorgente da usare per tutti i file (default: dal nome del file)")
+
+    export_parser = commands.add_parser("export", help="Esporta una query del catalogo in CSV")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--source")
+    export_parser.add_argument("--brand")
+    export_parser.add_argument("--name", help="Sottostringa del nome")
+    export_parser.add_argument("--seen-since", help="Solo prodotti rilevati da questa data (YYYY-MM-DD)")
+
+    commands.add_parser("stats", help="Prodotti per sorgente")
+    args = parser.parse_args()
+
+    with CatalogStore(args.db) as store:
+        if args.command == "import":
+            files = [path for pattern in args.files for path in (glob.glob(pattern) or [pattern])]
+            import_csv_files(files, store, args.source)
+        elif args.command == "export":
+            count = store.export_csv(args.output, source=args.source, brand=args.brand, name=args.name,
+                                     seen_since=args.seen_since)
+            print(f"Esportati {count} prodotti in {args.output}")
+        else:
+            for source, products, brands, last_seen in store.stats():
+                print(f"{source:<40} {products:>7} prodotti {brands:>4} marche  ultima rilevazione {last_seen}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,924 @@
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.request import urlopen
+
+import metrics
+
+try:
+    import websocket
+except ImportError:  # Senza websocket-client il driver CDP non è disponibile e si usa Selenium
+    websocket = None
+
+try:
+    from selenium.common.exceptions import (
+        ElementClickInterceptedException, ElementNotInteractableException, InvalidSelectorException,
+        JavascriptException, NoSuchElementException, NoSuchWindowException, StaleElementReferenceException,
+        TimeoutException, WebDriverException,
+    )
+except ImportError:  # Senza Selenium si usano eccezioni equivalenti
+    class WebDriverException(Exception):
+        pass
+
+    class NoSuchElementException(WebDriverException):
+        pass
+
+    class StaleElementReferenceException(WebDriverException):
+        pass
+
+    class TimeoutException(WebDriverException):
+        pass
+
+    class JavascriptException(WebDriverException):
+        pass
+
+    class InvalidSelectorException(WebDriverException):
+        pass
+
+    class NoSuchWindowException(WebDriverException):
+        pass
+
+    class ElementClickInterceptedException(WebDriverException):
+        pass
+
+    class ElementNotInteractableException(WebDriverException):
+        pass
+
+# Driver leggero che parla il Chrome DevTools Protocol (CDP) direttamente su un websocket persistente.
+# Con Selenium ogni azione (find_element, get_attribute, execute_script, page_source) è una richiesta
+# HTTP a chromedriver, che la traduce a sua volta in comandi CDP: migliaia di round trip in più per
+# ogni esecuzione. Qui un solo websocket per browser trasporta i comandi di tutte le schede (sessioni
+# CDP "flatten"), un thread di lettura smista risposte ed eventi, e:
+#   - ogni comando può essere inviato senza attendere la risposta (send restituisce un Future) e più
+#     comandi possono essere inviati in blocco (batch) pagando un solo round trip;
+#   - gli eventi del protocollo (Network, DOM, Page, ...) si sottoscrivono per scheda con on();
+#   - le schede sono indipendenti: ogni CdpDriver è una scheda dello stesso browser, usabile da un
+#     thread diverso (es. i worker della pipeline dei dettagli) senza un processo Chrome per worker;
+#     call_async permette di pilotare più schede da un solo event loop asyncio.
+# CdpDriver espone il sottoinsieme dell'API Selenium usato dagli scraper (get, find_element(s),
+# execute_script, execute_async_script, page_source, finestre, cookie, attese con WebDriverWait ed
+# expected_conditions) e solleva le stesse eccezioni di Selenium. Accetta anche i comandi e gli eventi
+# tipizzati dei binding selenium.webdriver.common.devtools (v134-v136) tramite execute() e on().
+# Con SCRAPER_CDP_DRIVER gli scraper che creano il browser con browserpool.get_driver ricevono un
+# CdpDriver su una nuova scheda del browser condiviso del processo; senza la variabile (o senza il
+# pacchetto websocket-client o Chrome) nulla cambia.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_CDP_DRIVER  "1" per avviare un Chrome headless locale pilotato via CDP, oppure l'indirizzo
+#                       di un Chrome già avviato con --remote-debugging-port (http://host:porta o ws://...)
+#                       (default: driver CDP non usato)
+#   SCRAPER_CDP_CHROME  eseguibile di Chrome/Chromium (default: cercato nel PATH)
+
+CDP_ENV = "SCRAPER_CDP_DRIVER"
+CDP_DRIVER = os.environ.get(CDP_ENV, "")
+CHROME_BINARY = os.environ.get("SCRAPER_CDP_CHROME", "")
+
+CHROME_CANDIDATES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+WINDOW_SIZE = "1920,1080"
+
+LAUNCH_TIMEOUT = 30.0       # Secondi di attesa dell'avvio di Chrome
+COMMAND_TIMEOUT = 60.0      # Secondi massimi di attesa della risposta a un comando
+IMPLICIT_POLL = 0.1         # Intervallo di ricerca degli elementi durante l'attesa implicita
+READY_POLL = 0.05           # Intervallo di controllo di document.readyState
+
+# Domini che vanno abilitati (<Dominio>.enable) per riceverne gli eventi
+_EVENT_DOMAINS = {"Network", "DOM", "Page", "Runtime", "Log", "CSS", "Fetch", "Security", "Inspector"}
+
+# Marcatori degli errori JavaScript generati dal driver stesso
+STALE_MARKER = "__scraper_stale_element__"
+SCRIPT_TIMEOUT_MARKER = "__scraper_script_timeout__"
+
+# Errori CDP di un riferimento a un nodo non più valido (navigazione, contesto distrutto)
+_STALE_ERRORS = ("Could not find object with given id", "Cannot find context with specified id",
+                 "Execution context was destroyed", "Inspected target navigated or closed")
+
+FIND_FUNCTION = """
+function (by, value, all) {
+    var root = (this && this.nodeType) ? this : document, found = [];
+    if (root !== document && !root.isConnected) { throw new Error('%s'); }
+    if (by === 'xpath') {
+        var result = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < result.snapshotLength; i++) {
+            if (result.snapshotItem(i).nodeType === 1) { found.push(result.snapshotItem(i)); if (!all) { break; } }
+        }
+    } else if (by === 'link text' || by === 'partial link text') {
+        var links = root.querySelectorAll('a');
+        for (var j = 0; j < links.length; j++) {
+            var text = (links[j].innerText || '').trim();
+            if (by === 'link text' ? text === value : text.indexOf(value) >= 0) { found.push(links[j]); if (!all) { break; } }
+        }
+    } else {
+        var selectors = {'css selector': value, 'tag name': value, 'id': '#' + CSS.escape(value),
+                         'class name': '.' + CSS.escape(value), 'name': '[name="' + value.replace(/"/g, '\\\\"') + '"]'};
+        if (!(by in selectors)) { throw new Error('Strategia di ricerca non supportata: ' + by); }
+        found = all ? Array.prototype.slice.call(root.querySelectorAll(selectors[by]))
+                    : [root.querySelector(selectors[by])].filter(Boolean);
+    }
+    return all ? found : (found[0] || null);
+}
+""" % STALE_MARKER
+
+PAGE_SOURCE_SCRIPT = """
+var doctype = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : '';
+return doctype + document.documentElement.outerHTML;
+"""
+
+# Funzioni eseguite sull'elemento (this); tutte verificano prima che sia ancora nel documento
+_ELEMENT_PROLOGUE = "if (!this.isConnected) { throw new Error('%s'); }" % STALE_MARKER
+ELEMENT_FUNCTIONS = {
+    "text": "var shown = this.checkVisibility ? this.checkVisibility() : true; return shown ? (this.innerText || '').trim() : '';",
+    "tag_name": "return this.tagName.toLowerCase();",
+    "attribute": """
+var name = arguments[0], value = this[name];
+if (value === undefined || value === null || typeof value === 'object' || typeof value === 'function') {
+    return this.getAttribute(name);
+}
+if (typeof value === 'boolean') { return value ? 'true' : null; }
+return String(value);
+""",
+    "dom_attribute": "return this.getAttribute(arguments[0]);",
+    "property": "var value = this[arguments[0]]; return (typeof value === 'object' || typeof value === 'function') ? null : value;",
+    "displayed": """
+var box = !!(this.offsetWidth || this.offsetHeight || this.getClientRects().length);
+var shown = this.checkVisibility ? this.checkVisibility({opacityProperty: true, visibilityProperty: true}) : true;
+return box && shown;
+""",
+    "enabled": "return !this.disabled;",
+    "selected": "return !!(this.checked || this.selected);",
+    # Porta l'elemento al centro della vista e restituisce il punto di click, se l'elemento vi è in primo piano
+    "click_point": """
+this.scrollIntoView({block: 'center', inline: 'center'});
+var rect = this.getBoundingClientRect();
+if (!rect.width || !rect.height) { return {status: 'not_interactable'}; }
+var x = rect.left + rect.width / 2, y = rect.top + rect.height / 2, top = document.elementFromPoint(x, y);
+if (top && top !== this && !this.contains(top)) { return {status: 'intercepted', by: top.outerHTML.slice(0, 200)}; }
+return {status: 'ok', x: x, y: y};
+""",
+    "focus": "this.scrollIntoView({block: 'center'}); this.focus();",
+    "clear": "this.focus(); this.value = ''; this.dispatchEvent(new Event('input', {bubbles: true})); this.dispatchEvent(new Event('change', {bubbles: true}));",
+    "submit": "var form = this.form || this.closest('form'); if (form) { form.requestSubmit ? form.requestSubmit() : form.submit(); }",
+}
+
+
+def _function(body):
+    return "function () { %s\n%s\n}" % (_ELEMENT_PROLOGUE, body)
+
+
+def _wrap_script(script, asynchronous):
+    """Dichiarazione di funzione che esegue `script` come execute_script/execute_async_script di Selenium."""
+    if not asynchronous:
+        return "function () { return (function () { %s\n}).apply(null, arguments); }" % script
+    return """function () {
+    var args = Array.prototype.slice.call(arguments), timeout = args.shift();
+    return new Promise(function (resolve, reject) {
+        args.push(resolve);
+        setTimeout(function () { reject(new Error('%s')); }, timeout);
+        try { (function () { %s
+        }).apply(null, args); } catch (e) { reject(e); }
+    });
+}""" % (SCRIPT_TIMEOUT_MARKER, script)
+
+
+class CdpError(WebDriverException):
+    """Errore restituito dal browser per un comando CDP."""
+
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("code")
+        self.error_message = error.get("message", "")
+        super().__init__(f"{method}: {self.error_message} ({self.code})")
+
+
+class CdpConnection:
+    """
+    Websocket CDP di un browser, thread-safe: i comandi di tutte le schede viaggiano sulla stessa
+    connessione, un thread legge le risposte e un altro consegna gli eventi ai sottoscrittori.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        # Nessuna intestazione Origin: Chrome rifiuta le connessioni con un'origine non autorizzata
+        self.ws = websocket.create_connection(url, timeout=LAUNCH_TIMEOUT, suppress_origin=True,
+                                              enable_multithread=True, skip_utf8_validation=True)
+        self.ws.settimeout(None)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listeners = {}    # (sessionId, metodo) -> lista di callback
+        self.events = queue.Queue()
+        self.closed = False
+        threading.Thread(target=self._read, name="cdp-reader", daemon=True).start()
+        threading.Thread(target=self._dispatch, name="cdp-events", daemon=True).start()
+
+    def _read(self):
+        try:
+            while True:
+                message = json.loads(self.ws.recv())
+                if "id" in message:
+                    with self.lock:
+                        future, method = self.pending.pop(message["id"], (None, None))
+                    if future is None:
+                        continue
+                    if "error" in message:
+                        future.set_exception(CdpError(method, message["error"]))
+                    else:
+                        future.set_result(message.get("result", {}))
+                elif "method" in message:
+                    self.events.put(message)
+        except Exception as e:
+            if not self.closed:
+                print(f"Connessione CDP interrotta: {e}")
+        finally:
+            self.closed = True
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for future, method in pending.values():
+                future.set_exception(WebDriverException(f"{method}: connessione CDP chiusa"))
+            self.events.put(None)
+
+    def _dispatch(self):
+        while True:
+            message = self.events.get()
+            if message is None:
+                return
+            key = (message.get("sessionId"), message["method"])
+            with self.lock:
+                callbacks = list(self.listeners.get(key, ()))
+            for callback in callbacks:
+                try:
+                    callback(message.get("params", {}))
+                except Exception as e:
+                    print(f"Errore nel gestore dell'evento CDP {message['method']}: {e}")
+
+    def send(self, method, params=None, session_id=None):
+        """Invia un comando senza attenderne la risposta; restituisce un Future con il risultato."""
+        future = Future()
+        if self.closed:
+            future.set_exception(WebDriverException(f"{method}: connessione CDP chiusa"))
+            return future
+        command_id = next(self.ids)
+        message = {"id": command_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        with self.lock:
+            self.pending[command_id] = (future, method)
+        try:
+            self.ws.send(json.dumps(message))
+        except Exception as e:
+            with self.lock:
+                self.pending.pop(command_id, None)
+            future.set_exception(WebDriverException(f"{method}: invio non riuscito ({e})"))
+        metrics.inc("scraper_cdp_commands_total", site=metrics.SITE, method=method)
+        return future
+
+    def call(self, method, params=None, session_id=None, timeout=COMMAND_TIMEOUT):
+        """Invia un comando e ne attende il risultato."""
+        try:
+            return self.send(method, params, session_id).result(timeout)
+        except FutureTimeout:
+            raise TimeoutException(f"{method}: nessuna risposta dal browser in {timeout:.0f} s") from None
+
+    def batch(self, commands, session_id=None, timeout=COMMAND_TIMEOUT):
+        """
+        Invia in blocco i comandi (metodo, parametri) e ne restituisce i risultati nello stesso ordine:
+        un solo round trip invece di uno per comando. Il primo errore viene sollevato dopo aver
+        atteso tutte le risposte.
+        """
+        futures = [self.send(method, params, session_id) for method, params in commands]
+        deadline = time.monotonic() + timeout
+        results, error = [], None
+        for (method, _), future in zip(commands, futures):
+            try:
+                results.append(future.result(max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                raise TimeoutException(f"{method}: nessuna risposta dal browser in {timeout:.0f} s") from None
+            except WebDriverException as e:
+                results.append(None)
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def subscribe(self, method, callback, session_id=None):
+        """Registra `callback(parametri)` per l'evento `method` (della sessione `session_id`); restituisce la funzione che lo rimuove."""
+        key = (session_id, method)
+        with self.lock:
+            self.listeners.setdefault(key, []).append(callback)
+
+        def unsubscribe():
+            with self.lock:
+                callbacks = self.listeners.get(key, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+        return unsubscribe
+
+    def close(self):
+        self.closed = True
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class _Tab:
+    """Scheda del browser collegata con una sessione CDP dedicata."""
+
+    def __init__(self, target_id, session_id):
+        self.target_id = target_id
+        self.session_id = session_id
+        self.domains = set()
+
+
+class CdpElement:
+    """Elemento della pagina (riferimento a un oggetto remoto), con l'API di WebElement usata dagli scraper."""
+
+    def __init__(self, driver, tab, object_id):
+        self._driver = driver
+        self._tab = tab
+        self.id = object_id
+
+    def __eq__(self, other):
+        return isinstance(other, CdpElement) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<CdpElement {self.id}>"
+
+    def _call(self, name, *args, by_value=True):
+        return self._driver._call_function(self._tab, _function(ELEMENT_FUNCTIONS[name]), args, self.id, by_value)
+
+    @property
+    def text(self):
+        return self._call("text")
+
+    @property
+    def tag_name(self):
+        return self._call("tag_name")
+
+    def get_attribute(self, name):
+        return self._call("attribute", name)
+
+    def get_dom_attribute(self, name):
+        return self._call("dom_attribute", name)
+
+    def get_property(self, name):
+        return self._call("property", name)
+
+    def is_displayed(self):
+        return self._call("displayed")
+
+    def is_enabled(self):
+        return self._call("enabled")
+
+    def is_selected(self):
+        return self._call("selected")
+
+    def click(self):
+        """Click reale del mouse (evento attendibile) al centro dell'elemento, come Selenium."""
+        point = self._call("click_point")
+        if point["status"] == "not_interactable":
+            raise ElementNotInteractableException("element not interactable")
+        if point["status"] == "intercepted":
+            raise ElementClickInterceptedException(f"element click intercepted: other element would receive the click: {point['by']}")
+        mouse = {"x": point["x"], "y": point["y"], "button": "left", "clickCount": 1}
+        self._driver.connection.batch([
+            ("Input.dispatchMouseEvent", {"type": "mouseMoved", "x": point["x"], "y": point["y"]}),
+            ("Input.dispatchMouseEvent", dict(mouse, type="mousePressed")),
+            ("Input.dispatchMouseEvent", dict(mouse, type="mouseReleased")),
+        ], self._tab.session_id)
+
+    def send_keys(self, *values):
+        self._call("focus")
+        self._driver.connection.call("Input.insertText", {"text": "".join(str(value) for value in values)}, self._tab.session_id)
+
+    def clear(self):
+        self._call("clear")
+
+    def submit(self):
+        self._call("submit")
+
+    def find_element(self, by="css selector", value=None):
+        return self._driver._find(self._tab, by, value, False, self.id)
+
+    def find_elements(self, by="css selector", value=None):
+        return self._driver._find(self._tab, by, value, True, self.id)
+
+
+class _SwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver._switch(handle)
+
+    def default_content(self):
+        pass  # I frame non sono supportati: si lavora sempre sul documento principale
+
+
+class CdpDriver:
+    """
+    Driver di una scheda (e delle finestre che apre) di un CdpBrowser, con il sottoinsieme dell'API
+    di Selenium WebDriver usato dagli scraper, più l'accesso diretto al protocollo: send, batch,
+    execute_cdp_cmd, execute (comandi tipizzati), on (eventi), call_async.
+    """
+
+    name = "chrome"
+
+    def __init__(self, browser, target_id):
+        self.browser = browser
+        self.connection = browser.connection
+        # Identificativo del driver, come WebDriver.session_id (es. per lo stato del consenso per browser)
+        self.session_id = f"cdp-{uuid.uuid4().hex}"
+        self.switch_to = _SwitchTo(self)
+        self.implicit_wait = 0.0
+        self.page_load_timeout = 300.0
+        self.script_timeout = 30.0
+        self._owned = [target_id]
+        self._tab = None
+        self._switch(target_id)
+
+    # --- Protocollo ---
+
+    @property
+    def tab(self):
+        if self._tab is None:
+            raise NoSuchWindowException("no such window: finestra corrente chiusa")
+        return self._tab
+
+    def send(self, method, params=None):
+        """Invia un comando CDP alla scheda corrente senza attendere; restituisce un Future."""
+        return self.connection.send(method, params, self.tab.session_id)
+
+    def batch(self, commands):
+        """Invia in blocco i comandi (metodo, parametri) alla scheda corrente; restituisce i risultati in ordine."""
+        return self.connection.batch(commands, self.tab.session_id)
+
+    def execute_cdp_cmd(self, cmd, cmd_args=None):
+        return self.connection.call(cmd, cmd_args or {}, self.tab.session_id)
+
+    async def call_async(self, method, params=None):
+        """Comando CDP sulla scheda corrente attendibile da asyncio (più schede in parallelo con asyncio.gather)."""
+        return await asyncio.wrap_future(self.send(method, params))
+
+    def execute(self, command):
+        """Esegue un comando tipizzato dei binding selenium.webdriver.common.devtools (es. page.navigate(url))."""
+        request = next(command)
+        result = self.execute_cdp_cmd(request["method"], request.get("params"))
+        try:
+            command.send(result)
+        except StopIteration as stop:
+            return stop.value
+        raise WebDriverException(f"{request['method']}: comando tipizzato non terminato")
+
+    def on(self, event, callback):
+        """
+        Sottoscrive un evento CDP della scheda corrente: `event` è il nome ("Network.responseReceived")
+        o una classe evento dei binding devtools, che il callback riceve già costruita. Il dominio
+        dell'evento viene abilitato alla prima sottoscrizione. I callback girano nel thread degli
+        eventi della connessione. Restituisce la funzione che annulla la sottoscrizione.
+        """
+        tab = self.tab
+        method = getattr(event, "event_class", event)
+        domain = method.split(".", 1)[0]
+        if domain in _EVENT_DOMAINS and domain not in tab.domains:
+            self.connection.call(f"{domain}.enable", {}, tab.session_id)
+            tab.domains.add(domain)
+        handler = callback if isinstance(event, str) else (lambda params: callback(event.from_json(params)))
+        return self.connection.subscribe(method, handler, tab.session_id)
+
+    # --- Finestre ---
+
+    def _switch(self, handle):
+        try:
+            self._tab = self.browser.attach(handle)
+        except CdpError as e:
+            raise NoSuchWindowException(f"no such window: {handle} ({e.error_message})") from None
+        if handle not in self._owned:
+            self._owned.append(handle)
+
+    @property
+    def window_handles(self):
+        """Finestre di questo driver: la scheda iniziale e quelle aperte dalle sue pagine, in ordine di apertura."""
+        handles = []
+        for target_id, opener in self.browser.page_targets():
+            if target_id in self._owned or opener in handles:
+                handles.append(target_id)
+        self._owned = [handle for handle in self._owned if handle in handles] + \
+                      [handle for handle in handles if handle not in self._owned]
+        return handles
+
+    @property
+    def current_window_handle(self):
+        return self.tab.target_id
+
+    def close(self):
+        """Chiude la finestra corrente (il driver resta senza finestra fino al prossimo switch_to.window)."""
+        tab = self.tab
+        self.browser.close_target(tab.target_id)
+        if tab.target_id in self._owned:
+            self._owned.remove(tab.target_id)
+        self._tab = None
+
+    def quit(self):
+        """Chiude tutte le finestre del driver; il browser si chiude quando non ha più driver."""
+        for handle in list(self.window_handles):
+            self.browser.close_target(handle)
+        self._owned = []
+        self._tab = None
+        self.browser.release(self)
+
+    # --- Navigazione ---
+
+    def _target_info(self):
+        return self.connection.call("Target.getTargetInfo", {"targetId": self.tab.target_id})["targetInfo"]
+
+    @property
+    def current_url(self):
+        return self._target_info()["url"]
+
+    @property
+    def title(self):
+        return self._target_info()["title"]
+
+    def _wait_ready(self, deadline):
+        while time.monotonic() < deadline:
+            try:
+                if self.execute_script("return document.readyState") == "complete":
+                    return
+            except WebDriverException:
+                pass  # Contesto in ricostruzione durante la navigazione
+            time.sleep(READY_POLL)
+        raise TimeoutException(f"timeout: pagina non caricata in {self.page_load_timeout:.0f} s")
+
+    def get(self, url):
+        """Naviga a `url` e attende l'evento load del nuovo documento, come driver.get di Selenium."""
+        tab = self.tab
+        loaded = set()
+        condition = threading.Condition()
+
+        def on_lifecycle(params):
+            if params.get("name") == "load":
+                with condition:
+                    loaded.add(params.get("loaderId"))
+                    condition.notify_all()
+
+        unsubscribe = self.connection.subscribe("Page.lifecycleEvent", on_lifecycle, tab.session_id)
+        try:
+            result = self.connection.call("Page.navigate", {"url": url}, tab.session_id)
+            if result.get("errorText"):
+                raise WebDriverException(f"unknown error: {result['errorText']} ({url})")
+            loader = result.get("loaderId")
+            if not loader:
+                return  # Navigazione nello stesso documento (es. solo frammento)
+            deadline = time.monotonic() + self.page_load_timeout
+            with condition:
+                while loader not in loaded:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutException(f"timeout: pagina non caricata in {self.page_load_timeout:.0f} s ({url})")
+                    condition.wait(remaining)
+        finally:
+            unsubscribe()
+
+    def back(self):
+        tab = self.tab
+        history = self.connection.call("Page.getNavigationHistory", {}, tab.session_id)
+        if history["currentIndex"] <= 0:
+            return
+        entry = history["entries"][history["currentIndex"] - 1]
+        self.connection.call("Page.navigateToHistoryEntry", {"entryId": entry["id"]}, tab.session_id)
+        deadline = time.monotonic() + self.page_load_timeout
+        while self.current_url != entry["url"] and time.monotonic() < deadline:
+            time.sleep(READY_POLL)
+        self._wait_ready(deadline)
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    @property
+    def page_source(self):
+        return self.execute_script(PAGE_SOURCE_SCRIPT)
+
+    # --- Attese ---
+
+    def implicitly_wait(self, time_to_wait):
+        self.implicit_wait = float(time_to_wait)
+
+    def set_page_load_timeout(self, time_to_wait):
+        self.page_load_timeout = float(time_to_wait)
+
+    def set_script_timeout(self, time_to_wait):
+        self.script_timeout = float(time_to_wait)
+
+    # --- Script ed elementi ---
+
+    def _raise_script_error(self, details):
+        exception = details.get("exception") or {}
+        text = exception.get("description") or details.get("text") or "errore sconosciuto"
+        if STALE_MARKER in text:
+            raise StaleElementReferenceException("stale element reference: element is not attached to the page document")
+        if SCRIPT_TIMEOUT_MARKER in text:
+            raise TimeoutException(f"script timeout: nessun risultato in {self.script_timeout:.0f} s")
+        if "is not a valid selector" in text or "is not a valid XPath expression" in text:
+            raise InvalidSelectorException(f"invalid selector: {text}")
+        raise JavascriptException(f"javascript error: {text}")
+
+    def _to_python(self, tab, remote):
+        """Valore Python di un RemoteObject: i nodi diventano CdpElement, gli array liste."""
+        if "objectId" not in remote:
+            if "unserializableValue" in remote:
+                try:
+                    return float(remote["unserializableValue"])
+                except ValueError:
+                    return remote["unserializableValue"]
+            return remote.get("value")
+        subtype = remote.get("subtype")
+        if subtype == "node":
+            return CdpElement(self, tab, remote["objectId"])
+        if subtype == "array":
+            properties = self.connection.call("Runtime.getProperties", {"objectId": remote["objectId"], "ownProperties": True},
+                                              tab.session_id)["result"]
+            items = sorted((int(item["name"]), item["value"]) for item in properties
+                           if item["name"].isdigit() and "value" in item)
+            return [self._to_python(tab, value) for _, value in items]
+        result = self.connection.call("Runtime.callFunctionOn", {
+            "functionDeclaration": "function () { return this; }", "objectId": remote["objectId"], "returnByValue": True,
+        }, tab.session_id)
+        return result["result"].get("value")
+
+    def _call_function(self, tab, declaration, args, object_id=None, by_value=False, await_promise=False, timeout=COMMAND_TIMEOUT):
+        """
+        Esegue la funzione `declaration` con `args` (gli elementi passati per riferimento): su
+        `object_id` come this se indicato, altrimenti nel documento della scheda con un solo
+        Runtime.evaluate quando nessun argomento è un elemento.
+        """
+        elements = [arg for arg in args if isinstance(arg, CdpElement)]
+        if object_id is None and not elements:
+            params = {"expression": f"({declaration}).apply(null, {json.dumps(list(args))})", "returnByValue": by_value,
+                      "awaitPromise": await_promise}
+            method = "Runtime.evaluate"
+        else:
+            params = {"functionDeclaration": declaration, "objectId": object_id or elements[0].id, "returnByValue": by_value,
+                      "awaitPromise": await_promise,
+                      "arguments": [{"objectId": arg.id} if isinstance(arg, CdpElement) else {"value": arg} for arg in args]}
+            method = "Runtime.callFunctionOn"
+        try:
+            response = self.connection.call(method, params, tab.session_id, timeout)
+        except CdpError as e:
+            if method == "Runtime.callFunctionOn" and any(error in e.error_message for error in _STALE_ERRORS):
+                raise StaleElementReferenceException(f"stale element reference: {e.error_message}") from None
+            raise
+        if "exceptionDetails" in response:
+            self._raise_script_error(response["exceptionDetails"])
+        if by_value:
+            return response["result"].get("value")
+        return self._to_python(tab, response["result"])
+
+    def execute_script(self, script, *args):
+        return self._call_function(self.tab, _wrap_script(script, False), args)
+
+    def execute_async_script(self, script, *args):
+        return self._call_function(self.tab, _wrap_script(script, True), (int(self.script_timeout * 1000),) + args,
+                                   await_promise=True, timeout=self.script_timeout + COMMAND_TIMEOUT)
+
+    def _find(self, tab, by, value, all, object_id=None):
+        deadline = time.monotonic() + self.implicit_wait
+        while True:
+            found = self._call_function(tab, FIND_FUNCTION, (by, value, all), object_id)
+            if found or time.monotonic() >= deadline:
+                break
+            time.sleep(IMPLICIT_POLL)
+        if all:
+            return found
+        if found is None:
+            raise NoSuchElementException(f"no such element: Unable to locate element: {{\"method\":\"{by}\",\"selector\":\"{value}\"}}")
+        return found
+
+    def find_element(self, by="css selector", value=None):
+        return self._find(self.tab, by, value, False)
+
+    def find_elements(self, by="css selector", value=None):
+        return self._find(self.tab, by, value, True)
+
+    # --- Cookie ---
+
+    def get_cookies(self):
+        cookies = []
+        for cookie in self.execute_cdp_cmd("Network.getCookies")["cookies"]:
+            converted = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+                         if key in cookie}
+            if not cookie.get("session") and cookie.get("expires", -1) >= 0:
+                converted["expiry"] = int(cookie["expires"])
+            cookies.append(converted)
+        return cookies
+
+    def add_cookie(self, cookie_dict):
+        params = {key: cookie_dict[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+                  if key in cookie_dict}
+        if "expiry" in cookie_dict:
+            params["expires"] = cookie_dict["expiry"]
+        if "domain" not in params:
+            params["url"] = self.current_url
+        if not self.execute_cdp_cmd("Network.setCookie", params).get("success", True):
+            raise WebDriverException(f"invalid cookie domain: cookie '{cookie_dict.get('name')}' non impostato")
+
+    def delete_all_cookies(self):
+        self.execute_cdp_cmd("Network.clearBrowserCookies")
+
+
+class CdpBrowser:
+    """Browser Chrome pilotato via CDP: la connessione condivisa, le schede e i driver che le usano."""
+
+    def __init__(self, endpoint, process=None, profile_dir=None):
+        self.connection = CdpConnection(endpoint)
+        self.process = process
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.targets = {}     # id scheda -> id della scheda che l'ha aperta, in ordine di apertura
+        self.tabs = {}
+        self.drivers = set()
+        self.spare = []       # Schede iniziali del browser avviato, riusate dal primo driver
+        self.connection.subscribe("Target.targetCreated", self._on_target_created)
+        self.connection.subscribe("Target.targetDestroyed", self._on_target_destroyed)
+        self.connection.call("Target.setDiscoverTargets", {"discover": True})
+        self.page_targets()
+        if process is not None:
+            self.spare = [target_id for target_id, _ in self.page_targets()]
+
+    @classmethod
+    def launch(cls):
+        """Avvia un Chrome headless locale con un profilo temporaneo e vi si collega."""
+        binary = CHROME_BINARY or next((path for path in map(shutil.which, CHROME_CANDIDATES) if path), None)
+        if not binary:
+            raise WebDriverException("Chrome non trovato: impostare SCRAPER_CDP_CHROME")
+        profile_dir = tempfile.mkdtemp(prefix="scraper-cdp-")
+        process = subprocess.Popen([
+            binary, "--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu",
+            f"--window-size={WINDOW_SIZE}", "--no-first-run", "--no-default-browser-check",
+            "--remote-debugging-port=0", f"--user-data-dir={profile_dir}", "about:blank",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        port_file = os.path.join(profile_dir, "DevToolsActivePort")
+        deadline = time.monotonic() + LAUNCH_TIMEOUT
+        while True:
+            try:
+                with open(port_file, encoding="utf-8") as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    break
+            except FileNotFoundError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                shutil.rmtree(profile_dir, ignore_errors=True)
+                raise WebDriverException(f"Chrome ({binary}) non avviato: DevToolsActivePort assente")
+            time.sleep(0.05)
+        return cls(f"ws://127.0.0.1:{lines[0]}{lines[1]}", process, profile_dir)
+
+    @classmethod
+    def connect(cls, address):
+        """Si collega a un Chrome già avviato con --remote-debugging-port (http://host:porta o ws://...)."""
+        if address.startswith("http"):
+            with urlopen(f"{address.rstrip('/')}/json/version", timeout=LAUNCH_TIMEOUT) as response:
+                address = json.load(response)["webSocketDebuggerUrl"]
+        return cls(address)
+
+    def _on_target_created(self, params):
+        info = params["targetInfo"]
+        if info.get("type") == "page":
+            with self.lock:
+                self.targets.setdefault(info["targetId"], info.get("openerId"))
+
+    def _on_target_destroyed(self, params):
+        with self.lock:
+            self.targets.pop(params["targetId"], None)
+            self.tabs.pop(params["targetId"], None)
+
+    def page_targets(self):
+        """Schede aperte come coppie (id, id di chi l'ha aperta), in ordine di apertura."""
+        infos = self.connection.call("Target.getTargets")["targetInfos"]
+        live = {info["targetId"]: info.get("openerId") for info in infos if info.get("type") == "page"}
+        with self.lock:
+            # Le schede appena aperte (window.open) possono arrivare prima dell'evento targetCreated
+            for target_id, opener in live.items():
+                self.targets.setdefault(target_id, opener)
+            for target_id in [target_id for target_id in self.targets if target_id not in live]:
+                del self.targets[target_id]
+            return list(self.targets.items())
+
+    def attach(self, target_id):
+        """Sessione CDP della scheda `target_id`, collegata e con gli eventi di caricamento attivi alla prima richiesta."""
+        with self.lock:
+            tab = self.tabs.get(target_id)
+        if tab is not None:
+            return tab
+        session_id = self.connection.call("Target.attachToTarget", {"targetId": target_id, "flatten": True})["sessionId"]
+        tab = _Tab(target_id, session_id)
+        self.connection.batch([("Page.enable", {}), ("Page.setLifecycleEventsEnabled", {"enabled": True})], session_id)
+        tab.domains.add("Page")
+        with self.lock:
+            return self.tabs.setdefault(target_id, tab)
+
+    def close_target(self, target_id):
+        try:
+            self.connection.call("Target.closeTarget", {"targetId": target_id})
+        except CdpError:
+            pass  # Scheda già chiusa
+        with self.lock:
+            self.targets.pop(target_id, None)
+            self.tabs.pop(target_id, None)
+
+    def new_driver(self):
+        """Driver su una nuova scheda (o sulla scheda iniziale inutilizzata del browser avviato)."""
+        with self.lock:
+            target_id = self.spare.pop() if self.spare else None
+        if target_id is None:
+            target_id = self.connection.call("Target.createTarget", {"url": "about:blank"})["targetId"]
+            with self.lock:
+                self.targets.setdefault(target_id, None)
+        driver = CdpDriver(self, target_id)
+        with self.lock:
+            self.drivers.add(driver)
+        return driver
+
+    def release(self, driver):
+        """Un driver ha terminato; il browser avviato da qui si chiude con l'ultimo driver."""
+        with self.lock:
+            self.drivers.discard(driver)
+            last = not self.drivers
+        if last and self.process is not None:
+            self.close()
+
+    @property
+    def closed(self):
+        return self.connection.closed
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.connection.call("Browser.close", timeout=5)
+            except WebDriverException:
+                pass
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.connection.close()
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+_BROWSER = None
+_BROWSER_LOCK = threading.Lock()
+
+
+def enabled():
+    return bool(CDP_DRIVER) and CDP_DRIVER != "0"
+
+
+def new_driver():
+    """
+    CdpDriver su una nuova scheda del browser condiviso del processo se SCRAPER_CDP_DRIVER è
+    impostato; None se il driver CDP non è in uso o non è disponibile (si usa Selenium).
+    """
+    global _BROWSER
+    if not enabled():
+        return None
+    if websocket is None:
+        print("Pacchetto websocket-client non installato: driver CDP non disponibile, uso Selenium.")
+        return None
+    with _BROWSER_LOCK:
+        if _BROWSER is None or _BROWSER.closed:
+            start = time.perf_counter()
+            try:
+                _BROWSER = CdpBrowser.launch() if CDP_DRIVER == "1" else CdpBrowser.connect(CDP_DRIVER)
+            except (OSError, ValueError, KeyError, WebDriverException) as e:
+                print(f"Driver CDP non disponibile ({e}): uso Selenium.")
+                _BROWSER = None
+                return None
+            print(f"Browser CDP pronto in {time.perf_counter() - start:.1f} s.")
+        browser = _BROWSER
+    return browser.new_driver()
+
+
+def close_browser():
+    """Chiude il browser condiviso, se avviato da questo processo (registrata per l'uscita)."""
+    with _BROWSER_LOCK:
+        if _BROWSER is not None and not _BROWSER.closed:
+            _BROWSER.close()
+
+
+atexit.register(close_browser)
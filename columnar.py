@@ -0,0 +1,169 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+
+import catalog
+import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dipendenza opzionale: senza pyarrow l'export colonnare non è disponibile
+    pa = None
+    pq = None
+
+# Export colonnare in Parquet delle uscite degli scraper e del catalogo.
+# Le righe hanno le stesse colonne del catalogo (catalog.COLUMNS); marca, sorgente e categoria
+# sono codificate a dizionario, il file è compresso con zstd e ogni row group porta le statistiche
+# min/max per colonna. Le righe vengono scritte a blocchi: chi scrive non tiene mai l'intera tabella.
+# Richiede pyarrow (opzionale: pip install pyarrow).
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_EXPORT_FORMAT  "parquet" per scrivere anche parquet/<sorgente>.parquet al salvataggio dei dati
+#
+# Uso da riga di comando:
+#   python columnar.py catalog prodotti.parquet --brand Hilti
+#   python columnar.py csv prodotti.parquet *.csv
+
+EXPORT_FORMAT_ENV = "SCRAPER_EXPORT_FORMAT"
+EXPORT_DIR = "parquet"
+
+BATCH_SIZE = 10000          # Righe per blocco scritto (e per row group)
+COMPRESSION = "zstd"
+DICTIONARY_COLUMNS = ["source", "brand", "category"]
+
+
+def available():
+    return pa is not None
+
+
+def enabled():
+    """True se è richiesto l'export Parquet delle uscite degli scraper e pyarrow è installato."""
+    return os.environ.get(EXPORT_FORMAT_ENV) == "parquet" and available()
+
+
+def schema():
+    return pa.schema([(column, pa.string()) for column in catalog.COLUMNS])
+
+
+class ParquetSink:
+    """Scrittura a blocchi di righe del catalogo in un file Parquet."""
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        if not available():
+            raise RuntimeError("pyarrow non è installato: impossibile scrivere file Parquet (pip install pyarrow)")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.schema = schema()
+        self.rows = []
+        self.written = 0
+        self.writer = pq.ParquetWriter(
+            path,
+            self.schema,
+            compression=COMPRESSION,
+            use_dictionary=DICTIONARY_COLUMNS,
+            write_statistics=True,
+        )
+
+    def add_row(self, row):
+        """Aggiunge una riga (tupla nell'ordine di catalog.COLUMNS o dizionario)."""
+        if isinstance(row, dict):
+            row = tuple(row.get(column) for column in catalog.COLUMNS)
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def add_record(self, record, source=metrics.SITE, seen_at=None):
+        """Aggiunge un record di uno scraper, normalizzato come nel catalogo."""
+        row = catalog.normalize_record(record, source, seen_at or time.strftime("%Y-%m-%dT%H:%M:%S"))
+        if row is not None:
+            self.add_row(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = list(zip(*self.rows))
+        table = pa.Table.from_arrays([pa.array(values, type=pa.string()) for values in columns], schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.batch_size)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_records(records, source=metrics.SITE):
+    """Scrive i record di uno scraper in parquet/<sorgente>.parquet; restituisce il percorso del file."""
+    path = os.path.join(EXPORT_DIR, f"{source}.parquet")
+    with ParquetSink(path) as sink:
+        for record in records:
+            sink.add_record(record, source)
+    print(f"Export Parquet: {sink.written} record salvati in {path}")
+    return path
+
+
+def export_catalog(output, db_path=None, **filters):
+    """Esporta una query del catalogo in Parquet, leggendo e scrivendo a blocchi."""
+    with catalog.CatalogStore(db_path) as store, ParquetSink(output) as sink:
+        for row in store.query(**filters):
+            sink.add_row(row)
+    return sink.written
+
+
+def export_csv_files(output, paths, source=None):
+    """Converte CSV esistenti in un unico file Parquet (colonne del catalogo), un blocco alla volta."""
+    with ParquetSink(output) as sink:
+        for path in paths:
+            seen_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(path)))
+            file_source = source or catalog.source_from_filename(path)
+            with open(path, newline="", encoding="utf-8", errors="replace") as f:
+                for record in csv.DictReader(f):
+                    sink.add_record(record, file_source, seen_at)
+    return sink.written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Parquet del catalogo o di file CSV.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    catalog_parser = commands.add_parser("catalog", help="Esporta una query del catalogo")
+    catalog_parser.add_argument("output")
+    catalog_parser.add_argument("--db", default=catalog.catalog_path() or catalog.DEFAULT_PATH)
+    catalog_parser.add_argument("--source")
+    catalog_parser.add_argument("--brand")
+    catalog_parser.add_argument("--seen-since")
+
+    csv_parser = commands.add_parser("csv", help="Converte file CSV")
+    csv_parser.add_argument("output")
+    csv_parser.add_argument("files", nargs="+")
+    csv_parser.add_argument("--source", help="Sorgente da usare per tutti i file (default: dal nome del file)")
+    args = parser.parse_args()
+
+    if not available():
+        print("pyarrow non è installato: installalo con 'pip install pyarrow' per usare l'export Parquet.")
+        return 1
+
+    if args.command == "catalog":
+        count = export_catalog(args.output, args.db, source=args.source, brand=args.brand, seen_since=args.seen_since)
+    else:
+        files = [path for pattern in args.files for path in (glob.glob(pattern) or [pattern])]
+        count = export_csv_files(args.output, files, args.source)
+    print(f"Esportate {count} righe in {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import metrics
+
+# Gestione dei banner di consenso ai cookie (cookie wall).
+# Prima ogni pagina attendeva fino a 5 secondi la comparsa del banner con WebDriverWait, anche
+# quando il consenso era già stato dato: 5 s sprecati per ogni scheda prodotto.
+# Qui il controllo avviene nel browser con un solo script: se il banner è visibile si clicca il
+# pulsante di accettazione, altrimenti si risponde subito. Solo la prima pagina di ogni host (in
+# ogni browser) attende (fino a FIRST_WAIT secondi) che il banner compaia; dopo la prima verifica le
+# pagine successive dello stesso host non attendono mai.
+# I cookie impostati dall'accettazione vengono salvati per host e, alle esecuzioni successive,
+# reinseriti nel browser prima della prima navigazione verso l'host (Network.setCookies via CDP,
+# da fetch.prepare_driver), così il banner non compare e nemmeno la prima pagina attende.
+# Se il browser non supporta CDP i cookie sono reinseriti dopo il caricamento della prima pagina,
+# che attende comunque il banner (può comparire in ritardo): dalla pagina successiva non ricompare.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_CONSENT_STORE  file dei cookie di consenso per host (default: consent_cookies.json, "0" per non salvarli)
+
+CONSENT_STORE = os.environ.get("SCRAPER_CONSENT_STORE", "consent_cookies.json")
+
+FIRST_WAIT = 5.0   # Secondi di attesa del banner alla prima pagina di un host
+CLOSE_WAIT = 5.0   # Secondi massimi di attesa della chiusura del banner dopo il click
+
+# Campi dei cookie Selenium reinseribili con add_cookie
+_COOKIE_FIELDS = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")
+
+DISMISS_SCRIPT = """
+var wallSelector = arguments[0], buttonSelector = arguments[1], texts = arguments[2];
+var waitMs = arguments[3], closeMs = arguments[4], done = arguments[arguments.length - 1];
+function visible(node) {
+    return !!node && !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+}
+function acceptButton() {
+    var buttons = document.querySelectorAll(buttonSelector);
+    for (var i = 0; i < buttons.length; i++) {
+        if (!visible(buttons[i])) { continue; }
+        var text = (buttons[i].innerText || buttons[i].textContent || '').trim().toLowerCase();
+        if (!texts.length || texts.indexOf(text) >= 0) { return buttons[i]; }
+    }
+    return null;
+}
+var start = Date.now(), clicked = false, before = [];
+function finish(outcome) { done(JSON.stringify({outcome: outcome, before: before})); }
+(function poll() {
+    var now = Date.now(), wall = document.querySelector(wallSelector);
+    if (!clicked) {
+        var button = visible(wall) ? acceptButton() : null;
+        if (button) {
+            // Cookie presenti prima del click, per salvare solo quelli impostati dal consenso
+            before = document.cookie ? document.cookie.split('; ') : [];
+            button.click();
+            clicked = true;
+            start = now;
+        } else if (now - start >= waitMs) {
+            finish(visible(wall) ? 'no_button' : 'absent');
+            return;
+        }
+    } else if (!visible(wall) || now - start >= closeMs) {
+        finish(visible(wall) ? 'still_visible' : 'accepted');
+        return;
+    }
+    setTimeout(poll, 50);
+})();
+"""
+
+
+class ConsentWall:
+    """
+    Descrizione di un banner di consenso: selettore del banner, selettore dei pulsanti al suo interno
+    e, facoltativamente, i testi accettati (minuscoli) per scegliere il pulsante giusto tra più candidati.
+    """
+
+    def __init__(self, wall_selector, button_selector, texts=()):
+        self.wall_selector = wall_selector
+        self.button_selector = button_selector
+        self.texts = [text.lower() for text in texts]
+
+
+# Banner OneTrust, usato da molti siti di produttori
+ONETRUST = ConsentWall("#onetrust-banner-sdk", "#onetrust-accept-btn-handler, button.onetrust-accept-btn-handler")
+
+
+class ConsentManager:
+    """Stato del consenso per host: host già verificati da ogni browser in questa esecuzione e cookie di consenso salvati."""
+
+    def __init__(self, path=CONSENT_STORE):
+        self.path = None if path == "0" else path
+        self.lock = threading.Lock()
+        self.checked = set()
+        self.preseeded = set()
+        self.cookies = {}
+        if self.path:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.cookies = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"Archivio consensi {self.path} non leggibile ({e}): verrà ricreato.")
+
+    def preseed(self, driver, url):
+        """
+        Prima della navigazione verso `url`, imposta nel browser i cookie di consenso salvati per il
+        suo host con Network.setCookies (CDP), una volta per browser e host.
+        """
+        host = urlsplit(url).netloc
+        browser_host = (getattr(driver, "session_id", None), host)
+        cookies = self.cookies.get(host)
+        if not cookies or not hasattr(driver, "execute_cdp_cmd"):
+            return
+        with self.lock:
+            if browser_host in self.preseeded or browser_host in self.checked:
+                return
+            self.preseeded.add(browser_host)
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": [_cdp_cookie(cookie, url) for cookie in cookies]})
+        except Exception as e:
+            with self.lock:
+                self.preseeded.discard(browser_host)
+            print(f"Cookie di consenso non preimpostati per {host}: {e}")
+
+    def _seed(self, driver, host):
+        """Reinserisce nel browser i cookie di consenso salvati per `host`; True se ce n'erano."""
+        cookies = self.cookies.get(host) or []
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                print(f"Cookie di consenso '{cookie.get('name')}' non reinserito per {host}: {e}")
+        return bool(cookies)
+
+    def _record(self, host, before, after):
+        """Salva i cookie impostati o modificati dall'accettazione del banner (`before`: coppie "nome=valore")."""
+        before = set(before)
+        cookies = [{key: cookie[key] for key in _COOKIE_FIELDS if key in cookie}
+                   for cookie in after if f"{cookie['name']}={cookie.get('value', '')}" not in before]
+        if not cookies or not self.path:
+            return
+        with self.lock:
+            self.cookies[host] = cookies
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.cookies, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        print(f"Cookie di consenso salvati per {host}: {', '.join(cookie['name'] for cookie in cookies)}")
+
+    def dismiss(self, driver, wall):
+        """
+        Chiude il banner `wall` sulla pagina corrente del driver, se presente.
+        Attende la comparsa del banner solo alla prima pagina di ogni host; restituisce l'esito
+        ("absent", "accepted", "no_button", "still_visible" o "error").
+        """
+        try:
+            host = urlsplit(driver.current_url).netloc
+            # Il consenso vale per il singolo browser: più driver (es. i worker della pipeline) verificano ciascuno il proprio
+            browser_host = (getattr(driver, "session_id", None), host)
+            with self.lock:
+                first = browser_host not in self.checked
+                self.checked.add(browser_host)
+                preseeded = browser_host in self.preseeded
+            if first and not preseeded:
+                # Cookie reinseriti solo ora: questa pagina è stata caricata senza, il banner può ancora comparire
+                self._seed(driver, host)
+            wait = FIRST_WAIT if first and not preseeded else 0
+            driver.set_script_timeout(wait + CLOSE_WAIT + 30)
+            result = json.loads(driver.execute_async_script(DISMISS_SCRIPT, wall.wall_selector, wall.button_selector,
+                                                            wall.texts, int(wait * 1000), int(CLOSE_WAIT * 1000)))
+            outcome = result["outcome"]
+        except Exception as e:
+            print(f"Errore nella gestione del banner cookie: {e}")
+            metrics.inc("scraper_consent_checks_total", site=metrics.SITE, outcome="error")
+            return "error"
+
+        metrics.inc("scraper_consent_checks_total", site=metrics.SITE, outcome=outcome)
+        if outcome == "accepted":
+            print("Banner cookie accettato.")
+            try:
+                self._record(host, result["before"], driver.get_cookies())
+            except Exception as e:
+                print(f"Cookie di consenso non salvati: {e}")
+        elif outcome == "no_button":
+            print("Banner cookie visibile ma bottone di accettazione non trovato.")
+        elif outcome == "still_visible":
+            print("Banner cookie ancora visibile dopo il click.")
+        return outcome
+
+
+def _cdp_cookie(cookie, url):
+    """Cookie Selenium salvato nel formato di Network.setCookies."""
+    converted = {key: cookie[key] for key in ("name", "value", "path", "domain", "secure", "httpOnly", "sameSite")
+                 if key in cookie}
+    if "domain" not in converted:
+        converted["url"] = url
+    if "expiry" in cookie:
+        converted["expires"] = cookie["expiry"]
+    return converted
+
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def _manager():
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = ConsentManager()
+        return _MANAGER
+
+
+def preseed(driver, url):
+    """Imposta i cookie di consenso salvati per l'host di `url` prima di navigarci (vedi ConsentManager.preseed)."""
+    if CONSENT_STORE != "0":
+        _manager().preseed(driver, url)
+
+
+def dismiss(driver, wall):
+    """Chiude il banner di consenso `wall` sulla pagina corrente usando il gestore condiviso del processo."""
+    return _manager().dismiss(driver, wall)
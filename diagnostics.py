@@ -0,0 +1,128 @@
+import atexit
+import os
+import re
+import threading
+import time
+
+import metrics
+
+# Diagnostica economica per i selettori che non trovano nulla.
+# Invece di serializzare l'intero albero con soup.prettify() a ogni pagina vuota, su un "miss"
+# si salvano i byte grezzi della pagina in un archivio di debug limitato e campionato:
+# al massimo qualche file per selettore, con un intervallo minimo tra un salvataggio e l'altro.
+# A fine esecuzione viene stampato un riepilogo dei miss per selettore.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_DEBUG_DIR        cartella dell'archivio (default: debug_pages)
+#   SCRAPER_DEBUG_MAX_FILES  file massimi conservati nell'archivio, tra tutte le esecuzioni (default: 200)
+
+DEBUG_DIR = os.environ.get("SCRAPER_DEBUG_DIR", "debug_pages")
+MAX_STORE_FILES = int(os.environ.get("SCRAPER_DEBUG_MAX_FILES", "200"))
+
+MAX_DUMPS_PER_SELECTOR = 3   # Dump massimi per selettore in una esecuzione
+MIN_DUMP_INTERVAL = 60.0     # Secondi minimi tra due dump dello stesso selettore
+SAMPLE_EVERY = 10            # Dopo il primo, considera un miss ogni SAMPLE_EVERY per il dump
+
+_lock = threading.Lock()
+_last_page = threading.local()
+_misses = {}  # selettore -> {"count", "dumps", "last_dump_at", "urls"}
+
+
+def remember_page(url, raw):
+    """Memorizza (per thread) l'ultima pagina scaricata: è quella che verrà salvata in caso di miss."""
+    _last_page.url = url
+    _last_page.raw = raw
+
+
+def _slug(text, max_length=40):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:max_length] or "selettore"
+
+
+def _prune_store():
+    """Mantiene l'archivio entro MAX_STORE_FILES eliminando i file più vecchi."""
+    try:
+        files = [os.path.join(DEBUG_DIR, name) for name in os.listdir(DEBUG_DIR)]
+    except FileNotFoundError:
+        return
+    files = [path for path in files if os.path.isfile(path)]
+    if len(files) <= MAX_STORE_FILES:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - MAX_STORE_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _should_dump(state, now):
+    if state["dumps"] >= MAX_DUMPS_PER_SELECTOR:
+        return False
+    if state["dumps"] and now - state["last_dump_at"] < MIN_DUMP_INTERVAL:
+        return False
+    return state["count"] == 1 or state["count"] % SAMPLE_EVERY == 0
+
+
+def record_miss(selector, url=None, page_source=None, site=metrics.SITE):
+    """
+    Registra che `selector` non ha trovato elementi sulla pagina `url`.
+    page_source può essere il contenuto della pagina (str/bytes) oppure una funzione che lo restituisce,
+    chiamata solo se il dump viene effettivamente salvato; se assente si usa l'ultima pagina scaricata.
+    """
+    url = url or getattr(_last_page, "url", None)
+    metrics.inc("scraper_selector_misses_total", site=site, selector=selector)
+    now = time.time()
+    with _lock:
+        state = _misses.setdefault(selector, {"count": 0, "dumps": 0, "last_dump_at": 0.0, "urls": [], "files": []})
+        state["count"] += 1
+        if url and len(state["urls"]) < 5 and url not in state["urls"]:
+            state["urls"].append(url)
+        dump = _should_dump(state, now)
+        if dump:
+            state["dumps"] += 1
+            state["last_dump_at"] = now
+            dump_number = state["dumps"]
+
+    if not dump:
+        print(f"Selettore '{selector}' senza risultati su {url} (miss n. {state['count']}, dump non salvato).")
+        return None
+
+    raw = page_source() if callable(page_source) else page_source
+    if raw is None:
+        raw = getattr(_last_page, "raw", None)
+    if raw is None:
+        print(f"Selettore '{selector}' senza risultati su {url} (nessun contenuto disponibile per il dump).")
+        return None
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+
+    os.makedirs(DEBUG_DIR, exist_ok=True)
+    path = os.path.join(DEBUG_DIR, f"{site}_{time.strftime('%Y%m%d_%H%M%S')}_{_slug(selector)}_{dump_number}.html")
+    try:
+        with open(path, "wb") as f:
+            f.write(raw)
+    except OSError as e:
+        print(f"Impossibile salvare il dump di debug in {path}: {e}")
+        return None
+    with _lock:
+        state["files"].append(path)
+    _prune_store()
+    print(f"Selettore '{selector}' senza risultati su {url}. HTML grezzo salvato in {path} per debug.")
+    return path
+
+
+def print_summary():
+    """Stampa il riepilogo dei miss per selettore raccolti durante l'esecuzione."""
+    with _lock:
+        if not _misses:
+            return
+        print("\n--- Riepilogo selettori senza risultati ---")
+        for selector, state in sorted(_misses.items(), key=lambda item: -item[1]["count"]):
+            print(f"'{selector}': {state['count']} miss, {len(state['files'])} dump salvati")
+            for url in state["urls"]:
+                print(f"    es. {url}")
+            for path in state["files"]:
+                print(f"    dump: {path}")
+
+
+atexit.register(print_summary)
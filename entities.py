@@ -0,0 +1,427 @@
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import catalog
+
+# Risoluzione delle entità tra sorgenti diverse: lo stesso prodotto compare per esempio in
+# mapei_prodotti_paginato.csv ("Sigillante siliconico Mapei Mapesil AC 310 ml") e in
+# edilportale_prodotti_mapei.csv ("MAPESIL AC").
+# Dal nome di ogni record si tolgono marca, parole generiche, unità di misura e la clausola d'uso
+# finale ("... Per martelli perforatori, Per sezionatori"), uguale per intere famiglie di prodotti;
+# le parole rimaste (e i loro trigrammi di caratteri, per tollerare refusi) formano l'insieme di
+# shingle da cui si calcola una firma MinHash. Il banding LSH raggruppa le firme simili in bucket, così che solo le
+# coppie candidate vengano confrontate (costo quasi lineare invece che quadratico).
+# Una coppia candidata è lo stesso prodotto se i nomi sono simili (Jaccard) o se, tra sorgenti
+# diverse, le parole del nome più corto sono tutte contenute nel più lungo; la descrizione conferma
+# i casi dubbi tra sorgenti diverse. Marche incompatibili o codici del modello diversi escludono la
+# corrispondenza: i codici sono i numeri e le sigle alfanumeriche del nome ("Planitop 530",
+# "45X40", "plus-4C", "18mm"), esclusi i numeri della confezione ("Sacchi da 25 Kg", "310 ml",
+# "36 pz."), e devono coincidere; solo tra sorgenti diverse un nome senza codici (es. "MAPESIL AC")
+# può corrispondere a uno con codici. Due record della stessa sorgente finiscono nello stesso
+# cluster se i nomi hanno le stesse parole (a meno di marca, ordine e confezione) e gli stessi codici:
+# le varianti di un catalogo restano distinte.
+# Per ogni cluster viene prodotto un record "golden".
+#
+# La firma usa il one-permutation hashing: un solo hash per shingle, distribuito in NUM_BINS bin
+# di cui si tiene il minimo (i bin vuoti prendono il valore del successivo non vuoto).
+#
+# Uso da riga di comando:
+#   python entities.py golden.csv                     # dal catalogo (catalog.db)
+#   python entities.py golden.csv --csv *.csv         # da file CSV
+#   python entities.py golden.csv --brand Mapei
+
+NUM_BINS = 128
+BANDS = 64                 # BANDS * ROWS_PER_BAND = NUM_BINS; soglia LSH ~ (1/BANDS)^(1/ROWS_PER_BAND) ~ 0.13
+ROWS_PER_BAND = NUM_BINS // BANDS
+MAX_BUCKET_SIZE = 100      # Bucket più grandi (nomi troppo generici) non generano candidati
+
+NAME_JACCARD_THRESHOLD = 0.75     # Parole identificative del nome quasi uguali
+TYPO_JACCARD_THRESHOLD = 0.85     # Trigrammi quasi uguali (stesso nome con refusi o grafie diverse)
+MIN_CONTAINMENT_TOKENS = 2        # Tra sorgenti diverse, un nome di almeno due parole contenuto nell'altro
+WEAK_NAME_THRESHOLD = 0.4         # Nomi solo in parte simili: serve la conferma della descrizione
+DESCRIPTION_THRESHOLD = 0.5
+DESCRIPTION_WORDS = 40            # Parole della descrizione usate per il confronto
+
+# Parole che non identificano il prodotto: articoli, preposizioni, confezioni e unità di misura
+STOPWORDS = {
+    "a", "al", "alla", "con", "da", "dal", "del", "della", "di", "e", "ed", "il", "in", "la", "le", "per", "su", "un", "una",
+    "kg", "g", "gr", "ml", "l", "lt", "litri", "mm", "cm", "m", "mq", "pz", "pezzi", "sacco", "sacchi", "secchio",
+    "tubetto", "tubetti", "confezione", "confezioni", "conf", "cartuccia", "cartucce", "scatola", "scatole",
+    "bomboletta", "bombolette", "tanica", "latta", "fustino", "bancale", "venduta", "venduto", "x",
+}
+
+# Unità e contenitori che accompagnano i numeri della confezione, da non confrontare tra prodotti
+PACKAGING_UNITS = {"kg", "g", "gr", "ml", "l", "lt", "litri", "pz", "pezzi"}
+CONTAINERS = {
+    "sacco", "sacchi", "secchio", "tubetto", "tubetti", "confezione", "confezioni", "conf", "cartuccia", "cartucce",
+    "scatola", "scatole", "bomboletta", "bombolette", "tanica", "latta", "fustino", "bancale",
+}
+USAGE_WORD = "per"   # Inizio della clausola d'uso nel nome
+
+_EMPTY_BIN = 1 << 64
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_GLUED_PACKAGING_RE = re.compile(r"^\d+(kg|g|gr|ml|l|lt|pz)$")
+_GLUED_MEASURE_RE = re.compile(r"^(\d+)(mm|cm|m|mq)$")
+_HYPHEN_CODE_RE = re.compile(r"\b([a-z]+)-(\d+)\b")
+
+
+def normalize_text(text):
+    """Minuscolo, senza accenti e punteggiatura, spazi normalizzati."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_WORD_RE.findall(text.lower().replace("×", "x")))
+
+
+def _packaging_words(name):
+    """Quantità della confezione scritte come parola a sé ("310ml", "(25kg)"), non dentro un codice come "C2/24L-N"."""
+    standalone = (normalize_text(word) for word in (name or "").split())
+    return {word for word in standalone if _GLUED_PACKAGING_RE.match(word)}
+
+
+def name_tokens(name, brand):
+    """Parole identificative del nome: senza marca, parole generiche, numeri e quantità ("310ml", "18mm")."""
+    brand_words = set(normalize_text(brand).split())
+    packaging = _packaging_words(name)
+    return [word for word in normalize_text(name).split()
+            if word not in STOPWORDS and word not in brand_words and not word.isdigit()
+            and word not in packaging and not _GLUED_MEASURE_RE.match(word)]
+
+
+def name_words(name, brand):
+    """
+    Tutte le parole del nome senza marca e numeri, comprese quelle generiche: nello stesso catalogo anche
+    una lettera o una preposizione distingue le varianti ("Taglia L" e "Taglia M", "HL" e "HL AL").
+    """
+    brand_words = set(normalize_text(brand).split())
+    packaging = _packaging_words(name)
+    return [word for word in normalize_text(name).split()
+            if word not in brand_words and not word.isdigit() and word not in packaging]
+
+
+def usage_free_tokens(name, brand):
+    """
+    Parole identificative del nome prima della clausola d'uso ("... Per martelli perforatori, Per
+    sezionatori"): il nome fino al primo "per" preceduto da almeno MIN_CONTAINMENT_TOKENS parole
+    identificative; None se il nome non ha una clausola d'uso.
+    """
+    words = normalize_text(name).split()
+    for index, word in enumerate(words):
+        if word == USAGE_WORD:
+            head = name_tokens(" ".join(words[:index]), brand)
+            if len(head) >= MIN_CONTAINMENT_TOKENS:
+                return head
+    return None
+
+
+def name_codes(name):
+    """
+    Codici del modello nel nome: numeri e sigle alfanumeriche (misure attaccate all'unità ridotte al
+    numero, "18mm" -> "18"), esclusi i numeri della confezione ("25 kg", "kg 15", "sacchi da 25", "310ml").
+    """
+    words = normalize_text(name).split()
+    packaging = _packaging_words(name)
+    # Lettera e numero uniti dal trattino sono una sigla ("Sikaplan G-15"), non una confezione
+    hyphen_codes = set(_HYPHEN_CODE_RE.findall(str(name or "").lower()))
+    codes = set()
+    for index, word in enumerate(words):
+        if not any(char.isdigit() for char in word) or word in packaging:
+            continue
+        if word.isdigit():
+            previous = words[index - 1] if index else ""
+            following = words[index + 1] if index + 1 < len(words) else ""
+            if (previous, word) in hyphen_codes:
+                pass
+            elif following in PACKAGING_UNITS or previous in PACKAGING_UNITS or previous in CONTAINERS:
+                continue
+            if previous == "da" and index >= 2 and words[index - 2] in CONTAINERS:
+                continue
+        measure = _GLUED_MEASURE_RE.match(word)
+        codes.add(measure.group(1) if measure else word)
+    return codes
+
+
+def shingles(tokens):
+    """Shingle del nome: le parole e i trigrammi di caratteri di ciascuna."""
+    result = set(tokens)
+    for token in tokens:
+        padded = f" {token} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def description_shingles(description):
+    words = normalize_text(description).split()[:DESCRIPTION_WORDS]
+    return {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(shingle_set, num_bins=NUM_BINS):
+    """Firma MinHash (one-permutation hashing con densificazione) di un insieme di shingle."""
+    signature = [_EMPTY_BIN] * num_bins
+    for shingle in shingle_set:
+        value = _hash64(shingle)
+        index = value % num_bins
+        value //= num_bins
+        if value < signature[index]:
+            signature[index] = value
+    if all(value == _EMPTY_BIN for value in signature):
+        return None
+    # Densificazione: un bin vuoto prende il valore del primo bin non vuoto alla sua destra (circolare)
+    for index in range(num_bins):
+        if signature[index] == _EMPTY_BIN:
+            offset = 1
+            while signature[(index + offset) % num_bins] == _EMPTY_BIN:
+                offset += 1
+            signature[index] = signature[(index + offset) % num_bins] + offset
+    return signature
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def candidate_pairs(signatures):
+    """Coppie di indici che condividono almeno un bucket LSH."""
+    pairs = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        start = band * ROWS_PER_BAND
+        for index, signature in signatures.items():
+            buckets[tuple(signature[start:start + ROWS_PER_BAND])].append(index)
+        for members in buckets.values():
+            if len(members) < 2 or len(members) > MAX_BUCKET_SIZE:
+                continue
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+def _find(parents, index):
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def _brands_compatible(first, second):
+    first, second = normalize_text(first), normalize_text(second)
+    return not first or not second or first == second or first in second or second in first
+
+
+class _Features:
+    """Dati di confronto di un record, calcolati una volta sola."""
+
+    def __init__(self, record):
+        self.source = record.get("source")
+        self.brand = record.get("brand")
+        self.words = set(name_words(record.get("name"), self.brand))
+        self.tokens = set(name_tokens(record.get("name"), self.brand))
+        head = usage_free_tokens(record.get("name"), self.brand)
+        self.head_tokens = self.tokens if head is None else set(head)
+        self.shingles = shingles(self.head_tokens)
+        self.codes = name_codes(record.get("name"))
+        self.description = None  # Calcolata solo se serve
+        self.raw_description = record.get("description")
+
+    def description_shingles(self):
+        if self.description is None:
+            self.description = description_shingles(self.raw_description)
+        return self.description
+
+
+def is_match(first, second):
+    """True se i due record (come _Features) descrivono lo stesso prodotto."""
+    if not _brands_compatible(first.brand, second.brand):
+        return False
+    same_source = first.source == second.source
+    if first.codes != second.codes and (same_source or (first.codes and second.codes)):
+        return False
+    # Una clausola d'uso comune a tutta una famiglia di prodotti non deve rendere simili i nomi:
+    # conta la somiglianza minore tra nomi interi e nomi senza clausola
+    name_similarity = min(jaccard(first.tokens, second.tokens), jaccard(first.head_tokens, second.head_tokens))
+    # Nello stesso catalogo nomi anche solo in parte diversi indicano varianti distinte (es. "Mapesil Bm"
+    # e "Mapesil Gp", "Griglia carrabile in PVC" e "... antishock"), che spesso condividono la descrizione:
+    # refusi, nomi contenuti uno nell'altro e conferma della descrizione valgono solo tra sorgenti diverse
+    if same_source:
+        return first.words == second.words
+    if name_similarity >= NAME_JACCARD_THRESHOLD:
+        return True
+    if jaccard(first.shingles, second.shingles) >= TYPO_JACCARD_THRESHOLD:
+        return True
+    shorter, longer = sorted((first.head_tokens, second.head_tokens), key=len)
+    if len(shorter) >= MIN_CONTAINMENT_TOKENS and shorter <= longer:
+        return True
+    return (name_similarity >= WEAK_NAME_THRESHOLD
+            and jaccard(first.description_shingles(), second.description_shingles()) >= DESCRIPTION_THRESHOLD)
+
+
+def _can_merge(first_members, second_members, features):
+    """
+    Due cluster si uniscono solo se i loro rappresentanti corrispondono (evita le catene A~B~C~...
+    che finirebbero per unire prodotti diversi) e se i record della stessa sorgente corrispondono tra loro.
+    """
+    if not is_match(features[first_members[0]], features[second_members[0]]):
+        return False
+    for first in first_members:
+        for second in second_members:
+            if features[first].source == features[second].source and not is_match(features[first], features[second]):
+                return False
+    return True
+
+
+def resolve(records):
+    """
+    Raggruppa i record (dizionari con le colonne del catalogo) in cluster dello stesso prodotto.
+    Restituisce una lista di cluster, ognuno una lista di indici in `records`.
+    """
+    features = [_Features(record) for record in records]
+    parents = list(range(len(records)))
+    signatures = {}
+    representatives = {}
+    for index, feature in enumerate(features):
+        signature = minhash(feature.shingles)
+        if signature is None:
+            continue
+        # Record con le stesse parole identificative, marca e codici (es. copie con timestamp dello stesso CSV)
+        # vengono uniti subito: entrano nell'LSH una volta sola invece di riempire i bucket di coppie banali
+        key = (tuple(sorted(feature.words)), normalize_text(feature.brand), tuple(sorted(feature.codes)))
+        representative = representatives.setdefault(key, index)
+        if representative != index:
+            parents[index] = representative
+            continue
+        signatures[index] = signature
+
+    pairs = candidate_pairs(signatures)
+    members = {index: [index] for index in signatures}  # Record distinti (senza copie identiche) per cluster
+    matches = 0
+    for first, second in sorted(pairs):
+        if not is_match(features[first], features[second]):
+            continue
+        matches += 1
+        root_first, root_second = _find(parents, first), _find(parents, second)
+        if root_first == root_second or not _can_merge(members[root_first], members[root_second], features):
+            continue
+        parents[root_second] = root_first
+        members[root_first].extend(members.pop(root_second))
+
+    clusters = defaultdict(list)
+    for index in range(len(records)):
+        clusters[_find(parents, index)].append(index)
+    print(f"Risoluzione entità: {len(records)} record, {len(pairs)} coppie candidate, {matches} corrispondenze, "
+          f"{len(clusters)} prodotti distinti.")
+    return list(clusters.values())
+
+
+def _source_rank(source):
+    # I siti dei produttori sono più affidabili dei portali che ne riportano le schede
+    return 1 if source and source.startswith(("edilportale", "scraper_edilportale", "scraper_index")) else 0
+
+
+def golden_record(cluster_records):
+    """Record di sintesi di un cluster: valori più frequenti o più completi, preferendo le sorgenti dei produttori."""
+    ordered = sorted(cluster_records, key=lambda record: _source_rank(record.get("source")))
+
+    def most_common(field):
+        values = [record[field] for record in ordered if record.get(field)]
+        if not values:
+            return None
+        counts = Counter(values)
+        return max(values, key=lambda value: counts[value])  # A parità vince la sorgente preferita
+
+    def first_present(field):
+        return next((record[field] for record in ordered if record.get(field)), None)
+
+    descriptions = [record["description"] for record in ordered if record.get("description")]
+    return {
+        "name": most_common("name"),
+        "brand": most_common("brand"),
+        "description": max(descriptions, key=len) if descriptions else None,
+        "image_url": first_present("image_url"),
+        "category": most_common("category"),
+        "price": first_present("price"),
+        "sources": ";".join(sorted({record["source"] for record in ordered if record.get("source")})),
+        "urls": ";".join(record["url"] for record in ordered if record.get("url") and "://" in record["url"]),
+        "records": len(ordered),
+    }
+
+
+def load_catalog(db_path, brand=None):
+    with catalog.CatalogStore(db_path) as store:
+        return list(store.query(brand=brand))
+
+
+def load_csv_files(paths, brand=None):
+    records = []
+    for path in paths:
+        seen_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(path)))
+        source = catalog.source_from_filename(path)
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            for record in csv.DictReader(f):
+                row = catalog.normalize_record(record, source, seen_at)
+                if row is not None:
+                    records.append(dict(zip(catalog.COLUMNS, row)))
+    if brand:
+        records = [record for record in records if normalize_text(brand) in normalize_text(record.get("brand"))]
+    return records
+
+
+def write_golden(records, clusters, filename):
+    """Scrive i record golden e, accanto, l'appartenenza di ogni record al suo cluster."""
+    fieldnames = ["cluster_id", "name", "brand", "description", "image_url", "category", "price", "sources", "urls", "records"]
+    members_file = f"{os.path.splitext(filename)[0]}_membri.csv"
+    clusters = sorted(clusters, key=lambda members: (-len(members), members[0]))
+    with open(filename, "w", newline="", encoding="utf-8") as golden_out, \
+            open(members_file, "w", newline="", encoding="utf-8") as members_out:
+        golden_writer = csv.DictWriter(golden_out, fieldnames=fieldnames)
+        golden_writer.writeheader()
+        members_writer = csv.writer(members_out)
+        members_writer.writerow(["cluster_id", "source", "url", "name"])
+        for cluster_id, members in enumerate(clusters, start=1):
+            cluster_records = [records[index] for index in members]
+            golden_writer.writerow({"cluster_id": cluster_id, **golden_record(cluster_records)})
+            for record in cluster_records:
+                members_writer.writerow([cluster_id, record.get("source"), record.get("url"), record.get("name")])
+    print(f"Record golden salvati in {filename}, appartenenza ai cluster in {members_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Risoluzione delle entità tra sorgenti con MinHash/LSH.")
+    parser.add_argument("output", help="CSV dei record golden")
+    parser.add_argument("--db", default=catalog.catalog_path() or catalog.DEFAULT_PATH, help="Catalogo da cui leggere")
+    parser.add_argument("--csv", nargs="+", help="Leggi da questi CSV invece che dal catalogo")
+    parser.add_argument("--brand", help="Limita la risoluzione a una marca")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.csv:
+        files = [path for pattern in args.csv for path in (glob.glob(pattern) or [pattern])]
+        records = load_csv_files(files, args.brand)
+    else:
+        records = load_catalog(args.db, args.brand)
+    if not records:
+        print("Nessun record da risolvere.")
+        return 1
+    clusters = resolve(records)
+    write_golden(records, clusters, args.output)
+    print(f"Completato in {time.perf_counter() - start:.1f} s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import json
+
+# Estrazione in blocco nel browser: lo scraper dichiara il selettore dei contenitori (le card
+# prodotto) e, per ogni campo, un selettore relativo al contenitore e cosa leggere; un'unica
+# chiamata execute_script restituisce tutti i record come array JSON.
+# Sostituisce i cicli find_element + get_attribute/.text per card e per campo, dove ogni chiamata
+# è un round trip HTTP verso chromedriver: da O(card × campi) round trip a uno per pagina.
+#
+# Un campo è una coppia (selettore, valore):
+#   - selettore CSS relativo al contenitore, oppure None per il contenitore stesso;
+#   - valore: "text" (testo visibile, come WebElement.text), "html" (outerHTML), oppure il nome di
+#     un attributo, letto come WebElement.get_attribute: prima la proprietà DOM (href e src quindi
+#     già assoluti), poi l'attributo HTML.
+# Un campo non trovato vale None.
+# Con `mark` (nome di un attributo) i contenitori già estratti vengono marcati nel DOM e saltati
+# alle chiamate successive: dopo un "carica altri" si leggono solo le card aggiunte. I contenitori a
+# cui manca uno dei campi `required` non vengono marcati (e non restituiti), così sono ritentati
+# alla chiamata successiva se la card era ancora in caricamento.
+
+EXTRACT_SCRIPT = """
+var containers = document.querySelectorAll(arguments[0]), fields = arguments[1], mark = arguments[2], required = arguments[3] || [];
+function read(node, what) {
+    if (!node) { return null; }
+    if (what === 'text') { return (node.innerText || node.textContent || '').trim(); }
+    if (what === 'html') { return node.outerHTML; }
+    var value = node[what];
+    if (value === undefined || value === null || typeof value === 'object' || typeof value === 'function') {
+        value = node.getAttribute(what);
+    }
+    return value === null ? null : String(value);
+}
+var records = [];
+for (var i = 0; i < containers.length; i++) {
+    if (mark && containers[i].hasAttribute(mark)) { continue; }
+    var record = {};
+    for (var j = 0; j < fields.length; j++) {
+        var selector = fields[j][1];
+        record[fields[j][0]] = read(selector ? containers[i].querySelector(selector) : containers[i], fields[j][2]);
+    }
+    if (mark) {
+        if (required.some(function (name) { return !record[name]; })) { continue; }
+        containers[i].setAttribute(mark, '');
+    }
+    records.push(record);
+}
+return JSON.stringify(records);
+"""
+
+
+def extract_records(driver, container_selector, fields, mark=None, required=()):
+    """
+    Record di tutti i contenitori `container_selector` della pagina corrente, in un solo round trip.
+    `fields` associa a ogni nome di campo la coppia (selettore, valore) descritta sopra.
+    Con `mark` restituisce solo i contenitori non ancora estratti (vedi sopra).
+    """
+    spec = [[name, selector, what] for name, (selector, what) in fields.items()]
+    return json.loads(driver.execute_script(EXTRACT_SCRIPT, container_selector, spec, mark, list(required)))
+
+
+def extract_values(driver, selector, what="href"):
+    """Valori (es. href) di tutti gli elementi `selector`, nell'ordine della pagina, esclusi quelli vuoti."""
+    records = extract_records(driver, selector, {"value": (None, what)})
+    return [record["value"] for record in records if record["value"]]
@@ -0,0 +1,157 @@
+import time
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+import archive
+import blocking
+import cassette
+import consent
+import diagnostics
+import limits
+import metrics
+import snapshot
+
+# Percorso di fetch condiviso dagli scraper.
+# Tutte le richieste HTTP (requests) e le letture di page_source (Selenium) passano da qui,
+# così registrazione/riproduzione della cassetta, archivio WARC e gli altri servizi trasversali
+# vengono applicati in un solo punto.
+
+
+def build_response(entry):
+    """Ricostruisce un oggetto requests.Response da una voce della cassetta."""
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response._content = cassette.Cassette.body_bytes(entry)
+    response.headers = requests.structures.CaseInsensitiveDict(entry.get("headers", {}))
+    response.url = entry.get("final_url") or entry["url"]
+    response.reason = "REPLAY"
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def get(url, headers=None, timeout=None, session=None, **kwargs):
+    """
+    Esegue una GET HTTP passando dalla cassetta, se attiva.
+    In riproduzione non viene fatta alcuna richiesta di rete: una URL non registrata
+    solleva requests.exceptions.ConnectionError, gestita dagli scraper come un normale errore di rete.
+    """
+    host = urlsplit(url).netloc
+    tape = cassette.get_cassette()
+    if tape is not None and tape.mode == "replay":
+        entry = tape.lookup("GET", url)
+        if entry is None:
+            metrics.inc("scraper_request_errors_total", host=host)
+            raise requests.exceptions.ConnectionError(f"URL non presente nella cassetta: {url}")
+        metrics.inc("scraper_cache_hits_total", host=host)
+        response = build_response(entry)
+        record_response_metrics(host, response)
+        return response
+
+    client = session if session is not None else requests
+    blocking.before_request(host)
+    limits.wait_for_host(host)
+    with limits.socket_slot():
+        start = time.perf_counter()
+        try:
+            response = client.get(url, headers=headers, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.inc("scraper_request_errors_total", host=host)
+            raise
+    metrics.observe("scraper_request_seconds", time.perf_counter() - start, host=host)
+    record_response_metrics(host, response)
+    blocking.check_response(host, response)
+    archive.archive_response(url, response)
+    if tape is not None:
+        tape.record("GET", url, response.status_code, response.headers, response.content, response.url)
+    return response
+
+
+def record_response_metrics(host, response):
+    metrics.inc("scraper_responses_total", host=host, status=response.status_code)
+    if response._content is False:
+        return  # Risposta in streaming: il corpo non è ancora stato letto
+    metrics.inc("scraper_response_bytes_total", len(response.content), host=host)
+    diagnostics.remember_page(response.url, response.content)
+
+
+def parse_html(content):
+    """Parsa l'HTML con BeautifulSoup registrando il tempo di parsing."""
+    with metrics.timer("scraper_parse_seconds", site=metrics.SITE):
+        return BeautifulSoup(content, 'html.parser')
+
+
+def get_page_source(driver):
+    """
+    HTML corrente del driver Selenium, registrato in cassetta e archivio WARC se attivi.
+    Finché la pagina non cambia (navigazione o modifica del DOM) si riusa lo snapshot già letto
+    (vedi snapshot.py) senza ritrasferire l'HTML.
+    """
+    page = snapshot.snapshot_for(driver)
+    with metrics.timer("scraper_page_source_seconds", site=metrics.SITE):
+        fresh = page.refresh(driver)
+    metrics.inc("scraper_page_snapshots_total", site=metrics.SITE, cached=str(not fresh).lower())
+    if not fresh:
+        return page.html
+    page_source = page.html
+    current_url = driver.current_url
+    metrics.inc("scraper_response_bytes_total", len(page_source), host="selenium")
+    diagnostics.remember_page(current_url, page_source)
+    tape = cassette.get_cassette()
+    if tape is not None and tape.mode == "record":
+        tape.record("GET", current_url, 200, {"Content-Type": "text/html; charset=utf-8"}, page_source)
+    archive.archive_page(current_url, page_source)
+    return page_source
+
+
+def get_page_soup(driver):
+    """
+    Albero BeautifulSoup della pagina corrente del driver, parsato una sola volta per snapshot e
+    condiviso tra tutti gli estrattori della stessa pagina: va trattato in sola lettura.
+    """
+    page = snapshot.snapshot_for(driver)
+    html = get_page_source(driver)
+    if page.soup is None:
+        page.soup = parse_html(html)
+    return page.soup
+
+
+def get_soup_from_selenium(driver):
+    """Albero BeautifulSoup della pagina corrente del driver Selenium (condiviso, vedi get_page_soup); None in caso di errore."""
+    try:
+        return get_page_soup(driver)
+    except Exception as e:
+        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
+        return None
+
+
+def prepare_driver(driver):
+    """
+    Prepara un driver Selenium appena creato per il percorso di fetch condiviso.
+    In riproduzione le navigazioni (driver.get) vengono reindirizzate al server locale
+    che serve le pagine della cassetta; altrimenti rispettano la frequenza massima per host (sotto
+    il runner) e passano dal rilevatore di blocchi, che mette in pausa gli host bloccati; prima della
+    navigazione vengono impostati i cookie di consenso salvati per l'host (vedi consent.py).
+    """
+    server = cassette.get_replay_server()
+    if server is None and not limits.enabled() and not blocking.BLOCK_DETECTION and consent.CONSENT_STORE == "0":
+        return driver
+    original_get = driver.get
+
+    def prepared_get(url):
+        if server is None:
+            host = urlsplit(url).netloc
+            blocking.before_request(host)
+            limits.wait_for_host(host)
+            consent.preseed(driver, url)
+            result = original_get(url)
+            if blocking.BLOCK_DETECTION:
+                blocking.check_page(driver, host)
+            return result
+        if url.startswith(server.base_url):
+            return original_get(url)
+        return original_get(server.replay_url(url))
+
+    driver.get = prepared_get
+    return driver
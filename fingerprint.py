@@ -0,0 +1,211 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Ricrawl incrementale.
+# Per ogni pagina (identificata dalla URL canonica) si conserva l'impronta della sola regione HTML
+# rilevante (card prodotto, scheda di dettaglio, ...) insieme ai record estratti l'ultima volta.
+# Se l'impronta non cambia l'estrazione viene saltata e si riusano i record salvati.
+# A fine esecuzione, accanto allo snapshot completo, viene scritto un file delta con
+# i prodotti aggiunti, modificati e rimossi rispetto all'esecuzione precedente.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_FINGERPRINT_DIR  cartella delle impronte (default: fingerprints)
+#   SCRAPER_FULL_RECRAWL     se "1" ignora le impronte e riestrae tutte le pagine
+
+FINGERPRINT_DIR = os.environ.get("SCRAPER_FINGERPRINT_DIR", "fingerprints")
+FULL_RECRAWL = os.environ.get("SCRAPER_FULL_RECRAWL") == "1"
+
+# Parametri di tracciamento che non identificano la pagina
+TRACKING_PARAMS = ("utm_", "gclid", "fbclid", "srsltid", "mc_cid", "mc_eid")
+
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_SCRIPT_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.S | re.I)
+_WHITESPACE_RE = re.compile(r"\s+")
+_BETWEEN_TAGS_RE = re.compile(r">\s+<")
+
+
+def canonical_url(url):
+    """URL canonica: schema e host in minuscolo, niente frammento, query ordinata e senza tracciamento."""
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMS)]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ""))
+
+
+def normalize_html(html):
+    """Rimuove commenti, script e spazi superflui, così che differenze cosmetiche non cambino l'impronta."""
+    html = _COMMENT_RE.sub("", html)
+    html = _SCRIPT_RE.sub("", html)
+    html = _BETWEEN_TAGS_RE.sub("><", html)
+    return _WHITESPACE_RE.sub(" ", html).strip()
+
+
+def fingerprint(*regions):
+    """
+    Impronta (sha1) delle regioni HTML rilevanti di una pagina.
+    Ogni regione può essere una stringa HTML, un elemento BeautifulSoup o una lista di elementi.
+    """
+    digest = hashlib.sha1()
+    for region in regions:
+        if region is None:
+            continue
+        if isinstance(region, (list, tuple)):
+            region = "".join(str(element) for element in region)
+        digest.update(normalize_html(str(region)).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _record_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Archivio delle impronte di uno scraper, salvato in FINGERPRINT_DIR/<nome>.json.
+    Contiene, per URL canonica, l'impronta della regione rilevante e i record estratti,
+    e, per ogni file di uscita, lo snapshot dei prodotti dell'ultima esecuzione (per il calcolo del
+    delta): uno scraper che scrive file diversi a seconda del marchio o della categoria confronta
+    ogni file solo con la propria esecuzione precedente.
+    """
+
+    def __init__(self, name, directory=FINGERPRINT_DIR):
+        self.path = os.path.join(directory, f"{name}.json")
+        self.pages = {}
+        self.snapshots = {}
+        self.visited = set()
+        self.reused = 0
+        self.extracted = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.pages = data.get("pages", {})
+            self.snapshots = data.get("snapshots", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Archivio impronte {self.path} non leggibile ({e}): ricrawl completo.")
+
+    def unchanged(self, url, page_fingerprint):
+        """
+        Restituisce i record salvati per `url` se l'impronta non è cambiata dall'ultima esecuzione,
+        altrimenti None (la pagina va estratta e poi registrata con update()).
+        """
+        key = canonical_url(url)
+        self.visited.add(key)
+        entry = self.pages.get(key)
+        if FULL_RECRAWL or entry is None or entry.get("fingerprint") != page_fingerprint:
+            return None
+        entry["last_seen"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.reused += 1
+        return [dict(record) for record in entry["records"]]
+
+    def unchanged_since(self, url, lastmod):
+        """
+        Come unchanged(), ma confrontando il lastmod della sitemap invece dell'impronta:
+        permette di saltare la pagina senza scaricarla. None se lastmod è assente o diverso.
+        """
+        key = canonical_url(url)
+        entry = self.pages.get(key)
+        if FULL_RECRAWL or lastmod is None or entry is None or entry.get("lastmod") != lastmod.isoformat():
+            return None
+        self.visited.add(key)
+        entry["last_seen"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.reused += 1
+        return [dict(record) for record in entry["records"]]
+
+    def update(self, url, page_fingerprint, records, lastmod=None):
+        """Registra l'impronta e i record appena estratti per `url` (con il lastmod della sitemap, se noto)."""
+        key = canonical_url(url)
+        self.visited.add(key)
+        self.extracted += 1
+        self.pages[key] = {
+            "fingerprint": page_fingerprint,
+            "records": [dict(record) for record in records],
+            "last_seen": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if lastmod is not None:
+            self.pages[key]["lastmod"] = lastmod.isoformat()
+
+    def page_entry(self, url):
+        """Voce registrata per `url` (impronta e record), da trasferire a un altro processo con merge_page()."""
+        return self.pages.get(canonical_url(url))
+
+    def merge_page(self, url, entry):
+        """Registra una voce prodotta da un altro processo (es. un worker della coda di lavori)."""
+        key = canonical_url(url)
+        self.visited.add(key)
+        if entry is not None:
+            self.pages[key] = entry
+
+    def complete(self, urls):
+        """True se tutte le `urls` sono state visitate in questa esecuzione."""
+        return all(canonical_url(url) in self.visited for url in urls)
+
+    def write_delta(self, records, snapshot_path, key_field, complete=True):
+        """
+        Confronta `records` con lo snapshot dell'esecuzione precedente che ha scritto lo stesso file
+        `snapshot_path` e scrive <snapshot>_delta.csv
+        con una colonna change_type (added/changed/removed).
+        I prodotti rimossi vengono riportati solo se l'esecuzione è completa: una pagina non raggiunta
+        non deve far sembrare spariti i suoi prodotti. Restituisce il percorso del file delta.
+        """
+        snapshot_key = os.path.basename(snapshot_path)
+        products = self.snapshots.get(snapshot_key, {})
+        current = {}
+        for record in records:
+            key = record.get(key_field)
+            if key and key != "N/A":
+                current[canonical_url(key) if "://" in key else key] = record
+
+        rows = []
+        for key, record in current.items():
+            previous = products.get(key)
+            if previous is None:
+                rows.append(("added", record))
+            elif previous["hash"] != _record_hash(record):
+                rows.append(("changed", record))
+        if complete:
+            rows.extend(("removed", previous["record"]) for key, previous in products.items() if key not in current)
+
+        snapshot = {key: {"hash": _record_hash(record), "record": record} for key, record in current.items()}
+        if not complete:
+            # Mantieni nello snapshot i prodotti delle pagine non raggiunte
+            snapshot = {**products, **snapshot}
+        self.snapshots[snapshot_key] = snapshot
+
+        delta_path = f"{os.path.splitext(snapshot_path)[0]}_delta.csv"
+        fieldnames = ["change_type"]
+        for _, record in rows:
+            fieldnames.extend(field for field in record if field not in fieldnames)
+        if len(fieldnames) == 1:
+            fieldnames.extend(records[0].keys() if records else [key_field])
+        try:
+            with open(delta_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                writer.writeheader()
+                for change_type, record in rows:
+                    writer.writerow({"change_type": change_type, **record})
+        except OSError as e:
+            print(f"Errore durante il salvataggio del delta {delta_path}: {e}")
+            return None
+
+        counts = {change: sum(1 for row in rows if row[0] == change) for change in ("added", "changed", "removed")}
+        print(f"Delta salvato in {delta_path}: {counts['added']} aggiunti, {counts['changed']} modificati, "
+              f"{counts['removed']} rimossi" + ("" if complete else " (esecuzione incompleta: rimossi non calcolati)"))
+        return delta_path
+
+    def save(self):
+        """Salva l'archivio su disco (scrittura atomica)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "snapshots": self.snapshots}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        print(f"Impronte salvate in {self.path}: {self.reused} pagine invariate riutilizzate, {self.extracted} estratte.")
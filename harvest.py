@@ -0,0 +1,143 @@
+import json
+
+# Raccolta incrementale dei link nelle pagine a scorrimento infinito (o con pulsante "carica altri").
+# Uno script iniettato nella pagina osserva il DOM con un MutationObserver e tiene traccia dei
+# contenitori già visti: a ogni giro restituisce, in un unico JSON, solo i valori (es. href) dei
+# contenitori aggiunti dall'ultimo giro. Il costo è un round trip WebDriver per giro invece di uno
+# per elemento, e non cresce con il numero di prodotti già caricati.
+# Dopo lo scroll lo script attende nel browser l'arrivo di nuovi contenitori (fino a `wait` secondi)
+# e risponde appena il DOM si stabilizza, invece di una pausa fissa.
+
+DEFAULT_WAIT = 2.0     # Secondi massimi di attesa di nuovi contenitori dopo uno scroll
+SETTLE_TIME = 0.3      # Secondi senza nuovi contenitori dopo i quali il lotto si considera completo
+IDLE_ROUNDS = 3        # Giri consecutivi senza nuovi contenitori dopo i quali lo scroll si ferma
+MAX_ROUNDS = 100
+
+INSTALL_SCRIPT = """
+var containerSelector = arguments[0], valueSelector = arguments[1], attribute = arguments[2];
+if (window.__scraperHarvest) { window.__scraperHarvest.observer.disconnect(); }
+var state = {seen: new WeakSet(), values: new Set(), pending: [], unresolved: [], count: 0, changed: 0};
+state.resolve = function (node) {
+    var target = valueSelector ? node.querySelector(valueSelector) : node;
+    if (!target) { return false; }
+    var value = attribute === 'href' ? target.href : (attribute === 'text' ? target.textContent.trim() : target.getAttribute(attribute));
+    if (!value) { return false; }
+    if (!state.values.has(value)) { state.values.add(value); state.pending.push(value); state.changed = Date.now(); }
+    return true;
+};
+state.collect = function (node) {
+    if (state.seen.has(node)) { return; }
+    state.seen.add(node);
+    state.count++;
+    // Contenitori ancora senza link (idratazione in corso) vengono ritentati al giro successivo
+    if (!state.resolve(node)) { state.unresolved.push(node); }
+};
+state.scan = function (root) {
+    if (root.nodeType !== 1) { return; }
+    if (root.matches(containerSelector)) { state.collect(root); }
+    root.querySelectorAll(containerSelector).forEach(state.collect);
+};
+state.scan(document.documentElement);
+state.observer = new MutationObserver(function (mutations) {
+    mutations.forEach(function (mutation) { mutation.addedNodes.forEach(state.scan); });
+});
+state.observer.observe(document.documentElement, {childList: true, subtree: true});
+window.__scraperHarvest = state;
+return state.count;
+"""
+
+HARVEST_SCRIPT = """
+var scroll = arguments[0], waitMs = arguments[1], settleMs = arguments[2], done = arguments[arguments.length - 1];
+var state = window.__scraperHarvest;
+if (!state) { done(null); return; }
+function drain() {
+    state.unresolved = state.unresolved.filter(function (node) { return !state.resolve(node); });
+    var fresh = state.pending;
+    state.pending = [];
+    done(JSON.stringify({fresh: fresh, total: state.count}));
+}
+if (scroll) { window.scrollTo(0, document.body.scrollHeight); }
+var start = Date.now();
+(function poll() {
+    var now = Date.now();
+    if ((state.pending.length && now - state.changed >= settleMs) || now - start >= waitMs) { drain(); return; }
+    setTimeout(poll, 50);
+})();
+"""
+
+
+class ScrollHarvester:
+    """
+    Raccoglitore incrementale dei contenitori `container_selector` della pagina corrente.
+    Per ogni contenitore si legge `attribute` ("href", "text" o un attributo qualsiasi) dal primo
+    elemento `value_selector` al suo interno (o dal contenitore stesso se value_selector è None).
+    """
+
+    def __init__(self, driver, container_selector, value_selector=None, attribute="href"):
+        self.driver = driver
+        self.container_selector = container_selector
+        self.value_selector = value_selector
+        self.attribute = attribute
+        self.total = 0
+        self.rounds = 0
+
+    def install(self):
+        """Inietta lo script nella pagina corrente (da ripetere dopo ogni navigazione)."""
+        self.total = self.driver.execute_script(INSTALL_SCRIPT, self.container_selector, self.value_selector, self.attribute)
+        return self.total
+
+    def harvest(self, scroll=True, wait=DEFAULT_WAIT):
+        """
+        Valori dei contenitori comparsi dall'ultimo giro, in un solo round trip.
+        Con scroll=True scorre prima fino in fondo alla pagina e attende fino a `wait` secondi nuovi contenitori.
+        """
+        self.rounds += 1
+        arguments = (scroll, int(wait * 1000), int(SETTLE_TIME * 1000))
+        payload = self.driver.execute_async_script(HARVEST_SCRIPT, *arguments)
+        if payload is None:
+            # La pagina è stata ricaricata: lo stato iniettato è andato perso
+            self.install()
+            payload = self.driver.execute_async_script(HARVEST_SCRIPT, *arguments)
+        data = json.loads(payload)
+        self.total = data["total"]
+        return data["fresh"]
+
+
+def harvest_infinite_scroll(driver, container_selector, value_selector=None, attribute="href", limit=None,
+                            wait=DEFAULT_WAIT, idle_rounds=IDLE_ROUNDS, max_rounds=MAX_ROUNDS, on_values=None):
+    """
+    Scorre una pagina a scorrimento infinito raccogliendo i valori dei contenitori man mano che compaiono.
+    Si ferma al raggiungimento di `limit` valori, dopo `idle_rounds` giri senza crescita o dopo `max_rounds` giri.
+    Con `on_values` i valori nuovi di ogni giro (entro `limit`) vengono passati subito alla callback,
+    ad esempio per avviare le pagine di dettaglio mentre lo scroll continua.
+    """
+    driver.set_script_timeout(wait + 30)
+    harvester = ScrollHarvester(driver, container_selector, value_selector, attribute)
+    harvester.install()
+    values = []
+
+    def collect(fresh):
+        if on_values is not None:
+            accepted = fresh if limit is None else fresh[:max(0, limit - len(values))]
+            if accepted:
+                on_values(accepted)
+        values.extend(fresh)
+
+    collect(harvester.harvest(scroll=False, wait=0))
+    print(f"  Contenitori iniziali: {harvester.total}, valori raccolti: {len(values)}")
+    idle = 0
+    while (limit is None or len(values) < limit) and harvester.rounds <= max_rounds:
+        fresh = harvester.harvest(wait=wait)
+        collect(fresh)
+        print(f"  Dopo scroll {harvester.rounds - 1}: {len(fresh)} nuovi, {len(values)} raccolti ({harvester.total} contenitori)")
+        if fresh:
+            idle = 0
+            continue
+        idle += 1
+        if idle >= idle_rounds:
+            print(f"  Nessun nuovo contenitore per {idle} giri consecutivi: fine dello scroll.")
+            break
+    if limit is not None and len(values) >= limit:
+        print(f"  Limite di {limit} valori raggiunto.")
+        values = values[:limit]
+    return values
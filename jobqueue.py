@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+import traceback
+
+import blocking
+import metrics
+
+# Coda di lavori persistente su SQLite, per distribuire il crawl di un sito su più processi worker
+# (anche su macchine diverse che condividono il file) senza servizi esterni.
+# Ogni lavoro (es. una pagina di elenco o di dettaglio) ha un tipo, un payload JSON e una chiave
+# univoca nella coda: inserire due volte lo stesso lavoro non lo duplica.
+#   - lease: un worker prende in carico il primo lavoro disponibile per VISIBILITY_TIMEOUT secondi;
+#     se il worker termina in modo anomalo il lease scade e il lavoro torna disponibile agli altri
+#     (ogni lease conta come tentativo: dopo MAX_ATTEMPTS lease scaduti il lavoro fallisce);
+#   - ack: il lavoro è completato e il suo risultato (JSON) resta nella coda fino alla raccolta;
+#   - nack: il lavoro è fallito e viene ritentato con attesa crescente, fino a MAX_ATTEMPTS tentativi;
+#   - defer: il lavoro torna in coda dopo un'attesa senza consumare un tentativo (host in pausa, vedi blocking).
+# Quando non restano lavori aperti, uno solo dei worker raccoglie i risultati (collect) e svuota la
+# coda per il giro successivo.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_QUEUE               percorso del database della coda (default: disattivata)
+#   SCRAPER_VISIBILITY_TIMEOUT  secondi di validità di un lease (default: 300)
+#   SCRAPER_MAX_ATTEMPTS        tentativi massimi per lavoro (default: 3)
+#
+# Uso da riga di comando:
+#   python jobqueue.py stats                      # lavori per coda e stato
+#   python jobqueue.py failed scraper_hilti       # lavori falliti con l'ultimo errore
+#   python jobqueue.py retry scraper_hilti        # rimette in coda i lavori falliti
+#   python jobqueue.py purge scraper_hilti        # svuota la coda
+
+QUEUE_ENV = "SCRAPER_QUEUE"
+VISIBILITY_TIMEOUT = float(os.environ.get("SCRAPER_VISIBILITY_TIMEOUT", "300"))
+MAX_ATTEMPTS = int(os.environ.get("SCRAPER_MAX_ATTEMPTS", "3"))
+
+RETRY_DELAY = 10.0        # Attesa prima del primo nuovo tentativo, raddoppiata a ogni fallimento
+MAX_RETRY_DELAY = 600.0
+POLL_INTERVAL = 2.0       # Secondi tra due controlli quando i lavori restanti sono in carico ad altri worker
+BUSY_TIMEOUT = 60.0
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY,
+    queue         TEXT NOT NULL,
+    job_key       TEXT NOT NULL,
+    kind          TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'pending',
+    priority      INTEGER NOT NULL DEFAULT 0,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    available_at  REAL NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL,
+    UNIQUE (queue, job_key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_available ON jobs (queue, state, available_at, priority);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (queue, state, lease_expires);
+"""
+
+
+def queue_path():
+    """Percorso della coda configurata, o None se la distribuzione su più worker non è attiva."""
+    return os.environ.get(QUEUE_ENV) or None
+
+
+def enabled():
+    return queue_path() is not None
+
+
+def worker_id():
+    """Identificativo del worker: host e PID (i lease di macchine diverse restano distinguibili)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Job:
+    """Lavoro preso in carico da un worker."""
+
+    def __init__(self, job_id, kind, payload, attempts, key):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.key = key
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.kind}, {self.key}, tentativo {self.attempts})"
+
+
+class JobQueue:
+    """Coda `name` nel database SQLite `path`, condivisibile tra processi."""
+
+    def __init__(self, name, path=None, visibility_timeout=VISIBILITY_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.name = name
+        self.path = path or queue_path()
+        if not self.path:
+            raise ValueError(f"Nessuna coda configurata: imposta {QUEUE_ENV}")
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.worker = worker_id()
+        # isolation_level=None: le transazioni sono gestite esplicitamente con BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    def put(self, kind, payload, key=None, priority=0):
+        """Aggiunge un lavoro; restituisce False se la coda contiene già un lavoro con la stessa chiave."""
+        return self.put_many(kind, [payload], [key], priority) == 1
+
+    def put_many(self, kind, payloads, keys=None, priority=0):
+        """Aggiunge più lavori in una transazione; restituisce quanti erano nuovi."""
+        now = time.time()
+        keys = keys or [None] * len(payloads)
+        added = 0
+        with self._transaction():
+            for payload, key in zip(payloads, keys):
+                encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO jobs (queue, job_key, kind, payload, priority, max_attempts, "
+                    "available_at, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.name, key or f"{kind}:{encoded}", kind, encoded, priority, self.max_attempts, now, now, now),
+                )
+                added += cursor.rowcount
+        return added
+
+    def lease(self):
+        """
+        Prende in carico il prossimo lavoro disponibile (o con lease scaduto); None se non ce ne sono.
+        Il lavoro resta invisibile agli altri worker per visibility_timeout secondi.
+        """
+        now = time.time()
+        with self._transaction():
+            while True:
+                row = self.connection.execute(
+                    "SELECT id, kind, payload, attempts, job_key, state, max_attempts FROM jobs WHERE queue = ? AND ("
+                    "(state = ? AND available_at <= ?) OR (state = ? AND lease_expires <= ?)) "
+                    "ORDER BY priority DESC, available_at, id LIMIT 1",
+                    (self.name, PENDING, now, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, kind, payload, attempts, key, state, max_attempts = row
+                if state != LEASED:
+                    break
+                metrics.inc("scraper_queue_jobs_total", queue=self.name, event="lease_expired")
+                if attempts < max_attempts:
+                    print(f"Lease scaduto per il lavoro {key}: ripreso da {self.worker}.")
+                    break
+                # Il worker è terminato a ogni tentativo (es. crash del browser) senza arrivare a nack
+                error = f"lease scaduto {attempts} volte: il worker è terminato durante il lavoro"
+                self.connection.execute(
+                    "UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? WHERE id = ?",
+                    (FAILED, error, now, job_id),
+                )
+                metrics.inc("scraper_queue_jobs_total", queue=self.name, event="failed")
+                print(f"Lavoro {key} fallito definitivamente dopo {attempts} tentativi: {error}")
+            attempts += 1
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated = ? WHERE id = ?",
+                (LEASED, attempts, self.worker, now + self.visibility_timeout, now, job_id),
+            )
+        metrics.inc("scraper_queue_jobs_total", queue=self.name, event="leased")
+        return Job(job_id, kind, json.loads(payload), attempts, key)
+
+    def extend(self, job, seconds=None):
+        """Prolunga il lease di un lavoro lungo; False se il lease è scaduto ed è passato a un altro worker."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (now + (seconds or self.visibility_timeout), now, job.id, LEASED, self.worker),
+            )
+        return cursor.rowcount == 1
+
+    def ack(self, job, result=None):
+        """Segna il lavoro come completato; False se nel frattempo il lease era passato a un altro worker."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, lease_owner = NULL, lease_expires = NULL, "
+                "updated = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), now, job.id, LEASED, self.worker),
+            )
+        if cursor.rowcount == 1:
+            metrics.inc("scraper_queue_jobs_total", queue=self.name, event="done")
+            return True
+        print(f"Lease del lavoro {job.key} perso prima del completamento: risultato scartato.")
+        return False
+
+    def nack(self, job, error=None):
+        """Segna un tentativo fallito: il lavoro torna in coda con attesa crescente, o fallisce definitivamente."""
+        now = time.time()
+        delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (job.attempts - 1))
+        with self._transaction():
+            row = self.connection.execute(
+                "SELECT max_attempts FROM jobs WHERE id = ? AND state = ? AND lease_owner = ?",
+                (job.id, LEASED, self.worker),
+            ).fetchone()
+            if row is None:
+                return
+            state = FAILED if job.attempts >= row[0] else PENDING
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated = ? WHERE id = ?",
+                (state, error, now + delay, now, job.id),
+            )
+        metrics.inc("scraper_queue_jobs_total", queue=self.name, event="failed" if state == FAILED else "retried")
+        if state == FAILED:
+            print(f"Lavoro {job.key} fallito definitivamente dopo {job.attempts} tentativi: {error}")
+        else:
+            print(f"Lavoro {job.key} fallito (tentativo {job.attempts}), nuovo tentativo tra {delay:.0f} s: {error}")
+
+    def defer(self, job, delay, reason=None):
+        """Rimette in coda il lavoro tra `delay` secondi senza consumare un tentativo (es. host in pausa)."""
+        now = time.time()
+        with self._transaction():
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts - 1, error = ?, available_at = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (PENDING, reason, now + delay, now, job.id, LEASED, self.worker),
+            )
+        metrics.inc("scraper_queue_jobs_total", queue=self.name, event="deferred")
+        print(f"Lavoro {job.key} rimandato di {delay:.0f} s: {reason}")
+
+    def counts(self):
+        """Numero di lavori per stato."""
+        rows = self.connection.execute(
+            "SELECT state, COUNT(*) FROM jobs WHERE queue = ? GROUP BY state", (self.name,)
+        ).fetchall()
+        return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def open_jobs(self):
+        counts = self.counts()
+        return counts[PENDING] + counts[LEASED]
+
+    def work(self, handlers, max_jobs=None):
+        """
+        Esegue lavori finché la coda non è esaurita: `handlers` associa a ogni tipo di lavoro una
+        funzione handler(payload, queue) che restituisce il risultato (serializzabile in JSON) e può
+        aggiungere nuovi lavori alla coda. Un'eccezione dell'handler equivale a un nack.
+        Quando i lavori restanti sono in carico ad altri worker, attende il loro completamento
+        o la scadenza del lease. Restituisce il numero di lavori completati da questo worker.
+        """
+        completed = 0
+        while max_jobs is None or completed < max_jobs:
+            job = self.lease()
+            if job is None:
+                if not self.open_jobs():
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+            handler = handlers.get(job.kind)
+            if handler is None:
+                self.nack(job, f"Nessun handler per il tipo di lavoro '{job.kind}'")
+                continue
+            try:
+                result = handler(job.payload, self)
+            except blocking.HostBlocked as e:
+                # Host in pausa: il lavoro aspetta la fine della pausa, gli altri host proseguono
+                self.defer(job, e.retry_after, str(e))
+                continue
+            except Exception as e:
+                traceback.print_exc()
+                self.nack(job, f"{type(e).__name__}: {e}")
+                continue
+            if self.ack(job, result):
+                completed += 1
+        return completed
+
+    def collect(self):
+        """
+        Raccoglie i risultati dei lavori completati e svuota la coda, se non restano lavori aperti.
+        Un solo worker ottiene i risultati: per gli altri (o se ci sono ancora lavori aperti) restituisce None.
+        I risultati sono coppie (lavoro, risultato) nell'ordine di inserimento.
+        """
+        with self._transaction():
+            if self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state IN (?, ?)", (self.name, PENDING, LEASED)
+            ).fetchone()[0]:
+                return None
+            rows = self.connection.execute(
+                "SELECT id, kind, payload, attempts, job_key, state, result, error FROM jobs WHERE queue = ? ORDER BY id",
+                (self.name,),
+            ).fetchall()
+            if not rows:
+                return None
+            self.connection.execute("DELETE FROM jobs WHERE queue = ?", (self.name,))
+        results = []
+        for job_id, kind, payload, attempts, key, state, result, error in rows:
+            if state == DONE:
+                results.append((Job(job_id, kind, json.loads(payload), attempts, key), json.loads(result)))
+            else:
+                print(f"Lavoro non completato: {key} ({error})")
+        return results
+
+    def retry_failed(self):
+        """Rimette in coda i lavori falliti definitivamente, azzerando i tentativi."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated = ? WHERE queue = ? AND state = ?",
+                (PENDING, now, now, self.name, FAILED),
+            )
+        return cursor.rowcount
+
+    def failed(self):
+        return self.connection.execute(
+            "SELECT job_key, attempts, error FROM jobs WHERE queue = ? AND state = ? ORDER BY id", (self.name, FAILED)
+        ).fetchall()
+
+    def purge(self):
+        with self._transaction():
+            cursor = self.connection.execute("DELETE FROM jobs WHERE queue = ?", (self.name,))
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: il lock di scrittura è preso subito, così due worker non leggono lo stesso lavoro."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc_info):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestione della coda di lavori degli scraper.")
+    parser.add_argument("--db", default=queue_path(), help=f"Database della coda (default: ${QUEUE_ENV})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Lavori per coda e stato")
+    for command, description in (("failed", "Elenca i lavori falliti"), ("retry", "Rimette in coda i lavori falliti"),
+                                 ("purge", "Svuota la coda")):
+        commands.add_parser(command, help=description).add_argument("queue")
+    args = parser.parse_args()
+    if not args.db:
+        print(f"Specifica il database della coda con --db o {QUEUE_ENV}.")
+        return 1
+
+    if args.command == "stats":
+        connection = sqlite3.connect(args.db, timeout=BUSY_TIMEOUT)
+        connection.executescript(SCHEMA)
+        for queue, state, count in connection.execute(
+            "SELECT queue, state, COUNT(*) FROM jobs GROUP BY queue, state ORDER BY queue, state"
+        ):
+            print(f"{queue:<30} {state:<8} {count:>7}")
+        connection.close()
+        return 0
+
+    with JobQueue(args.queue, args.db) as queue:
+        if args.command == "failed":
+            for key, attempts, error in queue.failed():
+                print(f"{key}  ({attempts} tentativi): {error}")
+        elif args.command == "retry":
+            print(f"{queue.retry_failed()} lavori rimessi in coda.")
+        else:
+            print(f"{queue.purge()} lavori eliminati.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
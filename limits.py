@@ -0,0 +1,98 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: i limiti condivisi tra processi non sono disponibili
+    fcntl = None
+
+# Limiti globali condivisi tra tutti i processi scraper avviati dal runner.
+# Il coordinamento avviene tramite file di lock in una cartella comune:
+#   - frequenza massima di richieste per host (prenotazione del prossimo turno libero);
+#   - numero massimo di richieste HTTP contemporanee (slot a lock esclusivo);
+#   - quota equa per sito: ogni processo può occupare al massimo SCRAPER_SITE_SOCKETS slot.
+# Senza SCRAPER_LIMITS_DIR (esecuzione manuale di un singolo scraper) i limiti sono disattivati.
+#
+# Configurazione tramite variabili d'ambiente (impostate dal runner):
+#   SCRAPER_LIMITS_DIR    cartella condivisa dei lock
+#   SCRAPER_HOST_RATE     richieste al secondo massime per host, tra tutti i processi (default: 2)
+#   SCRAPER_MAX_SOCKETS   richieste HTTP contemporanee massime tra tutti i processi (default: 16)
+#   SCRAPER_SITE_SOCKETS  richieste contemporanee massime per singolo processo (default: SCRAPER_MAX_SOCKETS)
+
+LIMITS_DIR = os.environ.get("SCRAPER_LIMITS_DIR")
+HOST_RATE = float(os.environ.get("SCRAPER_HOST_RATE", "2"))
+MAX_SOCKETS = int(os.environ.get("SCRAPER_MAX_SOCKETS", "16"))
+SITE_SOCKETS = int(os.environ.get("SCRAPER_SITE_SOCKETS", str(MAX_SOCKETS)))
+
+SLOT_POLL_INTERVAL = 0.05  # Secondi tra due tentativi di ottenere uno slot libero
+
+_site_slots = threading.BoundedSemaphore(max(1, SITE_SOCKETS))
+
+
+def enabled():
+    """True se i limiti condivisi sono attivi (processo avviato dal runner)."""
+    return bool(LIMITS_DIR) and fcntl is not None
+
+
+def _lock_path(name):
+    return os.path.join(LIMITS_DIR, re.sub(r"[^A-Za-z0-9._-]+", "_", name))
+
+
+def wait_for_host(host):
+    """
+    Attende il proprio turno per `host` rispettando SCRAPER_HOST_RATE tra tutti i processi.
+    Il lock è tenuto solo per prenotare il turno, non durante l'attesa.
+    """
+    if not enabled() or HOST_RATE <= 0 or not host:
+        return
+    interval = 1.0 / HOST_RATE
+    with open(_lock_path(f"host_{host}"), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            text = f.read().strip()
+            now = time.time()
+            turn = max(now, (float(text) + interval) if text else now)
+            f.seek(0)
+            f.truncate()
+            f.write(repr(turn))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    delay = turn - now
+    if delay > 0:
+        metrics.observe("scraper_limit_wait_seconds", delay, host=host, limit="host_rate")
+        time.sleep(delay)
+
+
+@contextmanager
+def socket_slot():
+    """Occupa uno dei SCRAPER_MAX_SOCKETS slot globali (e della quota del sito) per la durata del blocco."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    with _site_slots:
+        while True:
+            for index in range(max(1, MAX_SOCKETS)):
+                f = open(_lock_path(f"socket_{index}"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                waited = time.perf_counter() - start
+                if waited > SLOT_POLL_INTERVAL:
+                    metrics.observe("scraper_limit_wait_seconds", waited, limit="sockets")
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            time.sleep(SLOT_POLL_INTERVAL)
@@ -0,0 +1,129 @@
+import json
+
+import extraction
+import metrics
+
+# Motore per gli elenchi con pulsante "carica altri".
+# Prima, dopo ogni click si rileggeva l'intero page_source, si rianalizzava tutto il documento (che
+# cresce a ogni click) e ogni prodotto veniva confrontato con la lista di quelli già raccolti: costo
+# quadratico nel numero di click.
+# Qui ogni card estratta viene marcata nel DOM con MARK_ATTRIBUTE, quindi a ogni giro si leggono solo
+# le card aggiunte dall'ultimo click (extraction.extract_records con `mark`), e i duplicati si
+# scartano con un indice di chiavi (set) invece del confronto con tutta la lista.
+# Il click e l'attesa delle nuove card avvengono nel browser in un unico script asincrono, che
+# risponde appena il numero di card smette di crescere invece di dopo una pausa fissa.
+
+MARK_ATTRIBUTE = "data-scraper-seen"
+DEFAULT_WAIT = 15.0    # Secondi massimi di attesa del pulsante e poi delle nuove card dopo il click
+SETTLE_TIME = 0.5      # Secondi senza nuove card dopo i quali il caricamento si considera completo
+IDLE_CLICKS = 3        # Click consecutivi senza nuovi elementi dopo i quali ci si ferma
+MAX_CLICKS = 200       # Limite di sicurezza
+
+CLICK_SCRIPT = """
+var buttonSelector = arguments[0], containerSelector = arguments[1], waitMs = arguments[2], settleMs = arguments[3];
+var done = arguments[arguments.length - 1];
+function count() { return document.querySelectorAll(containerSelector).length; }
+function visible(node) {
+    return !node.disabled && !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+}
+var start = Date.now(), before = count(), clicked = false, total = before, changed = 0;
+(function poll() {
+    var now = Date.now();
+    if (!clicked) {
+        var button = document.querySelector(buttonSelector);
+        if (button && visible(button)) {
+            button.scrollIntoView({block: 'center'});
+            before = total = count();
+            button.click();
+            clicked = true;
+            start = now;
+        } else if (now - start >= waitMs) {
+            done(JSON.stringify({clicked: false, grown: false, total: count()}));
+            return;
+        }
+    } else {
+        var current = count();
+        if (current !== total) { total = current; changed = now; }
+        if ((total > before && now - changed >= settleMs) || now - start >= waitMs) {
+            done(JSON.stringify({clicked: true, grown: total > before, total: total}));
+            return;
+        }
+    }
+    setTimeout(poll, 50);
+})();
+"""
+
+
+def record_key(record):
+    """Chiave di deduplicazione predefinita: tutti i valori del record, nell'ordine dei campi."""
+    return tuple(record.values())
+
+
+class LoadMoreHarvester:
+    """
+    Estrazione incrementale dei contenitori `container_selector` di un elenco "carica altri".
+    `fields` e `required` come in extraction.extract_records; `key(record)` ricava la chiave di
+    deduplicazione (default: tutti i valori).
+    """
+
+    def __init__(self, driver, container_selector, fields, button_selector, key=record_key, required=()):
+        self.driver = driver
+        self.container_selector = container_selector
+        self.fields = fields
+        self.button_selector = button_selector
+        self.key = key
+        self.required = required
+        self.index = set()
+        self.total = 0
+        self.clicks = 0
+
+    def fresh(self):
+        """Record delle card comparse dall'ultima chiamata e non ancora viste, in un solo round trip."""
+        records = extraction.extract_records(self.driver, self.container_selector, self.fields,
+                                             mark=MARK_ATTRIBUTE, required=self.required)
+        new_records = []
+        for record in records:
+            key = self.key(record)
+            if key not in self.index:
+                self.index.add(key)
+                new_records.append(record)
+        return new_records
+
+    def click(self, wait=DEFAULT_WAIT):
+        """
+        Clicca il pulsante "carica altri" (attendendolo fino a `wait` secondi) e attende le nuove card.
+        Restituisce False se il pulsante non c'è più o se il click non ha caricato nulla.
+        """
+        self.driver.set_script_timeout(2 * wait + 30)
+        payload = self.driver.execute_async_script(CLICK_SCRIPT, self.button_selector, self.container_selector,
+                                                   int(wait * 1000), int(SETTLE_TIME * 1000))
+        data = json.loads(payload)
+        self.total = data["total"]
+        if data["clicked"]:
+            self.clicks += 1
+            metrics.inc("scraper_load_more_clicks_total", site=metrics.SITE)
+        return data["grown"]
+
+
+def load_all(driver, container_selector, fields, button_selector, key=record_key, required=(),
+             wait=DEFAULT_WAIT, idle_clicks=IDLE_CLICKS, max_clicks=MAX_CLICKS):
+    """
+    Record di tutte le card dell'elenco, cliccando "carica altri" finché il pulsante scompare, un click
+    non carica nuove card, si susseguono `idle_clicks` click senza elementi nuovi o si arriva a `max_clicks`.
+    """
+    harvester = LoadMoreHarvester(driver, container_selector, fields, button_selector, key, required)
+    records = harvester.fresh()
+    print(f"  Elementi iniziali: {len(records)}")
+    idle = 0
+    while harvester.clicks < max_clicks:
+        if not harvester.click(wait):
+            print("  Pulsante 'carica altri' assente o senza effetto: elenco completo.")
+            break
+        fresh = harvester.fresh()
+        records.extend(fresh)
+        print(f"  Click #{harvester.clicks}: {len(fresh)} nuovi, {len(records)} raccolti ({harvester.total} card)")
+        idle = 0 if fresh else idle + 1
+        if idle >= idle_clicks:
+            print(f"  Nessun elemento nuovo per {idle} click consecutivi: fine.")
+            break
+    return records
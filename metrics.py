@@ -0,0 +1,248 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metriche di esecuzione degli scraper: contatori, gauge e istogrammi con etichette,
+# esportati in formato testo Prometheus e salvati in un riepilogo JSON a fine esecuzione.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_METRICS_PORT     se impostata, espone /metrics su http://127.0.0.1:<porta>
+#   SCRAPER_METRICS_SUMMARY  cartella del riepilogo JSON (default: run_summaries, "0" per disattivarlo)
+
+PORT_ENV = "SCRAPER_METRICS_PORT"
+SUMMARY_ENV = "SCRAPER_METRICS_SUMMARY"
+SUMMARY_DIR = "run_summaries"
+
+# Limiti superiori (in secondi) dei bucket degli istogrammi
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Nome dello scraper in esecuzione, usato come etichetta "site" di default
+SITE = os.path.splitext(os.path.basename(sys.argv[0] or "scraper"))[0] or "scraper"
+
+METRIC_HELP = {
+    "scraper_request_seconds": ("histogram", "Latenza delle richieste HTTP per host"),
+    "scraper_response_bytes_total": ("counter", "Byte ricevuti per host"),
+    "scraper_responses_total": ("counter", "Risposte HTTP per host e codice di stato"),
+    "scraper_request_errors_total": ("counter", "Richieste fallite senza risposta per host"),
+    "scraper_cache_hits_total": ("counter", "Risposte servite dalla cassetta invece che dalla rete"),
+    "scraper_page_source_seconds": ("histogram", "Tempo di lettura di page_source da Selenium"),
+    "scraper_parse_seconds": ("histogram", "Tempo di parsing HTML con BeautifulSoup"),
+    "scraper_load_more_clicks_total": ("counter", "Click su pulsanti 'carica altri'"),
+    "scraper_phase_item_seconds": ("histogram", "Durata di ogni elemento di un ciclo di fase (es. pagine di dettaglio)"),
+    "scraper_queue_depth": ("gauge", "Elementi ancora da elaborare nella fase corrente"),
+    "scraper_records_emitted_total": ("counter", "Record prodotto emessi"),
+    "scraper_selector_misses_total": ("counter", "Selettori che non hanno trovato elementi"),
+    "scraper_limit_wait_seconds": ("histogram", "Attesa imposta dai limiti globali del runner (frequenza per host, socket)"),
+    "scraper_queue_jobs_total": ("counter", "Eventi della coda di lavori (leased, done, retried, failed, deferred, lease_expired)"),
+    "scraper_consent_checks_total": ("counter", "Controlli del banner cookie per esito (absent, accepted, no_button, still_visible, error)"),
+    "scraper_blocks_detected_total": ("counter", "Blocchi rilevati per host e tipo (status, marker, soft, selector)"),
+    "scraper_circuit_breaker_events_total": ("counter", "Eventi dell'interruttore per host (opened, closed, rejected)"),
+    "scraper_pipeline_first_result_seconds": ("gauge", "Secondi tra l'avvio della pipeline dei dettagli e il primo dettaglio completato"),
+    "scraper_selector_chain_hits_total": ("counter", "Valutazioni delle catene di selettori per catena e selettore vincente ('nessuno' se nessuno corrisponde)"),
+    "scraper_page_snapshots_total": ("counter", "Letture della pagina corrente da Selenium, per sito (cached: snapshot riusato senza ritrasferire l'HTML)"),
+    "scraper_cdp_commands_total": ("counter", "Comandi Chrome DevTools Protocol inviati dal driver CDP, per metodo"),
+    "scraper_inpage_fetch_total": ("counter", "Pagine scaricate con fetch() dalla pagina del browser, per esito (ok, error, status_<codice>, cross_origin)"),
+    "scraper_inpage_fetch_batch_seconds": ("histogram", "Durata di un gruppo di fetch() contemporanee nella pagina del browser"),
+    "scraper_browser_pool_leases_total": ("counter", "Sessioni prestate dal pool di browser, per sito (warm: con cookie del sito già presenti)"),
+}
+
+
+class Registry:
+    """Raccolta thread-safe di metriche con etichette."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+                self.histograms[key] = histogram
+            for i, upper in enumerate(histogram["buckets"]):
+                if value <= upper:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def is_empty(self):
+        with self.lock:
+            return not (self.counters or self.gauges or self.histograms)
+
+    def render(self):
+        """Restituisce tutte le metriche nel formato testo di Prometheus."""
+        with self.lock:
+            series = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                lines = series.setdefault(name, [])
+                for upper, count in zip(h["buckets"], h["counts"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(float(upper))),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {h['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+        output = []
+        for name in sorted(series):
+            metric_type, help_text = METRIC_HELP.get(name, ("untyped", ""))
+            if help_text:
+                output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(series[name])
+        return "\n".join(output) + "\n"
+
+    def summary(self):
+        """Riepilogo JSON-serializzabile dell'esecuzione."""
+        with self.lock:
+            def labelled(items):
+                return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(items)]
+
+            histograms = []
+            for (name, labels), h in sorted(self.histograms.items()):
+                histograms.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h["count"],
+                    "sum": round(h["sum"], 6),
+                    "mean": round(h["sum"] / h["count"], 6) if h["count"] else 0.0,
+                })
+            return {
+                "site": SITE,
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": labelled(self.counters.items()),
+                "gauges": labelled(self.gauges.items()),
+                "histograms": histograms,
+            }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + "}"
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    REGISTRY.set_gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Misura la durata del blocco e la registra nell'istogramma indicato."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - start, **labels)
+
+
+def track_loop(items, phase, site=SITE):
+    """
+    Itera su una lista registrando la profondità della coda residua e la durata di ogni elemento.
+    Usato nei cicli di fase (es. pagine di dettaglio) senza cambiarne la struttura.
+    """
+    total = len(items)
+    for index, item in enumerate(items):
+        set_gauge("scraper_queue_depth", total - index, site=site, phase=phase)
+        start = time.perf_counter()
+        yield item
+        observe("scraper_phase_item_seconds", time.perf_counter() - start, site=site, phase=phase)
+    set_gauge("scraper_queue_depth", 0, site=site, phase=phase)
+
+
+def record_emitted(count=1, site=SITE):
+    inc("scraper_records_emitted_total", count, site=site)
+
+
+# --- Endpoint Prometheus ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Avvia in un thread daemon l'endpoint /metrics."""
+    httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"Metriche Prometheus disponibili su http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
+
+
+def write_summary(directory=None):
+    """Scrive il riepilogo dell'esecuzione in JSON e restituisce il percorso del file."""
+    directory = directory or os.environ.get(SUMMARY_ENV) or SUMMARY_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{SITE}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.summary(), f, indent=2, ensure_ascii=False)
+    return path
+
+
+def _write_summary_at_exit():
+    if os.environ.get(SUMMARY_ENV) == "0" or REGISTRY.is_empty():
+        return
+    try:
+        print(f"Riepilogo metriche salvato in {write_summary()}")
+    except OSError as e:
+        print(f"Impossibile salvare il riepilogo delle metriche: {e}")
+
+
+atexit.register(_write_summary_at_exit)
+
+if os.environ.get(PORT_ENV):
+    try:
+        start_http_server(int(os.environ[PORT_ENV]))
+    except (ValueError, OSError) as e:
+        print(f"Impossibile avviare l'endpoint delle metriche sulla porta '{os.environ[PORT_ENV]}': {e}")
@@ -0,0 +1,181 @@
+import json
+import math
+import os
+from urllib.parse import urlsplit
+
+import archive
+import blocking
+import cassette
+import diagnostics
+import fetch
+import limits
+import metrics
+
+# Pagine di dettaglio scaricate con fetch() dall'interno della pagina del browser.
+# Per i siti che richiedono un vero browser (cookie di sessione, protezioni anti-bot) ma servono
+# pagine di dettaglio statiche, aprire ogni dettaglio in una scheda (window.open, attesa del
+# caricamento, rendering completo) costa secondi e memoria per pagina. Qui, dopo una sola
+# navigazione reale sul sito, il browser esegue molte fetch() contemporanee verso le pagine di
+# dettaglio dello stesso dominio (stessi cookie, stessa impronta TLS del browser) e restituisce
+# l'HTML, che viene parsato in Python: un solo browser fa il lavoro di una dozzina di schede.
+# Le pagine che non si possono usare così (dominio diverso, errore o stato non 2xx, pagina di
+# blocco, contenuto generato da JavaScript) tornano allo scraper, che le apre in una scheda come prima.
+# Le pagine scaricate passano da cassetta, archivio WARC, rilevatore di blocchi e limiti per host
+# come le altre richieste; in riproduzione da cassetta la modalità è disattivata.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_INPAGE_FETCH  richieste fetch() contemporanee nella pagina (default: 0 = disattivato,
+#                         i dettagli si aprono in schede come prima)
+
+INPAGE_FETCH = int(os.environ.get("SCRAPER_INPAGE_FETCH", "0"))
+
+REQUEST_TIMEOUT = 30.0   # Secondi massimi per una singola fetch()
+BATCH_FACTOR = 4         # Pagine per chiamata al browser, in multipli della concorrenza
+
+FETCH_SCRIPT = """
+var urls = arguments[0], concurrency = arguments[1], timeoutMs = arguments[2], done = arguments[arguments.length - 1];
+var results = new Array(urls.length), next = 0, active = 0;
+function launch() {
+    if (next >= urls.length) {
+        if (!active) { done(JSON.stringify(results)); }
+        return;
+    }
+    var index = next++, controller = new AbortController();
+    var timer = setTimeout(function () { controller.abort(); }, timeoutMs);
+    active++;
+    fetch(urls[index], {credentials: 'include', redirect: 'follow', signal: controller.signal,
+                        headers: {'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'}})
+        .then(function (response) {
+            return response.text().then(function (body) {
+                results[index] = {status: response.status, url: response.url,
+                                  type: response.headers.get('content-type') || '', body: body};
+            });
+        })
+        .catch(function (error) { results[index] = {status: 0, error: String(error)}; })
+        .then(function () { clearTimeout(timer); active--; launch(); });
+}
+if (!urls.length) { done('[]'); return; }
+for (var i = 0; i < Math.min(concurrency, urls.length); i++) { launch(); }
+"""
+
+
+def enabled():
+    """True se i dettagli vanno scaricati con fetch() in pagina (SCRAPER_INPAGE_FETCH > 0, non in riproduzione)."""
+    return INPAGE_FETCH > 0 and cassette.get_replay_server() is None
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return parts.scheme, parts.netloc
+
+
+class FetchedPage:
+    """Esito della fetch() di una pagina: stato, URL finale, tipo di contenuto, HTML oppure errore."""
+
+    def __init__(self, url, status=0, final_url=None, content_type="", html=None, error=None):
+        self.url = url
+        self.status = status
+        self.final_url = final_url or url
+        self.content_type = content_type
+        self.html = html
+        self.error = error
+
+    @property
+    def ok(self):
+        return (self.error is None and self.html is not None and 200 <= self.status < 300
+                and (not self.content_type or "html" in self.content_type.lower()))
+
+
+def _record(page, host):
+    """Registra la pagina scaricata come le altre richieste: metriche, blocchi, diagnostica, cassetta e archivio."""
+    if page.error is None:
+        reason = blocking.check_content(host, page.url, page.status, page.html)
+        if reason is not None:
+            page.error = f"blocco rilevato ({reason})"
+    outcome = "ok" if page.ok else ("error" if page.error else f"status_{page.status}")
+    metrics.inc("scraper_inpage_fetch_total", site=metrics.SITE, outcome=outcome)
+    if page.html is None:
+        return
+    metrics.inc("scraper_response_bytes_total", len(page.html), host=host)
+    diagnostics.remember_page(page.url, page.html)
+    tape = cassette.get_cassette()
+    if tape is not None and tape.mode == "record":
+        tape.record("GET", page.url, page.status, {"Content-Type": page.content_type or "text/html; charset=utf-8"},
+                    page.html, final_url=page.final_url)
+    if page.ok:
+        archive.archive_page(page.url, page.html)
+
+
+def fetch_pages(driver, urls, concurrency=None, timeout=REQUEST_TIMEOUT):
+    """
+    Scarica `urls` con fetch() dalla pagina corrente del driver, `concurrency` alla volta
+    (default: SCRAPER_INPAGE_FETCH), e restituisce un FetchedPage per URL nello stesso ordine,
+    a gruppi man mano che il browser li completa. Le URL di un dominio diverso da quello della
+    pagina corrente non vengono scaricate (la fetch() non invierebbe i cookie del sito).
+    """
+    concurrency = max(1, concurrency or INPAGE_FETCH or 1)
+    origin = _origin(driver.current_url)
+    batch_size = concurrency * BATCH_FACTOR
+    for start in range(0, len(urls), batch_size):
+        batch = urls[start:start + batch_size]
+        pages = {}
+        same_origin = []
+        for url in batch:
+            if _origin(url) != origin:
+                pages[url] = FetchedPage(url, error="dominio diverso dalla pagina corrente")
+                metrics.inc("scraper_inpage_fetch_total", site=metrics.SITE, outcome="cross_origin")
+            else:
+                same_origin.append(url)
+        host = origin[1]
+        if same_origin:
+            try:
+                blocking.before_request(host)
+                for _ in same_origin:
+                    limits.wait_for_host(host)
+                rounds = math.ceil(len(same_origin) / concurrency)
+                driver.set_script_timeout(rounds * timeout + 30)
+                with metrics.timer("scraper_inpage_fetch_batch_seconds", site=metrics.SITE):
+                    results = json.loads(driver.execute_async_script(FETCH_SCRIPT, same_origin, concurrency, int(timeout * 1000)))
+            except Exception as e:
+                print(f"Scaricamento in pagina non riuscito per {len(same_origin)} pagine: {e}")
+                results = [{"status": 0, "error": str(e)} for _ in same_origin]
+            for url, result in zip(same_origin, results):
+                result = result or {"status": 0, "error": "nessuna risposta"}
+                page = FetchedPage(url, result.get("status", 0), result.get("url"), result.get("type", ""),
+                                   result.get("body"), result.get("error"))
+                _record(page, host)
+                pages[url] = page
+        for url in batch:
+            yield pages[url]
+
+
+def scrape_in_page(driver, items, parse, url=lambda item: item, concurrency=None):
+    """
+    Scarica con fetch_pages le pagine degli elementi `items` (URL, o dati da cui `url(item)` ricava
+    la URL) e chiama parse(item, soup) su ogni pagina valida; parse restituisce il risultato oppure
+    None se la pagina scaricata non basta (es. contenuto generato da JavaScript).
+    Restituisce (risultati, elementi da aprire nel browser come prima).
+    """
+    results = []
+    fallback = []
+    items = list(items)
+    by_url = {}
+    for item in items:
+        by_url.setdefault(url(item), []).append(item)
+    print(f"Scaricamento in pagina di {len(by_url)} pagine di dettaglio ({concurrency or INPAGE_FETCH} alla volta)...")
+    for page in fetch_pages(driver, list(by_url), concurrency):
+        for item in by_url[page.url]:
+            result = None
+            if page.ok:
+                try:
+                    result = parse(item, fetch.parse_html(page.html))
+                except Exception as e:
+                    print(f"Errore nell'estrazione della pagina scaricata {page.url}: {e}")
+            elif page.error:
+                print(f"  {page.url}: {page.error}, la apro nel browser.")
+            if result is None:
+                fallback.append(item)
+            else:
+                results.append(result)
+    print(f"Scaricamento in pagina completato: {len(results)} pagine estratte, {len(fallback)} da aprire nel browser.")
+    return results, fallback
@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import limits
+
+# Paginazione predittiva delle pagine di elenco.
+# Invece di scoprire la pagina N+1 solo dopo aver elaborato la pagina N, si confronta l'URL della
+# prima pagina con quella del suo link "successivo" per ricavare lo schema di paginazione:
+#   - parametro numerico nella query (?page=2, ?p=2, &page=1 con numerazione da zero, ...);
+#   - segmento numerico nel percorso (/page/2/, /pagina/2, /2/).
+# Dai link della prima pagina che seguono lo schema si legge il numero dell'ultima pagina e tutte le
+# pagine restanti vengono scaricate in parallelo. Se il paginatore mostra solo alcune pagine, si
+# prosegue a finestre di SCRAPER_PAGINATION_WORKERS pagine finché una pagina è vuota, ripete la
+# precedente o non ha più il link "successivo".
+# Senza uno schema riconoscibile si seguono i link "successivo" uno alla volta, come prima.
+# Il parallelismo è attivo di default solo sotto il runner, dove la frequenza massima per host
+# (limits.py) protegge i siti; eseguendo a mano un singolo scraper la paginazione resta seriale e
+# rispetta la pausa tra le pagine indicata dallo scraper (`delay`).
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_PAGINATION_WORKERS  pagine di elenco scaricate in parallelo (default: 4 sotto il runner,
+#                               1 = paginazione seriale altrimenti)
+
+PAGINATION_WORKERS = int(os.environ.get("SCRAPER_PAGINATION_WORKERS") or (4 if limits.enabled() else 1))
+
+MAX_PAGES = 1000  # Limite di sicurezza per categoria
+
+_NUMBER_RE = re.compile(r"^\d+$")
+
+
+class PagePattern:
+    """Schema delle URL di paginazione: la URL della pagina successiva con un numero variabile (query o percorso)."""
+
+    def __init__(self, template_url, query_key=None, path_index=None):
+        self.parts = urlsplit(template_url)
+        self.query_key = query_key
+        self.path_index = path_index
+        self.query = parse_qsl(self.parts.query, keep_blank_values=True)
+        self.segments = self.parts.path.split("/")
+
+    @classmethod
+    def detect(cls, current_url, next_url):
+        """Schema ricavato da una pagina e dalla sua successiva; None se le due URL non differiscono per un solo numero."""
+        current, following = urlsplit(current_url), urlsplit(next_url)
+        if (current.scheme, current.netloc) != (following.scheme, following.netloc):
+            return None
+        current_query = dict(parse_qsl(current.query, keep_blank_values=True))
+        next_query = dict(parse_qsl(following.query, keep_blank_values=True))
+
+        if current.path.rstrip("/") == following.path.rstrip("/"):
+            changed = [key for key in set(current_query) | set(next_query) if current_query.get(key) != next_query.get(key)]
+            if len(changed) == 1 and _NUMBER_RE.match(next_query.get(changed[0], "")):
+                return cls(next_url, query_key=changed[0])
+            return None
+
+        if current_query != next_query:
+            return None
+        current_segments = current.path.rstrip("/").split("/")
+        next_segments = following.path.split("/")
+        trailing_slash = next_segments[-1] == ""
+        if trailing_slash:
+            next_segments = next_segments[:-1]
+        index = len(next_segments) - 1
+        while index >= 0 and not _NUMBER_RE.match(next_segments[index]):
+            index -= 1
+        if index < 0:
+            return None
+        if len(current_segments) == len(next_segments):
+            # Numero nello stesso punto del percorso (/categoria/2 -> /categoria/3)
+            same_elsewhere = (current_segments[:index] == next_segments[:index]
+                              and current_segments[index + 1:] == next_segments[index + 1:])
+            if same_elsewhere and current_segments[index] != next_segments[index]:
+                return cls(next_url, path_index=index)
+        elif next_segments[:len(current_segments)] == current_segments and index >= len(current_segments):
+            # Prima pagina senza numero (/categoria/ -> /categoria/page/2/)
+            return cls(next_url, path_index=index)
+        return None
+
+    def url(self, number):
+        """URL della pagina `number` (nella numerazione del sito)."""
+        if self.query_key is not None:
+            query = [(key, str(number) if key == self.query_key else value) for key, value in self.query]
+            return urlunsplit(self.parts._replace(query=urlencode(query)))
+        segments = list(self.segments)
+        segments[self.path_index] = str(number)
+        return urlunsplit(self.parts._replace(path="/".join(segments)))
+
+    def number(self, url):
+        """Numero di pagina di `url` se segue lo schema, altrimenti None."""
+        parts = urlsplit(url)
+        if (parts.scheme, parts.netloc) != (self.parts.scheme, self.parts.netloc):
+            return None
+        if self.query_key is not None:
+            query = dict(parse_qsl(parts.query, keep_blank_values=True))
+            value = query.pop(self.query_key, "")
+            expected = {key: value for key, value in self.query if key != self.query_key}
+            if parts.path.rstrip("/") != self.parts.path.rstrip("/") or query != expected:
+                return None
+            return int(value) if _NUMBER_RE.match(value) else None
+        segments = parts.path.split("/")
+        if len(segments) != len(self.segments) or parse_qsl(parts.query, keep_blank_values=True) != self.query:
+            return None
+        value = segments[self.path_index]
+        if not _NUMBER_RE.match(value):
+            return None
+        others = segments[:self.path_index] + segments[self.path_index + 1:]
+        return int(value) if others == self.segments[:self.path_index] + self.segments[self.path_index + 1:] else None
+
+    @property
+    def first_number(self):
+        """Numero della pagina successiva alla prima, da cui lo schema è stato ricavato."""
+        return self.number(urlunsplit(self.parts))
+
+    def last_number(self, soup, page_url):
+        """Numero più alto tra i link della pagina che seguono lo schema (None se non ce ne sono)."""
+        numbers = []
+        for element in soup.select("a[href], [data-href]"):
+            href = element.get("href") or element.get("data-href")
+            number = self.number(urljoin(page_url, href))
+            if number is not None:
+                numbers.append(number)
+        return max(numbers) if numbers else None
+
+
+def _items_key(items):
+    return repr(items)
+
+
+def _spaced(fetch_page, delay):
+    """fetch_page con almeno `delay` secondi tra l'inizio di due scaricamenti, anche tra thread diversi."""
+    lock = threading.Lock()
+    next_start = [0.0]
+
+    def spaced_fetch(url):
+        with lock:
+            wait = next_start[0] - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            next_start[0] = time.time() + delay
+        return fetch_page(url)
+    return spaced_fetch
+
+
+def crawl(start_url, fetch_page, extract, next_link, workers=None, max_pages=None, delay=0):
+    """
+    Elementi di tutte le pagine di elenco a partire da `start_url`, nell'ordine delle pagine.
+      fetch_page(url) -> pagina analizzata (es. BeautifulSoup) o None se non scaricabile
+      extract(page, url) -> lista degli elementi della pagina (prodotti, link, ...)
+      next_link(page, url) -> URL assoluta della pagina successiva o None
+    `delay` è la pausa minima in secondi tra due pagine quando i limiti condivisi non sono attivi;
+    sotto il runner vale la frequenza massima per host.
+    """
+    workers = PAGINATION_WORKERS if workers is None else workers
+    max_pages = min(max_pages or MAX_PAGES, MAX_PAGES)
+    if delay and not limits.enabled():
+        fetch_page = _spaced(fetch_page, delay)
+
+    page = fetch_page(start_url)
+    if page is None:
+        return []
+    items = list(extract(page, start_url))
+    next_url = next_link(page, start_url)
+    pages_done = 1
+    pattern = PagePattern.detect(start_url, next_url) if next_url and workers > 1 else None
+    if pattern is None:
+        if next_url and workers > 1:
+            print("Nessuno schema di paginazione riconosciuto: seguo i link 'successivo' uno alla volta.")
+        return items + _crawl_serial(next_url, fetch_page, extract, next_link, max_pages - pages_done)
+
+    number = pattern.first_number
+    last = pattern.last_number(page, start_url)
+    print(f"Schema di paginazione: {pattern.url('N')}"
+          + (f" (ultima pagina indicata: {last})" if last is not None else " (numero di pagine non indicato)"))
+    previous_key = _items_key(items)
+
+    def load(page_number):
+        url = pattern.url(page_number)
+        loaded = fetch_page(url)
+        if loaded is None:
+            return url, None, [], None
+        return url, loaded, list(extract(loaded, url)), next_link(loaded, url)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pages_done < max_pages:
+            # Tutte le pagine indicate dal paginatore e, oltre l'ultima, una finestra speculativa
+            known_last = last if last is not None else number - 1
+            size = min(max(workers, known_last - number + 1), max_pages - pages_done)
+            batch = list(range(number, number + size))
+            stop = False
+            for page_number, (url, loaded, page_items, following) in zip(batch, executor.map(load, batch)):
+                if loaded is None:
+                    print(f"Pagina {url} non scaricata: fine della paginazione.")
+                    stop = True
+                    break
+                key = _items_key(page_items)
+                speculative = page_number > known_last
+                if speculative and (not page_items or key == previous_key):
+                    print(f"Pagina {url} vuota o ripetuta: fine della paginazione.")
+                    stop = True
+                    break
+                items.extend(page_items)
+                previous_key = key
+                pages_done += 1
+                number = page_number + 1
+                if following is None:
+                    stop = True
+                    break
+                if pattern.number(following) is None:
+                    # Il sito cambia schema più avanti: si prosegue seguendo i link
+                    items.extend(_crawl_serial(following, fetch_page, extract, next_link, max_pages - pages_done))
+                    stop = True
+                    break
+                last_seen = pattern.last_number(loaded, url)
+                if last_seen is not None and (last is None or last_seen > last):
+                    last = last_seen
+            if stop:
+                break
+    print(f"Paginazione completata: {pages_done} pagine, {len(items)} elementi.")
+    return items
+
+
+def _crawl_serial(url, fetch_page, extract, next_link, max_pages):
+    """Paginazione classica: una pagina alla volta seguendo il link 'successivo'."""
+    items = []
+    pages = 0
+    while url and pages < max_pages:
+        page = fetch_page(url)
+        if page is None:
+            break
+        items.extend(extract(page, url))
+        pages += 1
+        url = next_link(page, url)
+    return items
@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+# Crawl a pipeline: scoperta e pagine di dettaglio in parallelo invece che in due fasi.
+# Prima le URL prodotto venivano raccolte tutte (Fase 1) e solo dopo si apriva la prima scheda di
+# dettaglio (Fase 2): tempo totale = scoperta + dettagli. Qui ogni URL scoperta entra subito in una
+# coda limitata consumata da SCRAPER_PIPELINE_WORKERS worker, ciascuno con la propria risorsa (di
+# solito un browser Selenium), mentre la scoperta prosegue: il tempo totale tende al massimo tra le
+# due fasi e i primi prodotti arrivano dopo pochi secondi.
+# La coda è limitata: se i worker sono indietro la scoperta si ferma finché non si libera un posto.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_PIPELINE_WORKERS  worker delle pagine di dettaglio (default: 0 = fasi sequenziali come prima)
+#   SCRAPER_PIPELINE_QUEUE    elementi massimi in attesa nella coda (default: 50)
+
+PIPELINE_WORKERS = int(os.environ.get("SCRAPER_PIPELINE_WORKERS", "0"))
+QUEUE_SIZE = int(os.environ.get("SCRAPER_PIPELINE_QUEUE", "50"))
+
+PUT_POLL_INTERVAL = 1.0   # Secondi tra due controlli dei worker attivi quando la coda è piena
+
+_STOP = object()
+
+
+def enabled():
+    """True se il crawl a pipeline è attivo (SCRAPER_PIPELINE_WORKERS > 0)."""
+    return PIPELINE_WORKERS > 0
+
+
+class DetailPipeline:
+    """
+    Coda limitata di elementi da elaborare (URL o dizionari con la URL) consumata da worker in thread.
+      scrape(risorsa, elemento) -> risultato dell'elemento (es. il dizionario del prodotto)
+      open_worker() -> risorsa propria di ogni worker (es. un driver Selenium), None se non serve
+      close_worker(risorsa) -> rilascio della risorsa a fine lavoro
+      key(elemento) -> chiave di deduplicazione (default: l'elemento stesso)
+    I risultati sono restituiti da close() nell'ordine di inserimento degli elementi.
+    """
+
+    def __init__(self, scrape, open_worker=None, close_worker=None, workers=None, maxsize=None, key=None,
+                 phase="dettaglio"):
+        self.scrape = scrape
+        self.open_worker = open_worker
+        self.close_worker = close_worker
+        self.workers = max(1, workers or PIPELINE_WORKERS or 1)
+        self.key = key or (lambda item: item)
+        self.phase = phase
+        self.queue = queue.Queue(maxsize=maxsize or QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.results = {}
+        self.submitted = 0
+        self.closed = False
+        self.started_at = time.perf_counter()
+        self.first_result_at = None
+        self.threads = [threading.Thread(target=self._run, name=f"pipeline-{index + 1}", daemon=True)
+                        for index in range(self.workers)]
+        self.alive = len(self.threads)
+        for thread in self.threads:
+            thread.start()
+        print(f"Pipeline dei dettagli avviata: {self.workers} worker, coda di {self.queue.maxsize} elementi.")
+
+    def _run(self):
+        resource = None
+        try:
+            if self.open_worker is not None:
+                resource = self.open_worker()
+        except Exception as e:
+            print(f"[{threading.current_thread().name}] Impossibile avviare il worker: {e}")
+            with self.lock:
+                self.alive -= 1
+            return
+        try:
+            while True:
+                entry = self.queue.get()
+                if entry is _STOP:
+                    break
+                index, item = entry
+                metrics.set_gauge("scraper_queue_depth", self.queue.qsize(), site=metrics.SITE, phase=self.phase)
+                start = time.perf_counter()
+                try:
+                    result = self.scrape(resource, item)
+                except Exception as e:
+                    print(f"[{threading.current_thread().name}] Errore sull'elemento {self.key(item)}: {e}")
+                    result = None
+                metrics.observe("scraper_phase_item_seconds", time.perf_counter() - start, site=metrics.SITE, phase=self.phase)
+                with self.lock:
+                    self.results[index] = result
+                    if self.first_result_at is None:
+                        self.first_result_at = time.perf_counter()
+                        elapsed = self.first_result_at - self.started_at
+                        metrics.set_gauge("scraper_pipeline_first_result_seconds", elapsed, site=metrics.SITE)
+                        print(f"Primo dettaglio completato dopo {elapsed:.1f} s.")
+        finally:
+            with self.lock:
+                self.alive -= 1
+            if resource is not None and self.close_worker is not None:
+                try:
+                    self.close_worker(resource)
+                except Exception as e:
+                    print(f"[{threading.current_thread().name}] Errore nella chiusura del worker: {e}")
+
+    def submit(self, item):
+        """Accoda un elemento (se non già visto); attende se la coda è piena. Restituisce False per i duplicati."""
+        key = self.key(item)
+        with self.lock:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            index = self.submitted
+            self.submitted += 1
+        while True:
+            if not self.alive:
+                raise RuntimeError("Nessun worker della pipeline attivo")
+            try:
+                self.queue.put((index, item), timeout=PUT_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        metrics.set_gauge("scraper_queue_depth", self.queue.qsize(), site=metrics.SITE, phase=self.phase)
+        return True
+
+    def submit_many(self, items):
+        """Accoda più elementi; restituisce quanti erano nuovi."""
+        return sum(1 for item in items if self.submit(item))
+
+    def close(self):
+        """Attende che i worker completino gli elementi in coda e restituisce i risultati in ordine di inserimento."""
+        if not self.closed:
+            self.closed = True
+            for _ in self.threads:
+                while self.alive:
+                    try:
+                        self.queue.put(_STOP, timeout=PUT_POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        continue
+            for thread in self.threads:
+                thread.join()
+            metrics.set_gauge("scraper_queue_depth", 0, site=metrics.SITE, phase=self.phase)
+            print(f"Pipeline dei dettagli completata: {len(self.results)}/{self.submitted} elementi elaborati "
+                  f"in {time.perf_counter() - self.started_at:.1f} s.")
+        return [self.results[index] for index in sorted(self.results)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,136 @@
+import argparse
+import csv
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import archive
+import metrics
+
+# Riestrazione offline da un archivio WARC (vedi archive.py).
+# Quando un selettore si rompe non serve ripetere il crawl: si corregge lo scraper e si riesegue
+# la sua estrazione sulle pagine archiviate, in parallelo su tutti i core e senza rete.
+# Uno scraper partecipa definendo a livello di modulo
+#     reextract_page(url, contenuto) -> record (dict), lista di record oppure None
+# che riceve l'HTML di ogni pagina archiviata e restituisce None per le pagine che non estrae
+# (es. gli elenchi). Per ogni URL si usa solo la versione archiviata più recente.
+# I worker leggono ciascuno i propri record direttamente dal loro offset nell'archivio.
+#
+# Uso:
+#   python reextract.py scraper_fitt                           # archivio di default archives/scraper_fitt.warc.gz
+#   python reextract.py scraper_poron --archive poron.warc.gz --jobs 4 --output prodotti_poron_riestratti.csv
+
+HOOK_NAME = "reextract_page"
+BATCH_SIZE = 16   # Pagine per compito inviato a un worker
+
+_EXTRACTOR = None
+_ARCHIVE_PATH = None
+
+
+def load_extractor(site):
+    """Funzione di estrazione offline dello scraper `site` (nome del modulo)."""
+    module = importlib.import_module(site)
+    extractor = getattr(module, HOOK_NAME, None)
+    if extractor is None:
+        raise SystemExit(f"{site} non definisce {HOOK_NAME}(url, contenuto): riestrazione non disponibile.")
+    return extractor
+
+
+def index_archive(path):
+    """URL delle pagine HTML valide dell'archivio con l'offset della versione più recente, in ordine di prima comparsa."""
+    offsets = {}
+    for offset, record in archive.iter_records(path):
+        if record.type not in ("response", "resource") or not record.url or not record.is_html:
+            continue
+        if record.status is None or not 200 <= record.status < 300:
+            continue
+        offsets[record.url] = offset
+    return list(offsets.items())
+
+
+def _init_worker(site, path):
+    global _EXTRACTOR, _ARCHIVE_PATH
+    _EXTRACTOR = load_extractor(site)
+    _ARCHIVE_PATH = path
+
+
+def _extract_batch(batch):
+    """Record estratti da un gruppo di pagine (url, offset) e numero di pagine fallite."""
+    records = []
+    errors = 0
+    with open(_ARCHIVE_PATH, "rb") as f:
+        for url, offset in batch:
+            try:
+                result = _EXTRACTOR(url, archive.read_record(f, offset).text())
+            except Exception as e:
+                print(f"Errore nella riestrazione di {url}: {e}")
+                errors += 1
+                continue
+            if result is None:
+                continue
+            records.extend(result if isinstance(result, list) else [result])
+    return records, errors
+
+
+def reextract(site, path, jobs=None):
+    """Riesegue l'estrazione di `site` sull'archivio `path`; restituisce (record, pagine fallite)."""
+    pages = index_archive(path)
+    batches = [pages[start:start + BATCH_SIZE] for start in range(0, len(pages), BATCH_SIZE)]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(batches) or 1))
+    print(f"Riestrazione di {site}: {len(pages)} pagine da {path}, {jobs} processi.")
+    records = []
+    errors = 0
+    if jobs == 1:
+        _init_worker(site, path)
+        results = map(_extract_batch, batches)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(site, path))
+        results = executor.map(_extract_batch, batches)
+    try:
+        for batch_records, batch_errors in results:
+            records.extend(batch_records)
+            errors += batch_errors
+    finally:
+        if jobs > 1:
+            executor.shutdown()
+    return records, errors
+
+
+def save_records(records, filename):
+    """Salva i record in CSV, con le colonne nell'ordine di prima comparsa."""
+    fieldnames = list(dict.fromkeys(key for record in records for key in record))
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(records)
+    print(f"Dati riestratti salvati in {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Riesegue l'estrazione di uno scraper su un archivio WARC, senza rete.")
+    parser.add_argument("site", help="Modulo dello scraper (es. scraper_fitt)")
+    parser.add_argument("--archive", help="Archivio WARC (default: archives/<modulo>.warc.gz)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Processi di estrazione (default: numero di CPU)")
+    parser.add_argument("--output", help="CSV di uscita (default: <modulo>_riestratti.csv)")
+    args = parser.parse_args()
+
+    site = os.path.splitext(os.path.basename(args.site))[0]
+    path = args.archive or archive.default_archive_path(site)
+    if not os.path.exists(path):
+        print(f"Archivio non trovato: {path}")
+        return 1
+    load_extractor(site)  # Errore immediato se lo scraper non supporta la riestrazione
+
+    start = time.perf_counter()
+    records, errors = reextract(site, path, args.jobs)
+    print(f"Riestratti {len(records)} record in {time.perf_counter() - start:.1f} s ({errors} pagine con errori).")
+    metrics.record_emitted(len(records), site=site)
+    if records:
+        save_records(records, args.output or f"{site}_riestratti.csv")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import metrics
+
+# Runner globale: scopre gli scraper_*.py e li esegue in parallelo, ognuno nel proprio processo,
+# sotto limiti condivisi:
+#   - processi contemporanei (--jobs) e browser contemporanei (--browsers);
+#   - socket HTTP contemporanei tra tutti i processi (--sockets), ripartiti in quote eque per sito;
+#   - frequenza massima di richieste per host (--host-rate), valida anche tra siti diversi
+#     che colpiscono lo stesso host (es. gli scraper edilportale).
+# I limiti di rete sono applicati da limits.py nel percorso di fetch condiviso.
+# L'output di ogni scraper va in logs/runner_<timestamp>/<sito>.log; avanzamento e fallimenti
+# sono riportati qui, con un riepilogo JSON finale in run_summaries/.
+#
+# Uso:
+#   python runner.py                         # tutti gli scraper
+#   python runner.py --only 'scraper_edil*'  # solo quelli che corrispondono al pattern
+#   python runner.py --list                  # elenca gli scraper scoperti
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGS_DIR = os.path.join(REPO_DIR, "logs")
+
+PROGRESS_INTERVAL = 30.0  # Secondi tra due righe di avanzamento
+POLL_INTERVAL = 0.5
+
+# Indizi nel sorgente di uno scraper che usa un browser
+BROWSER_MARKERS = ("webdriver.Chrome", "webdriver.Firefox", "webdriver.Remote")
+
+
+class Site:
+    """Uno scraper da eseguire e lo stato della sua esecuzione."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8", errors="replace") as f:
+            source = f.read()
+        self.needs_browser = any(marker in source for marker in BROWSER_MARKERS)
+        self.expected_seconds = last_duration(self.name)
+        self.process = None
+        self.log_path = None
+        self.started_at = None
+        self.duration = None
+        self.returncode = None
+        self.timed_out = False
+        self.records = None
+
+    @property
+    def failed(self):
+        return self.timed_out or (self.returncode is not None and self.returncode != 0)
+
+
+def discover_sites(only=None, exclude=None):
+    """Scraper del repository filtrati per pattern (stile glob sul nome del modulo)."""
+    sites = []
+    for path in sorted(glob.glob(os.path.join(REPO_DIR, "scraper_*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            continue
+        if exclude and any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+            continue
+        sites.append(Site(path))
+    return sites
+
+
+def _summary_files(name):
+    return glob.glob(os.path.join(REPO_DIR, metrics.SUMMARY_DIR, f"{name}_*.json"))
+
+
+def last_duration(name):
+    """Durata dell'ultima esecuzione nota dello scraper (dai riepiloghi delle metriche), se disponibile."""
+    files = sorted(_summary_files(name), key=os.path.getmtime)
+    if not files:
+        return None
+    try:
+        with open(files[-1], encoding="utf-8") as f:
+            return json.load(f).get("duration_seconds")
+    except (OSError, ValueError):
+        return None
+
+
+def records_emitted(site):
+    """Record emessi nell'esecuzione appena terminata, letti dal riepilogo delle metriche dello scraper."""
+    files = [path for path in _summary_files(site.name) if os.path.getmtime(path) >= site.started_at]
+    if not files:
+        return None
+    try:
+        with open(max(files, key=os.path.getmtime), encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return sum(c["value"] for c in summary.get("counters", []) if c["name"] == "scraper_records_emitted_total")
+
+
+def schedule_order(sites):
+    """
+    Ordine di avvio: prima gli scraper più lunghi secondo l'ultima esecuzione (quelli mai eseguiti
+    in testa), così che i siti lenti non restino soli in coda alla fine.
+    """
+    return sorted(sites, key=lambda site: -(site.expected_seconds if site.expected_seconds is not None else float("inf")))
+
+
+def _format_elapsed(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class Runner:
+    def __init__(self, sites, jobs, browsers, sockets, host_rate, timeout, log_dir):
+        self.pending = schedule_order(sites)
+        self.sites = list(self.pending)
+        self.running = []
+        self.finished = []
+        self.jobs = max(1, jobs)
+        self.browsers = max(1, browsers)
+        self.sockets = max(1, sockets)
+        self.host_rate = host_rate
+        self.timeout = timeout
+        self.log_dir = log_dir
+        self.limits_dir = tempfile.mkdtemp(prefix="scraper_limits_")
+        self.started_at = time.time()
+
+    def child_env(self):
+        env = dict(os.environ)
+        env.update({
+            "PYTHONUNBUFFERED": "1",
+            "SCRAPER_LIMITS_DIR": self.limits_dir,
+            "SCRAPER_MAX_SOCKETS": str(self.sockets),
+            # Quota equa: ogni sito in esecuzione può occupare al più la sua parte degli slot globali
+            "SCRAPER_SITE_SOCKETS": str(max(1, self.sockets // self.jobs)),
+            "SCRAPER_HOST_RATE": str(self.host_rate),
+        })
+        env.pop(metrics.PORT_ENV, None)  # Più processi non possono esporre le metriche sulla stessa porta
+        return env
+
+    def browsers_in_use(self):
+        return sum(1 for site in self.running if site.needs_browser)
+
+    def next_site(self):
+        """Primo scraper in attesa che rientra nei limiti correnti (un sito HTTP può superare uno con browser)."""
+        for site in self.pending:
+            if not site.needs_browser or self.browsers_in_use() < self.browsers:
+                return site
+        return None
+
+    def start(self, site):
+        site.log_path = os.path.join(self.log_dir, f"{site.name}.log")
+        site.started_at = time.time()
+        log_file = open(site.log_path, "w", encoding="utf-8")
+        site.process = subprocess.Popen(
+            [sys.executable, site.path],
+            cwd=REPO_DIR,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            env=self.child_env(),
+        )
+        log_file.close()  # Il processo figlio ha la sua copia del descrittore
+        self.pending.remove(site)
+        self.running.append(site)
+        print(f"[{_format_elapsed(time.time() - self.started_at)}] Avviato {site.name}"
+              f"{' (browser)' if site.needs_browser else ''} -> {site.log_path}")
+
+    def reap(self):
+        """Raccoglie gli scraper terminati o oltre il timeout."""
+        now = time.time()
+        for site in list(self.running):
+            if site.process.poll() is None:
+                if self.timeout and now - site.started_at > self.timeout:
+                    site.timed_out = True
+                    site.process.kill()
+                    site.process.wait()
+                else:
+                    continue
+            site.returncode = site.process.returncode
+            site.duration = time.time() - site.started_at
+            site.records = records_emitted(site)
+            self.running.remove(site)
+            self.finished.append(site)
+            if site.failed:
+                reason = f"timeout dopo {_format_elapsed(site.duration)}" if site.timed_out else f"codice di uscita {site.returncode}"
+                print(f"[{_format_elapsed(now - self.started_at)}] FALLITO {site.name}: {reason} (log: {site.log_path})")
+            else:
+                records = "?" if site.records is None else site.records
+                print(f"[{_format_elapsed(now - self.started_at)}] Completato {site.name} in "
+                      f"{_format_elapsed(site.duration)}, {records} record")
+
+    def print_progress(self):
+        running = ", ".join(f"{site.name} ({_format_elapsed(time.time() - site.started_at)})" for site in self.running)
+        failed = sum(1 for site in self.finished if site.failed)
+        print(f"[{_format_elapsed(time.time() - self.started_at)}] Completati {len(self.finished)}/{len(self.sites)}, "
+              f"falliti {failed}, in attesa {len(self.pending)}. In corso: {running or '-'}")
+
+    def stop_all(self):
+        for site in self.running:
+            site.process.terminate()
+        for site in self.running:
+            try:
+                site.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                site.process.kill()
+
+    def run(self):
+        last_progress = time.time()
+        try:
+            while self.pending or self.running:
+                while len(self.running) < self.jobs:
+                    site = self.next_site()
+                    if site is None:
+                        break
+                    self.start(site)
+                time.sleep(POLL_INTERVAL)
+                self.reap()
+                if time.time() - last_progress >= PROGRESS_INTERVAL:
+                    self.print_progress()
+                    last_progress = time.time()
+        except KeyboardInterrupt:
+            print("\nInterruzione richiesta: arresto degli scraper in corso...")
+            self.stop_all()
+            raise
+        return self.finished
+
+    def write_summary(self):
+        summary = {
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "duration_seconds": round(time.time() - self.started_at, 3),
+            "limits": {"jobs": self.jobs, "browsers": self.browsers, "sockets": self.sockets, "host_rate": self.host_rate},
+            "sites": [{
+                "site": site.name,
+                "browser": site.needs_browser,
+                "duration_seconds": round(site.duration, 3) if site.duration is not None else None,
+                "returncode": site.returncode,
+                "timed_out": site.timed_out,
+                "records": site.records,
+                "log": site.log_path,
+            } for site in self.finished],
+        }
+        directory = os.path.join(REPO_DIR, metrics.SUMMARY_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"runner_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        return path
+
+
+def print_report(finished):
+    print("\n--- Riepilogo runner ---")
+    for site in sorted(finished, key=lambda s: (not s.failed, s.name)):
+        status = "TIMEOUT" if site.timed_out else ("FALLITO" if site.failed else "ok")
+        records = "?" if site.records is None else site.records
+        warning = "  (nessun record emesso)" if not site.failed and site.records == 0 else ""
+        print(f"{site.name:<32} {status:<8} {_format_elapsed(site.duration or 0):>9} {records:>8} record{warning}")
+    failed = [site.name for site in finished if site.failed]
+    print(f"\n{len(finished) - len(failed)} completati, {len(failed)} falliti" + (f": {', '.join(failed)}" if failed else ""))
+
+
+def main():
+    cpu_count = os.cpu_count() or 2
+    parser = argparse.ArgumentParser(description="Esegue tutti gli scraper in parallelo sotto limiti condivisi.")
+    parser.add_argument("--only", nargs="+", help="Pattern dei moduli da eseguire (es. 'scraper_edil*')")
+    parser.add_argument("--exclude", nargs="+", help="Pattern dei moduli da escludere")
+    parser.add_argument("--jobs", type=int, default=cpu_count, help="Scraper contemporanei (default: numero di CPU)")
+    parser.add_argument("--browsers", type=int, default=max(1, cpu_count // 2), help="Browser contemporanei (default: CPU/2)")
+    parser.add_argument("--sockets", type=int, default=32, help="Richieste HTTP contemporanee tra tutti i processi")
+    parser.add_argument("--host-rate", type=float, default=2.0, help="Richieste al secondo massime per host (0 = illimitate)")
+    parser.add_argument("--timeout", type=float, default=0, help="Timeout in secondi per scraper (0 = nessuno)")
+    parser.add_argument("--list", action="store_true", help="Elenca gli scraper scoperti ed esce")
+    args = parser.parse_args()
+
+    sites = discover_sites(args.only, args.exclude)
+    if not sites:
+        print("Nessuno scraper trovato.")
+        return 1
+    if args.list:
+        for site in schedule_order(sites):
+            expected = _format_elapsed(site.expected_seconds) if site.expected_seconds is not None else "-"
+            print(f"{site.name:<32} {'browser' if site.needs_browser else 'http':<8} ultima durata: {expected}")
+        return 0
+
+    log_dir = os.path.join(LOGS_DIR, f"runner_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    runner = Runner(sites, args.jobs, args.browsers, args.sockets, args.host_rate, args.timeout, log_dir)
+    print(f"Avvio di {len(sites)} scraper: {runner.jobs} in parallelo, max {runner.browsers} browser, "
+          f"{runner.sockets} socket, {args.host_rate} richieste/s per host.")
+    try:
+        finished = runner.run()
+    except KeyboardInterrupt:
+        finished = runner.finished
+    finally:
+        shutil.rmtree(runner.limits_dir, ignore_errors=True)
+    print_report(finished)
+    print(f"Riepilogo runner salvato in {runner.write_summary()}")
+    return 1 if any(site.failed for site in finished) or len(finished) < len(sites) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
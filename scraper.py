@@ -1,8 +1,9 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import csv
 import os
+import fetch
+import diagnostics
 
 # Impostazioni iniziali
 BASE_URL = "https://products.kerakoll.com"
@@ -16,9 +17,9 @@ HEADERS = {
 def get_soup(url):
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -49,8 +50,8 @@ def main_scraper(listing_urls):
 
         if not product_containers:
             print(f"Nessun contenitore prodotto trovato su {listing_url}. Controlla il selettore 'div.card'.")
-            print("Primi 2000 caratteri dell'HTML della pagina di elenco per debug:")
-            print(listing_soup.prettify()[:2000])
+            # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+            diagnostics.record_miss("div.card")
             continue
 
         for i, container in enumerate(product_containers):
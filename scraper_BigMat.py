@@ -1,8 +1,11 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
-import time
+import fetch
+import diagnostics
+import catalog
+import pagination
+from urllib.parse import urljoin
 
 # Impostazioni iniziali
 # L'URL iniziale della prima pagina dei prodotti BigMat
@@ -42,9 +45,9 @@ def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -56,117 +59,112 @@ def get_soup(url):
 def scrape_bigmat_products_paginated(start_url):
     """
     Scarica le pagine di elenco prodotti BigMat con paginazione e estrae i dati.
+    Le pagine successive alla prima vengono scaricate in parallelo quando lo schema
+    di paginazione è riconoscibile (vedi pagination.py).
     """
+    return pagination.crawl(start_url, get_soup, extract_bigmat_products, find_next_page_url, delay=2)
+
+
+def extract_bigmat_products(soup, url):
+    """Estrae i dati dei prodotti di una pagina di elenco già scaricata."""
     all_products_data = []
-    current_url = start_url
-
-    while current_url:
-        soup = get_soup(current_url)
-        if not soup:
-            print(f"Impossibile recuperare la pagina: {current_url}. Interruzione scraping.")
-            break # Esci dal ciclo se non riesci a scaricare una pagina
-
-        # Trova tutti i contenitori prodotto nella pagina corrente
-        product_containers = soup.select(PRODUCT_CONTAINER_SELECTOR)
-
-        print(f"Trovati {len(product_containers)} contenitori prodotto ('{PRODUCT_CONTAINER_SELECTOR}') su {current_url}.")
-
-        if not product_containers:
-            print(f"Nessun contenitore prodotto trovato su {current_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
-            # Stampa una parte dell'HTML per debuggare se non trova contenitori
-            print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-            print(soup.prettify()[:2000])
-            # Se non ci sono prodotti, controlla comunque se c'è un link alla pagina successiva
-            # per evitare di bloccare lo scraping se una pagina è vuota per qualche motivo.
-            pass
-
-
-        for i, container in enumerate(product_containers):
-            # print(f"Elaborazione prodotto {i+1}/{len(product_containers)} su {current_url}...") # Messo a commento
-            try:
-                product_data = {
-                    "name": "N/A",
-                    "brand": "BigMat", # Marca fissa
-                    "description": "N/A",
-                    "price": "N/A", # Il prezzo è presente ma non richiesto, impostato a N/A
-                    "image_url": "N/A",
-                    "product_page_url": "N/A" # L'URL della pagina di dettaglio
-                }
-
-                # Estrai il Nome del prodotto e l'URL della pagina di dettaglio
-                title_link_tag = container.select_one(PRODUCT_NAME_SELECTOR)
-                if title_link_tag:
-                    product_data["name"] = title_link_tag.get_text(strip=True)
-                    product_data["product_page_url"] = title_link_tag.get('href', 'N/A')
-                    # Gli URL sembrano già assoluti su questo sito, ma aggiungiamo un controllo base
-                    if product_data["product_page_url"] != 'N/A' and product_data["product_page_url"].startswith('/'):
-                         product_data["product_page_url"] = BASE_URL + product_data["product_page_url"]
-
-                    # print(f"Trovato Nome: {product_data['name']}, URL: {product_data['product_page_url']}") # Messo a commento
-                # else: name e product_page_url rimangono N/A
-
-
-                # Estrai la Descrizione breve
-                description_tag = container.select_one(PRODUCT_DESCRIPTION_SELECTOR)
-                if description_tag:
-                    product_data["description"] = description_tag.get_text(strip=True)
-                    # print(f"Trovata Descrizione: {product_data['description'][:50]}...") # Messo a commento
-                # else: la descrizione potrebbe non essere sempre presente, N/A è il default
-
-
-                # Estrai l'URL dell'immagine (priorità data-image-large-src, poi data-image-medium-src, poi src)
-                img_tag = container.select_one(PRODUCT_IMAGE_SELECTOR)
-                if img_tag:
-                    # Priorità a data-image-large-src per l'immagine di massima qualità
-                    image_url = img_tag.get('data-image-large-src')
-                    if not image_url:
-                        image_url = img_tag.get('data-image-medium-src') # Fallback a data-image-medium-src
-                    if not image_url:
-                        image_url = img_tag.get('src') # Ultimo fallback a src
-
-                    # Assicurati che l'URL non sia un placeholder data:image
-                    if image_url and not image_url.startswith('data:image'):
-                         # Gli URL delle immagini sembrano già assoluti, ma aggiungiamo un controllo base
-                         if image_url.startswith('//'):
-                             product_data["image_url"] = "https:" + image_url
-                         else:
-                             product_data["image_url"] = image_url # Già assoluto
-
-                         # print(f"Trovata Immagine: {product_data['image_url']}") # Messo a commento
-                    # else: image_url rimane N/A se placeholder o vuoto
-                # else: img_tag non trovato, image_url rimane N/A
-
-
-                # Aggiungi i dati estratti alla lista principale
-                # Aggiungiamo solo se abbiamo trovato almeno il nome
-                if product_data.get("name") != "N/A":
-                    all_products_data.append(product_data)
-                # else: Saltato prodotto senza nome, non stampare per non intasare l'output
-
-
-            except Exception as e:
-                print(f"Errore durante l'elaborazione del contenitore prodotto {i+1} su {current_url}: {e}")
-                continue # Continua con il prossimo prodotto anche in caso di errore su uno
-
-        time.sleep(1) # Breve pausa tra l'elaborazione dei prodotti (opzionale)
-
-
-        # --- Gestione Paginazione ---
-        # Cerca il link "Successivo"
-        next_page_link = soup.select_one(NEXT_PAGE_SELECTOR)
-
-        if next_page_link and next_page_link.has_attr('href'):
-            next_url = next_page_link['href']
-            print(f"\nTrovato link pagina successiva: {next_url}")
-            current_url = next_url # Imposta l'URL corrente alla pagina successiva
-            time.sleep(2) # Pausa più lunga tra le pagine per non sovraccaricare il server
-        else:
-            print("\nNessun link pagina successiva trovato. Fine della paginazione.")
-            current_url = None # Imposta a None per uscire dal ciclo while
+
+    # Trova tutti i contenitori prodotto nella pagina corrente
+    product_containers = soup.select(PRODUCT_CONTAINER_SELECTOR)
+
+    print(f"Trovati {len(product_containers)} contenitori prodotto ('{PRODUCT_CONTAINER_SELECTOR}') su {url}.")
+
+    if not product_containers:
+        print(f"Nessun contenitore prodotto trovato su {url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR)
+        # Se non ci sono prodotti, controlla comunque se c'è un link alla pagina successiva
+        # per evitare di bloccare lo scraping se una pagina è vuota per qualche motivo.
+        pass
+
+
+    for i, container in enumerate(product_containers):
+        # print(f"Elaborazione prodotto {i+1}/{len(product_containers)} su {url}...") # Messo a commento
+        try:
+            product_data = {
+                "name": "N/A",
+                "brand": "BigMat", # Marca fissa
+                "description": "N/A",
+                "price": "N/A", # Il prezzo è presente ma non richiesto, impostato a N/A
+                "image_url": "N/A",
+                "product_page_url": "N/A" # L'URL della pagina di dettaglio
+            }
+
+            # Estrai il Nome del prodotto e l'URL della pagina di dettaglio
+            title_link_tag = container.select_one(PRODUCT_NAME_SELECTOR)
+            if title_link_tag:
+                product_data["name"] = title_link_tag.get_text(strip=True)
+                product_data["product_page_url"] = title_link_tag.get('href', 'N/A')
+                # Gli URL sembrano già assoluti su questo sito, ma aggiungiamo un controllo base
+                if product_data["product_page_url"] != 'N/A' and product_data["product_page_url"].startswith('/'):
+                     product_data["product_page_url"] = BASE_URL + product_data["product_page_url"]
+
+                # print(f"Trovato Nome: {product_data['name']}, URL: {product_data['product_page_url']}") # Messo a commento
+            # else: name e product_page_url rimangono N/A
+
+
+            # Estrai la Descrizione breve
+            description_tag = container.select_one(PRODUCT_DESCRIPTION_SELECTOR)
+            if description_tag:
+                product_data["description"] = description_tag.get_text(strip=True)
+                # print(f"Trovata Descrizione: {product_data['description'][:50]}...") # Messo a commento
+            # else: la descrizione potrebbe non essere sempre presente, N/A è il default
+
+
+            # Estrai l'URL dell'immagine (priorità data-image-large-src, poi data-image-medium-src, poi src)
+            img_tag = container.select_one(PRODUCT_IMAGE_SELECTOR)
+            if img_tag:
+                # Priorità a data-image-large-src per l'immagine di massima qualità
+                image_url = img_tag.get('data-image-large-src')
+                if not image_url:
+                    image_url = img_tag.get('data-image-medium-src') # Fallback a data-image-medium-src
+                if not image_url:
+                    image_url = img_tag.get('src') # Ultimo fallback a src
+
+                # Assicurati che l'URL non sia un placeholder data:image
+                if image_url and not image_url.startswith('data:image'):
+                     # Gli URL delle immagini sembrano già assoluti, ma aggiungiamo un controllo base
+                     if image_url.startswith('//'):
+                         product_data["image_url"] = "https:" + image_url
+                     else:
+                         product_data["image_url"] = image_url # Già assoluto
+
+                     # print(f"Trovata Immagine: {product_data['image_url']}") # Messo a commento
+                # else: image_url rimane N/A se placeholder o vuoto
+            # else: img_tag non trovato, image_url rimane N/A
+
+
+            # Aggiungi i dati estratti alla lista principale
+            # Aggiungiamo solo se abbiamo trovato almeno il nome
+            if product_data.get("name") != "N/A":
+                all_products_data.append(product_data)
+            # else: Saltato prodotto senza nome, non stampare per non intasare l'output
+
+
+        except Exception as e:
+            print(f"Errore durante l'elaborazione del contenitore prodotto {i+1} su {url}: {e}")
+            continue # Continua con il prossimo prodotto anche in caso di errore su uno
 
     return all_products_data
 
 
+def find_next_page_url(soup, url):
+    """URL della pagina successiva (link "Successivo"), o None sull'ultima pagina."""
+    next_page_link = soup.select_one(NEXT_PAGE_SELECTOR)
+
+    if next_page_link and next_page_link.has_attr('href'):
+        next_url = urljoin(url, next_page_link['href'])
+        print(f"\nTrovato link pagina successiva: {next_url}")
+        return next_url
+    print("\nNessun link pagina successiva trovato. Fine della paginazione.")
+    return None
+
+
 def save_to_csv(data, filename):
     """Salva una lista di dizionari in un file CSV."""
     if not data:
@@ -196,6 +194,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
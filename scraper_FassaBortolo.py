@@ -6,7 +6,9 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
+from fetch import get_soup_from_selenium, prepare_driver
+import metrics
+import catalog
 
 # Impostazioni iniziali
 # Lista per contenere gli URL delle pagine di categoria da scrapare.
@@ -69,16 +71,6 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "div.product-detail-right a.popup img"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_product_detail(driver, detail_url):
     """
@@ -232,7 +224,7 @@ def scrape_fassabortolo_category(driver, category_url):
     # Ottieni l'handle della finestra corrente (la pagina di categoria)
     original_window = driver.current_window_handle
 
-    for j, detail_url in enumerate(all_product_detail_urls):
+    for j, detail_url in enumerate(metrics.track_loop(all_product_detail_urls, "dettaglio")):
         try:
             # Apri l'URL di dettaglio in una nuova scheda
             driver.execute_script("window.open(arguments[0]);", detail_url)
@@ -248,6 +240,7 @@ def scrape_fassabortolo_category(driver, category_url):
             # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
             if product_detail and product_detail.get("name") != "N/A":
                 all_products_data.append(product_detail)
+                metrics.record_emitted()
                 # print(f"  Aggiunto prodotto: {product_detail.get('name')}") # DEBUG
             # else: Prodotto saltato (nome N/A)
 
@@ -300,12 +293,14 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
     try:
         # Inizializza il driver Selenium
         driver = webdriver.Chrome() # O webdriver.Firefox(), webdriver.Edge(), ecc.
+        driver = prepare_driver(driver)
 
         all_scraped_products = []
 
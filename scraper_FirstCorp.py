@@ -1,11 +1,22 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import re
 from datetime import datetime
 import os
 import random
+import fetch
+import catalog
+from selectorchain import SelectorChain
+
+# Immagine del prodotto: metodi in ordine di preferenza, valutati in una sola visita della pagina
+IMAGE_CHAIN = SelectorChain("immagine", [
+    'div.col-md-6 > img',                                                       # Metodo 1: immagine semplice
+    'div.slider.slider-single div.slick-slide.slick-current.slick-active img',  # Metodo 2: carosello principale
+    'div.slider.slider-nav div.slick-slide.slick-current.slick-active img',     # Metodo 3: miniature
+    'div.product_owl_slider img',                                               # Metodo 4: qualsiasi immagine nel carosello
+    'img[alt="ProductImage"]',                                                  # Metodo 5: immagine correlata al prodotto
+])
 
 def get_page_content(url, max_retries=3):
     """Scarica e restituisce il contenuto di una pagina web con gestione di errori e retry."""
@@ -18,7 +29,7 @@ def get_page_content(url, max_retries=3):
     
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, timeout=15)
+            response = fetch.get(url, headers=headers, timeout=15)
             if response.status_code == 200:
                 return response.text
             elif response.status_code == 429:  # Too Many Requests
@@ -39,7 +50,7 @@ def get_page_content(url, max_retries=3):
 
 def extract_product_links(page_content):
     """Estrae i link ai prodotti dalla pagina della categoria."""
-    soup = BeautifulSoup(page_content, 'html.parser')
+    soup = fetch.parse_html(page_content)
     
     product_links = []
     products = soup.select('div.col-md-4.mb-0 div.feature-wrap')
@@ -61,7 +72,7 @@ def extract_product_links(page_content):
 
 def extract_product_info(page_content):
     """Estrae le informazioni del prodotto dalla pagina del prodotto."""
-    soup = BeautifulSoup(page_content, 'html.parser')
+    soup = fetch.parse_html(page_content)
     
     # Estrazione del nome del prodotto
     nome_prodotto_elem = soup.select_one('div.scheda_dat_title h2')
@@ -86,37 +97,11 @@ def extract_product_info(page_content):
         if data_title:
             colori.append(data_title)
     
-    # Estrazione dell'immagine - metodo ulteriormente migliorato
+    # Estrazione dell'immagine: il primo metodo la cui immagine ha un src
     immagine = "N/A"
-    
-    # Metodo 1: Immagine semplice in div.col-md-6
-    simple_image = soup.select_one('div.col-md-6 > img')
-    if simple_image and 'src' in simple_image.attrs:
-        immagine = simple_image['src']
-    
-    # Metodo 2: Carosello principale
-    if immagine == "N/A":
-        slider_main = soup.select_one('div.slider.slider-single div.slick-slide.slick-current.slick-active img')
-        if slider_main and 'src' in slider_main.attrs:
-            immagine = slider_main['src']
-    
-    # Metodo 3: Miniature
-    if immagine == "N/A":
-        slider_thumb = soup.select_one('div.slider.slider-nav div.slick-slide.slick-current.slick-active img')
-        if slider_thumb and 'src' in slider_thumb.attrs:
-            immagine = slider_thumb['src']
-    
-    # Metodo 4: Qualsiasi immagine nel carosello
-    if immagine == "N/A":
-        any_slider_img = soup.select_one('div.product_owl_slider img')
-        if any_slider_img and 'src' in any_slider_img.attrs:
-            immagine = any_slider_img['src']
-    
-    # Metodo 5: Qualsiasi immagine correlata al prodotto
-    if immagine == "N/A":
-        any_product_img = soup.select_one('img[alt="ProductImage"]')
-        if any_product_img and 'src' in any_product_img.attrs:
-            immagine = any_product_img['src']
+    image_elem = IMAGE_CHAIN.select_one(soup, accept=lambda img: 'src' in img.attrs)
+    if image_elem:
+        immagine = image_elem['src']
     
     # Combinazione descrizione e materiale
     descrizione_completa = descrizione
@@ -218,6 +203,12 @@ def save_to_csv(products_info, filename="first_corporation_products.csv"):
             
     print(f"Backup salvato in {backup_filename}")
 
+def reextract_page(url, page_content):
+    """Estrazione offline di una pagina archiviata (reextract.py): solo le pagine prodotto."""
+    if "/product/" not in url:
+        return None
+    return extract_product_info(page_content)
+
 def main():
     # Lista di URL di categoria da scrapare
     start_urls = [
@@ -282,6 +273,7 @@ def main():
     
     print(f"\nTotale prodotti estratti: {len(all_products_info)}")
     print(f"Tutti i prodotti sono stati salvati in {final_file}")
+    catalog.save_records(all_products_info)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
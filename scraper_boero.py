@@ -6,8 +6,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin # Utile per costruire URL completi
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import diagnostics
+import catalog
 
 # Impostazioni iniziali
 # URL base del sito
@@ -55,16 +58,6 @@ PRODUCT_DESCRIPTION_EXTENDED_SELECTOR = "div.tab--content"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_product_detail_page(driver, detail_url):
     """
@@ -184,11 +177,8 @@ def scrape_boero_page(driver, page_url):
         print("Pagina caricata (primo blocco prodotto trovato).")
     except TimeoutException:
         print(f"Timeout nell'attesa dei prodotti sulla pagina {page_url}. Potrebbe non esserci nulla o il selettore non è corretto.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        soup_debug = get_soup_from_selenium(driver)
-        if soup_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-             print(soup_debug.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING, driver.current_url, lambda: driver.page_source)
         return [] # Restituisce lista vuota se non trova prodotti
 
 
@@ -204,9 +194,8 @@ def scrape_boero_page(driver, page_url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato su {page_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
         return [] # Restituisce lista vuota
 
 
@@ -335,6 +324,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -350,7 +340,8 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
 
 
         all_scraped_products = []
@@ -1,10 +1,22 @@
 import requests
-from bs4 import BeautifulSoup
 import re
 import time
+from urllib.parse import urljoin
 import pandas as pd
-
-def get_product_details_from_page(product_page_url):
+import fetch
+import catalog
+from fingerprint import FingerprintStore, fingerprint
+import sitemap
+import pagination
+
+# Impronte delle schede prodotto: una scheda invariata non viene riestratta
+FINGERPRINTS = FingerprintStore("scraper_bosch")
+# Pagine di categoria non scaricate e schede prodotto individuate in questa esecuzione: il delta
+# riporta i prodotti rimossi solo se tutte le categorie e tutte le schede sono state lette
+FAILED_CATEGORY_PAGES = []
+DISCOVERED_PRODUCT_URLS = []
+
+def get_product_details_from_page(product_page_url, lastmod=None):
     """
     Scrapa il nome completo del prodotto (titolo + sottotitolo),
     la descrizione e l'URL dell'immagine di qualità più elevata
@@ -12,19 +24,36 @@ def get_product_details_from_page(product_page_url):
 
     Args:
         product_page_url (str): L'URL della pagina del prodotto.
+        lastmod (datetime): data di modifica dalla sitemap, se la pagina è stata scoperta da lì.
 
     Returns:
         dict: Un dizionario contenente il nome del prodotto, la descrizione
               e l'URL dell'immagine, oppure None se si verifica un errore.
     """
+    # Pagina non modificata secondo il lastmod della sitemap: nessun bisogno di scaricarla
+    cached = FINGERPRINTS.unchanged_since(product_page_url, lastmod)
+    if cached:
+        return cached[0]
+
     try:
-        response = requests.get(product_page_url)
+        response = fetch.get(product_page_url)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Errore durante il recupero della pagina {product_page_url}: {e}")
         return None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = fetch.parse_html(response.text)
+
+    # Regione rilevante: titolo, sottotitolo, elenco descrittivo e immagini della scheda
+    page_fingerprint = fingerprint(
+        soup.find('h1', class_='product-detail-stage__title'),
+        soup.find('p', class_='product-detail-stage__subtitle'),
+        soup.find('ul', class_='product-detail-stage__list'),
+        soup.find('div', class_='product-detail-stage__slide'),
+    )
+    cached = FINGERPRINTS.unchanged(product_page_url, page_fingerprint)
+    if cached:
+        return cached[0]
 
     product_data = {}
 
@@ -93,15 +122,60 @@ def get_product_details_from_page(product_page_url):
 
     product_data['url_immagine'] = high_res_image_url
     product_data['marca'] = 'Bosch' # Aggiungiamo la marca
+    product_data['url_prodotto'] = product_page_url
 
+    FINGERPRINTS.update(product_page_url, page_fingerprint, [product_data], lastmod)
     return product_data
 
 
 
+def fetch_category_page(url):
+    """Scarica e analizza una pagina di categoria; None in caso di errore di rete."""
+    print(f"\n--- Recupero pagina di categoria: {url} ---")
+    try:
+        response = fetch.get(url)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Errore durante il recupero della pagina di categoria {url}: {e}")
+        if getattr(e.response, "status_code", None) != 404:  # 404 oltre l'ultima pagina: fine dell'elenco
+            FAILED_CATEGORY_PAGES.append(url)
+        return None
+    return fetch.parse_html(response.text)
+
+
+def extract_product_links(soup, page_url):
+    """Link alle schede prodotto presenti in una pagina di categoria."""
+    product_tiles = soup.find_all('div', class_='category-grid-tile', attrs={'data-sku': True})
+
+    print(f"Trovati {len(product_tiles)} prodotti nella pagina {page_url}.")
+
+    if not product_tiles:
+        print("Nessun prodotto trovato in questa pagina. Controlla il selettore o la struttura della pagina.")
+
+    product_urls = []
+    for tile in product_tiles:
+        product_link_tag = tile.find('a', class_='category-grid-tile__link-wrapper')
+        if product_link_tag and 'href' in product_link_tag.attrs:
+            product_urls.append(product_link_tag['href'])
+    return product_urls
+
+
+def find_next_page_url(soup, page_url):
+    """URL della pagina di categoria successiva (bottone 'avanti'), o None sull'ultima pagina."""
+    next_page_button = soup.find('button',
+                                 class_='m-ghostblock__nav-item arrow',
+                                 attrs={'aria-label': 'avanti'})
+    if next_page_button and 'data-href' in next_page_button.attrs:
+        return urljoin(page_url, next_page_button['data-href'])
+    return None
+
+
 def scrape_category_pages(start_category_url):
     """
     Scrapa tutti i link ai prodotti da una pagina di categoria e poi visita
     ciascun link per estrarre i dettagli, navigando tra tutte le pagine.
+    Le pagine di categoria vengono scaricate in parallelo quando lo schema
+    di paginazione è riconoscibile (vedi pagination.py).
 
     Args:
         start_category_url (str): L'URL della pagina di categoria iniziale.
@@ -111,54 +185,17 @@ def scrape_category_pages(start_category_url):
               di un prodotto.
     """
     all_products_data = []
-    current_page_url = start_category_url
-    page_count = 0
-
-    while current_page_url: # Continua finché c'è un URL per la pagina successiva
-        page_count += 1
-        print(f"\n--- Recupero pagina di categoria {page_count}: {current_page_url} ---")
-        try:
-            response = requests.get(current_page_url)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            print(f"Errore durante il recupero della pagina di categoria {current_page_url}: {e}")
-            break # Esci dal loop in caso di errore di rete
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Scraping dei prodotti dalla pagina attuale
-        product_tiles = soup.find_all('div', class_='category-grid-tile', attrs={'data-sku': True})
-
-        print(f"Trovati {len(product_tiles)} prodotti nella pagina {current_page_url}.")
-
-        if not product_tiles:
-            print("Nessun prodotto trovato in questa pagina. Controlla il selettore o la struttura della pagina.")
-
-        for tile in product_tiles:
-            product_link_tag = tile.find('a', class_='category-grid-tile__link-wrapper')
-            
-            if product_link_tag and 'href' in product_link_tag.attrs:
-                product_url = product_link_tag['href']
-                print(f"  Scraping del prodotto: {product_url}")
-                
-                product_details = get_product_details_from_page(product_url)
-                if product_details:
-                    all_products_data.append(product_details)
-                
-                time.sleep(0.5) # Piccolo ritardo tra le richieste ai dettagli dei prodotti
-
-        # --- Trova il link alla pagina successiva ---
-        next_page_button = soup.find('button', 
-                                     class_='m-ghostblock__nav-item arrow', 
-                                     attrs={'aria-label': 'avanti'})
-        
-        if next_page_button and 'data-href' in next_page_button.attrs:
-            current_page_url = next_page_button['data-href']
-            print(f"Trovata pagina successiva: {current_page_url}")
-            time.sleep(1) # Ritardo più lungo tra il caricamento delle pagine di categoria
-        else:
-            print("Nessun bottone 'avanti' trovato. Fine dello scraping delle pagine.")
-            current_page_url = None # Ferma il loop quando non ci sono più pagine
+    product_urls = pagination.crawl(start_category_url, fetch_category_page, extract_product_links, find_next_page_url, delay=1)
+
+    for product_url in dict.fromkeys(product_urls): # Senza duplicati, nell'ordine delle pagine
+        DISCOVERED_PRODUCT_URLS.append(product_url)
+        print(f"  Scraping del prodotto: {product_url}")
+
+        product_details = get_product_details_from_page(product_url)
+        if product_details:
+            all_products_data.append(product_details)
+
+        time.sleep(0.5) # Piccolo ritardo tra le richieste ai dettagli dei prodotti
 
     return all_products_data
 
@@ -180,29 +217,55 @@ category_urls = [
 
 ]
 
-all_scraped_products = []
+# Scoperta alternativa alla paginazione (SCRAPER_DISCOVERY=sitemap): schede prodotto degli accessori,
+# riconoscibili dal codice articolo 2607/2608/2609 in fondo alla URL
+SITEMAP_BASE_URL = "https://www.bosch-professional.com/it/it/"
+SITEMAP_URL_PATTERN = r"/it/it/products/[^/]*-260[789]\d{6}/?$"
+
 
-for url in category_urls:
-    print(f"\n***** INIZIO SCRAPING CATEGORIA: {url} *****")
-    products_from_category = scrape_category_pages(url)
-    all_scraped_products.extend(products_from_category)
-    print(f"***** FINE SCRAPING CATEGORIA: {url} *****")
-    time.sleep(2) # Breve pausa tra una categoria e l'altra
+def scrape_from_sitemap():
+    """Scrapa le schede prodotto elencate nelle sitemap, senza scorrere le pagine di categoria."""
+    all_products_data = []
+    for entry in sitemap.discover(SITEMAP_BASE_URL, SITEMAP_URL_PATTERN):
+        print(f"  Scraping del prodotto: {entry.loc}")
+        DISCOVERED_PRODUCT_URLS.append(entry.loc)
+        product_details = get_product_details_from_page(entry.loc, entry.lastmod)
+        if product_details:
+            all_products_data.append(product_details)
+            time.sleep(0.5)
+    return all_products_data
+
+
+if __name__ == "__main__":
+    all_scraped_products = scrape_from_sitemap() if sitemap.enabled() else []
 
-if all_scraped_products:
-    print("\n--- Scraping completato per tutte le categorie. Salvataggio in CSV... ---")
+    for url in ([] if all_scraped_products else category_urls):
+        print(f"\n***** INIZIO SCRAPING CATEGORIA: {url} *****")
+        products_from_category = scrape_category_pages(url)
+        all_scraped_products.extend(products_from_category)
+        print(f"***** FINE SCRAPING CATEGORIA: {url} *****")
+        time.sleep(2) # Breve pausa tra una categoria e l'altra
+
+    if all_scraped_products:
+        print("\n--- Scraping completato per tutte le categorie. Salvataggio in CSV... ---")
     
-    # Crea un DataFrame Pandas dai dati scrapati
-    df = pd.DataFrame(all_scraped_products)
+        # Crea un DataFrame Pandas dai dati scrapati
+        df = pd.DataFrame(all_scraped_products)
     
-    # Ordina le colonne come richiesto
-    output_columns = ['nome_prodotto', 'marca', 'descrizione', 'url_immagine']
-    df = df[output_columns]
+        # Ordina le colonne come richiesto
+        output_columns = ['nome_prodotto', 'marca', 'descrizione', 'url_immagine']
+        df = df[output_columns]
     
-    # Salva il DataFrame in un file CSV
-    csv_filename = 'bosch_accessori_products.csv' # Cambiato nome del file per includere tutti i prodotti
-    df.to_csv(csv_filename, index=False, encoding='utf-8')
+        # Salva il DataFrame in un file CSV
+        csv_filename = 'bosch_accessori_products.csv' # Cambiato nome del file per includere tutti i prodotti
+        df.to_csv(csv_filename, index=False, encoding='utf-8')
     
-    print(f"Dati salvati con successo in '{csv_filename}'")
-else:
-    print("Nessun dato di prodotto è stato scrapato da nessuna categoria o si è verificato un errore.")
\ No newline at end of file
+        print(f"Dati salvati con successo in '{csv_filename}'")
+        catalog.save_records(all_scraped_products)
+
+        # Delta rispetto all'esecuzione precedente, accanto allo snapshot completo
+        FINGERPRINTS.write_delta(all_scraped_products, csv_filename, 'url_prodotto',
+                                 complete=not FAILED_CATEGORY_PAGES and FINGERPRINTS.complete(DISCOVERED_PRODUCT_URLS))
+        FINGERPRINTS.save()
+    else:
+        print("Nessun dato di prodotto è stato scrapato da nessuna categoria o si è verificato un errore.")
\ No newline at end of file
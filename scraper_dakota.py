@@ -1,8 +1,10 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
+import fetch
+import diagnostics
+import catalog
 
 # Impostazioni iniziali
 # L'URL iniziale della prima pagina dei prodotti Dakota
@@ -39,9 +41,9 @@ def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -70,9 +72,8 @@ def scrape_dakota_products_paginated(start_url):
 
         if not product_containers:
             print(f"Nessun contenitore prodotto trovato su {current_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
-            # Stampa una parte dell'HTML per debuggare se non trova contenitori
-            print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-            print(soup.prettify()[:2000])
+            # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+            diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR)
             # Se non ci sono prodotti, controlla comunque se c'è un link alla pagina successiva
             # per evitare di bloccare lo scraping se una pagina è vuota per qualche motivo.
             pass
@@ -185,6 +186,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
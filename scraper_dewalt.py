@@ -1,10 +1,13 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import os
 import re
 from urllib.parse import urljoin
+import fetch
+import catalog
+import sitemap
+import pagination
 
 class DeWaltScraper:
     def __init__(self):
@@ -20,7 +23,7 @@ class DeWaltScraper:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.get(url, headers=self.headers)
+                response = fetch.get(url, headers=self.headers)
                 response.raise_for_status()
                 return response
             except requests.exceptions.RequestException as e:
@@ -38,7 +41,7 @@ class DeWaltScraper:
         if not response:
             return None
 
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = fetch.parse_html(response.text)
         
         # Extract product name
         product_name_elem = soup.select_one("h1.coh-heading.title.coh-style-h3---default")
@@ -78,54 +81,58 @@ class DeWaltScraper:
             "category": category
         }
 
-    def scrape_product_listings(self, url):
-        """Scrape product listings from a page and extract links to product pages."""
+    def fetch_listing(self, url):
+        """Download and parse a listing page; None if it cannot be fetched."""
         print(f"Scraping product listings from: {url}")
         response = self.make_request(url)
         if not response:
-            return False
+            return None
+        return fetch.parse_html(response.text)
 
-        soup = BeautifulSoup(response.text, "html.parser")
+    def extract_product_urls(self, soup, url):
+        """Extract the links to the product pages from a listing page."""
         product_articles = soup.select("article[about]")
-        
+
         if not product_articles:
-            print("No products found on this page")
-            return False
-            
-        print(f"Found {len(product_articles)} products on this page")
-        
+            print(f"No products found on {url}")
+            return []
+
+        print(f"Found {len(product_articles)} products on {url}")
+
+        product_urls = []
         for article in product_articles:
             product_link_elem = article.select_one("a.coh-link.subtitle.card-link.product-title")
             if product_link_elem and product_link_elem.has_attr("href"):
-                product_url = urljoin(self.base_url, product_link_elem["href"])
-                
-                # Check if we've already scraped this product
-                if any(p.get("product_url") == product_url for p in self.products):
-                    print(f"Skipping already scraped product: {product_url}")
-                    continue
-                
-                # Extract product data from the product page
-                print(f"Scraping product details from: {product_url}")
-                product_data = self.parse_product_page(product_url)
-                
-                if product_data:
-                    self.products.append(product_data)
-                    print(f"Successfully scraped: {product_data['name']} - {product_data['sku']} - {product_data['category']}")
-                
-                # Add a small delay to avoid overloading the server
-                time.sleep(1)
-        
-        return True
+                product_urls.append(urljoin(self.base_url, product_link_elem["href"]))
+        return product_urls
 
-    def get_next_page_url(self, current_url):
-        """Extract the URL for the next page of products."""
-        response = self.make_request(current_url)
-        if not response:
+    def scrape_product_pages(self, product_urls):
+        """Scrape the detail page of every product not scraped yet."""
+        for product_url in product_urls:
+            # Check if we've already scraped this product
+            if any(p.get("product_url") == product_url for p in self.products):
+                print(f"Skipping already scraped product: {product_url}")
+                continue
+
+            # Extract product data from the product page
+            print(f"Scraping product details from: {product_url}")
+            product_data = self.parse_product_page(product_url)
+
+            if product_data:
+                self.products.append(product_data)
+                print(f"Successfully scraped: {product_data['name']} - {product_data['sku']} - {product_data['category']}")
+
+            # Add a small delay to avoid overloading the server
+            time.sleep(1)
+
+    def get_next_page_url(self, soup, current_url):
+        """Extract the URL for the next page of products from a parsed listing page."""
+        # A page without products ends the listing, even if it still shows a pager
+        if not soup.select_one("article[about]"):
             return None
 
-        soup = BeautifulSoup(response.text, "html.parser")
         next_page_elem = soup.select_one("li.pager__item.pager__item--next a")
-        
+
         if next_page_elem and next_page_elem.has_attr("href"):
             next_page_href = next_page_elem["href"]
             # Handle both absolute and relative URLs
@@ -140,7 +147,7 @@ class DeWaltScraper:
                 else:
                     # Append query parameters
                     return f"{current_url}{next_page_href}"
-        
+
         return None
 
     def save_to_csv(self):
@@ -158,33 +165,44 @@ class DeWaltScraper:
                 writer.writerow(product)
                 
         print(f"Saved {len(self.products)} products to {self.csv_filename}")
+        catalog.save_records(self.products)
+
+    def scrape_from_sitemap(self, start_url):
+        """Scrape the product pages listed in the sitemaps under a category URL, without paging."""
+        pattern = "^" + re.escape(start_url.rstrip("/")) + "/"
+        entries = sitemap.discover(self.base_url, pattern, headers=self.headers)
+        for entry in entries:
+            if any(p.get("product_url") == entry.loc for p in self.products):
+                continue
+            print(f"Scraping product details from: {entry.loc}")
+            product_data = self.parse_product_page(entry.loc)
+            # Sitemaps also list sub-category pages: keep only real product pages
+            if product_data and product_data["name"] != "N/A":
+                self.products.append(product_data)
+                print(f"Successfully scraped: {product_data['name']} - {product_data['sku']} - {product_data['category']}")
+            time.sleep(1)
+        return len(entries)
 
     def scrape_url(self, start_url, max_pages=None):
         """Scrape a specific URL and its pagination."""
-        current_url = start_url
-        page_count = 1
-        
-        while current_url:
-            print(f"\nProcessing page {page_count} for {start_url}: {current_url}")
-            success = self.scrape_product_listings(current_url)
-            
-            if not success:
-                print(f"Failed to scrape products from page {page_count}")
-                break
-                
-            if max_pages and page_count >= max_pages:
-                print(f"Reached maximum number of pages ({max_pages}) for {start_url}")
-                break
-                
-            # Get the URL for the next page
-            current_url = self.get_next_page_url(current_url)
-            if not current_url:
-                print(f"No more pages to scrape for {start_url}")
-                break
-                
-            page_count += 1
-            
-        return page_count - 1  # Return the number of pages processed
+        # With SCRAPER_DISCOVERY=sitemap the product URLs come from the sitemaps instead of the pager
+        if sitemap.enabled() and self.scrape_from_sitemap(start_url):
+            return 0
+
+        # Listing pages are fetched concurrently when the pager URL pattern is recognised (see pagination.py)
+        pages = []
+
+        def extract(soup, url):
+            pages.append(url)
+            return self.extract_product_urls(soup, url)
+
+        product_urls = pagination.crawl(start_url, self.fetch_listing, extract, self.get_next_page_url, max_pages=max_pages,
+                                        delay=1)
+        if not pages:
+            print(f"Failed to scrape products from {start_url}")
+        self.scrape_product_pages(product_urls)
+
+        return len(pages)  # Return the number of pages processed
 
     def run(self, urls, max_pages=None):
         """Run the scraper for multiple URLs."""
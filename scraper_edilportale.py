@@ -6,13 +6,26 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import consent
+import diagnostics
+import metrics
+import catalog
+from fingerprint import FingerprintStore, fingerprint
+import sitemap
+import pipeline
+import pagefetch
 
 # Impostazioni iniziali
 # Il singolo URL di partenza per la lista di prodotti.
 START_URL = "https://www.edilportale.com/aziende/ursa_3982/prodotti"
 
+# Pattern delle URL prodotto nelle sitemap (scoperta alternativa alla paginazione) e brand corrispondente
+SITEMAP_URL_PATTERN = r"edilportale\.com/prodotti/ursa/"
+SITEMAP_BRAND = "URSA"
+
 # Nome del file CSV di output
 OUTPUT_CSV_FILE = "edilportale_prodotti_ursa.csv"
 
@@ -41,6 +54,8 @@ COOKIE_WALL_SELECTOR = "div#cookie-wall.cookie-wall-container"
 # Questo è un tentativo basato su selettori comuni; potrebbe richiedere aggiustamenti.
 # Cerchiamo un bottone o link all'interno del cookie wall che contenga il testo "Accetto" o "OK".
 COOKIE_ACCEPT_BUTTON_SELECTOR = f'{COOKIE_WALL_SELECTOR} button, {COOKIE_WALL_SELECTOR} a' # Iniziamo cercando bottoni o link generici all'interno del wall
+COOKIE_WALL = consent.ConsentWall(COOKIE_WALL_SELECTOR, COOKIE_ACCEPT_BUTTON_SELECTOR,
+                                  texts=['accetto', 'ok', 'chiudi', 'accetta i cookie'])
 
 
 # --- Selettori CSS per gli elementi sulla pagina di DETTAGLIO Prodotto ---
@@ -55,79 +70,72 @@ PRODUCT_DESCRIPTION_SELECTOR_DETAIL = "div.accordion-content p"
 # Selettore per l'immagine principale del prodotto nella pagina di dettaglio
 PRODUCT_IMAGE_SELECTOR_DETAIL = "div#product-image img"
 
+# Regione rilevante della pagina di dettaglio, letta direttamente dal browser per calcolarne l'impronta
+# senza trasferire e parsare l'intera page_source
+DETAIL_REGION_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (e) { return e.outerHTML; }).join('');
+"""
+DETAIL_REGION_SELECTOR = ", ".join([PRODUCT_NAME_SELECTOR_DETAIL, PRODUCT_DESCRIPTION_SELECTOR_DETAIL, PRODUCT_IMAGE_SELECTOR_DETAIL])
+
+# Impronte delle pagine di dettaglio: una scheda invariata non viene riestratta
+FINGERPRINTS = FingerprintStore("scraper_edilportale")
+
 
 # Configurazione di Selenium WebDriver
 driver = None
+detail_pipeline = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 def dismiss_cookie_wall(driver):
     """
-    Tenta di chiudere il banner dei cookie se presente.
+    Chiude il banner dei cookie se presente.
+    Attende il banner solo alla prima pagina del sito: una volta dato il consenso il controllo è immediato.
     """
-    try:
-        # Attendi brevemente la potenziale presenza del cookie wall
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, COOKIE_WALL_SELECTOR))
-        )
-        print("Banner cookie rilevato.")
-
-        # Prova a trovare e cliccare il bottone di accettazione.
-        # Iteriamo su possibili selettori o elementi per trovare il giusto bottone.
-        accept_button = None
-        try:
-            # Cerca un bottone o link all'interno del cookie wall
-            possible_buttons = driver.find_elements(By.CSS_SELECTOR, COOKIE_ACCEPT_BUTTON_SELECTOR)
-            for button in possible_buttons:
-                # Controlla il testo del bottone (case-insensitive e trimming)
-                if button.text.strip().lower() in ['accetto', 'ok', 'chiudi', 'accetta i cookie']:
-                    accept_button = button
-                    break # Trovato il bottone, esci dal loop
-
-            if accept_button and accept_button.is_displayed():
-                 print(f"Trovato bottone di accettazione cookie con testo: '{accept_button.text.strip()}'. Tentativo di click.")
-                 # Usa JavaScript per il click per superare possibili intercettazioni minori
-                 driver.execute_script("arguments[0].click();", accept_button)
-                 # Attendi che il banner scompaia
-                 WebDriverWait(driver, 5).until(
-                     EC.invisibility_of_element_located((By.CSS_SELECTOR, COOKIE_WALL_SELECTOR))
-                 )
-                 print("Banner cookie chiuso con successo.")
-            else:
-                 print("Bottone di accettazione cookie non trovato o non visibile all'interno del banner.")
-                 # Potresti voler provare a cliccare l'overlay o fare qualcos'altro qui se il bottone specifico non funziona.
-                 # Per ora, logghiamo e proseguiamo, potrebbe non essere sempre bloccante.
-
-        except NoSuchElementException:
-            print("Bottone di accettazione cookie non trovato con i selettori specificati.")
-            # Potrebbe non esserci un bottone standard o il selettore è sbagliato.
-
-        except Exception as e:
-            print(f"Errore durante la gestione del banner cookie: {e}")
-            # Continua anche in caso di errore nella gestione del cookie, non vogliamo bloccare tutto.
-
-    except TimeoutException:
-        # Il banner dei cookie non è apparso entro il timeout, prosegui.
-        # print("Banner cookie non rilevato (Timeout).") # DEBUG
-        pass
-    except Exception as e:
-         print(f"Errore generico nel controllo presenza cookie wall: {e}")
-         pass
+    consent.dismiss(driver, COOKIE_WALL)
 
 
-def scrape_edilportale_detail_page(driver, product_data):
+def parse_edilportale_detail_page(soup, product_data):
+    """
+    Estrae nome, descrizione e URL immagine dall'HTML (BeautifulSoup) di una pagina di dettaglio,
+    renderizzata nel browser o scaricata con fetch() in pagina, aggiornando il dizionario product_data.
+    """
+    # Estrai il Nome del prodotto
+    name_tag = soup.select_one(PRODUCT_NAME_SELECTOR_DETAIL)
+    if name_tag:
+        product_data["nome"] = name_tag.get_text(strip=True)
+
+
+    # Estrai la Descrizione
+    # MODIFICA INIZIA QUI
+    description_paragraphs = soup.select(PRODUCT_DESCRIPTION_SELECTOR_DETAIL) # Usa select per prendere TUTTI i <p>
+    description_text = ""
+    if description_paragraphs:
+        # Unisci il testo di tutti i paragrafi, separandoli con un ritorno a capo
+        # Usa get_text(strip=True) su ogni paragrafo per pulire spazi bianchi inutili
+        description_text = "\n".join([p.get_text(strip=True) for p in description_paragraphs if p.get_text(strip=True)]) # Filtra paragrafi vuoti
+
+    if description_text: # Controlla se il testo unito non è vuoto
+         product_data["descrizione"] = description_text
+    else:
+         product_data["descrizione"] = "N/A" # Imposta a N/A se non è stato trovato alcun testo nei paragrafi
+    # MODIFICA FINISCE QUI
+
+
+    # Estrai l'URL dell'immagine
+    img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
+    if img_tag and img_tag.has_attr('src'):
+         image_src = img_tag['src']
+         if image_src and not image_src.startswith('data:'):
+             image_url = img_tag.get('content') or img_tag.get('src')
+             if image_url:
+                 product_data["image url"] = urljoin(BASE_URL, image_url)
+
+
+def scrape_edilportale_detail_page(driver, product_data, lastmod=None):
     """
     Visita una singola pagina di dettaglio prodotto usando il driver Selenium
     ed estrae nome, descrizione e URL immagine, aggiornando il dizionario product_data.
+    lastmod è la data di modifica dalla sitemap, se la pagina è stata scoperta da lì.
     """
     detail_url = product_data["product url"]
     # print(f"  Navigazione pagina dettaglio: {detail_url}") # DEBUG
@@ -144,42 +152,20 @@ def scrape_edilportale_detail_page(driver, product_data):
         # Gestisci il banner cookie anche sulla pagina di dettaglio, potrebbe riapparire
         dismiss_cookie_wall(driver)
 
+        # Se la regione rilevante non è cambiata dall'ultima esecuzione, riusa i dati già estratti
+        page_fingerprint = fingerprint(driver.execute_script(DETAIL_REGION_SCRIPT, DETAIL_REGION_SELECTOR))
+        cached = FINGERPRINTS.unchanged(detail_url, page_fingerprint)
+        if cached:
+            product_data.update({key: value for key, value in cached[0].items() if key != "marca"})
+            return
 
         soup = get_soup_from_selenium(driver)
         if not soup:
              print("   Impossibile ottenere la soup dalla pagina di dettaglio.")
              return # Esci se non si ottiene la soup
 
-        # Estrai il Nome del prodotto
-        name_tag = soup.select_one(PRODUCT_NAME_SELECTOR_DETAIL)
-        if name_tag:
-            product_data["nome"] = name_tag.get_text(strip=True)
-
-
-        # Estrai la Descrizione
-        # MODIFICA INIZIA QUI
-        description_paragraphs = soup.select(PRODUCT_DESCRIPTION_SELECTOR_DETAIL) # Usa select per prendere TUTTI i <p>
-        description_text = ""
-        if description_paragraphs:
-            # Unisci il testo di tutti i paragrafi, separandoli con un ritorno a capo
-            # Usa get_text(strip=True) su ogni paragrafo per pulire spazi bianchi inutili
-            description_text = "\n".join([p.get_text(strip=True) for p in description_paragraphs if p.get_text(strip=True)]) # Filtra paragrafi vuoti
-
-        if description_text: # Controlla se il testo unito non è vuoto
-             product_data["descrizione"] = description_text
-        else:
-             product_data["descrizione"] = "N/A" # Imposta a N/A se non è stato trovato alcun testo nei paragrafi
-        # MODIFICA FINISCE QUI
-
-
-        # Estrai l'URL dell'immagine
-        img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
-        if img_tag and img_tag.has_attr('src'):
-             image_src = img_tag['src']
-             if image_src and not image_src.startswith('data:'):
-                 image_url = img_tag.get('content') or img_tag.get('src')
-                 if image_url:
-                     product_data["image url"] = urljoin(BASE_URL, image_url)
+        parse_edilportale_detail_page(soup, product_data)
+        FINGERPRINTS.update(detail_url, page_fingerprint, [product_data], lastmod)
 
 
     except (TimeoutException, NoSuchElementException) as e:
@@ -188,6 +174,40 @@ def scrape_edilportale_detail_page(driver, product_data):
         print(f"  Errore generico durante lo scraping della pagina di dettaglio {detail_url}: {e}")
 
 
+def scrape_edilportale_detail_url(driver, product_data, lastmod=None):
+    """
+    Apre la pagina di dettaglio di product_data nel driver (es. un worker della pipeline) e la estrae;
+    una pagina invariata secondo il lastmod della sitemap non viene aperta.
+    """
+    detail_url = product_data["product url"]
+    cached = FINGERPRINTS.unchanged_since(detail_url, lastmod)
+    if cached:
+        product_data.update({key: value for key, value in cached[0].items() if key != "marca"})
+        return product_data
+    driver.get(detail_url)
+    scrape_edilportale_detail_page(driver, product_data, lastmod)
+    return product_data
+
+
+def parse_edilportale_fetched_page(product_data, soup, lastmod=None):
+    """
+    Aggiorna product_data da una pagina di dettaglio scaricata con fetch() in pagina; None se il nome
+    manca (la pagina va aperta nel browser). L'impronta usa le stesse regioni della pagina renderizzata,
+    serializzate da BeautifulSoup: al primo cambio di modalità le pagine vengono riestratte una volta.
+    """
+    detail_url = product_data["product url"]
+    page_fingerprint = fingerprint(soup.select(DETAIL_REGION_SELECTOR))
+    cached = FINGERPRINTS.unchanged(detail_url, page_fingerprint)
+    if cached:
+        product_data.update({key: value for key, value in cached[0].items() if key != "marca"})
+        return product_data
+    if soup.select_one(PRODUCT_NAME_SELECTOR_DETAIL) is None:
+        return None
+    parse_edilportale_detail_page(soup, product_data)
+    FINGERPRINTS.update(detail_url, page_fingerprint, [product_data], lastmod)
+    return product_data
+
+
 def scrape_edilportale_listing_page(driver):
      """
      Raccoglie i dati base dei prodotti (URL e Brand) dalla pagina di elenco corrente.
@@ -202,10 +222,8 @@ def scrape_edilportale_listing_page(driver):
          print("Pagina lista prodotti caricata (primo prodotto trovato).")
      except TimeoutException:
          print("Timeout nell'attesa dei prodotti nella lista. Potrebbe non esserci nulla su questa pagina o il selettore del contenitore prodotto è errato.")
-         soup_listing_debug = get_soup_from_selenium(driver)
-         if soup_listing_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (Timeout o nessun contenitore trovato):")
-             print(soup_listing_debug.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING, driver.current_url, lambda: driver.page_source)
          return [] # Restituisce lista vuota di dati
 
      products_data_on_page = []
@@ -222,8 +240,8 @@ def scrape_edilportale_listing_page(driver):
 
      if not product_containers:
          print(f"Nessun contenitore prodotto trovato sulla pagina corrente. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-         print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-         print(soup_listing.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
          return [] # Restituisce lista vuota
 
      for i, container in enumerate(product_containers):
@@ -283,6 +301,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -291,72 +310,107 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
 
 
         all_products_base_data = []
         seen_product_urls = set()
+        sitemap_lastmod = {}
+
+        # Con SCRAPER_PIPELINE_WORKERS > 0 le schede di dettaglio vengono elaborate da browser dedicati
+        # mentre la Fase 1 pagina ancora l'elenco; i dizionari dei prodotti sono aggiornati sul posto
+        if pipeline.enabled():
+            detail_pipeline = pipeline.DetailPipeline(
+                lambda worker, product_data: scrape_edilportale_detail_url(
+                    worker, product_data, sitemap_lastmod.get(product_data["product url"])),
+                open_worker=lambda: prepare_driver(browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))),
+                close_worker=lambda worker: worker.quit(),
+                key=lambda product_data: product_data["product url"])
+
+        # Con SCRAPER_DISCOVERY=sitemap le URL prodotto arrivano dalle sitemap, senza paginare nel browser
+        sitemap_entries = sitemap.discover(BASE_URL, SITEMAP_URL_PATTERN) if sitemap.enabled() else []
+        if sitemap_entries:
+            print(f"\n--- Fase 1: URL prodotto dalle sitemap ({len(sitemap_entries)} trovate) ---")
+            for entry in sitemap_entries:
+                if entry.loc not in seen_product_urls:
+                    all_products_base_data.append({
+                        "marca": SITEMAP_BRAND,
+                        "nome": "N/A",
+                        "descrizione": "N/A",
+                        "image url": "N/A",
+                        "product url": entry.loc
+                    })
+                    seen_product_urls.add(entry.loc)
+                    sitemap_lastmod[entry.loc] = entry.lastmod
+                    if detail_pipeline:
+                        detail_pipeline.submit(all_products_base_data[-1])
+            # Una sola navigazione sul sito per accettare i cookie prima di aprire le schede di dettaglio
+            driver.get(START_URL)
+            dismiss_cookie_wall(driver)
+        else:
+            print(f"\n--- Fase 1: Raccogli URL e Brand dalle Pagine di Elenco (cliccando 'Avanti') ---")
 
-        print(f"\n--- Fase 1: Raccogli URL e Brand dalle Pagine di Elenco (cliccando 'Avanti') ---")
-
-        current_listing_url = START_URL
-        page_count = 0
+            current_listing_url = START_URL
+            page_count = 0
 
-        while True: # Loop infinito che verrà interrotto manualmente
-            page_count += 1
-            print(f"\n--- Elaborazione Pagina Lista Prodotti (cliccando Avanti) Pagina {page_count}: {current_listing_url} ---")
+            while True: # Loop infinito che verrà interrotto manualmente
+                page_count += 1
+                print(f"\n--- Elaborazione Pagina Lista Prodotti (cliccando Avanti) Pagina {page_count}: {current_listing_url} ---")
 
-            # Naviga alla pagina corrente (solo per la prima iterazione e dopo il click di "Avanti")
-            driver.get(current_listing_url)
+                # Naviga alla pagina corrente (solo per la prima iterazione e dopo il click di "Avanti")
+                driver.get(current_listing_url)
 
-            # --- Gestisci il banner dei cookie ---
-            dismiss_cookie_wall(driver)
-            # --- Fine gestione cookie ---
+                # --- Gestisci il banner dei cookie ---
+                dismiss_cookie_wall(driver)
+                # --- Fine gestione cookie ---
 
-            # Chiama la funzione per scrapare i dati base dalla pagina corrente
-            products_data_on_page = scrape_edilportale_listing_page(driver)
+                # Chiama la funzione per scrapare i dati base dalla pagina corrente
+                products_data_on_page = scrape_edilportale_listing_page(driver)
 
-            # Aggiungi i dati base trovati alla lista complessiva, evitando duplicati basati sull'URL
-            for product_data in products_data_on_page:
-                if product_data["product url"] != "N/A" and product_data["product url"] not in seen_product_urls:
-                    all_products_base_data.append(product_data)
-                    seen_product_urls.add(product_data["product url"])
+                # Aggiungi i dati base trovati alla lista complessiva, evitando duplicati basati sull'URL
+                for product_data in products_data_on_page:
+                    if product_data["product url"] != "N/A" and product_data["product url"] not in seen_product_urls:
+                        all_products_base_data.append(product_data)
+                        seen_product_urls.add(product_data["product url"])
+                        if detail_pipeline:
+                            detail_pipeline.submit(product_data)
 
 
-            # --- Gestione Clic Paginazione "Avanti" ---
-            next_button = None
-            try:
-                # Attendi che il bottone "Avanti" sia presente e cliccabile
-                # Aumentiamo un po' l'attesa per il bottone "Avanti" dopo il caricamento
-                wait = WebDriverWait(driver, 15)
-                next_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, NEXT_BUTTON_SELECTOR)))
-                print("Trovato bottone 'Avanti'.")
-            except (NoSuchElementException, TimeoutException):
-                print("Bottone 'Avanti' non trovato o non cliccabile. Fine paginazione.")
-                next_button = None # Assicurati che sia None se non trovato
-
-            if next_button:
+                # --- Gestione Clic Paginazione "Avanti" ---
+                next_button = None
                 try:
-                    # Ottieni l'URL attuale prima del click
-                    old_url = driver.current_url
-                    print(f"Clicco su 'Avanti'...")
-                    # Usa JavaScript per il click, a volte più affidabile con elementi coperti o scroll non perfetti
-                    driver.execute_script("arguments[0].click();", next_button)
-
-                    # Attendi che l'URL cambi, indicando che la nuova pagina è stata caricata
-                    # Aumentiamo l'attesa per il cambio URL
-                    wait.until(EC.url_changes(old_url))
-                    # Aggiorna l'URL corrente con l'URL della nuova pagina
-                    current_listing_url = driver.current_url
-                    print(f"Navigato alla pagina successiva: {current_listing_url}")
-
-                    time.sleep(3) # Aumenta la pausa per sicurezza dopo il caricamento della nuova pagina e prima della prossima iterazione
-
-                except Exception as e:
-                    print(f"Errore cliccando il bottone Avanti o caricando la pagina successiva: {e}. Interruzione paginazione.")
-                    break # Interrompi il loop se il click o il caricamento falliscono
-            else:
-                break # Esci dal loop se il bottone "Avanti" non è stato trovato
+                    # Attendi che il bottone "Avanti" sia presente e cliccabile
+                    # Aumentiamo un po' l'attesa per il bottone "Avanti" dopo il caricamento
+                    wait = WebDriverWait(driver, 15)
+                    next_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, NEXT_BUTTON_SELECTOR)))
+                    print("Trovato bottone 'Avanti'.")
+                except (NoSuchElementException, TimeoutException):
+                    print("Bottone 'Avanti' non trovato o non cliccabile. Fine paginazione.")
+                    next_button = None # Assicurati che sia None se non trovato
+
+                if next_button:
+                    try:
+                        # Ottieni l'URL attuale prima del click
+                        old_url = driver.current_url
+                        print(f"Clicco su 'Avanti'...")
+                        # Usa JavaScript per il click, a volte più affidabile con elementi coperti o scroll non perfetti
+                        driver.execute_script("arguments[0].click();", next_button)
+
+                        # Attendi che l'URL cambi, indicando che la nuova pagina è stata caricata
+                        # Aumentiamo l'attesa per il cambio URL
+                        wait.until(EC.url_changes(old_url))
+                        # Aggiorna l'URL corrente con l'URL della nuova pagina
+                        current_listing_url = driver.current_url
+                        print(f"Navigato alla pagina successiva: {current_listing_url}")
+
+                        time.sleep(3) # Aumenta la pausa per sicurezza dopo il caricamento della nuova pagina e prima della prossima iterazione
+
+                    except Exception as e:
+                        print(f"Errore cliccando il bottone Avanti o caricando la pagina successiva: {e}. Interruzione paginazione.")
+                        break # Interrompi il loop se il click o il caricamento falliscono
+                else:
+                    break # Esci dal loop se il bottone "Avanti" non è stato trovato
 
 
         print(f"\n--- Fine Fase 1. Raccolti {len(all_products_base_data)} set di dati base unici (URL e Brand) da tutte le pagine processate. ---")
@@ -365,54 +419,88 @@ if __name__ == "__main__":
         # --- Fase 2: Scraping dei dettagli da ogni pagina prodotto ---
         print("\n--- Fase 2: Scraping Dettagli Prodotti ---")
 
-        # Ottieni l'handle della finestra corrente (dopo l'ultima pagina di elenco visitata)
-        original_window = driver.current_window_handle
-
-        for i, product_data in enumerate(all_products_base_data): # Iteriamo sui dati base raccolti
-            detail_url = product_data["product url"]
-            print(f"Scraping dettaglio prodotto {i+1}/{len(all_products_base_data)}: {detail_url}")
+        if detail_pipeline:
+            # I dettagli sono stati elaborati dai worker durante la Fase 1: si attende la fine della coda
+            detail_pipeline.close()
+        else:
+            products_to_open = all_products_base_data
+            # Con SCRAPER_INPAGE_FETCH le pagine di dettaglio si scaricano con fetch() dalla pagina del sito
+            # già aperta (stessi cookie del browser); solo quelle non estraibili così vengono aperte in una scheda
+            if pagefetch.enabled():
+                fetched_products, _ = pagefetch.scrape_in_page(
+                    driver,
+                    [product_data for product_data in all_products_base_data
+                     if not FINGERPRINTS.unchanged_since(product_data["product url"], sitemap_lastmod.get(product_data["product url"]))],
+                    lambda product_data, soup: parse_edilportale_fetched_page(
+                        product_data, soup, sitemap_lastmod.get(product_data["product url"])),
+                    url=lambda product_data: product_data["product url"])
+                fetched_ids = {id(product_data) for product_data in fetched_products}
+                # Restano le pagine non scaricabili e quelle invariate secondo la sitemap (riusate senza aprirle)
+                products_to_open = [product_data for product_data in all_products_base_data if id(product_data) not in fetched_ids]
+
+            # Ottieni l'handle della finestra corrente (dopo l'ultima pagina di elenco visitata)
+            original_window = driver.current_window_handle
+
+            for i, product_data in enumerate(metrics.track_loop(products_to_open, "dettaglio")): # Iteriamo sui dati base raccolti
+                detail_url = product_data["product url"]
+                print(f"Scraping dettaglio prodotto {i+1}/{len(products_to_open)}: {detail_url}")
+
+                # Pagina non modificata secondo il lastmod della sitemap: nessun bisogno di aprirla
+                cached = FINGERPRINTS.unchanged_since(detail_url, sitemap_lastmod.get(detail_url))
+                if cached:
+                    product_data.update({key: value for key, value in cached[0].items() if key != "marca"})
+                    continue
 
-            try:
-                # Apri l'URL di dettaglio in una nuova scheda
-                driver.execute_script("window.open(arguments[0]);", detail_url)
-                time.sleep(1) # Breve pausa
+                try:
+                    # Apri l'URL di dettaglio in una nuova scheda
+                    driver.execute_script("window.open(arguments[0]);", detail_url)
+                    time.sleep(1) # Breve pausa
 
-                # Passa alla nuova scheda
-                driver.switch_to.window(driver.window_handles[-1])
+                    # Passa alla nuova scheda
+                    driver.switch_to.window(driver.window_handles[-1])
 
-                # Scrape i dati dalla pagina di dettaglio e aggiorna il dizionario product_data
-                scrape_edilportale_detail_page(driver, product_data)
+                    # Scrape i dati dalla pagina di dettaglio e aggiorna il dizionario product_data
+                    scrape_edilportale_detail_page(driver, product_data, sitemap_lastmod.get(detail_url))
 
-                # Il dizionario product_data in all_products_base_data è stato aggiornato direttamente
+                    # Il dizionario product_data in all_products_base_data è stato aggiornato direttamente
 
-                # Chiudi la scheda corrente
-                driver.close()
+                    # Chiudi la scheda corrente
+                    driver.close()
 
-                # Torna alla scheda originale
-                driver.switch_to.window(original_window)
+                    # Torna alla scheda originale
+                    driver.switch_to.window(original_window)
 
-                time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
+                    time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
 
-            except Exception as e:
-                print(f"Errore durante lo scraping della pagina di dettaglio {detail_url}: {e}. Salto e continuo.")
-                # Assicurati di tornare alla finestra originale anche in caso di errore
-                try:
-                     if len(driver.window_handles) > 1:
-                         driver.close()
-                     driver.switch_to.window(original_window)
-                except:
-                     pass
-                # Non facciamo continue qui, l'errore è gestito internamente al try/except
+                except Exception as e:
+                    print(f"Errore durante lo scraping della pagina di dettaglio {detail_url}: {e}. Salto e continuo.")
+                    # Assicurati di tornare alla finestra originale anche in caso di errore
+                    try:
+                         if len(driver.window_handles) > 1:
+                             driver.close()
+                         driver.switch_to.window(original_window)
+                    except:
+                         pass
+                    # Non facciamo continue qui, l'errore è gestito internamente al try/except
 
         print(f"\n--- Fine Fase 2. Scraping dettagli completato. ---")
         print(f"Totale prodotti con dati base e dettaglio raccolti: {len(all_products_base_data)}")
         # Salviamo tutti i dati raccolti, inclusi quelli di dettaglio
+        metrics.record_emitted(len(all_products_base_data))
         save_to_csv(all_products_base_data, OUTPUT_CSV_FILE)
 
+        # Delta rispetto all'esecuzione precedente, accanto allo snapshot completo
+        csv_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_CSV_FILE)
+        FINGERPRINTS.write_delta(all_products_base_data, csv_file_path, "product url",
+                                 complete=FINGERPRINTS.complete(product["product url"] for product in all_products_base_data))
+        FINGERPRINTS.save()
+
     except Exception as e:
         print(f"Errore critico durante l'esecuzione principale: {e}")
 
     finally:
+        if detail_pipeline:
+            detail_pipeline.close()
         # Assicurati che il driver venga chiuso anche in caso di errori
         if driver:
             try:
@@ -1,9 +1,11 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
 import re # Importa il modulo re per le espressioni regolari
+import fetch
+import diagnostics
+import catalog
 
 # Impostazioni iniziali
 # Lista per contenere gli URL delle pagine da scrapare.
@@ -64,9 +66,9 @@ def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -94,9 +96,8 @@ def scrape_fischer_page(url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato su {url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
-        # Stampa una parte dell'HTML per aiutarti a debuggare solo se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR)
         return []
 
 
@@ -273,6 +274,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
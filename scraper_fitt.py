@@ -1,15 +1,39 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import re
 from urllib.parse import urljoin, urlparse
 import logging
+import fetch
+import catalog
+from selectorchain import SelectorChain
 
 # Configurazione logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Catene di selettori di ripiego della scheda prodotto, compilate una volta (vedi selectorchain.py)
+TITLE_CHAIN = SelectorChain("titolo", [
+    'h1.ud_product--intro__title',
+    'h1[class*="product"][class*="title"]',
+    'h1[class*="intro"][class*="title"]',
+    '.product-title h1',
+    'h1'
+])
+DESCRIPTION_CHAIN = SelectorChain("descrizione", [
+    'div.description',
+    '.product-description',
+    '.ud_product--intro__description',
+    '[class*="description"]'
+])
+IMAGE_CHAIN = SelectorChain("immagine", [
+    '.swiper-slide img',
+    '.product-gallery img',
+    '.ud_product img',
+    'img[src*="thron.com"]',
+    '.product-image img'
+])
+
 class FittScraper:
     def __init__(self):
         self.base_url = "https://www.fitt.com"
@@ -29,7 +53,7 @@ class FittScraper:
         """Ottiene il contenuto di una pagina con retry automatico"""
         for attempt in range(retries):
             try:
-                response = self.session.get(url, timeout=10)
+                response = fetch.get(url, session=self.session, timeout=10)
                 response.raise_for_status()
                 return response
             except requests.RequestException as e:
@@ -49,7 +73,7 @@ class FittScraper:
             logger.error("Impossibile accedere alla pagina dei prodotti")
             return []
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         
         # Cerca tutti i link "Scopri di più"
         product_links = []
@@ -94,7 +118,11 @@ class FittScraper:
         if not response:
             return None
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+        return self.parse_product_info(product_url, response.content)
+
+    def parse_product_info(self, product_url, content):
+        """Estrae le informazioni di un prodotto dall'HTML della sua pagina (usato anche da reextract.py)"""
+        soup = fetch.parse_html(content)
         
         product_info = {
             'nome_prodotto': '',
@@ -105,55 +133,25 @@ class FittScraper:
         }
 
         # Estrai nome prodotto
-        title_selectors = [
-            'h1.ud_product--intro__title',
-            'h1[class*="product"][class*="title"]',
-            'h1[class*="intro"][class*="title"]',
-            '.product-title h1',
-            'h1'
-        ]
-        
-        for selector in title_selectors:
-            title_element = soup.select_one(selector)
-            if title_element:
-                product_info['nome_prodotto'] = self.clean_text(title_element.get_text())
-                break
+        title_element = TITLE_CHAIN.select_one(soup)
+        if title_element:
+            product_info['nome_prodotto'] = self.clean_text(title_element.get_text())
 
         # Estrai descrizione
-        desc_selectors = [
-            'div.description',
-            '.product-description',
-            '.ud_product--intro__description',
-            '[class*="description"]'
-        ]
-        
-        for selector in desc_selectors:
-            desc_element = soup.select_one(selector)
-            if desc_element:
-                product_info['descrizione'] = self.clean_text(desc_element.get_text())
-                break
-
-        # Estrai immagine principale
-        img_selectors = [
-            '.swiper-slide img',
-            '.product-gallery img',
-            '.ud_product img',
-            'img[src*="thron.com"]',
-            '.product-image img'
-        ]
-        
-        for selector in img_selectors:
-            img_element = soup.select_one(selector)
-            if img_element:
-                img_src = img_element.get('src')
-                if img_src:
-                    # Se l'URL è relativo, rendilo assoluto
-                    if img_src.startswith('//'):
-                        img_src = 'https:' + img_src
-                    elif img_src.startswith('/'):
-                        img_src = urljoin(self.base_url, img_src)
-                    product_info['immagine'] = img_src
-                    break
+        desc_element = DESCRIPTION_CHAIN.select_one(soup)
+        if desc_element:
+            product_info['descrizione'] = self.clean_text(desc_element.get_text())
+
+        # Estrai immagine principale (il primo elemento di un selettore deve avere un src)
+        img_element = IMAGE_CHAIN.select_one(soup, accept=lambda element: element.get('src'))
+        if img_element:
+            img_src = img_element.get('src')
+            # Se l'URL è relativo, rendilo assoluto
+            if img_src.startswith('//'):
+                img_src = 'https:' + img_src
+            elif img_src.startswith('/'):
+                img_src = urljoin(self.base_url, img_src)
+            product_info['immagine'] = img_src
 
         # Verifica che abbiamo estratto almeno il nome del prodotto
         if not product_info['nome_prodotto']:
@@ -221,6 +219,18 @@ class FittScraper:
                 print(f"\n{i}. {product['nome_prodotto']}")
                 print(f"   Descrizione: {product['descrizione'][:100]}...")
                 print(f"   Immagine: {product['immagine'][:50]}...")
+        catalog.save_records(self.products_data)
+
+_REEXTRACT_SCRAPER = None
+
+def reextract_page(url, content):
+    """Estrazione offline di una pagina archiviata (reextract.py): solo le schede prodotto"""
+    global _REEXTRACT_SCRAPER
+    if '/product/' not in url:
+        return None
+    if _REEXTRACT_SCRAPER is None:
+        _REEXTRACT_SCRAPER = FittScraper()
+    return _REEXTRACT_SCRAPER.parse_product_info(url, content)
 
 def main():
     """Funzione principale"""
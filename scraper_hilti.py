@@ -1,8 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
+import fetch
+import diagnostics
+import catalog
+import jobqueue
+from fingerprint import FingerprintStore, fingerprint
 
 # Impostazioni iniziali
 # Lista per contenere gli URL delle pagine da scrapare.
@@ -120,14 +124,17 @@ PRODUCT_DESCRIPTION_SELECTOR = "dd.product-description-definition"
 # È un tag <img> dentro shrd-uic-image
 PRODUCT_IMAGE_SELECTOR = "shrd-uic-image img"
 
+# Impronte delle pagine di elenco: una pagina con card invariate non viene riestratta
+FINGERPRINTS = FingerprintStore("scraper_hilti")
+
 
 def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -156,11 +163,16 @@ def scrape_hilti_page(url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato su {url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
-        # Stampa una parte dell'HTML per aiutarti a debuggare solo se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR)
         return []
 
+    # Se le card non sono cambiate dall'ultima esecuzione, riusa i prodotti già estratti
+    page_fingerprint = fingerprint(product_containers)
+    cached_products = FINGERPRINTS.unchanged(url, page_fingerprint)
+    if cached_products is not None:
+        print(f"Pagina invariata dall'ultima esecuzione: riutilizzati {len(cached_products)} prodotti.")
+        return cached_products
 
     for i, container in enumerate(product_containers):
         # print(f"Elaborazione prodotto {i+1}/{len(product_containers)} su {url}...") # Messo a commento
@@ -230,6 +242,7 @@ def scrape_hilti_page(url):
             print(f"Errore durante l'elaborazione del contenitore prodotto {i+1} su {url}: {e}")
             continue # Continua con il prossimo prodotto anche in caso di errore su uno
 
+    FINGERPRINTS.update(url, page_fingerprint, products_on_page)
     return products_on_page
 
 
@@ -262,20 +275,65 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
+
+
+def scrape_listing_job(payload, queue):
+    """Handler dei lavori 'listing' della coda: una pagina di elenco, con la sua impronta per il worker che raccoglie."""
+    url = payload["url"]
+    print(f"\n--- Scraping URL: {url} ---")
+    products = scrape_hilti_page(url)
+    if not products:
+        # Pagina non scaricata o senza card: il lavoro viene ritentato (eventualmente da un altro worker)
+        raise RuntimeError(f"Nessun prodotto estratto da {url}")
+    time.sleep(2) # Breve pausa tra le richieste a URL diversi
+    return {"products": products, "page": FINGERPRINTS.page_entry(url)}
+
+
+def scrape_with_queue():
+    """
+    Distribuisce le pagine di elenco sulla coda SCRAPER_QUEUE: ogni processo avviato aggiunge i lavori
+    (senza duplicarli), ne esegue quanti ne trova disponibili e l'ultimo a finire salva i risultati.
+    Restituisce None se i risultati sono stati raccolti da un altro worker.
+    """
+    with jobqueue.JobQueue("scraper_hilti") as queue:
+        queue.put_many("listing", [{"url": url} for url in HILTI_URLS], keys=HILTI_URLS)
+        completed = queue.work({"listing": scrape_listing_job})
+        print(f"Worker {queue.worker}: {completed} pagine completate.")
+        results = queue.collect()
+    if results is None:
+        print("Risultati raccolti da un altro worker.")
+        return None
+    all_products = []
+    for job, result in results:
+        FINGERPRINTS.merge_page(job.payload["url"], result["page"])
+        all_products.extend(result["products"])
+    return all_products
 
 
 if __name__ == "__main__":
     all_scraped_products = []
 
-    # Itera su ogni URL nella lista HILTI_URLS
-    for url in HILTI_URLS:
-        print(f"\n--- Scraping URL: {url} ---")
-        products_from_current_page = scrape_hilti_page(url)
-        all_scraped_products.extend(products_from_current_page) # Aggiunge i prodotti trovati alla lista totale
-        time.sleep(2) # Breve pausa tra le richieste a URL diversi
+    if jobqueue.enabled():
+        all_scraped_products = scrape_with_queue()
+        if all_scraped_products is None:
+            raise SystemExit(0)
+    else:
+        # Itera su ogni URL nella lista HILTI_URLS
+        for url in HILTI_URLS:
+            print(f"\n--- Scraping URL: {url} ---")
+            products_from_current_page = scrape_hilti_page(url)
+            all_scraped_products.extend(products_from_current_page) # Aggiunge i prodotti trovati alla lista totale
+            time.sleep(2) # Breve pausa tra le richieste a URL diversi
 
 
     # Salva tutti i dati raccolti da tutti gli URL in un unico file CSV
     print(f"\nCompletato lo scraping di {len(HILTI_URLS)} URL.")
     print(f"Totale prodotti raccolti: {len(all_scraped_products)}")
     save_to_csv(all_scraped_products, OUTPUT_CSV_FILE)
+
+    # Delta rispetto all'esecuzione precedente, accanto allo snapshot completo
+    csv_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_CSV_FILE)
+    FINGERPRINTS.write_delta(all_scraped_products, csv_file_path, "product_page_url",
+                             complete=FINGERPRINTS.complete(HILTI_URLS))
+    FINGERPRINTS.save()
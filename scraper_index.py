@@ -6,8 +6,12 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import diagnostics
+import metrics
+import catalog
 
 # Impostazioni iniziali
 # Lista di URL iniziali delle pagine di elenco prodotti da cui iniziare lo scraping.
@@ -77,16 +81,6 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "div#product-image img"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_edilportale_detail_page(driver, product_data):
     """
@@ -164,10 +158,8 @@ def scrape_edilportale_listing_page(driver, listing_url):
          print("Pagina lista prodotti caricata (primo prodotto trovato).")
      except TimeoutException:
          print("Timeout nell'attesa dei prodotti nella lista. Potrebbe non esserci nulla su questa pagina o il selettore del contenitore prodotto è errato.")
-         soup_listing_debug = get_soup_from_selenium(driver)
-         if soup_listing_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (Timeout o nessun contenitore trovato):")
-             print(soup_listing_debug.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING, driver.current_url, lambda: driver.page_source)
          return [], None # Restituisce lista vuota di dati e nessun URL successivo
 
 
@@ -185,8 +177,8 @@ def scrape_edilportale_listing_page(driver, listing_url):
 
      if not product_containers:
          print(f"Nessun contenitore prodotto trovato su {listing_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-         print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-         print(soup_listing.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
          pass # Continua per cercare il link di paginazione
 
      for i, container in enumerate(product_containers):
@@ -259,6 +251,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -268,7 +261,8 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
 
 
         # Lista per raccogliere TUTTI i dati base dei prodotti dalle pagine di elenco
@@ -322,7 +316,7 @@ if __name__ == "__main__":
         # Ottieni l'handle della finestra corrente (dopo l'ultima pagina di elenco visitata)
         original_window = driver.current_window_handle
 
-        for i, product_data in enumerate(all_products_base_data): # Iteriamo sui dati base raccolti
+        for i, product_data in enumerate(metrics.track_loop(all_products_base_data, "dettaglio")): # Iteriamo sui dati base raccolti
             detail_url = product_data["product url"]
             print(f"Scraping dettaglio prodotto {i+1}/{len(all_products_base_data)}: {detail_url}")
 
@@ -363,6 +357,7 @@ if __name__ == "__main__":
         print(f"\n--- Fine Fase 2. Scraping dettagli completato. ---")
         print(f"Totale prodotti con dati base raccolti: {len(all_products_base_data)}")
         # Salviamo tutti i dati raccolti, inclusi quelli di dettaglio
+        metrics.record_emitted(len(all_products_base_data))
         save_to_csv(all_products_base_data, OUTPUT_CSV_FILE)
 
     except Exception as e:
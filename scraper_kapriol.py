@@ -6,9 +6,16 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import time # Importa time per le pause
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import harvest
+import diagnostics
+import metrics
+import catalog
+import pipeline
+import pagefetch
 
 # Impostazioni iniziali
 # URL della pagina del brand Kapriol su Adipietro Commerciale.
@@ -63,17 +70,62 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "div.images-container picture img"
 
 # Configurazione di Selenium WebDriver
 driver = None
+detail_pipeline = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
+
+def parse_kapriol_detail_page(soup, detail_url):
+    """
+    Estrae nome, descrizione e URL immagine dall'HTML (BeautifulSoup) di una pagina di dettaglio,
+    renderizzata nel browser o scaricata con fetch() in pagina.
+    """
+    product_detail_data = {
+        "name": "N/A",
+        "brand": "Kapriol", # Marca fissa
+        "description": "N/A",
+        "price": "N/A", # Il prezzo potrebbe non essere sempre visibile o con un selettore standard
+        "image_url": "N/A",
+        "product_page_url": detail_url # L'URL della pagina di dettaglio stessa
+    }
+
+    # Estrai il Nome del prodotto
+    name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
+    if name_tag:
+        product_detail_data["name"] = name_tag.get_text(strip=True)
+        # print(f"   Trovato Nome: {product_detail_data['name']}") # DEBUG
+
+
+    # Estrai la Descrizione
+    description_tag = soup.select_one(PRODUCT_DESCRIPTION_SELECTOR_DETAIL)
+    if description_tag:
+        # Estrai il testo mantenendo la formattazione base dei paragrafi se presenti
+        description_text = description_tag.get_text(separator='\n', strip=True)
+        if description_text:
+            product_detail_data["description"] = description_text
+            # print(f"   Trovata Descrizione (snippet): {product_detail_data['description'][:70]}...") # DEBUG
+        # else: Nessun testo nella descrizione, rimane N/A
+    # else: Elementi descrizione non trovati, rimane N/A
+
+
+    # Estrai l'URL dell'immagine
+    # Usiamo il selettore più specifico che hai fornito
+    img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
+    if img_tag and img_tag.has_attr('src'):
+         image_src = img_tag['src']
+         # Usa urljoin per costruire l'URL completo, gestisce la codifica
+         if image_src and not image_src.startswith('data:'): # Ignora placeholder data:image
+             # Preferiamo l'attributo data-full-size-image-url se presente, altrimenti usiamo src.
+             full_size_image_src = img_tag.get('data-full-size-image-url')
+             if full_size_image_src:
+                 product_detail_data["image_url"] = urljoin(BASE_URL, full_size_image_src)
+             else:
+                 product_detail_data["image_url"] = urljoin(BASE_URL, image_src)
+
+             # print(f"   Trovata Immagine: {product_detail_data['image_url']}") # DEBUG
+         # else: image_url rimane N/A se placeholder o vuoto
+    # else: img_tag non trovato o senza src, image_url rimane N/A
+
+    return product_detail_data
 
 
 def scrape_kapriol_detail_page(driver, detail_url):
@@ -105,44 +157,7 @@ def scrape_kapriol_detail_page(driver, detail_url):
              print("   Impossibile ottenere la soup dalla pagina di dettaglio.")
              return product_detail_data # Restituisce dati parziali se non si ottiene la soup
 
-
-        # Estrai il Nome del prodotto
-        name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
-        if name_tag:
-            product_detail_data["name"] = name_tag.get_text(strip=True)
-            # print(f"   Trovato Nome: {product_detail_data['name']}") # DEBUG
-
-
-        # Estrai la Descrizione
-        description_tag = soup.select_one(PRODUCT_DESCRIPTION_SELECTOR_DETAIL)
-        if description_tag:
-            # Estrai il testo mantenendo la formattazione base dei paragrafi se presenti
-            description_text = description_tag.get_text(separator='\n', strip=True)
-            if description_text:
-                product_detail_data["description"] = description_text
-                # print(f"   Trovata Descrizione (snippet): {product_detail_data['description'][:70]}...") # DEBUG
-            # else: Nessun testo nella descrizione, rimane N/A
-        # else: Elementi descrizione non trovati, rimane N/A
-
-
-        # Estrai l'URL dell'immagine
-        # Usiamo il selettore più specifico che hai fornito
-        img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
-        if img_tag and img_tag.has_attr('src'):
-             image_src = img_tag['src']
-             # Usa urljoin per costruire l'URL completo, gestisce la codifica
-             if image_src and not image_src.startswith('data:'): # Ignora placeholder data:image
-                 # Preferiamo l'attributo data-full-size-image-url se presente, altrimenti usiamo src.
-                 full_size_image_src = img_tag.get('data-full-size-image-url')
-                 if full_size_image_src:
-                     product_detail_data["image_url"] = urljoin(BASE_URL, full_size_image_src)
-                 else:
-                     product_detail_data["image_url"] = urljoin(BASE_URL, image_src)
-
-                 # print(f"   Trovata Immagine: {product_detail_data['image_url']}") # DEBUG
-             # else: image_url rimane N/A se placeholder o vuoto
-        # else: img_tag non trovato o senza src, image_url rimane N/A
-
+        product_detail_data = parse_kapriol_detail_page(soup, detail_url)
 
     # Cattura eccezioni specifiche di Selenium durante la navigazione della pagina di dettaglio
     except (TimeoutException, NoSuchElementException) as e:
@@ -153,10 +168,17 @@ def scrape_kapriol_detail_page(driver, detail_url):
     return product_detail_data
 
 
-def scrape_kapriol_listing_page_for_product_urls(driver, listing_url, product_limit):
+def parse_kapriol_fetched_page(detail_url, soup):
+    """Dati di una pagina di dettaglio scaricata con fetch() in pagina; None se il nome manca (la pagina va aperta nel browser)."""
+    product_detail_data = parse_kapriol_detail_page(soup, detail_url)
+    return product_detail_data if product_detail_data["name"] != "N/A" else None
+
+
+def scrape_kapriol_listing_page_for_product_urls(driver, listing_url, product_limit, on_urls=None):
      """
      Naviga a una pagina di elenco (o brand), scorre per caricare i prodotti fino al limite
      o finché non ce ne sono più, raccoglie gli URL e trova l'URL pagina successiva.
+     Con `on_urls` gli URL di ogni scroll vengono passati subito alla callback (es. la pipeline dei dettagli).
      """
      print(f"Navigazione Pagina Lista Prodotti e scrolling per caricare (limite: {product_limit} prodotti): {listing_url}")
      driver.get(listing_url)
@@ -168,78 +190,26 @@ def scrape_kapriol_listing_page_for_product_urls(driver, listing_url, product_li
          print("Pagina lista prodotti caricata (primo prodotto trovato).")
      except TimeoutException:
          print("Timeout nell'attesa dei prodotti nella lista. Potrebbe non esserci nulla su questa pagina o il selettore del contenitore prodotto è errato.")
-         soup_listing_debug = get_soup_from_selenium(driver)
-         if soup_listing_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (Timeout o nessun contenitore trovato):")
-             print(soup_listing_debug.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING, driver.current_url, lambda: driver.page_source)
          return [], None # Restituisce lista vuota di URL e nessun URL successivo
 
-     # --- Implementazione dello scrolling per il lazy loading ---
-     last_product_count = 0
-     consecutive_no_growth = 0 # Contatore per scroll senza nuovi prodotti
-     max_consecutive_no_growth = 5 # Numero di scroll senza crescita per fermarsi
-     scroll_attempts = 0
-     max_scroll_attempts = 100 # Limite massimo di tentativi di scroll assoluto
-     scroll_pause_time = 2 # Secondi da attendere dopo ogni scroll
-
+     # --- Scrolling incrementale per il lazy loading ---
+     # Lo script iniettato restituisce a ogni scroll solo i link dei prodotti appena aggiunti
+     # (un round trip per scroll) e lo scrolling si ferma quando la lista smette di crescere.
      print("Inizio scrolling per caricare prodotti...")
-
-     # Raccogli URL progressivamente durante lo scrolling per controllare il limite
-     product_detail_urls_on_page = []
-     seen_urls_on_page = set()
-
-     while True:
-         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-         time.sleep(scroll_pause_time) # Attendi che i nuovi prodotti si carichino
-
-         scroll_attempts += 1
-
-         # Ottieni tutti i contenitori prodotto attuali
-         product_containers = driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LISTING)
-         current_product_count = len(product_containers)
-         print(f"  Dopo scroll {scroll_attempts}: prodotti trovati finora: {current_product_count}")
-
-         # Raccogli i nuovi URL aggiunti durante questo scroll
-         newly_added_urls = []
-         for container in product_containers:
-             try:
-                 detail_link_tag = container.find_element(By.CSS_SELECTOR, PRODUCT_DETAIL_LINK_SELECTOR_LISTING)
-                 detail_url = detail_link_tag.get_attribute('href')
-                 if detail_url:
-                      full_detail_url = urljoin(BASE_URL, detail_url)
-                      if full_detail_url not in seen_urls_on_page:
-                           newly_added_urls.append(full_detail_url)
-                           seen_urls_on_page.add(full_detail_url)
-             except NoSuchElementException:
-                  continue # Salta se il link non si trova nel container (non dovrebbe succedere con selettori corretti)
-             except Exception as e:
-                  print(f"Errore durante la raccolta URL in scrolling: {e}. Salto.")
-                  continue
-
-         product_detail_urls_on_page.extend(newly_added_urls)
-
-         # Controlla se abbiamo raggiunto il limite di prodotti
-         if product_limit is not None and len(product_detail_urls_on_page) >= product_limit:
-              print(f"Limite di {product_limit} prodotti raggiunto. Interruzione scrolling.")
-              break # Esci dal loop di scrolling
-
-         # Logica per fermare lo scrolling se non vengono caricati nuovi prodotti
-         if current_product_count == last_product_count:
-             consecutive_no_growth += 1
-             print(f"  Nessun nuovo prodotto caricato. Conteggio consecutivo senza crescita: {consecutive_no_growth}")
-         else:
-             consecutive_no_growth = 0 # Reimposta il contatore se nuovi prodotti sono stati trovati
-
-         last_product_count = current_product_count # Aggiorna il conteggio per il prossimo ciclo
-
-         # Condizioni di uscita dal loop di scrolling
-         if consecutive_no_growth >= max_consecutive_no_growth or scroll_attempts >= max_scroll_attempts:
-              print("Criterio di interruzione scrolling raggiunto (nessuna nuova crescita o max tentativi).")
-              break
-
+     detail_urls = harvest.harvest_infinite_scroll(
+         driver,
+         PRODUCT_CONTAINER_SELECTOR_LISTING,
+         PRODUCT_DETAIL_LINK_SELECTOR_LISTING,
+         limit=product_limit,
+         on_values=(lambda urls: on_urls([urljoin(BASE_URL, url) for url in urls])) if on_urls else None,
+     )
+     # Gli href letti dal browser sono già assoluti; urljoin per sicurezza, senza duplicati
+     product_detail_urls_on_page = list(dict.fromkeys(urljoin(BASE_URL, url) for url in detail_urls))
 
      print(f"Scrolling completato. Totale URL raccolti durante scrolling: {len(product_detail_urls_on_page)}")
-     # --- Fine implementazione scrolling ---
+     # --- Fine scrolling ---
 
      # Cerca il link per la pagina successiva dopo lo scrolling (potrebbe non esserci)
      soup_listing = get_soup_from_selenium(driver)
@@ -281,6 +251,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -290,7 +261,15 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
+
+        # Con SCRAPER_PIPELINE_WORKERS > 0 i dettagli vengono elaborati da browser dedicati durante lo scroll
+        if pipeline.enabled():
+            detail_pipeline = pipeline.DetailPipeline(
+                scrape_kapriol_detail_page,
+                open_worker=lambda: prepare_driver(browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))),
+                close_worker=lambda worker: worker.quit())
 
 
         all_scraped_products = []
@@ -310,7 +289,8 @@ if __name__ == "__main__":
             # Chiama la funzione modificata che include lo scrolling e il limite
             # Passiamo il limite rimanente per la raccolta URL su questa pagina
             remaining_limit = PRODUCT_LIMIT - len(all_product_detail_urls_collected) if PRODUCT_LIMIT is not None else None
-            detail_urls_on_page, next_listing_url = scrape_kapriol_listing_page_for_product_urls(driver, current_listing_url, remaining_limit)
+            detail_urls_on_page, next_listing_url = scrape_kapriol_listing_page_for_product_urls(
+                driver, current_listing_url, remaining_limit, on_urls=detail_pipeline.submit_many if detail_pipeline else None)
 
             # Aggiungi gli URL trovati nella pagina corrente alla lista complessiva
             all_product_detail_urls_collected.extend(detail_urls_on_page)
@@ -332,47 +312,64 @@ if __name__ == "__main__":
         # --- Fase 2: Scraping di ogni pagina di dettaglio prodotto ---
         print("\n--- Fase 2: Scraping Dettagli Prodotti ---")
 
-        # Ottieni l'handle della finestra corrente
-        original_window = driver.current_window_handle
-
-        # Iteriamo solo sugli URL unici (e limitati) raccolti nella Fase 1
-        for i, detail_url in enumerate(all_product_detail_urls_unique):
-            print(f"Scraping dettaglio prodotto {i+1}/{len(all_product_detail_urls_unique)}: {detail_url}")
+        if detail_pipeline:
+            # I dettagli sono stati elaborati dai worker durante la Fase 1: si attende la fine della coda
+            for product_detail in detail_pipeline.close():
+                if product_detail and product_detail.get("name") != "N/A":
+                    all_scraped_products.append(product_detail)
+                    metrics.record_emitted()
+        else:
+            detail_urls_to_open = all_product_detail_urls_unique
+            # Con SCRAPER_INPAGE_FETCH le pagine di dettaglio si scaricano con fetch() dalla pagina brand
+            # già aperta (stessi cookie del browser); solo quelle non estraibili così vengono aperte in una scheda
+            if pagefetch.enabled():
+                fetched_products, detail_urls_to_open = pagefetch.scrape_in_page(
+                    driver, all_product_detail_urls_unique, parse_kapriol_fetched_page)
+                all_scraped_products.extend(fetched_products)
+                metrics.record_emitted(len(fetched_products))
+
+            # Ottieni l'handle della finestra corrente
+            original_window = driver.current_window_handle
+
+            # Iteriamo solo sugli URL unici (e limitati) raccolti nella Fase 1
+            for i, detail_url in enumerate(metrics.track_loop(detail_urls_to_open, "dettaglio")):
+                print(f"Scraping dettaglio prodotto {i+1}/{len(detail_urls_to_open)}: {detail_url}")
 
-            try:
-                # Apri l'URL di dettaglio in una nuova scheda
-                driver.execute_script("window.open(arguments[0]);", detail_url)
-                time.sleep(1) # Breve pausa
+                try:
+                    # Apri l'URL di dettaglio in una nuova scheda
+                    driver.execute_script("window.open(arguments[0]);", detail_url)
+                    time.sleep(1) # Breve pausa
 
-                # Passa alla nuova scheda
-                driver.switch_to.window(driver.window_handles[-1])
+                    # Passa alla nuova scheda
+                    driver.switch_to.window(driver.window_handles[-1])
 
-                # Scrape i dati dalla pagina di dettaglio
-                product_detail = scrape_kapriol_detail_page(driver, detail_url)
+                    # Scrape i dati dalla pagina di dettaglio
+                    product_detail = scrape_kapriol_detail_page(driver, detail_url)
 
-                # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
-                if product_detail and product_detail.get("name") != "N/A":
-                    all_scraped_products.append(product_detail)
-                    # Non controlliamo più il limite qui, è gestito dalla lista di URL in input a questo loop
+                    # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
+                    if product_detail and product_detail.get("name") != "N/A":
+                        all_scraped_products.append(product_detail)
+                        metrics.record_emitted()
+                        # Non controlliamo più il limite qui, è gestito dalla lista di URL in input a questo loop
 
-                # Chiudi la scheda corrente
-                driver.close()
+                    # Chiudi la scheda corrente
+                    driver.close()
 
-                # Torna alla scheda originale
-                driver.switch_to.window(original_window)
+                    # Torna alla scheda originale
+                    driver.switch_to.window(original_window)
 
-                time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
+                    time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
 
-            except Exception as e:
-                print(f"Errore durante lo scraping della pagina di dettaglio {detail_url}: {e}. Salto.")
-                # Assicurati di tornare alla finestra originale anche in caso di errore
-                try:
-                     if len(driver.window_handles) > 1:
-                         driver.close()
-                     driver.switch_to.window(original_window)
-                except:
-                     pass
-                continue
+                except Exception as e:
+                    print(f"Errore durante lo scraping della pagina di dettaglio {detail_url}: {e}. Salto.")
+                    # Assicurati di tornare alla finestra originale anche in caso di errore
+                    try:
+                         if len(driver.window_handles) > 1:
+                             driver.close()
+                         driver.switch_to.window(original_window)
+                    except:
+                         pass
+                    continue
 
 
         print(f"\n--- Fine Fase 2. Scraping dettagli completato. ---")
@@ -383,6 +380,8 @@ if __name__ == "__main__":
         print(f"Errore critico durante l'esecuzione principale: {e}")
 
     finally:
+        if detail_pipeline:
+            detail_pipeline.close()
         # Assicurati che il driver venga chiuso anche in caso di errori
         if driver:
             try:
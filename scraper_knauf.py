@@ -6,7 +6,9 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
+from fetch import get_page_source, prepare_driver, parse_html
+import catalog
+import consent
 
 # Impostazioni iniziali
 KNAUF_URL = "https://knauf.com/it-IT/p/prodotti"
@@ -47,6 +49,7 @@ try:
     # driver = webdriver.Chrome(options=chrome_options)
 
     driver = webdriver.Chrome() # O webdriver.Firefox(), webdriver.Edge(), ecc.
+    driver = prepare_driver(driver)
 
 except Exception as e:
     print(f"Errore nell'inizializzazione del WebDriver: {e}")
@@ -74,9 +77,9 @@ def scrape_knauf_products(url):
         # Possibile che la pagina non abbia prodotti o il selettore sia sbagliato
         print("Nessun prodotto iniziale trovato. Controlla l'URL o il selettore.")
         # Ottieni l'HTML anche in caso di timeout iniziale per vedere se c'è qualcosa
-        page_source = driver.page_source
+        page_source = get_page_source(driver)
         driver.quit()
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = parse_html(page_source)
         product_containers_on_timeout = soup.select(PRODUCT_CONTAINER_SELECTOR)
         if not product_containers_on_timeout:
              return [] # Nessun prodotto trovato nemmeno nell'HTML iniziale
@@ -86,6 +89,9 @@ def scrape_knauf_products(url):
              pass # Continua al codice di estrazione sotto
 
 
+    # Chiudi il banner dei cookie, che altrimenti intercetta i click su "Mostra di più"
+    consent.dismiss(driver, consent.ONETRUST)
+
     # Cicla per cliccare sul pulsante "Mostra di più"
     while True:
         try:
@@ -141,7 +147,7 @@ def scrape_knauf_products(url):
     # Se il timeout iniziale è scattato e siamo arrivati qui, l'HTML è già stato ottenuto
     # altrimenti lo otteniamo ora.
     try:
-        page_source = driver.page_source
+        page_source = get_page_source(driver)
         print("Ottenuto l'HTML finale della pagina.")
     except Exception as e:
         print(f"Errore nell'ottenere la page_source dopo il caricamento: {e}")
@@ -158,7 +164,7 @@ def scrape_knauf_products(url):
     print("Browser chiuso.")
 
     # Usa BeautifulSoup per analizzare l'HTML
-    soup = BeautifulSoup(page_source, 'html.parser')
+    soup = parse_html(page_source)
 
     all_products_data = []
 
@@ -302,6 +308,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -317,6 +324,7 @@ if __name__ == "__main__":
         # driver = webdriver.Chrome(options=chrome_options)
 
         driver = webdriver.Chrome() # O webdriver.Firefox(), webdriver.Edge(), ecc.
+        driver = prepare_driver(driver)
 
     except Exception as e:
         print(f"Errore nell'inizializzazione del WebDriver: {e}")
@@ -1,5 +1,4 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import json
 import csv
@@ -9,7 +8,26 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from fetch import prepare_driver
+import loadmore
+import catalog
+
+LOAD_MORE_SELECTOR = "a.button.full.loadMore"
+
+# Campi letti da ogni article.post dell'elenco (vedi extraction.extract_records)
+LISTING_FIELDS = {
+    "nome": ("p.entry-title", "text"),
+    "descrizione": ("p.entry-content", "text"),
+    "immagine": ("img.entry-thumb", "src"),
+    "link": ("a", "href"),
+}
+
+
+def product_key(record):
+    """Chiave di deduplicazione: due prodotti con gli stessi campi sono lo stesso prodotto."""
+    return (record["nome"], record["descrizione"], record["immagine"], record["link"])
+
 
 class LecaScraper:
     def __init__(self, headless=True):
@@ -33,6 +51,7 @@ class LecaScraper:
         
         try:
             self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver = prepare_driver(self.driver)
             print("Browser Chrome avviato con successo")
         except Exception as e:
             print(f"Errore nell'avvio di Chrome: {e}")
@@ -42,10 +61,11 @@ class LecaScraper:
             if self.headless:
                 firefox_options.add_argument("--headless")
             self.driver = webdriver.Firefox(options=firefox_options)
+            self.driver = prepare_driver(self.driver)
             print("Browser Firefox avviato con successo")
             
     def extract_products_from_page(self):
-        """Estrae i prodotti dalla pagina attuale"""
+        """Estrae i prodotti comparsi nella pagina dall'ultima estrazione"""
         # Attendi che i prodotti siano caricati
         try:
             WebDriverWait(self.driver, 10).until(
@@ -55,76 +75,31 @@ class LecaScraper:
             print("Timeout durante l'attesa del caricamento dei prodotti")
             return []
         
-        # Ottieni il contenuto HTML aggiornato
-        html_content = self.driver.page_source
-        soup = BeautifulSoup(html_content, "html.parser")
-        
-        # Trova tutti gli articoli di prodotto
-        product_articles = soup.find_all("article", class_="post")
-        print(f"Trovati {len(product_articles)} prodotti nella pagina corrente")
+        # Solo gli articoli aggiunti dall'ultimo click, già deduplicati dal motore "carica altri"
+        records = self.loader.fresh()
+        print(f"Trovati {len(records)} nuovi prodotti nella pagina corrente")
         
         new_products = []
-        for article in product_articles:
-            try:
-                product_link = article.find("a")["href"] if article.find("a") else None
-                product_name = article.find("p", class_="entry-title").text.strip() if article.find("p", class_="entry-title") else None
-                product_description = article.find("p", class_="entry-content").text.strip() if article.find("p", class_="entry-content") else None
-                product_image = article.find("img", class_="entry-thumb")["src"] if article.find("img", class_="entry-thumb") else None
-                
-                product = {
-                    "nome": product_name,
-                    "Marca": "Leca",
-                    "descrizione": product_description,
-                    "immagine": product_image,
-                    "link": product_link
-                }
-                
-                # Verifica che il prodotto non sia già nella lista
-                if product not in self.products and all(product.get(key) for key in ["nome", "immagine"]):
-                    new_products.append(product)
-            except Exception as e:
-                print(f"Errore nell'estrazione di un prodotto: {e}")
+        for record in records:
+            product = {
+                "nome": record["nome"],
+                "Marca": "Leca",
+                "descrizione": record["descrizione"],
+                "immagine": record["immagine"],
+                "link": record["link"]
+            }
+            new_products.append(product)
         
         return new_products
     
     def click_load_more(self):
-        """Clicca sul pulsante 'Carica altri' se disponibile"""
+        """Clicca sul pulsante 'Carica altri' se disponibile e attende i nuovi prodotti"""
         try:
-            # Verifica se il pulsante esiste
-            load_more_button = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a.button.full.loadMore"))
-            )
-            
-            # Verifica se il pulsante è visibile e cliccabile
-            if load_more_button.is_displayed():
-                # Scrolla fino al pulsante
-                self.driver.execute_script("arguments[0].scrollIntoView(true);", load_more_button)
-                time.sleep(1)  # Piccola pausa per assicurarsi che il pulsante sia visibile
-                
-                # Clicca sul pulsante
-                load_more_button.click()
+            if self.loader.click(wait=5):
                 print("Pulsante 'Carica altri' cliccato con successo")
-                
-                # Attendi che i nuovi prodotti siano caricati
-                time.sleep(2)
                 return True
-            else:
-                print("Pulsante 'Carica altri' non visibile")
-                return False
-                
-        except TimeoutException:
             print("Pulsante 'Carica altri' non trovato - probabilmente non ci sono più prodotti da caricare")
             return False
-        except ElementClickInterceptedException:
-            print("Impossibile cliccare sul pulsante - potrebbe essere coperto da un altro elemento")
-            # Tenta di cliccare con JavaScript
-            try:
-                self.driver.execute_script("arguments[0].click();", load_more_button)
-                time.sleep(2)
-                return True
-            except Exception as e:
-                print(f"Errore anche con JavaScript: {e}")
-                return False
         except Exception as e:
             print(f"Errore durante il click sul pulsante 'Carica altri': {e}")
             return False
@@ -135,7 +110,8 @@ class LecaScraper:
             # Apri la pagina dei prodotti
             print(f"Navigando verso {self.base_url}...")
             self.driver.get(self.base_url)
-            time.sleep(3)  # Attendi il caricamento iniziale
+            self.loader = loadmore.LoadMoreHarvester(self.driver, "article.post", LISTING_FIELDS, LOAD_MORE_SELECTOR,
+                                                     key=product_key, required=("nome", "immagine"))
             
             # Estrai i prodotti dalla prima pagina
             initial_products = self.extract_products_from_page()
@@ -151,12 +127,8 @@ class LecaScraper:
                     # Estrai i prodotti dalla pagina aggiornata
                     new_products = self.extract_products_from_page()
                     
-                    # Aggiungi solo i nuovi prodotti non già presenti nella lista
-                    new_count = 0
-                    for product in new_products:
-                        if product not in self.products:
-                            self.products.append(product)
-                            new_count += 1
+                    self.products.extend(new_products)
+                    new_count = len(new_products)
                     
                     print(f"Aggiunti {new_count} nuovi prodotti dopo il click #{click_count+1}")
                     
@@ -200,6 +172,7 @@ class LecaScraper:
             print(f"Prodotti salvati in {filename}")
         except Exception as e:
             print(f"Errore nel salvataggio del file CSV: {e}")
+        catalog.save_records(self.products)
     
     def save_to_json(self, filename="prodotti_leca.json"):
         """Salva i prodotti in un file JSON"""
@@ -1,8 +1,9 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
+import fetch
+import catalog
 
 # Impostazioni iniziali
 # L'URL iniziale della prima pagina
@@ -27,9 +28,9 @@ def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -157,6 +158,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
 from urllib.parse import urljoin, urlparse # Importa urljoin e urlparse per debug
+import fetch
+import diagnostics
+import catalog
+import pagination
 
 # Impostazioni iniziali
 # Lista per contenere gli URL delle pagine di catalogo da cui iniziare lo scraping.
@@ -58,9 +61,9 @@ def get_soup(url):
     """Invia una richiesta GET all'URL e restituisce un oggetto BeautifulSoup."""
     try:
         print(f"Fetching URL: {url}")
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = fetch.get(url, headers=HEADERS, timeout=15)
         response.raise_for_status() # Solleva un'eccezione per stati di errore (4xx, 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = fetch.parse_html(response.content)
         return soup
     except requests.exceptions.Timeout:
         print(f"Timeout durante la richiesta a {url}")
@@ -69,16 +72,17 @@ def get_soup(url):
         print(f"Errore durante la richiesta a {url}: {e}")
         return None
 
-def scrape_maurer_page(url):
+def scrape_maurer_category(start_url):
     """
-    Scarica una singola pagina di elenco prodotti Maurer, estrae nome e immagine,
-    e trova l'URL della pagina successiva (se esiste).
+    Scarica tutte le pagine di elenco di una categoria a partire da `start_url`.
+    Le pagine successive alla prima vengono scaricate in parallelo quando lo schema
+    di paginazione è riconoscibile (vedi pagination.py).
     """
-    soup = get_soup(url)
-    if not soup:
-        # get_soup ha già stampato un messaggio di errore
-        return [], None # Restituisce lista vuota di prodotti e nessun URL successivo
+    return pagination.crawl(start_url, get_soup, extract_maurer_products, find_next_page_url, delay=2)
 
+
+def extract_maurer_products(soup, url):
+    """Estrae nome e immagine dei prodotti di una pagina di elenco già scaricata."""
     products_on_page = []
 
     # Trova tutti i contenitori prodotto nella pagina corrente
@@ -88,9 +92,8 @@ def scrape_maurer_page(url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato su {url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR}'.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR)
         # Anche se non trova prodotti, controlla se c'è un link alla pagina successiva
         pass # Continua per cercare il link di paginazione
 
@@ -169,7 +172,11 @@ def scrape_maurer_page(url):
             print(f"Errore durante l'elaborazione del contenitore prodotto {i+1} su {url}: {e}")
             continue # Continua con il prossimo prodotto anche in caso di errore su uno
 
-    # Cerca il link per la pagina successiva
+    return products_on_page
+
+
+def find_next_page_url(soup, url):
+    """URL completo della pagina di elenco successiva, o None sull'ultima pagina."""
     # Il link della paginazione potrebbe trovarsi all'interno di una lista (ul)
     # Cerchiamo un link con la classe page-link e l'attributo aria-label='Next'
     next_page_link = soup.select_one(NEXT_PAGE_SELECTOR)
@@ -182,8 +189,7 @@ def scrape_maurer_page(url):
         # potrebbe non essere strettamente necessario se non contengono caratteri speciali
         next_listing_url = urljoin(BASE_URL, relative_next_url)
 
-
-    return products_on_page, next_listing_url
+    return next_listing_url
 
 
 def save_to_csv(data, filename):
@@ -215,6 +221,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -222,27 +229,13 @@ if __name__ == "__main__":
 
     # Itera su ogni URL iniziale fornito
     for start_listing_url in MAURER_URLS:
-        current_listing_url = start_listing_url
+        print(f"\n--- Scraping Categoria: {start_listing_url} ---")
 
-        # Loop per gestire la paginazione delle pagine di elenco per questa categoria
-        while current_listing_url:
-            print(f"\n--- Scraping Pagina di Elenco: {current_listing_url} ---")
-
-            # Scrape la pagina corrente ed ottieni l'URL della pagina successiva
-            products_on_page, next_listing_url = scrape_maurer_page(current_listing_url)
-
-            # Aggiungi i prodotti trovati sulla pagina corrente alla lista totale
-            all_scraped_products.extend(products_on_page)
-
-            # Passa all'URL della pagina di elenco successiva per la prossima iterazione del ciclo while
-            current_listing_url = next_listing_url
-            if current_listing_url:
-                print(f"Passando alla pagina di elenco successiva: {current_listing_url}")
-                time.sleep(2) # Pausa tra le pagine di elenco
-            else:
-                print("\nNessuna pagina di elenco successiva trovata per questa categoria.")
+        # Tutte le pagine di elenco della categoria (in parallelo se lo schema di paginazione è riconosciuto)
+        all_scraped_products.extend(scrape_maurer_category(start_listing_url))
 
         print(f"\nCompletato lo scraping per l'URL iniziale {start_listing_url}.")
+        time.sleep(2) # Pausa tra le categorie
 
 
     # Salva tutti i dati raccolti da tutte le pagine in un unico file CSV
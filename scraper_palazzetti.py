@@ -6,8 +6,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin # Utile per costruire URL completi
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import diagnostics
+import metrics
+import catalog
+import pipeline
 
 # Impostazioni iniziali
 # URL della pagina iniziale con le macro-categorie
@@ -43,18 +48,9 @@ BASE_URL = "https://palazzetti.it"
 
 # Configurazione di Selenium WebDriver
 driver = None
+detail_pipeline = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def collect_links_from_listing(driver, url, item_container_selector, item_link_selector):
     """
@@ -70,11 +66,8 @@ def collect_links_from_listing(driver, url, item_container_selector, item_link_s
         print("Pagina caricata (primo contenitore trovato).")
     except TimeoutException:
         print(f"Timeout nell'attesa dei contenitori ('{item_container_selector}') su {url}. Potrebbe non esserci nulla o il selettore non è corretto.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        soup_debug = get_soup_from_selenium(driver)
-        if soup_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-             print(soup_debug.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(item_container_selector, driver.current_url, lambda: driver.page_source)
         return [] # Restituisce lista vuota se non trova contenitori
 
 
@@ -90,9 +83,8 @@ def collect_links_from_listing(driver, url, item_container_selector, item_link_s
 
     if not item_containers:
         print(f"Nessun contenitore trovato su {url}. Controlla il selettore '{item_container_selector}'.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(item_container_selector)
         return [] # Restituisce lista vuota
 
     collected_urls = []
@@ -286,6 +278,7 @@ def save_to_csv(data, filename):
         print(f"Dati salvati in {csv_file_path}")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -301,7 +294,16 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
+
+        # Con SCRAPER_PIPELINE_WORKERS > 0 i dettagli vengono elaborati da browser dedicati mentre la
+        # Fase 3 raccoglie ancora le URL delle categorie successive
+        if pipeline.enabled():
+            detail_pipeline = pipeline.DetailPipeline(
+                scrape_palazzetti_product_detail,
+                open_worker=lambda: prepare_driver(browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))),
+                close_worker=lambda worker: worker.quit())
 
 
         all_scraped_products = []
@@ -347,6 +349,8 @@ if __name__ == "__main__":
             print(f"\nElaborazione Categoria {i+1}/{len(category_urls)}: {category_url}")
             current_product_urls = collect_links_from_listing(driver, category_url, LISTING_ITEM_CONTAINER_SELECTOR, LISTING_ITEM_LINK_SELECTOR)
             product_detail_urls.extend(current_product_urls)
+            if detail_pipeline:
+                detail_pipeline.submit_many(current_product_urls)
             print(f"Totale URL prodotti raccolti finora: {len(product_detail_urls)}")
             time.sleep(1) # Pausa tra le categorie
 
@@ -358,62 +362,70 @@ if __name__ == "__main__":
 
         # --- Fase 4: Scraping dei Dettagli per ogni Prodotto ---
         print("\n--- Fase 4: Scraping Dettagli Prodotti ---")
-        # Ottieni l'handle della finestra corrente prima di aprire nuove schede
-        original_window = driver.current_window_handle
-
-        # Limita l'iterazione agli URL raccolti, fino al limite di prodotti
-        # Non è necessario tagliare la lista qui se i controlli sono all'interno del loop
-        # product_detail_urls_to_scrape = product_detail_urls[:PRODUCT_TOTAL_LIMIT] # Rimosso taglio lista
-
-        for i, product_url in enumerate(product_detail_urls):
-            # Rimosso: if len(all_scraped_products) >= PRODUCT_TOTAL_LIMIT:
-            # Rimosso: print(f"Limite totale di {PRODUCT_TOTAL_LIMIT} prodotti raggiunto. Interruzione scraping dei dettagli.")
-            # Rimosso: break # Esci dal loop dei dettagli se il limite è raggiunto
-
-            print(f"\nScraping Prodotto {len(all_scraped_products) + 1} (URL {i+1}/{len(product_detail_urls)}): {product_url}")
-
-            try:
-                # Apri l'URL di dettaglio in una nuova scheda
-                driver.execute_script("window.open(arguments[0]);", product_url)
-                time.sleep(1) # Breve pausa per permettere alla nuova scheda di aprirsi
-
-                # Passa alla nuova scheda
-                driver.switch_to.window(driver.window_handles[-1])
-                # print(f"  Passato alla nuova scheda per {product_url}") # DEBUG
-
-                # Scrape i dati dalla pagina di dettaglio
-                product_data = scrape_palazzetti_product_detail(driver, product_url)
-
-                # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
+        if detail_pipeline:
+            # I dettagli sono stati elaborati dai worker durante la Fase 3: si attende la fine della coda
+            for product_data in detail_pipeline.close():
                 if product_data and product_data.get("name") != "N/A":
                     all_scraped_products.append(product_data)
-                    print(f"  Aggiunto prodotto {len(all_scraped_products)} (Totale): {product_data.get('name')}")
-                # else: Prodotto saltato (nome N/A)
-
+                    metrics.record_emitted()
+        else:
+            # Ottieni l'handle della finestra corrente prima di aprire nuove schede
+            original_window = driver.current_window_handle
 
-                # Chiudi la scheda corrente
-                driver.close()
-                # print("  Scheda chiusa.") # DEBUG
+            # Limita l'iterazione agli URL raccolti, fino al limite di prodotti
+            # Non è necessario tagliare la lista qui se i controlli sono all'interno del loop
+            # product_detail_urls_to_scrape = product_detail_urls[:PRODUCT_TOTAL_LIMIT] # Rimosso taglio lista
 
-                # Torna alla scheda originale (la pagina da cui è stata aperta l'ultima scheda)
-                driver.switch_to.window(original_window)
-                # print("  Tornato alla scheda originale.") # DEBUG
+            for i, product_url in enumerate(metrics.track_loop(product_detail_urls, "dettaglio")):
+                # Rimosso: if len(all_scraped_products) >= PRODUCT_TOTAL_LIMIT:
+                # Rimosso: print(f"Limite totale di {PRODUCT_TOTAL_LIMIT} prodotti raggiunto. Interruzione scraping dei dettagli.")
+                # Rimosso: break # Esci dal loop dei dettagli se il limite è raggiunto
 
-                time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
+                print(f"\nScraping Prodotto {len(all_scraped_products) + 1} (URL {i+1}/{len(product_detail_urls)}): {product_url}")
 
-            except Exception as e:
-                print(f"Errore durante lo scraping della pagina di dettaglio {product_url}: {e}. Salto.")
-                # Assicurati di tornare alla finestra originale anche in caso di errore
                 try:
-                     # Prova a chiudere la scheda corrente se è ancora aperta
-                     if len(driver.window_handles) > 1 and driver.current_window_handle != original_window:
-                         driver.close()
-                     # Torna alla finestra originale se non ci siamo già
-                     if driver.current_window_handle != original_window:
-                          driver.switch_to.window(original_window)
-                except:
-                     pass # Ignora errori nella gestione delle finestre in caso di errore critico
-                continue # Continua con il prossimo URL di dettaglio
+                    # Apri l'URL di dettaglio in una nuova scheda
+                    driver.execute_script("window.open(arguments[0]);", product_url)
+                    time.sleep(1) # Breve pausa per permettere alla nuova scheda di aprirsi
+
+                    # Passa alla nuova scheda
+                    driver.switch_to.window(driver.window_handles[-1])
+                    # print(f"  Passato alla nuova scheda per {product_url}") # DEBUG
+
+                    # Scrape i dati dalla pagina di dettaglio
+                    product_data = scrape_palazzetti_product_detail(driver, product_url)
+
+                    # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
+                    if product_data and product_data.get("name") != "N/A":
+                        all_scraped_products.append(product_data)
+                        metrics.record_emitted()
+                        print(f"  Aggiunto prodotto {len(all_scraped_products)} (Totale): {product_data.get('name')}")
+                    # else: Prodotto saltato (nome N/A)
+
+
+                    # Chiudi la scheda corrente
+                    driver.close()
+                    # print("  Scheda chiusa.") # DEBUG
+
+                    # Torna alla scheda originale (la pagina da cui è stata aperta l'ultima scheda)
+                    driver.switch_to.window(original_window)
+                    # print("  Tornato alla scheda originale.") # DEBUG
+
+                    time.sleep(1) # Breve pausa tra lo scraping di pagine di dettaglio
+
+                except Exception as e:
+                    print(f"Errore durante lo scraping della pagina di dettaglio {product_url}: {e}. Salto.")
+                    # Assicurati di tornare alla finestra originale anche in caso di errore
+                    try:
+                         # Prova a chiudere la scheda corrente se è ancora aperta
+                         if len(driver.window_handles) > 1 and driver.current_window_handle != original_window:
+                             driver.close()
+                         # Torna alla finestra originale se non ci siamo già
+                         if driver.current_window_handle != original_window:
+                              driver.switch_to.window(original_window)
+                    except:
+                         pass # Ignora errori nella gestione delle finestre in caso di errore critico
+                    continue # Continua con il prossimo URL di dettaglio
 
 
         print(f"\n--- Scraping completato. ---")
@@ -424,6 +436,8 @@ if __name__ == "__main__":
         print(f"Errore critico durante l'esecuzione principale: {e}")
 
     finally:
+        if detail_pipeline:
+            detail_pipeline.close()
         # Assicurati che il driver venga chiuso anche in caso di errori
         if driver:
             try:
@@ -1,10 +1,14 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import re
 from urllib.parse import urljoin, urlparse
 import os
+import diagnostics
+import catalog
+import fetch
+from fetch import prepare_driver
+from selectorchain import SelectorChain
 
 # Versione con Selenium per siti con JavaScript
 try:
@@ -19,6 +23,39 @@ except ImportError:
     SELENIUM_AVAILABLE = False
     print("Selenium non installato. Usa: pip install selenium")
 
+# Catene di selettori di ripiego, compilate una volta (vedi selectorchain.py)
+PRODUCT_LINK_CHAIN = SelectorChain("link prodotti", [
+    'a.x-cell.e448-e17.mcg-11',
+    'a[class*="x-cell"][class*="e448-e17"]',
+    'a[class*="mcg-11"]',
+    'a[href*="/product/"]',
+    '.x-cell a',
+    'a[href*="gruppoporon.com/product/"]'
+])
+NAME_CHAIN = SelectorChain("nome", [
+    'h1.x-text-content-text-primary',
+    'h2.x-text-content-text-primary',
+    '.x-text-content-text-primary',
+    'h1',
+    'h2',
+    '.entry-title',
+    '.product-title'
+])
+DESCRIPTION_CHAIN = SelectorChain("descrizione", [
+    'div.x-text.x-content.e119-e11.m3b-1j',
+    'div.x-text.x-content.e448-e20.mcg-12',
+    'div.x-text.x-content',
+    '.x-text.x-content',
+    '.product-description',
+    '.entry-content'
+])
+IMAGE_CHAIN = SelectorChain("immagine", [
+    '.x-image img',
+    'span.x-image img',
+    'img[src*=".jpg"], img[src*=".png"], img[src*=".jpeg"]',
+    'img'
+])
+
 class PoronScraperSelenium:
     def __init__(self, use_selenium=True):
         self.base_url = "https://gruppoporon.com"
@@ -47,6 +84,7 @@ class PoronScraperSelenium:
         
         try:
             self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver = prepare_driver(self.driver)
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             print("Selenium configurato con successo!")
         except Exception as e:
@@ -86,7 +124,7 @@ class PoronScraperSelenium:
             self.driver.execute_script("window.scrollTo(0, 0);")
             time.sleep(1)
             
-            return self.driver.page_source
+            return fetch.get_page_source(self.driver)
         except Exception as e:
             print(f"Errore Selenium: {e}")
             return None
@@ -96,7 +134,7 @@ class PoronScraperSelenium:
         for attempt in range(retries):
             try:
                 print(f"Tentativo {attempt + 1} con requests: {url}")
-                response = self.session.get(url, timeout=15, verify=True, allow_redirects=True)
+                response = fetch.get(url, session=self.session, timeout=15, verify=True, allow_redirects=True)
                 response.raise_for_status()
                 print(f"Successo! Status code: {response.status_code}")
                 return response.text
@@ -106,6 +144,14 @@ class PoronScraperSelenium:
                     time.sleep(3)
         return None
     
+    def absolute_url(self, href):
+        """URL assoluta di un link della pagina"""
+        if href.startswith('/'):
+            return self.base_url + href
+        elif not href.startswith('http'):
+            return urljoin(self.base_url, href)
+        return href
+    
     def extract_product_links(self):
         """Estrae tutti i link dei prodotti"""
         print("=== ESTRAZIONE LINK PRODOTTI ===")
@@ -125,46 +171,23 @@ class PoronScraperSelenium:
             print(f"🔄 Usando {len(known_products)} link noti")
             return known_products
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Salva HTML per debug
-        with open('debug_products_page.html', 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
-        print("💾 HTML salvato in debug_products_page.html")
+        diagnostics.remember_page(self.products_url, html_content)
+        soup = fetch.parse_html(html_content)
         
         product_links = []
         
-        # Selettori basati sul tuo HTML
-        selectors_to_try = [
-            'a.x-cell.e448-e17.mcg-11',
-            'a[class*="x-cell"][class*="e448-e17"]',
-            'a[class*="mcg-11"]',
-            'a[href*="/product/"]',
-            '.x-cell a',
-            'a[href*="gruppoporon.com/product/"]'
-        ]
-        
+        # Tutti i selettori della catena in una sola visita: vince il primo che porta a pagine prodotto
         print("🔍 Ricerca link prodotti...")
-        for i, selector in enumerate(selectors_to_try):
-            links = soup.select(selector)
-            print(f"   Selettore {i+1}: '{selector}' -> {len(links)} link")
-            
-            if links:
-                for link in links:
-                    href = link.get('href')
-                    if href:
-                        if href.startswith('/'):
-                            full_url = self.base_url + href
-                        elif not href.startswith('http'):
-                            full_url = urljoin(self.base_url, href)
-                        else:
-                            full_url = href
-                        
-                        if '/product/' in full_url and full_url not in product_links:
-                            product_links.append(full_url)
-                
-                if product_links:
-                    break
+        selector, links = PRODUCT_LINK_CHAIN.select(soup, accept=lambda links: any(
+            '/product/' in self.absolute_url(link.get('href')) for link in links if link.get('href')))
+        if selector:
+            print(f"   Selettore '{selector}' -> {len(links)} link")
+            for link in links:
+                href = link.get('href')
+                if href:
+                    full_url = self.absolute_url(href)
+                    if '/product/' in full_url and full_url not in product_links:
+                        product_links.append(full_url)
         
         # Se non trova nulla, cerca tutti i link della pagina
         if not product_links:
@@ -173,16 +196,13 @@ class PoronScraperSelenium:
             for link in all_links:
                 href = link.get('href')
                 if href and '/product/' in href:
-                    if href.startswith('/'):
-                        full_url = self.base_url + href
-                    elif not href.startswith('http'):
-                        full_url = urljoin(self.base_url, href)
-                    else:
-                        full_url = href
+                    full_url = self.absolute_url(href)
                     
                     if full_url not in product_links:
                         product_links.append(full_url)
         
+        if not product_links:
+            diagnostics.record_miss("link prodotti (selectors_to_try)")
         print(f"✅ Trovati {len(product_links)} link di prodotti")
         
         # Mostra i primi 5 link
@@ -207,53 +227,31 @@ class PoronScraperSelenium:
             print("❌ Impossibile caricare la pagina del prodotto")
             return None
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Salva HTML per debug
-        filename = f"debug_product_{len(self.products_data) + 1}.html"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
+        diagnostics.remember_page(product_url, html_content)
+        return self.parse_product_data(product_url, html_content)
+    
+    def parse_product_data(self, product_url, html_content):
+        """Estrae i dati di un prodotto dall'HTML della sua pagina (usato anche da reextract.py)"""
+        soup = fetch.parse_html(html_content)
         
         # Estrazione nome prodotto
         nome_prodotto = ""
-        nome_selectors = [
-            'h1.x-text-content-text-primary',
-            'h2.x-text-content-text-primary',
-            '.x-text-content-text-primary',
-            'h1',
-            'h2',
-            '.entry-title',
-            '.product-title'
-        ]
-        
-        for selector in nome_selectors:
-            element = soup.select_one(selector)
-            if element:
-                nome_prodotto = element.get_text(strip=True)
-                print(f"✅ Nome trovato: {nome_prodotto}")
-                break
+        element = NAME_CHAIN.select_one(soup)
+        if element:
+            nome_prodotto = element.get_text(strip=True)
+            print(f"✅ Nome trovato: {nome_prodotto}")
         
         if not nome_prodotto:
             print("❌ Nome prodotto non trovato")
+            diagnostics.record_miss("nome prodotto (nome_selectors)")
         
         # Estrazione descrizione
         descrizione = ""
-        desc_selectors = [
-            'div.x-text.x-content.e119-e11.m3b-1j',
-            'div.x-text.x-content.e448-e20.mcg-12',
-            'div.x-text.x-content',
-            '.x-text.x-content',
-            '.product-description',
-            '.entry-content'
-        ]
-        
-        for selector in desc_selectors:
-            element = soup.select_one(selector)
-            if element:
-                descrizione = element.get_text(separator=' ', strip=True)
-                descrizione = re.sub(r'\s+', ' ', descrizione)
-                print(f"✅ Descrizione trovata: {descrizione[:80]}...")
-                break
+        element = DESCRIPTION_CHAIN.select_one(soup)
+        if element:
+            descrizione = element.get_text(separator=' ', strip=True)
+            descrizione = re.sub(r'\s+', ' ', descrizione)
+            print(f"✅ Descrizione trovata: {descrizione[:80]}...")
         
         if not descrizione:
             print("❌ Descrizione non trovata")
@@ -275,21 +273,12 @@ class PoronScraperSelenium:
         
         # Se non trova background, cerca tag img
         if not immagine_url:
-            img_selectors = [
-                '.x-image img',
-                'span.x-image img',
-                'img[src*=".jpg"], img[src*=".png"], img[src*=".jpeg"]',
-                'img'
-            ]
-            
-            for selector in img_selectors:
-                img = soup.select_one(selector)
-                if img and img.get('src'):
-                    immagine_url = img.get('src')
-                    if not immagine_url.startswith('http'):
-                        immagine_url = urljoin(self.base_url, immagine_url)
-                    print(f"✅ Immagine img trovata: {immagine_url}")
-                    break
+            img = IMAGE_CHAIN.select_one(soup, accept=lambda img: img.get('src'))
+            if img:
+                immagine_url = img.get('src')
+                if not immagine_url.startswith('http'):
+                    immagine_url = urljoin(self.base_url, immagine_url)
+                print(f"✅ Immagine img trovata: {immagine_url}")
         
         if not immagine_url:
             print("❌ Immagine non trovata")
@@ -355,6 +344,7 @@ class PoronScraperSelenium:
         
         print(f"✅ File CSV salvato: {filename}")
         print(f"📊 Prodotti salvati: {len(self.products_data)}")
+        catalog.save_records(self.products_data)
     
     def print_summary(self):
         """Stampa riassunto"""
@@ -379,6 +369,17 @@ class PoronScraperSelenium:
             self.driver.quit()
             print("🔒 Browser chiuso")
 
+_REEXTRACT_SCRAPER = None
+
+def reextract_page(url, content):
+    """Estrazione offline di una pagina archiviata (reextract.py): solo le schede prodotto"""
+    global _REEXTRACT_SCRAPER
+    if '/product/' not in url:
+        return None
+    if _REEXTRACT_SCRAPER is None:
+        _REEXTRACT_SCRAPER = PoronScraperSelenium(use_selenium=False)
+    return _REEXTRACT_SCRAPER.parse_product_data(url, content)
+
 def main():
     print("🔧 WEBSCRAPER GRUPPO PORON")
     print("="*50)
@@ -12,6 +12,9 @@ from selenium.common.exceptions import (
     WebDriverException,
     StaleElementReferenceException
 )
+from fetch import prepare_driver
+import extraction
+import catalog
 import csv
 import os
 
@@ -35,6 +38,13 @@ PRODUCT_LISTING_PRICE_SELECTOR = 'div.price-box .price'
 # Selettore per il pulsante "Pagina successiva" (rilevante se non usi ?limit=all)
 PAGINATION_NEXT_SELECTOR = 'a[rel="next"].js-search-link'
 
+# Campi letti in blocco da ogni card della listing (vedi extraction.py): nome -> (selettore, valore)
+LISTING_FIELDS = {
+    'detail_url': (PRODUCT_LINK_SELECTOR, 'href'),
+    'listing_image_url': (PRODUCT_LISTING_IMAGE_SELECTOR, 'src'),
+    'listing_price': (PRODUCT_LISTING_PRICE_SELECTOR, 'text'),
+}
+
 
 # Selettori per i dati sulla PAGINA DI DETTAGLIO del prodotto (basati sul tuo HTML)
 DETAIL_PAGE_TITLE_SELECTOR = 'div.product-name h1' # Titolo principale
@@ -72,6 +82,7 @@ def scrape_products(url):
 
         # service = Service('/path/to/chromedriver') # Decommenta e modifica se chromedriver non è nel PATH
         driver = webdriver.Chrome(options=options) # , service=service)
+        driver = prepare_driver(driver)
         # driver.implicitly_wait(IMPLICIT_WAIT_TIME) # Attiva se vuoi attesa implicita globale
 
         logging.info(f"--- Inizio scraping da: {current_page_url} ---")
@@ -94,7 +105,8 @@ def scrape_products(url):
 
             # Raccogli i link, URL delle immagini e prezzi dalla pagina di listing corrente
             # È cruciale raccogliere questi dati ORA, prima di navigare via per ogni prodotto
-            product_listing_items = driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR)
+            # (tutte le card in un'unica chiamata nel browser, vedi extraction.py)
+            product_listing_items = extraction.extract_records(driver, PRODUCT_CONTAINER_SELECTOR, LISTING_FIELDS)
             product_details_from_listing = [] # Lista per salvare URL, immagine e prezzo dalla listing
 
             if not product_listing_items:
@@ -103,48 +115,21 @@ def scrape_products(url):
 
             logging.info(f"Trovati {len(product_listing_items)} contenitori prodotto. Raccogliendo link, immagini e prezzi...")
 
-            for i, product_elem in enumerate(product_listing_items):
-                product_url = None # Inizializza a None
-                image_url = 'N/A'
-                price_listing = 'N/A'
-
-                # Estrai il link alla pagina di dettaglio (Gestione errori specifica)
-                try:
-                    link_elem = product_elem.find_element(By.CSS_SELECTOR, PRODUCT_LINK_SELECTOR)
-                    product_url = link_elem.get_attribute('href')
-                except NoSuchElementException:
+            for i, item in enumerate(product_listing_items):
+                # Aggiungi alla lista SOLO se il link principale è stato trovato
+                if not item['detail_url']:
                     logging.warning(f"  Link prodotto ('{PRODUCT_LINK_SELECTOR}') non trovato nella card {i+1}. Skippato per URL/Dettaglio.")
-                except Exception as e:
-                    logging.error(f"  Errore imprevisto nell'estrarre link dalla card {i+1}: {e}")
-
-                # Estrai l'URL dell'immagine dalla listing (Gestione errori specifica)
-                try:
-                    image_elem = product_elem.find_element(By.CSS_SELECTOR, PRODUCT_LISTING_IMAGE_SELECTOR)
-                    image_url = image_elem.get_attribute('src')
-                except NoSuchElementException:
+                    continue
+                if not item['listing_image_url']:
                     logging.warning(f"  Immagine ('{PRODUCT_LISTING_IMAGE_SELECTOR}') non trovata nella card {i+1}. Userà N/A.")
-                except Exception as e:
-                    logging.error(f"  Errore imprevisto nell'estrarre immagine dalla card {i+1}: {e}")
-
-                # Estrai il prezzo dalla listing (Gestione errori specifica, selettore più generale)
-                try:
-                    price_elem = product_elem.find_element(By.CSS_SELECTOR, PRODUCT_LISTING_PRICE_SELECTOR)
-                    price_listing = price_elem.text.strip()
-                except NoSuchElementException:
+                if not item['listing_price']:
                     logging.warning(f"  Prezzo ('{PRODUCT_LISTING_PRICE_SELECTOR}') non trovato nella card {i+1}. Userà N/A.")
-                except Exception as e:
-                    logging.error(f"  Errore imprevisto nell'estrarre prezzo dalla card {i+1}: {e}")
-
-
-                # Aggiungi alla lista SOLO se il link principale è stato trovato
-                if product_url:
-                     product_details_from_listing.append({
-                         'detail_url': product_url,
-                         'listing_image_url': image_url, # Immagine dalla listing (potrebbe essere N/A)
-                         'listing_price': price_listing, # Prezzo dalla listing (potrebbe essere N/A)
-                         'listing_index': i + 1
-                     })
-                # else: il warning specifico per il link non trovato è già stato loggato
+                product_details_from_listing.append({
+                    'detail_url': item['detail_url'],
+                    'listing_image_url': item['listing_image_url'] or 'N/A', # Immagine dalla listing (potrebbe essere N/A)
+                    'listing_price': item['listing_price'] or 'N/A', # Prezzo dalla listing (potrebbe essere N/A)
+                    'listing_index': i + 1
+                })
 
             logging.info(f"Raccolti {len(product_details_from_listing)} URL di prodotti validi (su {len(product_listing_items)} contenitori trovati) da questa pagina di listing.")
 
@@ -331,6 +316,7 @@ def scrape_products(url):
                         writer.writeheader()
                         writer.writerows(all_product_data)
                     logging.info("Dati salvati con successo.")
+                    catalog.save_records(all_product_data)
                 else:
                      logging.warning("Nessun dato raccolto, CSV non creato.")
 
@@ -6,7 +6,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import diagnostics
+import metrics
+import catalog
 
 # Impostazioni iniziali
 # Lista per contenere gli URL delle pagine di elenco da cui iniziare lo scraping.
@@ -52,16 +56,6 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "div.product-cover img.js-qv-product-cover"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_sait_detail_page(driver, detail_url):
     """
@@ -165,9 +159,8 @@ def scrape_sait_listing_page(driver, listing_url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato su {listing_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-        # Stampa una parte dell'HTML per debuggare se non trova contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-        print(soup_listing.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
         # Anche se non trova prodotti, controlla se c'è un link alla pagina successiva
         pass # Continua per cercare il link di paginazione
 
@@ -223,6 +216,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -238,7 +232,8 @@ if __name__ == "__main__":
         # chrome_options.add_argument("--headless") # Rimuovi il commento per eseguire senza finestra
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
 
 
         all_scraped_products = []
@@ -265,7 +260,7 @@ if __name__ == "__main__":
                 # Scrape i dettagli per ogni URL di prodotto trovato su questa pagina di elenco
                 if detail_urls_on_page:
                     print(f"\nScraping dei dettagli per {len(detail_urls_on_page)} prodotti su {current_listing_url}...")
-                    for k, detail_url in enumerate(detail_urls_on_page):
+                    for k, detail_url in enumerate(metrics.track_loop(detail_urls_on_page, "dettaglio")):
                         if len(all_scraped_products) >= PRODUCT_LIMIT:
                             print(f"Limite di {PRODUCT_LIMIT} prodotti raggiunto. Interruzione scraping dei dettagli.")
                             break # Esci dal loop dei dettagli se il limite è raggiunto
@@ -274,6 +269,7 @@ if __name__ == "__main__":
                         # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
                         if product_detail and product_detail.get("name") != "N/A":
                             all_scraped_products.append(product_detail)
+                            metrics.record_emitted()
                             print(f"  Aggiunto prodotto {len(all_scraped_products)}: {product_detail.get('name')}") # DEBUG
                         # else: Prodotto saltato (nome N/A)
 
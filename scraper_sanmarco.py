@@ -1,5 +1,4 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import json
 import csv
@@ -10,6 +9,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from fetch import get_page_soup, prepare_driver
+import catalog
 
 class ProductScraper:
     def __init__(self, base_urls, headless=True):
@@ -33,6 +34,7 @@ class ProductScraper:
         
         try:
             self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver = prepare_driver(self.driver)
             print("Browser Chrome avviato con successo")
         except Exception as e:
             print(f"Errore nell'avvio di Chrome: {e}")
@@ -42,6 +44,7 @@ class ProductScraper:
             if self.headless:
                 firefox_options.add_argument("--headless")
             self.driver = webdriver.Firefox(options=firefox_options)
+            self.driver = prepare_driver(self.driver)
             print("Browser Firefox avviato con successo")
             
     def extract_products_from_page(self):
@@ -56,8 +59,7 @@ class ProductScraper:
             return []
         
         # Ottieni il contenuto HTML aggiornato
-        html_content = self.driver.page_source
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = get_page_soup(self.driver)
         
         # Trova tutti i container di prodotti
         product_containers = soup.find_all("div", class_="product_preview")
@@ -130,8 +132,7 @@ class ProductScraper:
         Metodo alternativo per estrarre prodotti quando i container non sono facilmente identificabili.
         Cerca elementi individuali relativi ai prodotti e li combina.
         """
-        html_content = self.driver.page_source
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = get_page_soup(self.driver)
         
         # Cerca tutti i titoli di prodotto
         title_elements = soup.find_all("p", class_="product_preview_title")
@@ -207,8 +208,7 @@ class ProductScraper:
         Estrae i link per la paginazione, se presenti
         Ritorna una lista di URL per le pagine successive
         """
-        html_content = self.driver.page_source
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = get_page_soup(self.driver)
         
         # Cerca elementi di paginazione (adatta il selettore in base al sito specifico)
         pagination = soup.find("div", class_="pagination")
@@ -323,6 +323,7 @@ class ProductScraper:
             print(f"Prodotti salvati in {filename}")
         except Exception as e:
             print(f"Errore nel salvataggio del file CSV: {e}")
+        catalog.save_records(self.products)
     
     def save_to_json(self, filename="prodotti.json"):
         """Salva i prodotti in un file JSON"""
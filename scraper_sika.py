@@ -13,6 +13,12 @@ from bs4 import BeautifulSoup
 import requests
 import os
 from urllib.parse import urljoin
+from fetch import prepare_driver
+import browserpool
+import consent
+import extraction
+import metrics
+import catalog
 
 class SikaScraper:
     def __init__(self, output_folder="sika_products"):
@@ -36,10 +42,12 @@ class SikaScraper:
         chrome_options.add_argument("--window-size=1920,1080")
         
         # Inizializza il webdriver
-        self.driver = webdriver.Chrome(
+        # Con il pool di browser attivo ci si collega a una sessione calda (niente installazione del driver)
+        self.driver = browserpool.get_driver(lambda: webdriver.Chrome(
             service=Service(ChromeDriverManager().install()),
             options=chrome_options
-        )
+        ))
+        self.driver = prepare_driver(self.driver)
         self.driver.implicitly_wait(10)
     
     def load_all_products(self):
@@ -48,15 +56,8 @@ class SikaScraper:
         self.driver.get(self.start_url)
         time.sleep(3)  # Attendi caricamento iniziale
         
-        # Accetta i cookie se presente il banner
-        try:
-            cookie_button = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "button.onetrust-accept-btn-handler"))
-            )
-            cookie_button.click()
-            print("Banner cookie accettato")
-            time.sleep(1)
-        except TimeoutException:
+        # Accetta i cookie se presente il banner (senza attese se il consenso è già stato dato)
+        if consent.dismiss(self.driver, consent.ONETRUST) == "absent":
             print("Nessun banner cookie trovato o già accettato")
         
         # Clicca sul pulsante "Più Risultati" finché esiste
@@ -70,6 +71,7 @@ class SikaScraper:
                 time.sleep(1)
                 load_more_button.click()
                 load_more_count += 1
+                metrics.inc("scraper_load_more_clicks_total", site=metrics.SITE)
                 print(f"Cliccato 'Più Risultati' ({load_more_count} volte)")
                 time.sleep(2)  # Attendi caricamento nuovi prodotti
             except (TimeoutException, NoSuchElementException):
@@ -82,15 +84,8 @@ class SikaScraper:
         """Estrae i link di tutti i prodotti dalla pagina principale."""
         print("Estraendo i link di tutti i prodotti...")
         
-        # Trova tutti gli elementi dei prodotti
-        product_elements = self.driver.find_elements(By.CSS_SELECTOR, "div[data-list-item] div.cmp-teaser_product a")
-        
-        # Estrai gli URL
-        product_links = []
-        for element in product_elements:
-            href = element.get_attribute("href")
-            if href:
-                product_links.append(href)
+        # Tutti gli href dei prodotti in un'unica chiamata nel browser
+        product_links = extraction.extract_values(self.driver, "div[data-list-item] div.cmp-teaser_product a", "href")
         
         print(f"Trovati {len(product_links)} prodotti")
         return product_links
@@ -218,6 +213,7 @@ class SikaScraper:
                     writer.writerow(product)
         
         print(f"Dati salvati in {csv_file}")
+        catalog.save_records([product for product in self.products_data if product])
     
     def run(self):
         """Esegui lo scraping completo."""
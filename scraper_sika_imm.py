@@ -5,8 +5,11 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from fetch import get_page_source, prepare_driver, parse_html
+import loadmore
+import metrics
+import catalog
 # Non usiamo più requests per le pagine di dettaglio
 
 # Impostazioni iniziali
@@ -23,6 +26,7 @@ HEADERS = {
 PRODUCT_CONTAINER_SELECTOR_LIST = "div[data-list-item].cell"
 PRODUCT_LINK_SELECTOR_LIST = "a.cmp-teaser_productContainer"
 LOAD_MORE_BUTTON_SELECTOR = ".load-more-results button"
+LISTING_FIELDS = {"url": (PRODUCT_LINK_SELECTOR_LIST, "href")}
 
 # --- Selettori per la pagina di DETTAGLIO PRODOTTO ---
 PRODUCT_TITLE_SELECTOR_DETAIL = "h1.cmp-title__text"
@@ -42,58 +46,18 @@ def get_product_urls_from_listing(driver, url):
         print("Timeout nell'attesa dei primi prodotti nella lista. Potrebbe non esserci nulla da scrapare.")
         return []
 
-    while True:
-        try:
-            print("Ricerca del pulsante 'Più Risultati'...")
-            wait = WebDriverWait(driver, 15)
-            load_more_button = wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, LOAD_MORE_BUTTON_SELECTOR)))
-            load_more_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, LOAD_MORE_BUTTON_SELECTOR)))
-            print("Pulsante 'Più Risultati' trovato e cliccabile.")
-
-            driver.execute_script("arguments[0].scrollIntoView(true);", load_more_button)
-            time.sleep(0.5)
-
-            initial_product_count = len(driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST))
-            print(f"Trovati {initial_product_count} prodotti prima di cliccare.")
-
-            try:
-                load_more_button.click()
-                print("Cliccato su 'Più Risultati' (click diretto).")
-            except ElementClickInterceptedException:
-                print("Click diretto intercettato. Tentativo con execute_script.")
-                driver.execute_script("arguments[0].click();", load_more_button)
-                print("Cliccato su 'Più Risultati' (execute_script).")
-
-            try:
-                print("Attendere il caricamento di nuovi prodotti...")
-                wait.until(
-                    lambda driver: len(driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST)) > initial_product_count
-                )
-                print(f"Nuovi prodotti caricati. Totale attuale: {len(driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST))}")
-            except TimeoutException:
-                print("Timeout nell'attesa di nuovi prodotti. Potrebbero non essercene altri o il caricamento è molto lento.")
-                break
-
-        except (NoSuchElementException, TimeoutException, StaleElementReferenceException):
-            print("Pulsante 'Più Risultati' non più presente o non cliccabile. Tutti i prodotti dovrebbero essere caricati.")
-            break
-
-    print("Raccogliere gli URL delle pagine di dettaglio...")
+    # Click su "Più Risultati" finché il pulsante scompare; a ogni click si leggono solo le card nuove
+    print("Caricamento di tutti i prodotti con 'Più Risultati' e raccolta degli URL delle pagine di dettaglio...")
+    records = loadmore.load_all(driver, PRODUCT_CONTAINER_SELECTOR_LIST, LISTING_FIELDS, LOAD_MORE_BUTTON_SELECTOR,
+                                required=("url",))
     product_urls = []
-    product_containers = driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST)
-    for container in product_containers:
-        try:
-            link_tag = container.find_element(By.CSS_SELECTOR, PRODUCT_LINK_SELECTOR_LIST)
-            if link_tag and link_tag.get_attribute('href'):
-                relative_url = link_tag.get_attribute('href')
-                if relative_url.startswith('/'):
-                    full_url = SIKA_BASE_URL + relative_url
-                else:
-                    full_url = relative_url
-                product_urls.append(full_url)
-        except Exception as e:
-            print(f"Errore nel raccogliere l'URL da un contenitore prodotto nella lista: {e}")
-            continue
+    for record in records:
+        relative_url = record["url"]
+        if relative_url.startswith('/'):
+            full_url = SIKA_BASE_URL + relative_url
+        else:
+            full_url = relative_url
+        product_urls.append(full_url)
 
     print(f"Raccolti {len(product_urls)} URL di pagine di dettaglio.")
     return product_urls
@@ -249,8 +213,8 @@ def scrape_product_detail(driver, product_url):
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_TITLE_SELECTOR_DETAIL)))
         print("  Pagina di dettaglio caricata (titolo trovato).")
 
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        page_source = get_page_source(driver)
+        soup = parse_html(page_source)
 
         name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
         if name_tag:
@@ -292,11 +256,13 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
     try:
         driver = webdriver.Chrome()
+        driver = prepare_driver(driver)
     except Exception as e:
         print(f"Errore nell'inizializzazione del WebDriver: {e}")
         print("Assicurati di aver installato il browser driver corretto (es. ChromeDriver) e che sia nel tuo PATH di sistema.")
@@ -308,11 +274,12 @@ if __name__ == "__main__":
 
     all_products_data = []
     print(f"\nInizio scraping delle {len(urls_to_process)} pagine di dettaglio prodotto (limitate per test) usando Selenium...")
-    for j, product_url in enumerate(urls_to_process):
+    for j, product_url in enumerate(metrics.track_loop(urls_to_process, "dettaglio")):
         product_detail = scrape_product_detail(driver, product_url)
         print(f"DEBUG: Dati prodotto prima di append: {product_detail}")
         if product_detail and product_detail.get("name") != "N/A":
             all_products_data.append(product_detail)
+            metrics.record_emitted()
         time.sleep(1)
 
     try:
@@ -1,10 +1,11 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
 import time
 import re
 import random
 import os
+import fetch
+import catalog
 
 class UnishopScraper:
     def __init__(self, start_url, output_file='unishop_products.csv'):
@@ -20,9 +21,9 @@ class UnishopScraper:
     def get_soup(self, url):
         """Makes a request to the URL and returns a BeautifulSoup object"""
         try:
-            response = requests.get(url, headers=self.headers)
+            response = fetch.get(url, headers=self.headers)
             response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
+            return fetch.parse_html(response.text)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching {url}: {e}")
             return None
@@ -161,6 +162,7 @@ class UnishopScraper:
                 })
             
         print(f"Saved {len(self.products)} products to {self.output_file}")
+        catalog.save_records(self.products)
     
     def run(self):
         """Main method to run the scraper"""
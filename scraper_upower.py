@@ -7,8 +7,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin # Utile per costruire URL completi
+from fetch import get_page_source, get_soup_from_selenium, prepare_driver, parse_html
+import browserpool
+import metrics
+import catalog
+import extraction
+import loadmore
+import pipeline
 
 # Impostazioni iniziali
 # URL della pagina di elenco prodotti U-Power
@@ -42,27 +48,36 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "img#main-image" # Selettore per l'immagine prin
 # URL base del sito per costruire URL completi
 BASE_URL = "https://www.u-power.it"
 
+# Campi letti dalle card della lista per passare subito le URL nuove alla pipeline dei dettagli
+LISTING_FIELDS = {"url": (PRODUCT_LINK_SELECTOR_LIST, "href")}
+
 
 # Configurazione di Selenium WebDriver
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
+
+def emit_new_product_urls(driver, on_urls):
+    """Passa a `on_urls` le URL delle card comparse dall'ultima chiamata (in un solo round trip)."""
+    if on_urls is None:
+        return
     try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
+        records = extraction.extract_records(driver, PRODUCT_CONTAINER_SELECTOR_LIST, LISTING_FIELDS,
+                                             mark=loadmore.MARK_ATTRIBUTE, required=("url",))
+        on_urls([urljoin(BASE_URL, record["url"]) for record in records])
+    except RuntimeError:
+        raise  # Nessun worker della pipeline attivo
     except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
+        print(f"Errore nel passaggio delle nuove URL alla pipeline: {e}")
 
 
-def get_product_urls_from_listing(driver, url):
+def get_product_urls_from_listing(driver, url, on_urls=None):
     """
     Naviga alla pagina di elenco usando il driver Selenium,
     clicca su "CARICA ALTRI" finché possibile (carica tutti i prodotti),
     e restituisce una lista di URL delle pagine di dettaglio prodotto.
+    Con `on_urls` le URL di ogni gruppo di card caricate vengono passate subito alla callback
+    (es. pipeline.DetailPipeline.submit_many), senza attendere la fine del caricamento.
     """
     print(f"Navigazione alla pagina di elenco: {url}")
     driver.get(url)
@@ -88,6 +103,7 @@ def get_product_urls_from_listing(driver, url):
         wait = WebDriverWait(driver, 40) # Attesa iniziale più lunga per il caricamento della pagina e dei primi prodotti
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST)))
         print("Primi prodotti visibili nella lista.")
+        emit_new_product_urls(driver, on_urls)
     except TimeoutException:
         print(f"Timeout nell'attesa dei primi prodotti nella lista con selettore '{PRODUCT_CONTAINER_SELECTOR_LIST}'. Potrebbe non esserci nulla da scrapare o il selettore non è corretto.")
         return [] # Restituisce lista vuota se non trova i primi prodotti
@@ -136,6 +152,7 @@ def get_product_urls_from_listing(driver, url):
                     load_more_button.click()
                     print("Click riuscito.")
                     click_successful = True
+                    metrics.inc("scraper_load_more_clicks_total", site=metrics.SITE)
                     # Breve pausa subito dopo il click per dare tempo alla richiesta di partire
                     time.sleep(1.5)
                 except ElementClickInterceptedException:
@@ -191,6 +208,7 @@ def get_product_urls_from_listing(driver, url):
                 )
                 current_product_count_after_click = len(driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR_LIST))
                 print(f"Nuovi prodotti caricati. Totale attuale: {current_product_count_after_click}")
+                emit_new_product_urls(driver, on_urls)
 
                 # Aggiungi una piccola pausa extra dopo il caricamento per stabilizzare la pagina
                 time.sleep(4) # Pausa aggiuntiva
@@ -283,8 +301,8 @@ def scrape_upower_product_detail(driver, detail_url):
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_TITLE_SELECTOR_DETAIL)))
         print("  Pagina di dettaglio caricata (titolo trovato).")
 
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        page_source = get_page_source(driver)
+        soup = parse_html(page_source)
 
         # Estrai il Nome del prodotto
         name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
@@ -386,6 +404,7 @@ def save_to_csv(data, filename):
         print(f"Dati salvati in {csv_file_path}")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -404,7 +423,8 @@ if __name__ == "__main__":
         chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
 
         print("Inizializzazione driver Selenium...")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
         driver.implicitly_wait(5) # Attesa implicita per trovare gli elementi
 
     except Exception as e:
@@ -412,15 +432,36 @@ if __name__ == "__main__":
         print("Assicurati di aver installato il browser driver corretto (es. ChromeDriver) e che sia nel tuo PATH di sistema.")
         exit()
 
+    # Con SCRAPER_PIPELINE_WORKERS > 0 le pagine di dettaglio vengono elaborate da browser dedicati
+    # mentre la Fase 1 continua a caricare la lista
+    detail_pipeline = None
+    if pipeline.enabled():
+        detail_pipeline = pipeline.DetailPipeline(
+            scrape_upower_product_detail,
+            open_worker=lambda: prepare_driver(browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))),
+            close_worker=lambda worker: worker.quit())
+
     # Passo 1: Usa Selenium per ottenere tutti gli URL dalla pagina di elenco (gestendo il caricamento dinamico)
     # Questa funzione ora caricherà TUTTI i prodotti prima di raccogliere gli URL
     print("\n--- Fase 1: Caricamento dinamico e raccolta URL dalla pagina di elenco ---")
-    all_product_urls = get_product_urls_from_listing(driver, UPOWER_LISTING_URL)
+    try:
+        all_product_urls = get_product_urls_from_listing(
+            driver, UPOWER_LISTING_URL, on_urls=detail_pipeline.submit_many if detail_pipeline else None)
+        if detail_pipeline:
+            detail_pipeline.submit_many(all_product_urls)  # URL sfuggite alla raccolta incrementale
+    finally:
+        pipeline_results = detail_pipeline.close() if detail_pipeline else []
     print(f"\n--- Fine Fase 1. Raccolti {len(all_product_urls)} URL di prodotti totali. ---")
 
     # Passo 2: Scrape i dettagli per ogni URL raccolto usando la stessa istanza del driver Selenium
     all_scraped_products = []
-    if not all_product_urls:
+    if detail_pipeline:
+        for product_data in pipeline_results:
+            if product_data and product_data.get("name") != "N/A":
+                all_scraped_products.append(product_data)
+                metrics.record_emitted()
+        print(f"\n--- Fase 2 eseguita in pipeline: {len(all_scraped_products)} prodotti completi. ---")
+    elif not all_product_urls:
         print("\nNessun URL prodotto raccolto nella Fase 1. Impossibile procedere con lo scraping dei dettagli.")
     else:
         print(f"\n--- Fase 2: Scraping delle {len(all_product_urls)} pagine di dettaglio prodotto ---")
@@ -428,7 +469,7 @@ if __name__ == "__main__":
         # Ottieni l'handle della finestra corrente (la pagina di elenco) prima di aprire nuove schede
         original_window = driver.current_window_handle
 
-        for i, product_url in enumerate(all_product_urls):
+        for i, product_url in enumerate(metrics.track_loop(all_product_urls, "dettaglio")):
             print(f"\nScraping Prodotto {i+1}/{len(all_product_urls)}: {product_url}")
 
             try:
@@ -446,6 +487,7 @@ if __name__ == "__main__":
                 # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
                 if product_data and product_data.get("name") != "N/A":
                     all_scraped_products.append(product_data)
+                    metrics.record_emitted()
                     print(f"  Aggiunto prodotto {len(all_scraped_products)} (Totale): {product_data.get('name')}")
                 else:
                     print("  Dati prodotto incompleti (Nome N/A). Questo prodotto non sarà aggiunto alla lista finale.")
@@ -7,8 +7,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from fetch import get_soup_from_selenium, prepare_driver
+import browserpool
+import metrics
+import catalog
 
 # Impostazioni iniziali
 VOLTECO_INITIAL_URL = "https://volteco.com/it/prodotti/"
@@ -28,16 +31,6 @@ PRODUCT_ADVANTAGES_SELECTOR = "div#i-vantaggi ul.items-list li"
 PRODUCT_IMAGE_SELECTOR = "span#product-image"
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def extract_image_url_from_style(style_attribute):
     """Estrae l'URL dall'attributo style 'background-image: url(...)'. """
@@ -218,6 +211,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -235,7 +229,8 @@ if __name__ == "__main__":
 
     try:
         print("Inizializzazione driver Selenium...")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = browserpool.get_driver(lambda: webdriver.Chrome(options=chrome_options))
+        driver = prepare_driver(driver)
         driver.implicitly_wait(5)  # Attesa implicita per trovare gli elementi
 
         # Fase 1: Raccogliere tutti gli URL dei prodotti
@@ -243,12 +238,13 @@ if __name__ == "__main__":
         
         # Fase 2: Visitare ogni pagina di dettaglio prodotto e raccogliere i dati
         print("\n--- Inizio scraping dettaglio prodotti ---")
-        for i, product_url in enumerate(product_links, 1):
+        for i, product_url in enumerate(metrics.track_loop(product_links, "dettaglio"), 1):
             print(f"\nProdotto {i}/{len(product_links)}")
             product_data = scrape_product_detail_page(driver, product_url)
             
             if product_data:
                 all_scraped_products.append(product_data)
+                metrics.record_emitted()
                 print(f"Aggiunto prodotto alla lista: {product_data.get('name')}")
             
             # Pausa tra le richieste per evitare di sovraccaricare il server
@@ -6,8 +6,12 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin # Utile per costruire URL completi
+from fetch import get_page_source, get_soup_from_selenium, prepare_driver, parse_html
+import blocking
+import diagnostics
+import metrics
+import catalog
 
 # Impostazioni iniziali
 # URL della pagina di elenco prodotti Weber
@@ -48,16 +52,6 @@ DESCRIPTION_PARAGRAPH_SELECTOR_DETAIL = f"{DESCRIPTION_BLOCK_SELECTOR_DETAIL} p"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_weber_listing(driver, url):
     """
@@ -73,21 +67,12 @@ def scrape_weber_listing(driver, url):
 
     # --- Gestione CAPTCHA ---
     print("Controllo per potenziale CAPTCHA o blocco...")
-    captcha_present = False
-    for selector in CAPTCHA_INDICATOR_SELECTORS:
-        try:
-            # Cerca l'elemento indicatore del CAPTCHA
-            captcha_element = driver.find_element(By.CSS_SELECTOR, selector)
-            if captcha_element.is_displayed():
-                captcha_present = True
-                print(f"Potenziale CAPTCHA o blocco rilevato usando selettore: {selector}")
-                break # Esci dal ciclo selettori se ne trovi uno
-        except NoSuchElementException:
-            # L'elemento non è presente, continua a controllare gli altri selettori
-            pass
-        except Exception as e:
-            print(f"Errore durante il controllo CAPTCHA con selettore {selector}: {e}")
-            # Continua con gli altri selettori anche in caso di errore
+    # Selettori e segni tipici delle pagine di challenge in un solo controllo nel browser; il
+    # rilevamento alimenta anche l'interruttore dell'host (vedi blocking.py)
+    block_reason = blocking.check_page(driver, selectors=CAPTCHA_INDICATOR_SELECTORS)
+    captcha_present = block_reason is not None
+    if captcha_present:
+        print(f"Potenziale CAPTCHA o blocco rilevato ({block_reason})")
 
     if captcha_present:
         print("\n=========================================================")
@@ -159,9 +144,8 @@ def scrape_weber_listing(driver, url):
 
     if not product_containers:
         print(f"Nessun contenitore prodotto trovato. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LIST}'.")
-        # Stampa una parte dell'HTML per aiutarti a debuggare se non trova i contenitori
-        print("Primi 2000 caratteri dell'HTML della pagina di elenco per debug:")
-        print(soup_listing.prettify()[:2000])
+        # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+        diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LIST)
         return []
 
 
@@ -209,8 +193,8 @@ def scrape_weber_product_detail(driver, detail_url):
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_TITLE_SELECTOR_DETAIL)))
         print("  Pagina di dettaglio caricata (titolo trovato).")
 
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        page_source = get_page_source(driver)
+        soup = parse_html(page_source)
 
         # Estrai il Nome del prodotto
         name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
@@ -347,6 +331,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -354,6 +339,7 @@ if __name__ == "__main__":
         # Inizializza il driver Selenium
         # Esegui in modalità visibile per debuggare inizialmente
         driver = webdriver.Chrome() # O webdriver.Firefox(), webdriver.Edge(), ecc.
+        driver = prepare_driver(driver)
 
         # Fase 1: Usa Selenium per ottenere tutti gli URL dalla pagina di elenco
         # Questa funzione ora include la gestione manuale del CAPTCHA
@@ -367,12 +353,13 @@ if __name__ == "__main__":
             # Questo handle dovrebbe essere quello della pagina di elenco DOPO l'eventuale CAPTCHA
             original_window = driver.current_window_handle
 
-            for i, detail_url in enumerate(product_detail_urls):
+            for i, detail_url in enumerate(metrics.track_loop(product_detail_urls, "dettaglio")):
                 print(f"\nScraping prodotto {i+1}/{len(product_detail_urls)}: {detail_url}")
                 # Passa l'istanza del driver alla funzione di scraping dettaglio
                 product_data = scrape_weber_product_detail(driver, detail_url)
                 if product_data and product_data.get("name") != "N/A": # Aggiungi solo se lo scraping del dettaglio ha avuto successo (nome trovato)
                     all_scraped_products.append(product_data)
+                    metrics.record_emitted()
 
                 # Non chiudiamo la scheda qui perché scrape_weber_product_detail naviga direttamente.
                 # Se avessimo aperto in una nuova scheda, la chiuderemmo qui.
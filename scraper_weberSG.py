@@ -6,8 +6,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from fetch import get_soup_from_selenium, prepare_driver
+import diagnostics
+import metrics
+import catalog
 
 # Impostazioni iniziali
 # URL della pagina del brand Weber su Gruppo Edico.
@@ -55,16 +58,6 @@ PRODUCT_IMAGE_SELECTOR_DETAIL = "div.fotorama__stage__frame.fotorama__active img
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_weber_detail_page(driver, detail_url):
     """
@@ -130,10 +123,8 @@ def scrape_weber_listing_page_for_product_urls(driver, listing_url):
          print("Pagina lista prodotti caricata (primo prodotto trovato).")
      except TimeoutException:
          print("Timeout nell'attesa dei prodotti nella lista. Potrebbe non esserci nulla su questa pagina o il selettore del contenitore prodotto è errato.")
-         soup_listing_debug = get_soup_from_selenium(driver)
-         if soup_listing_debug:
-             print("Primi 2000 caratteri dell'HTML della pagina per debug (Timeout o nessun contenitore trovato):")
-             print(soup_listing_debug.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING, driver.current_url, lambda: driver.page_source)
          return [], None
 
      product_detail_urls_on_page = []
@@ -148,8 +139,8 @@ def scrape_weber_listing_page_for_product_urls(driver, listing_url):
 
      if not product_containers:
          print(f"Nessun contenitore prodotto trovato su {listing_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-         print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-         print(soup_listing.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
          pass
 
      for i, container in enumerate(product_containers):
@@ -201,6 +192,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -210,6 +202,7 @@ if __name__ == "__main__":
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         driver = webdriver.Chrome(options=chrome_options)
+        driver = prepare_driver(driver)
 
         all_scraped_products = []
         all_product_detail_urls_collected = []
@@ -251,7 +244,7 @@ if __name__ == "__main__":
 
         original_window = driver.current_window_handle
 
-        for i, detail_url in enumerate(all_product_detail_urls_collected):
+        for i, detail_url in enumerate(metrics.track_loop(all_product_detail_urls_collected, "dettaglio")):
             print(f"Scraping dettaglio prodotto {i+1}/{len(all_product_detail_urls_collected)}: {detail_url}")
 
             try:
@@ -264,6 +257,7 @@ if __name__ == "__main__":
 
                 if product_detail and product_detail.get("name") != "N/A":
                     all_scraped_products.append(product_detail)
+                    metrics.record_emitted()
 
                 driver.close()
                 driver.switch_to.window(original_window)
@@ -6,8 +6,12 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, StaleElementReferenceException
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin # Utile per costruire URL completi
+from fetch import get_soup_from_selenium, prepare_driver
+import diagnostics
+import metrics
+import catalog
+import pagefetch
 
 # Impostazioni iniziali
 # Lista di URL iniziali per trovare il menu delle categorie.
@@ -66,15 +70,51 @@ BASE_URL = "https://www.yamato.ferritalia.it"
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
+
+def parse_yamato_detail_page(soup, detail_url):
+    """
+    Estrae nome, descrizione e URL immagine dall'HTML (BeautifulSoup) di una pagina di dettaglio,
+    renderizzata nel browser o scaricata con fetch() in pagina.
+    """
+    product_detail_data = {
+        "name": "N/A",
+        "brand": "Yamato", # Marca fissa
+        "description": "N/A",
+        "price": "N/A", # Non sembra esserci un prezzo visibile sul sito pubblico
+        "image_url": "N/A",
+        "product_page_url": detail_url # L'URL della pagina di dettaglio stessa
+    }
+
+    # Estrai il Nome del prodotto
+    name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
+    if name_tag:
+        product_detail_data["name"] = name_tag.get_text(strip=True)
+        # print(f"   Trovato Nome: {product_detail_data['name']}") # DEBUG
+
+
+    # Estrai la Descrizione (concatena gli elementi della lista)
+    description_items = soup.select(PRODUCT_DESCRIPTION_SELECTOR_DETAIL)
+    if description_items:
+        description_text = "\n".join([item.get_text(strip=True) for item in description_items])
+        if description_text:
+            product_detail_data["description"] = description_text
+            # print(f"   Trovata Descrizione (snippet): {product_detail_data['description'][:70]}...") # DEBUG
+        # else: Nessun testo nella descrizione, rimane N/A
+    # else: Elementi descrizione non trovati, rimane N/A
+
+
+    # Estrai l'URL dell'immagine
+    img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
+    if img_tag and img_tag.has_attr('src'):
+         image_src = img_tag['src']
+         # Usa urljoin per costruire l'URL completo, gestisce la codifica
+         if image_src and not image_src.startswith('data:'): # Ignora placeholder data:image
+             product_detail_data["image_url"] = urljoin(BASE_URL, image_src)
+             # print(f"   Trovata Immagine: {product_detail_data['image_url']}") # DEBUG
+         # else: image_url rimane N/A se placeholder o vuoto
+    # else: img_tag non trovato o senza src, image_url rimane N/A
+
+    return product_detail_data
 
 
 def scrape_yamato_detail_page(driver, detail_url):
@@ -106,36 +146,7 @@ def scrape_yamato_detail_page(driver, detail_url):
              print("   Impossibile ottenere la soup dalla pagina di dettaglio.")
              return product_detail_data # Restituisce dati parziali se non si ottiene la soup
 
-
-        # Estrai il Nome del prodotto
-        name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
-        if name_tag:
-            product_detail_data["name"] = name_tag.get_text(strip=True)
-            # print(f"   Trovato Nome: {product_detail_data['name']}") # DEBUG
-
-
-        # Estrai la Descrizione (concatena gli elementi della lista)
-        description_items = soup.select(PRODUCT_DESCRIPTION_SELECTOR_DETAIL)
-        if description_items:
-            description_text = "\n".join([item.get_text(strip=True) for item in description_items])
-            if description_text:
-                product_detail_data["description"] = description_text
-                # print(f"   Trovata Descrizione (snippet): {product_detail_data['description'][:70]}...") # DEBUG
-            # else: Nessun testo nella descrizione, rimane N/A
-        # else: Elementi descrizione non trovati, rimane N/A
-
-
-        # Estrai l'URL dell'immagine
-        img_tag = soup.select_one(PRODUCT_IMAGE_SELECTOR_DETAIL)
-        if img_tag and img_tag.has_attr('src'):
-             image_src = img_tag['src']
-             # Usa urljoin per costruire l'URL completo, gestisce la codifica
-             if image_src and not image_src.startswith('data:'): # Ignora placeholder data:image
-                 product_detail_data["image_url"] = urljoin(BASE_URL, image_src)
-                 # print(f"   Trovata Immagine: {product_detail_data['image_url']}") # DEBUG
-             # else: image_url rimane N/A se placeholder o vuoto
-        # else: img_tag non trovato o senza src, image_url rimane N/A
-
+        product_detail_data = parse_yamato_detail_page(soup, detail_url)
 
     # Cattura eccezioni specifiche di Selenium durante la navigazione della pagina di dettaglio
     except (TimeoutException, NoSuchElementException) as e:
@@ -146,6 +157,12 @@ def scrape_yamato_detail_page(driver, detail_url):
     return product_detail_data
 
 
+def parse_yamato_fetched_page(detail_url, soup):
+    """Dati di una pagina di dettaglio scaricata con fetch() in pagina; None se il nome manca (la pagina va aperta nel browser)."""
+    product_detail_data = parse_yamato_detail_page(soup, detail_url)
+    return product_detail_data if product_detail_data["name"] != "N/A" else None
+
+
 def scrape_yamato_category_page_for_product_urls(driver, listing_url):
      """
      Naviga a una pagina di elenco, raccoglie gli URL dei prodotti su quella pagina,
@@ -180,9 +197,8 @@ def scrape_yamato_category_page_for_product_urls(driver, listing_url):
 
      if not product_containers:
          print(f"Nessun contenitore prodotto trovato su {listing_url}. Controlla il selettore '{PRODUCT_CONTAINER_SELECTOR_LISTING}'.")
-         # Stampa una parte dell'HTML per debuggare se non trova contenitori
-         print("Primi 2000 caratteri dell'HTML della pagina per debug (nessun contenitore trovato):")
-         print(soup_listing.prettify()[:2000])
+         # Salva l'HTML grezzo (campionato) per debug, senza serializzare l'albero
+         diagnostics.record_miss(PRODUCT_CONTAINER_SELECTOR_LISTING)
          # Anche se non trova prodotti, controlla se c'è un link alla pagina successiva
          pass # Continua per cercare il link di paginazione
 
@@ -241,6 +257,7 @@ def save_to_csv(data, filename):
         print("Nessun dato prodotto valido estratto per determinare le intestazioni CSV.")
     except Exception as e:
         print(f"Errore durante il salvataggio del file CSV: {e}")
+    catalog.save_records(data)
 
 
 if __name__ == "__main__":
@@ -257,6 +274,7 @@ if __name__ == "__main__":
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         driver = webdriver.Chrome(options=chrome_options)
+        driver = prepare_driver(driver)
 
 
         all_scraped_products = []
@@ -345,10 +363,19 @@ if __name__ == "__main__":
             # Ora visita ogni URL di dettaglio raccolto per scrapare i dati completi
             print("Inizio scraping dei dettagli dei prodotti per questa categoria...")
 
+            detail_urls_to_open = all_product_detail_urls_in_category
+            # Con SCRAPER_INPAGE_FETCH le pagine di dettaglio si scaricano con fetch() dalla pagina di elenco
+            # già aperta (stessi cookie del browser); solo quelle non estraibili così vengono aperte in una scheda
+            if pagefetch.enabled():
+                fetched_products, detail_urls_to_open = pagefetch.scrape_in_page(
+                    driver, all_product_detail_urls_in_category, parse_yamato_fetched_page)
+                all_scraped_products.extend(fetched_products)
+                metrics.record_emitted(len(fetched_products))
+
             # Ottieni l'handle della finestra corrente (dopo l'ultima pagina di elenco visitata)
             original_window = driver.current_window_handle
 
-            for j, detail_url in enumerate(all_product_detail_urls_in_category):
+            for j, detail_url in enumerate(metrics.track_loop(detail_urls_to_open, "dettaglio")):
                 # Rimosso: if len(all_scraped_products) >= PRODUCT_TOTAL_LIMIT:
                 # Rimosso: print(f"Limite totale di {PRODUCT_TOTAL_LIMIT} prodotti raggiunto. Interruzione scraping dei dettagli.")
                 # Rimosso: break # Esci dal loop dei dettagli se il limite è raggiunto
@@ -368,6 +395,7 @@ if __name__ == "__main__":
                     # Aggiungi i dati estratti alla lista principale solo se il nome è stato trovato
                     if product_detail and product_detail.get("name") != "N/A":
                         all_scraped_products.append(product_detail)
+                        metrics.record_emitted()
                         print(f"  Aggiunto prodotto {len(all_scraped_products)} (Totale): {product_detail.get('name')}") # DEBUG
                     # else: Prodotto saltato (nome N/A)
 
@@ -6,7 +6,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from bs4 import BeautifulSoup
+from fetch import prepare_driver, parse_html
+import blocking
 
 # Impostazioni iniziali
 # URL della singola pagina prodotto da scrapare
@@ -39,16 +40,6 @@ CAPTCHA_INDICATOR_SELECTORS = [
 driver = None
 
 
-def get_soup_from_selenium(driver):
-    """Ottiene l'HTML corrente dal driver Selenium e lo parsa con BeautifulSoup."""
-    try:
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        return soup
-    except Exception as e:
-        print(f"Errore nell'ottenere la page_source o nel parsing con BeautifulSoup: {e}")
-        return None
-
 
 def scrape_weber_single_product(driver, product_url):
     """
@@ -72,32 +63,14 @@ def scrape_weber_single_product(driver, product_url):
 
         # --- Gestione CAPTCHA ---
         print("Controllo per potenziale CAPTCHA o blocco...")
-        captcha_present = False
         # Diamo un po' di tempo alla pagina per caricarsi e mostrare il CAPTCHA
         time.sleep(5)
-        for selector_type, selector_value in CAPTCHA_INDICATOR_SELECTORS:
-            try:
-                if selector_type == "css":
-                    # Usa By.CSS_SELECTOR per i selettori CSS
-                    captcha_element = driver.find_element(By.CSS_SELECTOR, selector_value)
-                elif selector_type == "xpath":
-                    # Usa By.XPATH per i selettori XPath
-                    captcha_element = driver.find_element(By.XPATH, selector_value)
-                else:
-                    print(f"Tipo di selettore sconosciuto: {selector_type}. Salto.")
-                    continue # Salta questo selettore se il tipo non è riconosciuto
-
-                if captcha_element.is_displayed():
-                    captcha_present = True
-                    print(f"Potenziale CAPTCHA o blocco rilevato usando selettore ({selector_type}): {selector_value}")
-                    break # Esci dal ciclo selettori se ne trovi uno
-            except NoSuchElementException:
-                # L'elemento non è presente, continua a controllare gli altri selettori
-                pass
-            except Exception as e:
-                # Stampa l'errore ma continua con gli altri selettori
-                print(f"Errore durante il controllo CAPTCHA con selettore ({selector_type}) {selector_value}: {e}")
-
+        # Tutti i selettori (CSS e XPath) in un solo controllo nel browser, che alimenta anche
+        # l'interruttore dell'host (vedi blocking.py)
+        block_reason = blocking.check_page(driver, selectors=CAPTCHA_INDICATOR_SELECTORS)
+        captcha_present = block_reason is not None
+        if captcha_present:
+            print(f"Potenziale CAPTCHA o blocco rilevato ({block_reason})")
 
         if captcha_present:
             print("\n=========================================================")
@@ -138,7 +111,7 @@ def scrape_weber_single_product(driver, product_url):
 
         # Ottieni l'HTML dopo il caricamento completo (e l'eventuale risoluzione CAPTCHA)
         page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = parse_html(page_source)
 
         # Estrai il Nome del prodotto (anche se l'abbiamo già atteso, lo ri-estraiamo dalla soup)
         name_tag = soup.select_one(PRODUCT_TITLE_SELECTOR_DETAIL)
@@ -290,6 +263,7 @@ if __name__ == "__main__":
         # Inizializza il driver Selenium
         # Esegui in modalità visibile per debuggare inizialmente
         driver = webdriver.Chrome() # O webdriver.Firefox(), webdriver.Edge(), ecc.
+        driver = prepare_driver(driver)
 
         # Scrape la singola pagina prodotto
         # Questa funzione ora include la gestione manuale del CAPTCHA
@@ -0,0 +1,337 @@
+import argparse
+import csv
+import glob
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+import catalog
+import metrics
+
+# Indice full-text dei prodotti (nome, marca, descrizione) su SQLite FTS5, per cercare per parola
+# chiave in tutte le marche senza scorrere decine di CSV.
+# Il testo indicizzato passa da un tokenizer per l'italiano: minuscolo, accenti rimossi ("è" -> "e",
+# "perché" -> "perche"), apostrofi separati ("dell'intonaco" -> "intonaco") e stemming leggero
+# (plurali e desinenze di genere: "malte", "malta" -> "malt"; "bianche", "bianco" -> "bianc").
+# La query viene trattata allo stesso modo; i risultati sono ordinati per rilevanza BM25, con il nome
+# che pesa più della marca e della descrizione.
+# L'indice è aggiornato in modo incrementale ogni volta che uno scraper salva i suoi record
+# (tramite catalog.save_records): ogni prodotto è identificato da (sorgente, URL) come nel catalogo.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_SEARCH_INDEX  percorso dell'indice (default: search.db, "0" per non aggiornarlo)
+#
+# Uso da riga di comando:
+#   python search.py query "malta fibrorinforzata"          # cerca (tutte le parole)
+#   python search.py query "silicone sigillante" --any --brand Mapei
+#   python search.py index *.csv                           # indicizza CSV esistenti
+#   python search.py rebuild                               # ricostruisce l'indice dal catalogo
+#   python search.py stats
+
+SEARCH_INDEX_ENV = "SCRAPER_SEARCH_INDEX"
+DEFAULT_PATH = "search.db"
+
+BATCH_SIZE = 500
+BUSY_TIMEOUT = 30.0
+DEFAULT_LIMIT = 20
+EXCERPT_LENGTH = 160  # Caratteri della descrizione mostrati nei risultati
+
+# Pesi BM25 delle colonne indicizzate (nome, marca, descrizione)
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+MIN_STEM_LENGTH = 4  # Le parole più corte (sigle, codici) restano intatte
+
+# Desinenze rimosse dallo stemmer, dalla più lunga: superlativi, avverbi, plurali e genere
+_SUFFIXES = (
+    ("issimi", ""), ("issime", ""), ("issimo", ""), ("issima", ""),
+    ("mente", ""),
+    ("che", "c"), ("chi", "c"), ("ghe", "g"), ("ghi", "g"),
+    ("a", ""), ("e", ""), ("i", ""), ("o", ""),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id          INTEGER PRIMARY KEY,
+    source      TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    name        TEXT,
+    brand       TEXT,
+    description TEXT,
+    updated     TEXT NOT NULL,
+    UNIQUE (source, url)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_brand ON documents (brand COLLATE NOCASE);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    name, brand, description,
+    content='',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_QUERY_WORD_RE = re.compile(r"[a-z0-9]+\*?")
+
+
+def index_path():
+    """Percorso dell'indice configurato, o None se l'aggiornamento è disattivato."""
+    value = os.environ.get(SEARCH_INDEX_ENV, DEFAULT_PATH)
+    return None if value == "0" else value
+
+
+def fold(text):
+    """Minuscolo e senza accenti."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def stem(word):
+    """Stemming leggero per l'italiano: rimuove una sola desinenza flessiva."""
+    if len(word) < MIN_STEM_LENGTH or not word.isalpha():
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= MIN_STEM_LENGTH - 1:
+            return word[:len(word) - len(suffix)] + replacement
+    return word
+
+
+def analyze(text):
+    """Testo da indicizzare: parole normalizzate e ridotte alla radice, separate da spazi."""
+    return " ".join(stem(word) for word in _WORD_RE.findall(fold(text)))
+
+
+def build_query(text, match_any=False):
+    """
+    Converte la ricerca dell'utente in una query FTS5: ogni parola viene normalizzata come il testo
+    indicizzato; "parola*" resta una ricerca per prefisso. Restituisce None se non resta nessuna parola.
+    """
+    terms = []
+    for word in _QUERY_WORD_RE.findall(fold(text)):
+        if word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{stem(word)}"')
+    if not terms:
+        return None
+    return (" OR " if match_any else " ").join(terms)
+
+
+class SearchIndex:
+    """Indice full-text dei prodotti: aggiornamento a blocchi per (sorgente, URL) e ricerca ordinata per rilevanza."""
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE):
+        self.path = path or index_path() or DEFAULT_PATH
+        self.batch_size = batch_size
+        self.pending = {}
+        self.written = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def add(self, record, source=metrics.SITE, seen_at=None):
+        """Aggiunge o aggiorna un record di uno scraper (normalizzato come nel catalogo)."""
+        row = catalog.normalize_record(record, source, seen_at or time.strftime("%Y-%m-%dT%H:%M:%S"))
+        if row is not None:
+            self.add_row(dict(zip(catalog.COLUMNS, row)))
+
+    def add_many(self, records, source=metrics.SITE, seen_at=None):
+        seen_at = seen_at or time.strftime("%Y-%m-%dT%H:%M:%S")
+        for record in records:
+            self.add(record, source, seen_at)
+
+    def add_row(self, row):
+        """Aggiunge una riga del catalogo (dizionario con le colonne di catalog.COLUMNS)."""
+        with self.lock:
+            # A parità di chiave nello stesso blocco vale l'ultima versione
+            self.pending[(row["source"], row["url"])] = row
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        with self.connection:
+            for (source, url), row in self.pending.items():
+                previous = self.connection.execute(
+                    "SELECT id, name, brand, description FROM documents WHERE source = ? AND url = ?", (source, url)
+                ).fetchone()
+                if previous:
+                    document_id, name, brand, description = previous
+                    if (name, brand, description) == (row["name"], row["brand"], row["description"]):
+                        continue  # Testo invariato: l'indice non va toccato
+                    # Tabella FTS5 senza contenuto: per rimuovere un documento vanno ripassati i valori indicizzati
+                    self.connection.execute(
+                        "INSERT INTO documents_fts (documents_fts, rowid, name, brand, description) "
+                        "VALUES ('delete', ?, ?, ?, ?)",
+                        (document_id, analyze(name), analyze(brand), analyze(description)),
+                    )
+                    self.connection.execute(
+                        "UPDATE documents SET name = ?, brand = ?, description = ?, updated = ? WHERE id = ?",
+                        (row["name"], row["brand"], row["description"], row["last_seen"], document_id),
+                    )
+                else:
+                    document_id = self.connection.execute(
+                        "INSERT INTO documents (source, url, name, brand, description, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                        (source, url, row["name"], row["brand"], row["description"], row["last_seen"]),
+                    ).lastrowid
+                self.connection.execute(
+                    "INSERT INTO documents_fts (rowid, name, brand, description) VALUES (?, ?, ?, ?)",
+                    (document_id, analyze(row["name"]), analyze(row["brand"]), analyze(row["description"])),
+                )
+                self.written += 1
+        self.pending = {}
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def optimize(self):
+        """Unisce i segmenti dell'indice (utile dopo una ricostruzione completa)."""
+        self.flush()
+        with self.connection:
+            self.connection.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, text, limit=DEFAULT_LIMIT, brand=None, source=None, match_any=False):
+        """
+        Prodotti che contengono le parole cercate (tutte, o almeno una con match_any), dal più rilevante.
+        Ogni risultato è un dizionario con sorgente, URL, nome, marca, descrizione e punteggio.
+        """
+        self.flush()
+        query = build_query(text, match_any)
+        if query is None:
+            return []
+        weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+        sql = (
+            f"SELECT d.source, d.url, d.name, d.brand, d.description, bm25(documents_fts, {weights}) AS score "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params = [query]
+        if brand:
+            sql += " AND d.brand = ? COLLATE NOCASE"
+            params.append(brand)
+        if source:
+            sql += " AND d.source = ?"
+            params.append(source)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        columns = ("source", "url", "name", "brand", "description", "score")
+        return [dict(zip(columns, row)) for row in self.connection.execute(sql, params)]
+
+    def stats(self):
+        self.flush()
+        return self.connection.execute(
+            "SELECT source, COUNT(*), MAX(updated) FROM documents GROUP BY source ORDER BY source"
+        ).fetchall()
+
+
+def save_records(records, source=metrics.SITE):
+    """
+    Aggiorna l'indice con i record di uno scraper (se non disattivato con SCRAPER_SEARCH_INDEX=0).
+    Non interrompe mai lo scraper: un errore dell'indice viene solo segnalato.
+    """
+    path = index_path()
+    if not records or not path:
+        return 0
+    try:
+        with SearchIndex(path) as index:
+            index.add_many(records, source)
+            index.flush()
+            written = index.written
+    except Exception as e:
+        print(f"Errore durante l'aggiornamento dell'indice di ricerca {path}: {e}")
+        return 0
+    print(f"Indice di ricerca {path}: {written} prodotti aggiornati per la sorgente '{source}'.")
+    return written
+
+
+def index_csv_files(paths, index, source=None):
+    """Indicizza CSV esistenti, dal più vecchio al più recente: a parità di chiave vince il file più recente."""
+    for path in sorted(paths, key=os.path.getmtime):
+        seen_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(path)))
+        file_source = source or catalog.source_from_filename(path)
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            rows = list(csv.DictReader(f))
+        index.add_many(rows, file_source, seen_at)
+        print(f"Indicizzati {len(rows)} record da {path} (sorgente '{file_source}').")
+    index.flush()
+
+
+def rebuild_from_catalog(index, db_path=None):
+    """Indicizza tutti i prodotti del catalogo SQLite."""
+    with catalog.CatalogStore(db_path) as store:
+        for row in store.query():
+            index.add_row(row)
+    index.optimize()
+
+
+def _excerpt(text):
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= EXCERPT_LENGTH else text[:EXCERPT_LENGTH].rsplit(" ", 1)[0] + "..."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ricerca full-text nei prodotti.")
+    parser.add_argument("--index", default=index_path() or DEFAULT_PATH, help="Percorso dell'indice")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    query_parser = commands.add_parser("query", help="Cerca per parole chiave")
+    query_parser.add_argument("text")
+    query_parser.add_argument("--any", action="store_true", help="Basta una delle parole (default: tutte)")
+    query_parser.add_argument("--brand")
+    query_parser.add_argument("--source")
+    query_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+
+    index_parser = commands.add_parser("index", help="Indicizza file CSV")
+    index_parser.add_argument("files", nargs="+")
+    index_parser.add_argument("--source", help="Sorgente da usare per tutti i file (default: dal nome del file)")
+
+    rebuild_parser = commands.add_parser("rebuild", help="Indicizza tutto il catalogo SQLite")
+    rebuild_parser.add_argument("--db", default=catalog.catalog_path() or catalog.DEFAULT_PATH)
+
+    commands.add_parser("stats", help="Prodotti indicizzati per sorgente")
+    args = parser.parse_args()
+
+    with SearchIndex(args.index) as index:
+        if args.command == "query":
+            start = time.perf_counter()
+            results = index.search(args.text, args.limit, args.brand, args.source, args.any)
+            elapsed = (time.perf_counter() - start) * 1000
+            for position, result in enumerate(results, start=1):
+                print(f"{position:>3}. {result['name']}  [{result['brand'] or '-'} | {result['source']}]")
+                print(f"     {result['url']}")
+                if result["description"]:
+                    print(f"     {_excerpt(result['description'])}")
+            print(f"{len(results)} risultati in {elapsed:.1f} ms")
+        elif args.command == "index":
+            files = [path for pattern in args.files for path in (glob.glob(pattern) or [pattern])]
+            index_csv_files(files, index, args.source)
+            index.optimize()
+        elif args.command == "rebuild":
+            rebuild_from_catalog(index, args.db)
+            print(f"Indicizzati {index.written} prodotti dal catalogo {args.db}")
+        else:
+            for source, products, updated in index.stats():
+                print(f"{source:<40} {products:>7} prodotti  ultimo aggiornamento {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import atexit
+import json
+import os
+import threading
+
+import soupsieve
+
+import metrics
+
+# Catene di selettori CSS di ripiego ("prova questo, poi quest'altro...").
+# Prima ogni selettore veniva cercato con soup.select_one/select su tutto l'albero, uno dopo l'altro:
+# su una pagina dove i primi selettori non corrispondono ogni tentativo fallito è una visita completa.
+# Qui i selettori sono compilati una volta sola (soupsieve) e valutati insieme in un'unica visita
+# dell'albero come lista di selettori: per ogni elemento trovato si stabilisce quali candidati
+# corrispondono, e la visita si ferma appena il risultato è deciso, cioè quando il vincitore e tutti
+# i candidati che lo precedono nella catena sono risolti.
+# Vince sempre il primo candidato (nell'ordine dichiarato) il cui primo elemento è accettato, come
+# nella catena sequenziale: il risultato non dipende dalle pagine viste in precedenza.
+# Per ogni sito si contano i successi di ogni selettore (metrica e file per sito, salvato a fine
+# esecuzione e ricaricato alle successive) per individuare i selettori che non vincono mai.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_SELECTOR_STATS  cartella dei conteggi per sito (default: selector_stats, "0" per non salvarli)
+
+STATS_DIR = os.environ.get("SCRAPER_SELECTOR_STATS", "selector_stats")
+
+NO_MATCH = "nessuno"   # Etichetta delle valutazioni senza alcun selettore vincente
+
+_lock = threading.Lock()
+_stats = {}   # sito -> {catena: {selettore: successi}}
+
+
+def _stats_path(site):
+    return os.path.join(STATS_DIR, f"{site}.json")
+
+
+def _site_stats(site):
+    """Conteggi dei successi del sito, caricati dal file della esecuzione precedente alla prima richiesta."""
+    with _lock:
+        stats = _stats.get(site)
+        if stats is None:
+            stats = {}
+            if STATS_DIR != "0":
+                try:
+                    with open(_stats_path(site), encoding="utf-8") as f:
+                        stats = json.load(f)
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    print(f"Statistiche dei selettori di {site} non leggibili ({e}): si riparte da zero.")
+            _stats[site] = stats
+        return stats
+
+
+def save_stats():
+    """Salva i conteggi dei successi di ogni sito (scrittura atomica)."""
+    if STATS_DIR == "0":
+        return
+    with _lock:
+        snapshot = {site: json.dumps(stats, ensure_ascii=False, indent=1, sort_keys=True)
+                    for site, stats in _stats.items() if stats}
+    if not snapshot:
+        return
+    os.makedirs(STATS_DIR, exist_ok=True)
+    for site, payload in snapshot.items():
+        path = _stats_path(site)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+class SelectorChain:
+    """
+    Catena di selettori CSS di ripiego, compilata una volta e valutata in una sola visita dell'albero.
+    `name` identifica la catena nelle statistiche del sito.
+    """
+
+    def __init__(self, name, selectors, site=metrics.SITE):
+        self.name = name
+        self.selectors = list(selectors)
+        self.compiled = [soupsieve.compile(selector) for selector in self.selectors]
+        self.combined = soupsieve.compile(", ".join(self.selectors))
+        self.site = site
+        self.hits = _site_stats(site).setdefault(name, {})
+
+    def _credit(self, index):
+        selector = self.selectors[index] if index is not None else NO_MATCH
+        if index is not None:
+            with _lock:
+                self.hits[selector] = self.hits.get(selector, 0) + 1
+        metrics.inc("scraper_selector_chain_hits_total", site=self.site, chain=self.name, selector=selector)
+
+    def select_one(self, root, accept=None):
+        """
+        Primo elemento del candidato prioritario che trova qualcosa, come soup.select_one provato
+        selettore per selettore. Con `accept(elemento)` un candidato il cui primo elemento non è
+        accettato (es. un'immagine senza src) cede il posto al successivo. None se nessuno vince.
+        """
+        order = range(len(self.selectors))
+        first = {}
+        for element in self.combined.iselect(root):
+            for index in order:
+                if index not in first and self.compiled[index].match(element):
+                    first[index] = element
+            # Il risultato è deciso quando tutti i candidati più prioritari del vincitore sono risolti
+            for index in order:
+                if index not in first:
+                    break
+                if accept is None or accept(first[index]):
+                    self._credit(index)
+                    return first[index]
+            else:
+                break
+        for index in order:
+            if index in first and (accept is None or accept(first[index])):
+                self._credit(index)
+                return first[index]
+        self._credit(None)
+        return None
+
+    def select(self, root, accept=None):
+        """
+        Elementi del candidato prioritario che trova qualcosa, come soup.select provato selettore per
+        selettore, in una sola visita. Con `accept(elementi)` un candidato può essere scartato.
+        Restituisce (selettore, elementi), oppure (None, []) se nessun candidato vince.
+        """
+        order = range(len(self.selectors))
+        matches = {index: [] for index in order}
+        for element in self.combined.iselect(root):
+            for index in order:
+                if self.compiled[index].match(element):
+                    matches[index].append(element)
+        for index in order:
+            if matches[index] and (accept is None or accept(matches[index])):
+                self._credit(index)
+                return self.selectors[index], matches[index]
+        self._credit(None)
+        return None, []
+
+
+atexit.register(save_stats)
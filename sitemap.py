@@ -0,0 +1,150 @@
+import gzip
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import requests
+
+import fetch
+from fingerprint import canonical_url
+
+# Scoperta delle URL prodotto tramite sitemap, in alternativa allo scorrimento della paginazione.
+# Si parte dalle sitemap dichiarate in robots.txt (o da /sitemap.xml), si seguono ricorsivamente
+# gli indici di sitemap (anche compressi .xml.gz) e si filtrano le URL con un pattern per sito.
+# Il campo lastmod viene conservato: insieme all'archivio delle impronte permette di saltare
+# le pagine non modificate senza nemmeno scaricarle.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_DISCOVERY  "sitemap" per usare le sitemap, "pagination" (default) per la paginazione
+
+DISCOVERY_MODE = os.environ.get("SCRAPER_DISCOVERY", "pagination")
+
+MAX_SITEMAPS = 500  # Limite di sicurezza sul numero di sitemap lette per scoperta
+
+SitemapEntry = namedtuple("SitemapEntry", ["loc", "lastmod"])
+
+
+def enabled():
+    """True se la scoperta delle URL deve passare dalle sitemap."""
+    return DISCOVERY_MODE == "sitemap"
+
+
+def parse_lastmod(value):
+    """Converte un lastmod W3C (data o data/ora) in datetime UTC senza fuso; None se assente o non valido."""
+    if not value:
+        return None
+    value = value.strip().replace("Z", "+00:00")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = datetime.strptime(value[:10], "%Y-%m-%d")
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def robots_sitemaps(base_url, headers=None):
+    """Sitemap dichiarate in robots.txt; se non ce ne sono si prova /sitemap.xml."""
+    try:
+        response = fetch.get(urljoin(base_url, "/robots.txt"), headers=headers, timeout=15)
+        response.raise_for_status()
+        sitemaps = re.findall(r"^\s*sitemap:\s*(\S+)", response.text, re.I | re.M)
+    except requests.exceptions.RequestException as e:
+        print(f"robots.txt non disponibile per {base_url}: {e}")
+        sitemaps = []
+    return sitemaps or [urljoin(base_url, "/sitemap.xml")]
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_sitemap(url, headers=None):
+    """
+    Scarica e legge una sitemap (anche gzip).
+    Restituisce (tipo, voci) con tipo "index" per un indice di sitemap o "urlset" per un elenco di URL.
+    """
+    response = fetch.get(url, headers=headers, timeout=30)
+    response.raise_for_status()
+    content = response.content
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+
+    root = ET.fromstring(content)
+    kind = "index" if _local_name(root.tag) == "sitemapindex" else "urlset"
+    entries = []
+    for node in root:
+        fields = {_local_name(child.tag): (child.text or "").strip() for child in node}
+        if fields.get("loc"):
+            entries.append(SitemapEntry(fields["loc"], parse_lastmod(fields.get("lastmod"))))
+    return kind, entries
+
+
+def iter_entries(sitemap_urls, pattern=None, since=None, index_pattern=None, headers=None):
+    """
+    Visita le sitemap (seguendo gli indici) e restituisce le voci la cui URL corrisponde a `pattern`.
+    `index_pattern` limita le sottositemap seguite; `since` scarta le voci con lastmod precedente.
+    """
+    url_re = re.compile(pattern) if pattern else None
+    index_re = re.compile(index_pattern) if index_pattern else None
+    queue = list(sitemap_urls)
+    visited = set()
+    while queue and len(visited) < MAX_SITEMAPS:
+        sitemap_url = queue.pop(0)
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        try:
+            kind, entries = read_sitemap(sitemap_url, headers=headers)
+        except (requests.exceptions.RequestException, ET.ParseError, OSError) as e:
+            print(f"Sitemap non leggibile {sitemap_url}: {e}")
+            continue
+
+        if kind == "index":
+            for entry in entries:
+                if index_re and not index_re.search(entry.loc):
+                    continue
+                if since and entry.lastmod and entry.lastmod < since:
+                    continue  # Sottositemap non modificata: nessuna delle sue URL può essere cambiata
+                queue.append(entry.loc)
+            continue
+
+        for entry in entries:
+            if url_re and not url_re.search(entry.loc):
+                continue
+            if since and entry.lastmod and entry.lastmod < since:
+                continue
+            yield entry
+
+
+def discover(base_url, pattern, since=None, index_pattern=None, headers=None, sitemap_urls=None):
+    """
+    Elenco delle voci di sitemap (URL + lastmod) del sito che corrispondono a `pattern`,
+    senza duplicati (per URL canonica) e nell'ordine in cui compaiono nelle sitemap.
+    """
+    sitemap_urls = sitemap_urls or robots_sitemaps(base_url, headers=headers)
+    seen = set()
+    found = []
+    for entry in iter_entries(sitemap_urls, pattern, since=since, index_pattern=index_pattern, headers=headers):
+        key = canonical_url(entry.loc)
+        if key not in seen:
+            seen.add(key)
+            found.append(entry)
+    print(f"Scoperte {len(found)} URL dalle sitemap di {base_url} (pattern: {pattern}).")
+    return found
+
+
+if __name__ == "__main__":
+    # Uso: python sitemap.py <url sito> [pattern]
+    if len(sys.argv) < 2:
+        print("Uso: python sitemap.py <url sito> [pattern]")
+        sys.exit(1)
+    for item in discover(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None):
+        print(f"{item.lastmod.isoformat() if item.lastmod else '-':<20} {item.loc}")
@@ -0,0 +1,76 @@
+import os
+import threading
+import weakref
+
+# Snapshot del DOM per navigazione, condiviso tra gli estrattori.
+# Prima ogni estrattore che lavorava sulla pagina corrente rileggeva page_source (l'intero HTML
+# trasferito da chromedriver) e lo riparsava con BeautifulSoup: con più estrattori di ripiego e la
+# ricerca della paginazione la stessa pagina veniva trasferita e parsata fino a tre volte.
+# Qui il primo snapshot installa nel documento un MutationObserver che incrementa una versione a
+# ogni modifica del DOM; le richieste successive inviano il token (documento, versione) dello
+# snapshot in cache e il browser restituisce l'HTML solo se nel frattempo la pagina è cambiata
+# (nuova navigazione o DOM modificato), altrimenti risponde null con un round trip minimo e si
+# riusano HTML e albero già parsato.
+# Le modifiche del solo attributo style (animazioni, caroselli) non invalidano lo snapshot.
+# L'albero condiviso va trattato in sola lettura: per modificarlo lavorare su una copia.
+#
+# Configurazione tramite variabili d'ambiente:
+#   SCRAPER_SNAPSHOT_CACHE  "0" per rileggere e riparsare la pagina a ogni richiesta (default: attivo)
+
+SNAPSHOT_CACHE = os.environ.get("SCRAPER_SNAPSHOT_CACHE", "1") != "0"
+
+SNAPSHOT_SCRIPT = """
+var previous = arguments[0], state = document.__scraperSnapshot;
+if (!state) {
+    state = document.__scraperSnapshot = {id: Math.random().toString(36).slice(2), version: 0};
+    new MutationObserver(function (records) {
+        for (var i = 0; i < records.length; i++) {
+            if (records[i].type !== 'attributes' || records[i].attributeName !== 'style') { state.version++; return; }
+        }
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+var token = state.id + ':' + state.version;
+if (token === previous) { return null; }
+var doctype = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : '';
+return [token, doctype + document.documentElement.outerHTML];
+"""
+
+
+class PageSnapshot:
+    """Ultimo snapshot della pagina di un driver: token di validità, HTML e (se già richiesto) albero parsato."""
+
+    def __init__(self):
+        self.token = None
+        self.html = None
+        self.soup = None
+
+    def refresh(self, driver):
+        """Aggiorna lo snapshot se la pagina è cambiata; restituisce True se l'HTML è stato riletto."""
+        if SNAPSHOT_CACHE:
+            try:
+                result = driver.execute_script(SNAPSHOT_SCRIPT, self.token)
+            except Exception:
+                result = False  # Documento senza DOM utilizzabile: lettura classica
+            if result is None:
+                return False
+            if result:
+                self.token, self.html = result
+                self.soup = None
+                return True
+        self.token = None
+        self.html = driver.page_source
+        self.soup = None
+        return True
+
+
+_lock = threading.Lock()
+_snapshots = weakref.WeakKeyDictionary()
+
+
+def snapshot_for(driver):
+    """Snapshot associato al driver (creato alla prima richiesta)."""
+    with _lock:
+        snapshot = _snapshots.get(driver)
+        if snapshot is None:
+            snapshot = _snapshots[driver] = PageSnapshot()
+        return snapshot